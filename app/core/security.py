@@ -1,3 +1,6 @@
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from passlib.context import CryptContext
@@ -40,4 +43,43 @@ def decode_access_token(token: str):
         payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.ALGORITHM])
         return payload
     except JWTError as e:
-        raise ValueError(f"Token non valido: {e}")
\ No newline at end of file
+        raise ValueError(f"Token non valido: {e}")
+
+
+# ------------------------------------------------------------
+# TOKEN — CACHE DEI TOKEN VERIFICATI (2026-10-19)
+# Lo stesso token arriva a ogni richiesta della sessione: verificare firma
+# ed exp ogni volta (middleware viewer + get_current_user, due volte per
+# richiesta) è lavoro ripetuto. LRU token → claims, valida fino a `exp`.
+# Solo i token VALIDI entrano in cache; un token scaduto viene rimosso e
+# ridecodificato (→ errore come prima).
+# ------------------------------------------------------------
+_TOKEN_CACHE_MAX = 256
+_token_cache: "OrderedDict[str, dict]" = OrderedDict()
+_token_lock = threading.Lock()
+
+
+def decode_access_token_cached(token: str) -> dict:
+    """Come decode_access_token, con LRU dei token già verificati."""
+    now = time.time()
+    with _token_lock:
+        payload = _token_cache.get(token)
+        if payload is not None:
+            if payload["exp"] > now:
+                _token_cache.move_to_end(token)
+                return dict(payload)
+            del _token_cache[token]
+    payload = decode_access_token(token)
+    if isinstance(payload.get("exp"), (int, float)):
+        with _token_lock:
+            _token_cache[token] = payload
+            _token_cache.move_to_end(token)
+            while len(_token_cache) > _TOKEN_CACHE_MAX:
+                _token_cache.popitem(last=False)
+    return dict(payload)
+
+
+def svuota_token_cache() -> None:
+    """Da chiamare se cambia SECRET_KEY a caldo (i token vecchi non valgono più)."""
+    with _token_lock:
+        _token_cache.clear()
@@ -0,0 +1,224 @@
+# Modulo: controllo_gestione
+"""
+Migrazione 170 — ledger mensile del Conto Economico (2026-10-19)
+
+CONTESTO:
+  compute_pl rifaceva a ogni richiesta, per OGNI mese del range, la join
+  fe_fatture × fe_righe × fe_fornitore_categoria × categorie con il filtro
+  di spalmatura, le due query spese fisse e l'aggregazione stipendi. La
+  vista "Anno" del CE, il PDF e la dashboard CG ricalcolavano 12 mesi chiusi
+  che non cambiano da settimane.
+
+  Ora le righe per mese vivono in `ce_ledger` (vedi services/ce_ledger.py):
+  compute_pl legge i mesi freschi e ricalcola solo quelli toccati.
+
+COSA CREA:
+  - ce_ledger        righe unificate del CE per (periodo, modalita, fonte)
+  - ce_ledger_mesi   un record per mese calcolato (+ impronta stipendi,
+                     che vengono da dipendenti.sqlite3 e non hanno trigger qui)
+  - ce_ledger_dirty  coda dei range di mesi da ricalcolare
+  - trigger su fe_fatture, fe_righe, fe_fornitore_categoria, fe_categorie,
+    fe_sottocategorie, cg_uscite, cg_spese_fisse che accodano il range
+    toccato. Per le fatture il range è quello della spalmatura (N mesi da
+    spalmatura_data_inizio), altrimenti competenza_anno_mese, altrimenti il
+    mese di data_fattura — la stessa priorità di
+    _aggregate_fatture_per_categoria. Rinomina di una categoria = '*'
+    (tutto il ledger).
+
+  Nessun seed: il ledger nasce vuoto e si popola alla prima lettura.
+
+DB COLPITO: foodcost.db. Solo tabelle/trigger nuovi, nessun dato esistente
+toccato.
+"""
+
+# Range di mesi di una fattura (alias F = NEW/OLD). SQLite non ammette CTE
+# nei trigger: l'espressione viene incollata dove serve.
+_FATTURA_DA = (
+    "CASE WHEN COALESCE({f}.spalmatura_mesi, 0) > 0 AND {f}.spalmatura_data_inizio IS NOT NULL "
+    "THEN substr({f}.spalmatura_data_inizio, 1, 7) "
+    "ELSE COALESCE({f}.competenza_anno_mese, strftime('%Y-%m', {f}.data_fattura)) END"
+)
+_FATTURA_N = (
+    "CASE WHEN COALESCE({f}.spalmatura_mesi, 0) > 0 AND {f}.spalmatura_data_inizio IS NOT NULL "
+    "THEN {f}.spalmatura_mesi ELSE 1 END"
+)
+_SPESA_DA = "substr({f}.spalmatura_data_inizio, 1, 7)"
+_SPESA_N = "COALESCE({f}.spalmatura_mesi, 1)"
+
+
+def _accoda_fattura(alias: str) -> str:
+    return (
+        "INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) VALUES ("
+        + _FATTURA_DA.format(f=alias) + ", " + _FATTURA_N.format(f=alias) + ");"
+    )
+
+
+def _accoda_fattura_da_riga(alias: str) -> str:
+    return (
+        "INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) SELECT "
+        + _FATTURA_DA.format(f="f") + ", " + _FATTURA_N.format(f="f")
+        + f" FROM fe_fatture f WHERE f.id = {alias}.fattura_id;"
+    )
+
+
+def _accoda_fatture_fornitore(alias: str) -> str:
+    return (
+        "INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) SELECT DISTINCT "
+        + _FATTURA_DA.format(f="f") + ", " + _FATTURA_N.format(f="f")
+        + f" FROM fe_fatture f WHERE f.fornitore_piva = {alias}.fornitore_piva;"
+    )
+
+
+def _accoda_spesa_fissa(alias: str) -> str:
+    return (
+        "INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) SELECT "
+        + _SPESA_DA.format(f=alias) + ", " + _SPESA_N.format(f=alias)
+        + f" WHERE {alias}.spalmatura_data_inizio IS NOT NULL;"
+        " INSERT INTO ce_ledger_dirty (periodo_da, n_mesi)"
+        " SELECT DISTINCT periodo_riferimento, 1 FROM cg_uscite"
+        f" WHERE spesa_fissa_id = {alias}.id AND periodo_riferimento IS NOT NULL;"
+    )
+
+
+def _accoda_uscita(alias: str) -> str:
+    return (
+        "INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) SELECT "
+        f"{alias}.periodo_riferimento, 1 WHERE {alias}.periodo_riferimento IS NOT NULL;"
+    )
+
+
+_TUTTO = "INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) VALUES ('*', 0);"
+
+# Colonne che entrano nel CE: gli UPDATE su altre colonne (stato pagamento,
+# note, xml, ...) non sporcano niente.
+_COL_FATTURE = (
+    "data_fattura, competenza_anno_mese, spalmatura_mesi, spalmatura_data_inizio, "
+    "is_autofattura, tipo_documento, fornitore_piva, fornitore_nome, numero_fattura"
+)
+_COL_RIGHE = "fattura_id, prezzo_totale, categoria_id, sottocategoria_id"
+_COL_FORNITORE = "fornitore_piva, categoria_id, sottocategoria_id, escluso_acquisti"
+_COL_USCITE = (
+    "tipo_uscita, periodo_riferimento, spesa_fissa_id, totale, fornitore_nome, "
+    "numero_fattura, data_pagamento, data_scadenza, data_fattura"
+)
+_COL_SPESE = (
+    "tipo, titolo, importo, attiva, categoria_id, sottocategoria_id, "
+    "spalmatura_mesi, spalmatura_data_inizio"
+)
+_USCITA_CE = "{f}.tipo_uscita IN ('SPESA_FISSA', 'STIPENDIO')"
+
+
+def _triggers() -> list[tuple[str, str, str]]:
+    """(nome, evento, corpo) — tabella nell'evento."""
+    t = []
+    t.append(("trg_ce_ledger_fatture_ins", "AFTER INSERT ON fe_fatture", _accoda_fattura("NEW")))
+    t.append(("trg_ce_ledger_fatture_del", "AFTER DELETE ON fe_fatture", _accoda_fattura("OLD")))
+    t.append((
+        "trg_ce_ledger_fatture_upd",
+        f"AFTER UPDATE OF {_COL_FATTURE} ON fe_fatture",
+        _accoda_fattura("OLD") + " " + _accoda_fattura("NEW"),
+    ))
+    t.append(("trg_ce_ledger_righe_ins", "AFTER INSERT ON fe_righe", _accoda_fattura_da_riga("NEW")))
+    t.append(("trg_ce_ledger_righe_del", "AFTER DELETE ON fe_righe", _accoda_fattura_da_riga("OLD")))
+    t.append((
+        "trg_ce_ledger_righe_upd",
+        f"AFTER UPDATE OF {_COL_RIGHE} ON fe_righe",
+        _accoda_fattura_da_riga("OLD") + " " + _accoda_fattura_da_riga("NEW"),
+    ))
+    t.append((
+        "trg_ce_ledger_fornitore_ins", "AFTER INSERT ON fe_fornitore_categoria",
+        _accoda_fatture_fornitore("NEW"),
+    ))
+    t.append((
+        "trg_ce_ledger_fornitore_del", "AFTER DELETE ON fe_fornitore_categoria",
+        _accoda_fatture_fornitore("OLD"),
+    ))
+    t.append((
+        "trg_ce_ledger_fornitore_upd",
+        f"AFTER UPDATE OF {_COL_FORNITORE} ON fe_fornitore_categoria",
+        _accoda_fatture_fornitore("OLD") + " " + _accoda_fatture_fornitore("NEW"),
+    ))
+    for tab in ("fe_categorie", "fe_sottocategorie"):
+        t.append((f"trg_ce_ledger_{tab}_upd", f"AFTER UPDATE OF nome ON {tab}", _TUTTO))
+        t.append((f"trg_ce_ledger_{tab}_del", f"AFTER DELETE ON {tab}", _TUTTO))
+    t.append((
+        "trg_ce_ledger_uscite_ins",
+        "AFTER INSERT ON cg_uscite FOR EACH ROW WHEN " + _USCITA_CE.format(f="NEW"),
+        _accoda_uscita("NEW"),
+    ))
+    t.append((
+        "trg_ce_ledger_uscite_del",
+        "AFTER DELETE ON cg_uscite FOR EACH ROW WHEN " + _USCITA_CE.format(f="OLD"),
+        _accoda_uscita("OLD"),
+    ))
+    t.append((
+        "trg_ce_ledger_uscite_upd",
+        f"AFTER UPDATE OF {_COL_USCITE} ON cg_uscite FOR EACH ROW WHEN "
+        + _USCITA_CE.format(f="OLD") + " OR " + _USCITA_CE.format(f="NEW"),
+        _accoda_uscita("OLD") + " " + _accoda_uscita("NEW"),
+    ))
+    t.append(("trg_ce_ledger_spese_ins", "AFTER INSERT ON cg_spese_fisse", _accoda_spesa_fissa("NEW")))
+    t.append(("trg_ce_ledger_spese_del", "AFTER DELETE ON cg_spese_fisse", _accoda_spesa_fissa("OLD")))
+    t.append((
+        "trg_ce_ledger_spese_upd",
+        f"AFTER UPDATE OF {_COL_SPESE} ON cg_spese_fisse",
+        _accoda_spesa_fissa("OLD") + " " + _accoda_spesa_fissa("NEW"),
+    ))
+    return t
+
+
+def upgrade(conn):
+    cur = conn.cursor()
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ce_ledger (
+            periodo         TEXT    NOT NULL,   -- 'YYYY-MM'
+            modalita        TEXT    NOT NULL,   -- 'competenza' | 'cassa'
+            fonte           TEXT    NOT NULL,   -- 'fatture' | 'spese_fisse' | 'stipendi'
+            ordine          INTEGER NOT NULL,   -- ordine originale delle righe
+            categoria       TEXT,
+            sottocategoria  TEXT,
+            tipo_riga       TEXT,
+            ref_id          INTEGER,            -- 'id' dello schema riga unificato
+            spesa_fissa_id  INTEGER,
+            data            TEXT,
+            descrizione     TEXT,
+            ref             TEXT,
+            importo         REAL    NOT NULL DEFAULT 0,
+            PRIMARY KEY (periodo, modalita, fonte, ordine)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ce_ledger_mesi (
+            periodo           TEXT NOT NULL,
+            modalita          TEXT NOT NULL,
+            impronta_stipendi TEXT,
+            stipendi_meta     TEXT,             -- JSON del meta di _aggregate_stipendi
+            calcolato_il      TEXT DEFAULT (datetime('now','localtime')),
+            PRIMARY KEY (periodo, modalita)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ce_ledger_dirty (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            periodo_da  TEXT,                   -- 'YYYY-MM' oppure '*' = tutto
+            n_mesi      INTEGER NOT NULL DEFAULT 1,
+            created_at  TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    print("  [170] tabelle ce_ledger, ce_ledger_mesi, ce_ledger_dirty pronte")
+
+    tabelle = {
+        r[0] for r in cur.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+    }
+    creati = 0
+    for nome, evento, corpo in _triggers():
+        tabella = evento.split(" ON ")[1].split()[0]
+        if tabella not in tabelle:
+            print(f"  [170] {tabella} non presente, trigger {nome} saltato")
+            continue
+        cur.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        cur.execute(f"CREATE TRIGGER {nome} {evento} BEGIN {corpo} END")
+        creati += 1
+    conn.commit()
+    print(f"  ✔ [170] {creati} trigger di invalidazione ce_ledger creati")
@@ -0,0 +1,47 @@
+# Modulo: statistiche
+"""
+Migrazione 171 — fact table vendite_giornaliere + rollup mensile (2026-10-19)
+
+CONTESTO:
+  vendite_aggregator.giorni_merged rifaceva in Python il merge
+  shift_closures (primario) + daily_closures (fallback) a ogni range: CG
+  dashboard (mese + mese precedente), andamento annuale (12 merge), CE,
+  storico YoY pluriennale. corrispettivi_export ne aveva una copia.
+
+  Ora il merge è materializzato in `vendite_giornaliere` (una riga per
+  giorno), mantenuta da trigger su shift_closures, daily_closures e
+  shift_preconti; sopra, `vendite_mensili` (trigger sulla fact table) e la
+  vista `vendite_annuali`. DDL e trigger vivono in vendite_aggregator
+  (ensure_vendite_giornaliere), che li ricrea anche in self-heal da
+  chiusure_turno / admin_finance.
+
+DB COLPITO: admin_finance.sqlite3 (locale-aware). Solo tabelle/trigger
+nuovi + backfill dai dati esistenti; le sorgenti non vengono toccate.
+"""
+
+import sqlite3
+
+from app.utils.locale_data import locale_data_path
+
+
+def upgrade(conn):
+    """conn = foodcost.db (passato dal runner, non usato). Apre admin_finance.sqlite3."""
+    path = locale_data_path("admin_finance.sqlite3")
+    if not path.exists():
+        print("  [171] admin_finance.sqlite3 non esiste, skip (self-heal al primo uso)")
+        return
+
+    from app.services.vendite_aggregator import ensure_vendite_giornaliere
+
+    aconn = sqlite3.connect(str(path), timeout=30)
+    try:
+        aconn.execute("PRAGMA busy_timeout=30000")
+        if not ensure_vendite_giornaliere(aconn):
+            print("  [171] tabelle sorgente cassa non presenti, skip (self-heal al primo uso)")
+            return
+        aconn.commit()
+        n = aconn.execute("SELECT COUNT(*) FROM vendite_giornaliere").fetchone()[0]
+        m = aconn.execute("SELECT COUNT(*) FROM vendite_mensili").fetchone()[0]
+        print(f"  ✔ [171] vendite_giornaliere: {n} giorni, {m} mesi")
+    finally:
+        aconn.close()
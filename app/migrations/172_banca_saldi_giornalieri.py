@@ -0,0 +1,30 @@
+# Modulo: banca
+"""
+Migrazione 172 — saldi giornalieri per rapporto bancario (2026-10-19)
+
+CONTESTO:
+  Liquidità e dashboard CG ricalcolavano il saldo sommando TUTTO
+  banca_movimenti a ogni apertura (saldo attuale, saldo a inizio trend 90gg,
+  subquery SUM nella dashboard CG), più una scansione per mese per KPI,
+  confronto YoY e andamento annuale.
+
+  Ora `banca_saldi_giornalieri` tiene per (rapporto, giorno) movimenti,
+  entrate, uscite, delta e saldo progressivo di fine giornata, mantenuta da
+  trigger su banca_movimenti (INSERT / DELETE / UPDATE di importo,
+  data_contabile, rapporto). DDL e trigger vivono in
+  services/liquidita_service.py (ensure_saldi_giornalieri).
+
+DB COLPITO: foodcost.db. Tabella/trigger nuovi + backfill dallo storico;
+banca_movimenti non viene toccata.
+"""
+
+
+def upgrade(conn):
+    from app.services.liquidita_service import ensure_saldi_giornalieri
+
+    if not ensure_saldi_giornalieri(conn):
+        print("  [172] banca_movimenti non presente, skip")
+        return
+    conn.commit()
+    n = conn.execute("SELECT COUNT(*) FROM banca_saldi_giornalieri").fetchone()[0]
+    print(f"  ✔ [172] banca_saldi_giornalieri: {n} giorni/rapporto")
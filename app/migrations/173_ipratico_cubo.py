@@ -0,0 +1,30 @@
+# Modulo: statistiche
+"""
+Migrazione 173 — cubo vendite iPratico (2026-10-19)
+
+CONTESTO:
+  La Dashboard Statistiche riaggregava ipratico_prodotti/ipratico_categorie
+  a ogni apertura (categorie, top prodotti, trend) e /movimenti confrontava
+  due mesi in Python. Ora ipratico_cubo_prodotti / ipratico_cubo_categorie
+  tengono per (anno, mese, categoria[, prodotto]) quantità, totale, rank e
+  valori del mese importato precedente, ai livelli mese / anno (mese = 0) /
+  storico (anno = 0); ipratico_cubo_mesi il mese precedente e i totali.
+  Il router li ricalcola solo per il mese importato o eliminato. DDL e
+  calcolo in services/ipratico_cubo.py.
+
+DB COLPITO: foodcost.db. Tabelle nuove + calcolo dallo storico importato;
+le tabelle ipratico_* esistenti non vengono toccate.
+"""
+
+
+def upgrade(conn):
+    from app.services import ipratico_cubo
+
+    has = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ipratico_imports'"
+    ).fetchone()
+    if not has:
+        print("  [173] ipratico_imports non presente, skip")
+        return
+    n = ipratico_cubo.ricostruisci(conn)
+    print(f"  ✔ [173] cubo vendite iPratico: {n} mesi")
@@ -0,0 +1,36 @@
+# Modulo: platform
+"""
+Migrazione 174 — change-log per il delta-sync (2026-10-19)
+
+CONTESTO:
+  Carta staff, calici in mescita, lista magazzino e planning prenotazioni
+  accettano `?since=<cursore>` e restituiscono solo upserts / deletes.
+  Il cursore è il seq di `sync_changelog`, alimentata da trigger
+  AFTER INSERT/UPDATE/DELETE. DDL e lettura in services/delta_sync.py;
+  gli init dei due DB (vini_magazzino_db, clienti_db) chiamano la stessa
+  `installa()` per i DB creati dopo questa migrazione.
+
+DB COLPITI (la conn ricevuta dal runner non è usata):
+  - vini_magazzino.sqlite3: trigger su vini_bottiglie, vini_magazzino_movimenti
+  - clienti.sqlite3: trigger su clienti_prenotazioni
+  Solo oggetti nuovi; il log parte vuoto (nessun backfill: il primo giro
+  di ogni client è comunque completo).
+"""
+
+
+def upgrade(conn):
+    from app.models.clienti_db import get_clienti_conn
+    from app.models.vini_magazzino_db import get_magazzino_connection
+    from app.services import delta_sync
+
+    for nome, apri, tabelle in (
+        ("vini_magazzino", get_magazzino_connection, ["vini_bottiglie", "vini_magazzino_movimenti"]),
+        ("clienti", get_clienti_conn, ["clienti_prenotazioni"]),
+    ):
+        c = apri()
+        try:
+            n = delta_sync.installa(c, tabelle)
+            c.commit()
+        finally:
+            c.close()
+        print(f"  ✔ [174] {nome}: sync_changelog, {n} trigger")
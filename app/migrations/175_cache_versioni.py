@@ -0,0 +1,33 @@
+# Modulo: platform
+"""
+Migrazione 175 — contatori di versione per il conditional GET (2026-10-19)
+
+CONTESTO:
+  Gli endpoint di lettura pesanti (elenco fatture, lista clienti, lista
+  cantina, cross-ref banca, statistiche iPratico) rispondono con ETag e
+  304 Not Modified. L'ETag viene da `cache_versioni`, un contatore per
+  tabella incrementato da trigger AFTER INSERT/UPDATE/DELETE.
+  DDL e logica in services/http_cache.py (REGISTRO = tabelle per DB);
+  le tabelle create dopo questa migrazione prendono i trigger al primo
+  uso dell'endpoint.
+
+DB COLPITI (la conn ricevuta dal runner non è usata):
+  - foodcost.db, clienti.sqlite3, vini_magazzino.sqlite3
+  Solo oggetti nuovi; le tabelle assenti nel DB vengono saltate.
+"""
+
+import sqlite3
+
+
+def upgrade(conn):
+    from app.services import http_cache
+    from app.utils.locale_data import locale_data_path
+
+    for db, tabelle in http_cache.REGISTRO.items():
+        c = sqlite3.connect(locale_data_path(db), timeout=30)
+        try:
+            n = http_cache.installa(c, tabelle)
+            c.commit()
+        finally:
+            c.close()
+        print(f"  ✔ [175] {db}: cache_versioni, {n} trigger")
@@ -0,0 +1,28 @@
+# Modulo: acquisti
+"""
+Migrazione 176 — n_righe materializzato e indice per l'elenco fatture (2026-10-19)
+
+CONTESTO:
+  GET /contabilita/fe/fatture calcolava n_righe con un COUNT(*) correlato su
+  fe_righe per ogni fattura e paginava con LIMIT/OFFSET fino a 50.000.
+  Ora n_righe sta sulla testata e la paginazione è keyset su
+  (data_fattura, id). Logica in services/fe_elenco.py.
+
+COSA CREA (foodcost.db):
+  - fe_fatture.n_righe INTEGER NOT NULL DEFAULT 0, popolata una volta
+  - trigger trg_fe_righe_n_{ins,del,upd} su fe_righe che la tengono allineata
+  - indice idx_fe_fatture_data_id ON fe_fatture(data_fattura, id)
+  Se fe_fatture non esiste ancora non fa niente: ci pensa
+  fe_import._ensure_tables alla prima chiamata.
+"""
+
+
+def upgrade(conn):
+    from app.services import fe_elenco
+
+    if fe_elenco.installa(conn):
+        conn.commit()
+        n = conn.execute("SELECT COUNT(*) FROM fe_fatture").fetchone()[0]
+        print(f"  ✔ [176] fe_fatture.n_righe popolata ({n} fatture), trigger e indice creati")
+    else:
+        print("  [176] fe_fatture/fe_righe non presenti, saltata")
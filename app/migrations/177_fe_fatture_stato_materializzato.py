@@ -0,0 +1,37 @@
+# Modulo: acquisti
+"""
+Migrazione 177 — stato pagamento materializzato su fe_fatture (2026-10-19)
+
+CONTESTO:
+  Da G.5 (mig 112) lo stato pagamento delle fatture era ricostruito dalla
+  VIEW fe_fatture_with_stato con una JOIN su cg_uscite a ogni lettura:
+  elenco fatture, widget dashboard, alert scadenze, statistiche fornitori,
+  CE. Nessun filtro sullo stato poteva usare un indice.
+
+COSA FA (foodcost.db), logica in services/fatture_stato_service.py:
+  - fe_fatture.cg_uscite_stato TEXT: copia di cg_uscite.stato, backfill
+    una volta e poi tenuta dai trigger trg_fe_stato_uscite_{ins,del,upd}
+  - fe_fatture.pagato / stato_pagamento / cg_uscite_stato_macro: GENERATED
+    VIRTUAL da cg_uscite_stato (stessa mappatura della VIEW di mig 116)
+  - indici idx_fe_fatture_pagato_scadenza, idx_fe_fatture_cg_stato
+  - VIEW fe_fatture_with_stato ricreata come `SELECT * FROM fe_fatture`
+    (stessi nomi colonna: i SELECT esistenti non cambiano)
+
+  cg_uscite.stato resta la fonte di verità. Verifica/riparazione:
+  GET /contabilita/fe/stato-pagamento/verifica.
+
+Richiede SQLite >= 3.31 (GENERATED ALWAYS, come mig 116).
+"""
+
+
+def upgrade(conn):
+    """conn = foodcost.db"""
+    from app.services import fatture_stato_service as fss
+
+    if not fss.installa_stato_materializzato(conn):
+        print("  [177] fe_fatture/cg_uscite non presenti, saltata")
+        return
+    conn.commit()
+    esito = fss.verifica_stato_materializzato(conn, ripara=False)
+    print(f"  ✔ [177] stato materializzato su {esito['fatture']} fatture "
+          f"(divergenti dopo backfill: {esito['divergenti']})")
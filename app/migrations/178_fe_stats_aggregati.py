@@ -0,0 +1,37 @@
+# Modulo: acquisti
+"""
+Migrazione 178 — aggregati per le statistiche Acquisti (2026-10-19)
+
+CONTESTO:
+  Gli endpoint /contabilita/fe/stats/* (fornitori, mensili, kpi,
+  per-categoria, top-fornitori, confronto-annuale, anomalie, drill)
+  riaggregavano ciascuno da zero fe_fatture / fe_righe. La dashboard
+  Acquisti ne chiama sei in parallelo a ogni apertura.
+
+COSA CREA (foodcost.db), logica in services/fe_stats.py:
+  - fe_stats_fornitori_mese  fatture per mese × fornitore
+  - fe_stats_righe_mese      righe per mese × fornitore × categoria
+                             (livello 'C') e × sottocategoria (livello 'S')
+  - fe_stats_baseline        spesa del mese e media mobile 12 mesi per
+                             fornitore (anomalie)
+  - fe_stats_dirty           coda dei mesi da ricalcolare
+  - trigger trg_fe_stats_{fatture,righe}_{ins,del,upd} che accodano il
+    mese della fattura toccata
+
+  Categoria ed esclusione del fornitore NON sono negli aggregati: si
+  agganciano in lettura. Popolamento completo qui sotto; se fe_fatture non
+  esiste ancora ci pensa fe_import._ensure_tables.
+"""
+
+
+def upgrade(conn):
+    """conn = foodcost.db"""
+    from app.services import fe_stats
+
+    if not fe_stats.installa(conn):
+        print("  [178] fe_fatture/fe_righe non presenti, saltata")
+        return
+    conn.commit()
+    fe_stats.aggiorna(conn)
+    n = conn.execute("SELECT COUNT(*) FROM fe_stats_fornitori_mese").fetchone()[0]
+    print(f"  ✔ [178] aggregati statistiche acquisti popolati ({n} righe fornitore × mese)")
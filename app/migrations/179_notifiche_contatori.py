@@ -0,0 +1,36 @@
+# Modulo: platform
+"""
+Migrazione 179 — contatori non lette e archivio notifiche (2026-10-19)
+
+CONTESTO:
+  Il badge della campanella contava notifiche e comunicazioni non lette con
+  un LEFT JOIN sulle tabelle di lettura a ogni render dell'Header; la
+  tabella notifiche cresce ogni giorno con l'alert engine.
+
+COSA CREA (notifiche.sqlite3), logica in services/notifiche_contatori.py:
+  - notifiche_contatori / notifiche_contatori_lette          per chiave di pubblico
+  - comunicazioni_contatori / comunicazioni_contatori_lette  per ruolo/scadenza
+  - notifiche_archivio  notifiche vecchie o scadute spostate da compatta()
+  - trigger trg_notifiche_*_cnt_* / trg_comunicazioni_*_cnt_*
+
+  Il runner passa la connessione di foodcost.db: come la 152, apre la sua
+  su notifiche.sqlite3. Se il DB notifiche non è ancora inizializzato ci
+  pensa init_notifiche_db al primo avvio.
+"""
+
+from app.models.notifiche_db import get_notifiche_conn
+
+
+def upgrade(conn):
+    from app.services import notifiche_contatori
+
+    nconn = get_notifiche_conn()
+    try:
+        if not notifiche_contatori.installa(nconn):
+            print("  [179] tabelle notifiche non presenti, saltata")
+            return
+        nconn.commit()
+        n = nconn.execute("SELECT COUNT(*) FROM notifiche_contatori").fetchone()[0]
+        print(f"  ✔ [179] contatori non lette popolati ({n} chiavi notifiche)")
+    finally:
+        nconn.close()
@@ -0,0 +1,22 @@
+# Modulo: platform
+"""
+Migrazione 180 — pulizia render cache dei PDF brand (2026-10-19)
+
+CONTESTO:
+  La prima versione della render cache (services/pdf_render_cache.py) salvava
+  anche i PDF del mattone M.B (preventivi, conto economico, inventario, ...).
+  Il loro HTML contiene "Generato il gg/mm/aaaa hh:mm": ogni stampa era un
+  miss e un file nuovo, mai più riletto. Ora pdf_brand renderizza fuori dalla
+  cache; restano su disco i file già scritti, documenti interni.
+
+COSA FA:
+  Cancella locali/<locale>/data/render_cache/pdf_brand/*.pdf. Nessuna
+  modifica di schema; `conn` non usata.
+"""
+
+
+def upgrade(conn):
+    from app.services import pdf_render_cache
+
+    n = pdf_render_cache.svuota("pdf_brand")
+    print(f"  ✔ [180] render cache pdf_brand svuotata ({n} file)")
@@ -0,0 +1,31 @@
+# Modulo: controllo_gestione
+"""
+Migrazione 181 — trigger ce_ledger: range della spalmatura come nella query (2026-10-19)
+
+CONTESTO:
+  I trigger della mig 170 accodavano, per fatture e spese fisse spalmate,
+  spalmatura_mesi mesi a partire da substr(spalmatura_data_inizio, 1, 7).
+  Le query del CE invece fanno partire una spalmatura di metà mese dal mese
+  successivo e la chiudono nel mese di (inizio + N mesi - 1 giorno): dopo
+  una modifica, l'ultimo mese coperto restava vecchio nel ledger.
+
+COSA FA (foodcost.db):
+  - ricrea i trigger trg_ce_ledger_* con le definizioni di
+    services/ce_ledger.installa_trigger (range calcolato con la stessa
+    aritmetica dei mesi delle query);
+  - accoda '*': il ledger si ricostruisce alla prima lettura, così
+    spariscono anche i mesi rimasti vecchi finora.
+  La mig 170 resta com'era (già applicata sulle installazioni esistenti).
+"""
+
+
+def upgrade(conn):
+    from app.services import ce_ledger
+
+    if not ce_ledger._tabelle_presenti(conn):
+        print("  [181] ce_ledger non presente, saltata")
+        return
+    n = ce_ledger.installa_trigger(conn)
+    conn.execute("INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) VALUES ('*', 0)")
+    conn.commit()
+    print(f"  ✔ [181] {n} trigger ce_ledger ricreati, ledger da ricostruire")
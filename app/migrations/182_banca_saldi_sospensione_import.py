@@ -0,0 +1,29 @@
+# Modulo: banca
+"""
+Migrazione 182 — trigger dei saldi giornalieri sospendibili per l'import (2026-10-19)
+
+CONTESTO:
+  I trigger di banca_saldi_giornalieri (mig 172) lavorano riga per riga: in
+  un import CSV di migliaia di movimenti riscrivono a ogni INSERT la coda
+  dei saldi del rapporto e costano più dell'INSERT stesso.
+
+COSA FA (foodcost.db):
+  - crea banca_saldi_sospesi: se contiene righe i trigger non fanno niente;
+  - ricrea i trigger trg_banca_saldi_* con `WHEN NOT EXISTS (SELECT 1 FROM
+    banca_saldi_sospesi)` (services/liquidita_service.installa_trigger_saldi).
+  L'import sospende i trigger, inserisce in blocco e ricalcola i saldi una
+  volta sola dalla data più vecchia del file. I dati non vengono toccati.
+"""
+
+
+def upgrade(conn):
+    from app.services import liquidita_service
+
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'banca_saldi_giornalieri'"
+    ).fetchone():
+        print("  [182] banca_saldi_giornalieri non presente, skip")
+        return
+    liquidita_service.installa_trigger_saldi(conn)
+    conn.commit()
+    print("  ✔ [182] trigger banca_saldi_* ricreati con sospensione per l'import")
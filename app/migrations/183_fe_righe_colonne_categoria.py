@@ -0,0 +1,27 @@
+"""
+Migrazione 183: colonne categoria_id / sottocategoria_id su fe_righe
+
+Le aggiunge la 009, con un ALTER in try/except. Su un locale nuovo la 009
+gira prima che fe_righe esista (la crea il self-heal di
+app/routers/fe_import.py), l'ALTER fallisce in silenzio e la tabella nasce
+senza le due colonne: CE, categorizzazione ed elenco fatture leggono
+r.categoria_id e vanno in errore. Qui si aggiungono solo se mancano.
+Additiva e idempotente, nessun dato toccato.
+"""
+
+
+def upgrade(conn):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='fe_righe'"
+    ).fetchone()
+    if not row:
+        print("  fe_righe non ancora presente — skip")
+        return
+    colonne = {r[1] for r in conn.execute("PRAGMA table_info(fe_righe)").fetchall()}
+    aggiunte = []
+    for col in ("categoria_id", "sottocategoria_id"):
+        if col not in colonne:
+            conn.execute(f"ALTER TABLE fe_righe ADD COLUMN {col} INTEGER")
+            aggiunte.append(col)
+    conn.commit()
+    print(f"  ✔ fe_righe: {', '.join(aggiunte) if aggiunte else 'colonne categoria già presenti'}")
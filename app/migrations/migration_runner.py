@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-# @version: v1.3-locale-aware (R3, sessione 60, 2026-04-29)
+# @version: v1.5-manifest (2026-10-19) — baseline multi-DB
 # Sistema migrazioni TRGB — semplificato, stile Alembic.
 #
 # R3 (sessione 60): aggiunta supporto flag TRGB_SPECIFIC sulle migrazioni che
@@ -8,10 +8,37 @@
 # locali/trgb/), queste migrazioni sono saltate — il cliente nuovo parte
 # con DB vuoti e popola i suoi dati dal pannello UI.
 # Vedi docs/refactor_monorepo.md §3 R3 e locali/tregobbi/seeds/MIGRATIONS_TRGB.md.
-
-import sqlite3
+#
+# v1.4 (2026-10-19): MANIFEST. `manifest.json` (generato, nel repo) tiene per
+# ogni migrazione nome, sha256, DB toccati e flag TRGB_SPECIFIC. Al boot:
+# listdir − schema_migrations = pendenti, e il flag si legge dal manifest
+# invece di importare ogni modulo pendente. Se un file pendente manca dal
+# manifest o ha un checksum diverso (migrazione nuova, manifest non
+# rigenerato) il flag si ricava con ast dal sorgente — mai con un import.
+# La connessione usa i PRAGMA standard (WAL, synchronous=NORMAL, busy_timeout).
+#
+# BASELINE SQUASHED (opzionale): per un locale NUOVO (foodcost.db senza
+# schema_migrations) con TRGB_MIGRATIONS_BASELINE=1, invece di rigiocare tutte
+# le migrazioni storiche si caricano gli snapshot in `baseline/` (foodcost.db
+# E gli altri DB che le migrazioni toccano: dipendenti, clienti, vini, ...) e
+# si segnano come applicate le migrazioni che coprono; le successive girano
+# normalmente. Se uno di quei DB esiste già con delle tabelle, niente
+# baseline: si rigioca lo storico come sempre.
+#
+# Comandi:
+#   python -m app.migrations.migration_runner --manifest        rigenera manifest.json
+#   python -m app.migrations.migration_runner --check           manifest allineato? (exit 1 se no)
+#   python -m app.migrations.migration_runner --squash <db>     baseline da un foodcost.db (e DB
+#                                                               fratelli) appena migrato su locale pulito
+import ast
+import hashlib
 import importlib
+import json
 import os
+import re
+import sqlite3
+import sys
+from datetime import datetime
 from pathlib import Path
 
 from app.utils.locale_data import locale_data_path
@@ -30,6 +57,123 @@ MIGRATIONS_DIR = BASE_DIR
 # fallback ad app/data/foodcost.db (storico). Punto di ingresso al boot.
 DB_PATH = locale_data_path("foodcost.db")
 
+MANIFEST_PATH = BASE_DIR / "manifest.json"
+BASELINE_DIR = BASE_DIR / "baseline"
+BASELINE_SQL = BASELINE_DIR / "foodcost.sql"
+BASELINE_META = BASELINE_DIR / "baseline.json"
+
+# Nomi file DB citati nel sorgente di una migrazione (per target_db).
+_RE_DB_NAME = re.compile(r"[\"']([a-z_0-9]+\.(?:sqlite3|db))[\"']")
+# La migrazione usa la connessione passata dal runner (→ foodcost.db).
+_RE_USA_CONN = re.compile(r"\bconn\.(?:execute|executescript|executemany|cursor)\(")
+
+
+def _connect(path) -> sqlite3.Connection:
+    """Connessione al DB delle migrazioni con i PRAGMA standard dei DB TRGB."""
+    conn = sqlite3.connect(str(path), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+def _migration_files() -> list:
+    """File 001_*.py, 002_*.py, ... in ordine."""
+    return sorted(
+        f for f in os.listdir(MIGRATIONS_DIR)
+        if f.endswith(".py") and f[0:3].isdigit()
+    )
+
+
+# ---------------------------------------------------------
+# MANIFEST
+# ---------------------------------------------------------
+
+def _analizza_sorgente(filename: str) -> dict:
+    """
+    Voce di manifest per una migrazione, SENZA importarla: sha256 del file,
+    flag TRGB_SPECIFIC letto via ast (assegnazione a livello modulo), DB
+    toccati dedotti dai nomi file citati nel sorgente.
+    """
+    raw = (MIGRATIONS_DIR / filename).read_bytes()
+    src = raw.decode("utf-8", errors="replace")
+
+    trgb = False
+    try:
+        for node in ast.parse(src).body:
+            if isinstance(node, ast.Assign) and any(
+                isinstance(t, ast.Name) and t.id == "TRGB_SPECIFIC" for t in node.targets
+            ):
+                trgb = bool(ast.literal_eval(node.value))
+    except (SyntaxError, ValueError):
+        # Nel dubbio NON è TRGB-specific: meglio applicare per errore una
+        # migrazione del prodotto che skippare una migrazione di schema.
+        trgb = False
+
+    dbs = set(_RE_DB_NAME.findall(src))
+    if _RE_USA_CONN.search(src) or not dbs:
+        dbs.add("foodcost.db")
+
+    return {
+        "name": filename,
+        "sha256": hashlib.sha256(raw).hexdigest(),
+        "target_db": sorted(dbs),
+        "trgb_specific": trgb,
+    }
+
+
+def genera_manifest() -> dict:
+    """Ricostruisce manifest.json da tutti i file di migrazione."""
+    voci = [_analizza_sorgente(f) for f in _migration_files()]
+    data = {
+        "generato_il": datetime.now().isoformat(timespec="seconds"),
+        "migrazioni": voci,
+    }
+    MANIFEST_PATH.write_text(json.dumps(data, indent=1, ensure_ascii=False) + "\n", encoding="utf-8")
+    return data
+
+
+def _load_manifest() -> dict:
+    """name → voce. Manifest assente o illeggibile → {} (si ricade sull'ast)."""
+    try:
+        data = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+        return {v["name"]: v for v in data.get("migrazioni", [])}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"⚠️  manifest.json non leggibile ({e}): flag letti dai sorgenti")
+        return {}
+
+
+def _voce_verificata(filename: str, manifest: dict) -> dict:
+    """
+    Voce del manifest per un file PENDENTE, verificata col checksum. Se il
+    manifest è vecchio (file nuovo o modificato) si rianalizza il sorgente.
+    """
+    voce = manifest.get(filename)
+    raw = (MIGRATIONS_DIR / filename).read_bytes()
+    if voce and voce.get("sha256") == hashlib.sha256(raw).hexdigest():
+        return voce
+    print(f"ℹ️  manifest non aggiornato per {filename}: "
+          f"rigenera con `python -m app.migrations.migration_runner --manifest`")
+    return _analizza_sorgente(filename)
+
+
+def check_manifest() -> list:
+    """Differenze tra manifest e file su disco (vuota = allineato)."""
+    manifest = _load_manifest()
+    diff = []
+    files = _migration_files()
+    for f in files:
+        voce = manifest.get(f)
+        if voce is None:
+            diff.append(f"mancante nel manifest: {f}")
+        elif voce != _analizza_sorgente(f):
+            diff.append(f"non aggiornata: {f}")
+    for f in sorted(set(manifest) - set(files)):
+        diff.append(f"nel manifest ma non su disco: {f}")
+    return diff
+
 
 def get_applied_migrations(conn):
     """Crea tabella schema_migrations se non esiste e ritorna quelle applicate."""
@@ -47,27 +191,6 @@ def get_applied_migrations(conn):
     return {row[0] for row in cur.fetchall()}
 
 
-def _is_trgb_specific(filename: str) -> bool:
-    """
-    R3 (sessione 60): controlla se una migrazione ha la flag TRGB_SPECIFIC = True
-    al livello modulo. Le migrazioni TRGB-specific contengono SOLO dati seed
-    dell'osteria di Marco (es. menu Primavera 2026, ingredienti specifici, MEP
-    templates). Vanno saltate quando si deploya su un locale != tregobbi.
-
-    Importa il modulo (idempotente — Python cacha) e legge l'attributo.
-    Ritorna False se l'attributo non esiste (default: migration generica).
-    """
-    module_name = f"app.migrations.{filename[:-3]}"
-    try:
-        module = importlib.import_module(module_name)
-        return bool(getattr(module, "TRGB_SPECIFIC", False))
-    except Exception:
-        # Se import fallisce, NON la marchiamo TRGB-specific: meglio applicare
-        # per errore una migrazione del prodotto, che skippare per errore una
-        # migrazione di schema universale.
-        return False
-
-
 def apply_migration(conn, filename):
     """Esegue una singola migration importando il file Python 001_*.py."""
     print(f"⚙️  Applying migration: {filename}")
@@ -89,11 +212,100 @@ def apply_migration(conn, filename):
         raise
 
 
+def _db_vergine(conn) -> bool:
+    """True se foodcost.db non ha ancora nessuna tabella applicativa."""
+    row = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type='table' "
+        "AND name NOT LIKE 'sqlite_%' AND name != 'schema_migrations'"
+    ).fetchone()
+    return row[0] == 0
+
+
+def _file_vergine(path: Path) -> bool:
+    """True se il DB non esiste o non ha tabelle (aprendolo in sola lettura)."""
+    if not path.exists():
+        return True
+    c = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return _db_vergine(c)
+    finally:
+        c.close()
+
+
+def _baseline_abilitata() -> bool:
+    return (os.environ.get("TRGB_MIGRATIONS_BASELINE") or "").strip().lower() in ("1", "true", "yes")
+
+
+def _dump_baseline(nome_db: str) -> Path:
+    return BASELINE_SQL if nome_db == "foodcost.db" else BASELINE_DIR / f"{nome_db}.sql"
+
+
+def _applica_baseline(conn, applied: set) -> set:
+    """
+    Carica gli snapshot squashed su un locale vergine e segna come applicate
+    le migrazioni che coprono. Ritorna il nuovo set `applied` (invariato se
+    la baseline non è applicabile).
+
+    Gli altri DB si costruiscono in un file temporaneo e si mettono al loro
+    posto solo quando sono pronti TUTTI: un errore a metà lascia il locale
+    vergine e il boot successivo può ripartire.
+    """
+    meta = json.loads(BASELINE_META.read_text(encoding="utf-8"))
+    altri = [d for d in meta.get("database", []) if d != "foodcost.db"]
+    if "foodcost.db" not in meta.get("database", []):
+        print("⚠️  baseline senza elenco DB (formato vecchio): rigenerala con --squash, "
+              "rigioco lo storico")
+        return applied
+    occupati = [d for d in altri if not _file_vergine(DB_PATH.parent / d)]
+    if occupati:
+        print(f"ℹ️  baseline non applicabile, DB già popolati: {', '.join(occupati)} "
+              f"— rigioco lo storico")
+        return applied
+
+    coperte = [m for m in meta.get("migrazioni", []) if m not in applied]
+    print(f"📦 Baseline squashed: {len(coperte)} migrazioni coperte "
+          f"(fino a {meta.get('fino_a')}, generata {meta.get('generato_il')}), "
+          f"{len(altri) + 1} DB")
+
+    pronti = []
+    try:
+        for nome in altri:
+            dest = DB_PATH.parent / nome
+            tmp = dest.with_name(dest.name + ".baseline.tmp")
+            tmp.unlink(missing_ok=True)
+            c = sqlite3.connect(str(tmp))
+            try:
+                c.executescript(_dump_baseline(nome).read_text(encoding="utf-8"))
+            finally:
+                c.close()
+            pronti.append((tmp, dest))
+        for tmp, dest in pronti:
+            for extra in ("-wal", "-shm"):
+                Path(str(dest) + extra).unlink(missing_ok=True)
+            os.replace(tmp, dest)
+    except Exception:
+        for tmp, _dest in pronti:
+            tmp.unlink(missing_ok=True)
+        raise
+
+    try:
+        conn.executescript(BASELINE_SQL.read_text(encoding="utf-8"))
+        conn.executemany(
+            "INSERT OR IGNORE INTO schema_migrations (name) VALUES (?)",
+            [(m,) for m in coperte],
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return applied | set(coperte)
+
+
 def run_migrations():
     """Esegue tutte le migrazioni mancanti sul DB foodcost.db CORRETTO.
 
     R3 (sessione 60): se l'env var TRGB_LOCALE != "tregobbi", salta le
-    migrazioni con flag TRGB_SPECIFIC = True (vedi _is_trgb_specific).
+    migrazioni con flag TRGB_SPECIFIC = True (flag letto da manifest.json).
     Default TRGB_LOCALE = "tregobbi" → comportamento backward-compat per
     l'osteria di Marco.
     """
@@ -107,35 +319,122 @@ def run_migrations():
     locale = os.environ.get("TRGB_LOCALE", "tregobbi").strip() or "tregobbi"
     print(f"🏠 Locale corrente: {locale}")
 
-    # Apertura DB
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect(DB_PATH)
+    try:
+        applied = get_applied_migrations(conn)
 
-    applied = get_applied_migrations(conn)
+        # Locale nuovo + baseline richiesta: snapshot invece dello storico.
+        if (not applied and _baseline_abilitata()
+                and BASELINE_SQL.exists() and BASELINE_META.exists()
+                and _db_vergine(conn)):
+            applied = _applica_baseline(conn, applied)
 
-    # Cerchiamo file 001_*.py, 002_*.py ecc.
-    migration_files = sorted(
-        f for f in os.listdir(MIGRATIONS_DIR)
-        if f.endswith(".py") and f[0:3].isdigit()
-    )
+        # Una differenza di insiemi: nessun file letto per le migrazioni già applicate.
+        pending = [f for f in _migration_files() if f not in applied]
+        if not pending:
+            print("🎉 All migrations applied.")
+            return
+
+        manifest = _load_manifest() if locale != "tregobbi" else {}
+        skipped_trgb = []
+        for filename in pending:
+            # R3: skip migrazioni TRGB-specific se non siamo sull'istanza tregobbi
+            if locale != "tregobbi" and _voce_verificata(filename, manifest)["trgb_specific"]:
+                print(f"⏭  Skip TRGB-specific (locale='{locale}'): {filename}")
+                skipped_trgb.append(filename)
+                continue
+            apply_migration(conn, filename)
+    finally:
+        conn.close()
 
-    skipped_trgb = []
-    # Applica solo le migrazioni NON ancora applicate
-    for filename in migration_files:
-        if filename in applied:
-            continue
-        # R3: skip migrazioni TRGB-specific se non siamo sull'istanza tregobbi
-        if locale != "tregobbi" and _is_trgb_specific(filename):
-            print(f"⏭  Skip TRGB-specific (locale='{locale}'): {filename}")
-            skipped_trgb.append(filename)
-            continue
-        apply_migration(conn, filename)
-
-    conn.close()
     if skipped_trgb:
         print(f"🎉 All migrations applied (skipped {len(skipped_trgb)} TRGB-specific).")
     else:
         print("🎉 All migrations applied.")
 
 
+# ---------------------------------------------------------
+# BASELINE SQUASHED
+# ---------------------------------------------------------
+
+def _righe_dump(path: Path, escludi_migrazioni: bool) -> list:
+    src = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return [
+            line for line in src.iterdump()
+            if not (escludi_migrazioni and "schema_migrations" in line)
+            and line not in ("BEGIN TRANSACTION;", "COMMIT;")
+        ]
+    finally:
+        src.close()
+
+
+def genera_baseline(sorgente: str) -> dict:
+    """
+    Crea baseline/ da un foodcost.db appena migrato su un locale PULITO
+    (TRGB_LOCALE != tregobbi: niente seed dell'osteria). Le migrazioni che
+    scrivono anche su altri DB (060, 071, 132, ...) toccano insieme
+    foodcost.db e dipendenti/clienti/...: uno snapshot del solo foodcost.db
+    le costringerebbe a rigiocare anche la parte foodcost già presente
+    (ADD COLUMN doppie, seed doppi). Per questo si fotografano tutti i DB
+    citati dalle migrazioni applicate che esistono accanto al sorgente, e
+    la baseline copre TUTTE le migrazioni applicate.
+    """
+    sorgente_path = Path(sorgente).resolve()
+    manifest = _load_manifest() or {f: _analizza_sorgente(f) for f in _migration_files()}
+    src = sqlite3.connect(f"file:{sorgente_path}?mode=ro", uri=True)
+    try:
+        coperte = [r[0] for r in src.execute("SELECT name FROM schema_migrations ORDER BY name")]
+    finally:
+        src.close()
+
+    ignote = [m for m in coperte if m not in manifest]
+    if ignote:
+        raise ValueError(f"migrazioni assenti dal manifest ({', '.join(ignote)}): rigeneralo con --manifest")
+    trgb = [m for m in coperte if manifest[m].get("trgb_specific")]
+    if trgb:
+        raise ValueError(
+            "il DB sorgente contiene migrazioni TRGB_SPECIFIC "
+            f"({', '.join(trgb)}): generare la baseline da un locale pulito"
+        )
+
+    # DB citati ma assenti accanto al sorgente: su un locale pulito la
+    # migrazione non ha trovato niente da toccare, non c'è stato da riprodurre.
+    citati = sorted({d for m in coperte for d in manifest[m]["target_db"]} | {"foodcost.db"})
+    database = [d for d in citati if d == "foodcost.db" or (sorgente_path.parent / d).exists()]
+
+    BASELINE_DIR.mkdir(exist_ok=True)
+    for vecchio in BASELINE_DIR.glob("*.sql"):
+        vecchio.unlink()
+    for nome in database:
+        path = sorgente_path if nome == "foodcost.db" else sorgente_path.parent / nome
+        righe = _righe_dump(path, escludi_migrazioni=(nome == "foodcost.db"))
+        _dump_baseline(nome).write_text("\n".join(righe) + "\n", encoding="utf-8")
+    meta = {
+        "generato_il": datetime.now().isoformat(timespec="seconds"),
+        "fino_a": coperte[-1] if coperte else None,
+        "database": database,
+        "migrazioni": coperte,
+    }
+    BASELINE_META.write_text(json.dumps(meta, indent=1) + "\n", encoding="utf-8")
+    return meta
+
+
 if __name__ == "__main__":
-    run_migrations()
\ No newline at end of file
+    args = sys.argv[1:]
+    if args[:1] == ["--manifest"]:
+        n = len(genera_manifest()["migrazioni"])
+        print(f"✔ manifest.json rigenerato ({n} migrazioni)")
+    elif args[:1] == ["--check"]:
+        diff = check_manifest()
+        for d in diff:
+            print(f"✘ {d}")
+        if diff:
+            sys.exit(1)
+        print("✔ manifest.json allineato")
+    elif args[:1] == ["--squash"] and len(args) == 2:
+        meta = genera_baseline(args[1])
+        print(f"✔ baseline: {len(meta['migrazioni'])} migrazioni coperte fino a {meta['fino_a']}, "
+              f"{len(meta['database'])} DB ({', '.join(meta['database'])})")
+    else:
+        run_migrations()
\ No newline at end of file
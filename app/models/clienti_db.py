@@ -1,4 +1,4 @@
-# @version: v1.3-clienti-wal-protected
+# @version: v1.4-clienti-delta-sync
 # -*- coding: utf-8 -*-
 """
 Database Clienti — TRGB Gestionale (modulo CRM)
@@ -14,6 +14,7 @@ Contiene:
 
 import sqlite3
 
+from app.services import delta_sync
 from app.utils.locale_data import locale_data_path
 
 # R6.5 — path tenant-aware. Modulo: clienti (CRM + prenotazioni + preventivi).
@@ -624,5 +625,8 @@ def init_clienti_db() -> None:
         ('giftcard_importi_rapidi', '[25,50,100,150,200]', 'Importi proposti come bottoni rapidi in emissione (JSON array)')
     """)
 
+    # Change-log per il delta-sync del planning (?since=, mig 174)
+    delta_sync.installa(conn, ["clienti_prenotazioni"])
+
     conn.commit()
     conn.close()
@@ -1,4 +1,4 @@
-# @version: v1.1-wal-protected
+# @version: v1.2-contatori-non-lette
 # -*- coding: utf-8 -*-
 """
 Database Notifiche — TRGB Gestionale (mattone M.A)
@@ -8,6 +8,7 @@ Contiene:
 - Tabella notifiche_lettura (tracciamento lettura per utente)
 - Tabella comunicazioni (bacheca ordini di servizio admin → staff)
   + righe tipo='nota_servizio' usate dalla Lavagna (Home)
+- Contatori non lette + archivio notifiche (services/notifiche_contatori.py)
 
 DB separato: app/data/notifiche.sqlite3
 """
@@ -204,5 +205,10 @@ def init_notifiche_db() -> None:
         END
     """)
 
+    # ── CONTATORI NON LETTE + ARCHIVIO ──
+    # Logica e trigger in services/notifiche_contatori (idempotente).
+    from app.services import notifiche_contatori
+    notifiche_contatori.installa(conn)
+
     conn.commit()
     conn.close()
@@ -1,4 +1,4 @@
-# @version: v1.6-wal-protected
+# @version: v1.7-delta-sync
 # -*- coding: utf-8 -*-
 """
 Tre Gobbi — Database Vini (Magazzino)
@@ -21,6 +21,7 @@ import sqlite3
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
+from app.services import delta_sync
 from app.utils.locale_data import locale_data_path
 
 # R6.5 — path tenant-aware. Modulo: vini.
@@ -44,6 +45,33 @@ def _now_iso() -> str:
     return datetime.now().isoformat(timespec="seconds")
 
 
+def _segnala_carte_stale(evento: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Vini/prezzi/giacenze cambiati: le carte PDF in render cache sono vecchie.
+    Pianifica il pre-render in background (debounced, vedi
+    app/services/pdf_render_cache.py) e, se attiva, l'auto-pubblicazione sul
+    sito (ftp_publish_service). Pubblica anche l'evento SSE `cantina`
+    (eventi_hub): carta staff e cantina mobile ricaricano invece di fare
+    polling. `evento` = payload (azione, vino_id, ...). Best-effort: non deve
+    mai far fallire la scrittura che l'ha causato.
+    """
+    try:
+        from app.services import eventi_hub
+        eventi_hub.pubblica("cantina", evento or {"azione": "modifica"})
+    except Exception:
+        pass
+    try:
+        from app.services.pdf_render_cache import segnala_modifica
+        segnala_modifica("carta_vini", "carta_vini_staff", "carta_bevande", "carta_bevande_staff")
+    except Exception:
+        pass
+    try:
+        from app.services.ftp_publish_service import pianifica_autopubblicazione
+        pianifica_autopubblicazione("carta_vini", "carta_bevande")
+    except Exception:
+        pass
+
+
 # ---------------------------------------------------------
 # STORICO PREZZI — helper privato (Fase 6, sessione 2026-04-20)
 # ---------------------------------------------------------
@@ -534,6 +562,11 @@ def init_magazzino_database() -> None:
                       "ON vini_magazzino_movimenti (vino_id, data_mov);")
         print("✅ Migration completata: tipo MODIFICA disponibile")
 
+    # Change-log per il delta-sync di carta staff / calici / lista (?since=,
+    # mig 174). DOPO il rebuild di movimenti qui sopra: il DROP della tabella
+    # vecchia si porta via anche i trigger.
+    delta_sync.installa(conn, ["vini_bottiglie", "vini_magazzino_movimenti"])
+
     conn.commit()
     conn.close()
 
@@ -602,6 +635,7 @@ def create_vino(data: Dict[str, Any]) -> int:
     _recalc_qta_totale(conn, vino_id)
 
     conn.close()
+    _segnala_carte_stale({"azione": "creato", "vino_id": vino_id})
     return vino_id
 
 
@@ -966,6 +1000,7 @@ def update_vino(
                 pass
 
     conn.close()
+    _segnala_carte_stale({"azione": "modificato", "vino_id": vino_id})
 
 
 def bulk_update_vini(
@@ -1045,6 +1080,7 @@ def bulk_update_vini(
 
     conn.commit()
     conn.close()
+    _segnala_carte_stale({"azione": "modifica_multipla", "n": len(updates)})
     return count
 
 
@@ -1067,6 +1103,7 @@ def delete_vino(vino_id: int) -> bool:
 
     conn.commit()
     conn.close()
+    _segnala_carte_stale({"azione": "eliminato", "vino_id": vino_id})
     return True
 
 
@@ -1162,11 +1199,13 @@ def search_vini(
     produttore: Optional[str] = None,
     solo_in_carta: bool = False,
     min_qta: Optional[int] = None,
+    ids: Optional[set] = None,
 ) -> List[sqlite3.Row]:
     """
     Ricerca vini in magazzino con alcuni filtri base.
     Verrà usata dal frontend per la lista / ricerca.
     - Se vino_id è valorizzato, filtra per id esatto.
+    - `ids` (delta-sync, ?since=): rilegge solo quei vini, filtri compresi.
     """
     conn = get_magazzino_connection()
     cur = conn.cursor()
@@ -1207,6 +1246,11 @@ def search_vini(
         where.append("QTA_TOTALE >= ?")
         params.append(min_qta)
 
+    if ids is not None:
+        cond, ids_params = delta_sync.filtro_ids("id", ids)
+        where.append(cond)
+        params.extend(ids_params)
+
     where_sql = " WHERE " + " AND ".join(where) if where else ""
     sql = (
         "SELECT * FROM vini_bottiglie"
@@ -1505,6 +1549,7 @@ def registra_movimento(
 
     conn.commit()
     conn.close()
+    _segnala_carte_stale({"azione": "movimento", "vino_id": vino_id, "tipo": tipo})
 
 
 def registra_modifica(
@@ -2035,6 +2080,8 @@ def delete_movimento(movimento_id: int) -> None:
 
     conn.commit()
     conn.close()
+    _segnala_carte_stale({"azione": "movimento_annullato", "vino_id": vino_id,
+                          "movimento_id": movimento_id})
 
 
 # ---------------------------------------------------------
@@ -3125,6 +3172,9 @@ def conferma_arrivo_ordine_pending(
     finally:
         conn.close()
 
+    from app.services import eventi_hub
+    eventi_hub.pubblica("cantina", {"azione": "movimento", "vino_id": vino_id, "tipo": "CARICO"})
+
     return {
         "ordine_id": ordine_id,
         "movimento_id": movimento_id,
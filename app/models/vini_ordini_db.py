@@ -878,6 +878,9 @@ def ricevi(
         raise
     conn.close()
 
+    from app.services import eventi_hub
+    eventi_hub.pubblica("cantina", {"azione": "arrivo_ordine", "ordine_id": ordine_id})
+
     ordine = get_ordine(ordine_id)
     ordine["_movimenti_creati"] = movimenti
     ordine["_righe_saltate"] = righe_saltate
@@ -9,7 +9,9 @@ Al boot del backend, legge:
 
 Espone:
   - is_module_active(module_id)         → bool
-  - is_router_active(router_file_name)  → bool (usato da main.py per filtrare include_router)
+  - is_router_active(router_file_name)  → bool (usato da main.py per decidere se
+                                          importare e montare il router: i router dei
+                                          moduli spenti non vengono nemmeno importati)
   - get_active_modules()                → set[str]
   - get_module_info()                   → dict diagnostico per GET /system/modules
   - boot_banner()                       → stringa log al boot
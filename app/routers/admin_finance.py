@@ -14,17 +14,16 @@ from pydantic import BaseModel
 import io
 
 # 🔄 IMPORT MULTI-ANNO CORRISPETTIVI
+# (pandas e openpyxl si caricano al primo import/export, non al boot:
+#  corrispettivi_export è importato dentro gli endpoint che lo usano)
 from app.services.corrispettivi_import import (
     DB_PATH,
     ensure_table,
     import_df_into_db,
     load_corrispettivi_from_excel,
 )
-from app.services.corrispettivi_export import (
-    export_corrispettivi_to_excel,
-    generate_template,
-)
 from app.services.auth_service import get_current_user
+from app.services.vendite_aggregator import ensure_vendite_giornaliere
 
 router = APIRouter(
     prefix="/admin/finance",
@@ -59,6 +58,8 @@ def ensure_daily_closures_table(conn: sqlite3.Connection) -> None:
     if "annulli_resi" not in cols:
         conn.execute("ALTER TABLE daily_closures ADD COLUMN annulli_resi REAL DEFAULT 0")
         conn.commit()
+    # Fact table vendite_giornaliere (vendite_aggregator v1.1, mig 171)
+    ensure_vendite_giornaliere(conn)
 
 
 # ---------------------------------------------------------
@@ -278,6 +279,7 @@ async def export_corrispettivi(
     Senza filtri → esporta tutto.
     """
     try:
+        from app.services.corrispettivi_export import export_corrispettivi_to_excel
         excel_bytes = export_corrispettivi_to_excel(year=year, month=month)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore generazione Excel: {e}")
@@ -307,6 +309,7 @@ async def download_template():
     istruzioni e riga di esempio.
     """
     try:
+        from app.services.corrispettivi_export import generate_template
         excel_bytes = generate_template()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore generazione template: {e}")
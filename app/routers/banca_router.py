@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
-# @version: v1.1-csv-robust-import
+# @version: v1.4-import-saldi
 # -*- coding: utf-8 -*-
 """
 Router modulo Banca — movimenti bancari, categorie, dashboard, cross-ref fatture.
 
 Endpoints:
-  1. POST   /banca/import             — upload CSV Banco BPM
+  1. POST   /banca/import             — upload CSV Banco BPM (?dry_run=true = anteprima)
   2. GET    /banca/movimenti           — lista movimenti con filtri
   3. GET    /banca/dashboard           — stats aggregati (saldo, entrate/uscite, breakdown)
   4. GET    /banca/categorie           — lista categorie banca con mapping custom
@@ -31,6 +31,9 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query,
 from pydantic import BaseModel
 import sqlite3
 
+from app.services import banca_categorie_engine
+from app.services import liquidita_service
+from app.services import http_cache
 from app.services.auth_service import get_current_user
 from app.utils.locale_data import locale_data_path
 
@@ -71,26 +74,10 @@ EXCLUDE_CARTA_SQL_NO_ALIAS = "(banca IS NULL OR banca NOT LIKE 'CARTA_%')"
 # ═══════════════════════════════════════════════════════
 
 def _load_categorie_registrazione(conn=None):
-    """Carica categorie registrazione da DB. Ritorna dict {codice: {label, tipo, pattern, colore, ordine}}."""
-    own_conn = conn is None
-    if own_conn:
-        conn = get_db()
-    try:
-        rows = conn.execute(
-            "SELECT codice, label, tipo, pattern, colore, ordine FROM banca_categorie_registrazione WHERE attiva = 1 ORDER BY tipo, ordine"
-        ).fetchall()
-    except Exception:
-        # Tabella non ancora creata — fallback hardcoded
-        return {
-            "SPESA_BANCARIA": {"label": "Spese bancarie", "tipo": "uscita", "pattern": "", "colore": "#6b7280", "ordine": 1},
-            "ALTRO_USCITA": {"label": "Altra uscita", "tipo": "uscita", "pattern": "", "colore": "#9ca3af", "ordine": 99},
-            "INCASSO_POS": {"label": "Incasso POS", "tipo": "entrata", "pattern": "", "colore": "#059669", "ordine": 1},
-            "ALTRO_ENTRATA": {"label": "Altra entrata", "tipo": "entrata", "pattern": "", "colore": "#9ca3af", "ordine": 99},
-        }
-    finally:
-        if own_conn:
-            conn.close()
-    return {r["codice"]: dict(r) for r in rows}
+    """Categorie registrazione attive {codice: {label, tipo, pattern, colore, ordine}}.
+    Dalla cache del motore compilato (services/banca_categorie_engine), che
+    ricade sul set hardcoded se la tabella non esiste ancora."""
+    return banca_categorie_engine.categorie(conn)
 
 
 def _get_categorie_by_tipo(conn=None):
@@ -103,44 +90,9 @@ def _get_categorie_by_tipo(conn=None):
 
 
 def _auto_detect_categoria(descrizione: str, importo: float) -> str:
-    """Rileva automaticamente la categoria dalla descrizione del movimento usando i pattern da DB."""
-    d = (descrizione or "").upper()
-    cats = _load_categorie_registrazione()
-    tipo_filtro = "entrata" if importo > 0 else "uscita"
-
-    # Ordina per ordine (le specifiche prima, ALTRO alla fine)
-    sorted_cats = sorted(
-        [(k, v) for k, v in cats.items() if v["tipo"] == tipo_filtro and v.get("pattern")],
-        key=lambda x: x[1].get("ordine", 50)
-    )
-
-    for codice, info in sorted_cats:
-        patterns = [p.strip() for p in (info.get("pattern") or "").split("|") if p.strip()]
-        for pat in patterns:
-            # Pattern speciale con soglia importo: "DEBIT PAGAMENTO<50" o ">=50"
-            if "<" in pat and not pat.startswith("<"):
-                text_part, threshold = pat.rsplit("<", 1)
-                try:
-                    threshold_val = float(threshold)
-                    if text_part.strip() in d and abs(importo) < threshold_val:
-                        return codice
-                except ValueError:
-                    if pat in d:
-                        return codice
-            elif ">=" in pat and not pat.startswith(">="):
-                text_part, threshold = pat.rsplit(">=", 1)
-                try:
-                    threshold_val = float(threshold)
-                    if text_part.strip() in d and abs(importo) >= threshold_val:
-                        return codice
-                except ValueError:
-                    if pat in d:
-                        return codice
-            elif pat in d:
-                return codice
-
-    # Fallback: ALTRO_USCITA o ALTRO_ENTRATA
-    return f"ALTRO_{tipo_filtro.upper()}"
+    """Rileva automaticamente la categoria dalla descrizione del movimento usando i pattern da DB.
+    Regole compilate e in cache: vedi services/banca_categorie_engine."""
+    return banca_categorie_engine.categorizza(None, descrizione, importo)
 
 
 # ═══════════════════════════════════════════════════════
@@ -180,12 +132,17 @@ class RegistraMovimentoRequest(BaseModel):
 # HELPERS
 # ═══════════════════════════════════════════════════════
 
+_RE_DATA_IT = re.compile(r"(\d{2})/(\d{2})/(\d{4})")
+_RE_PUNTEGGIATURA = re.compile(r"[^\w\s]")
+_RE_SPAZI = re.compile(r"\s+")
+
+
 def _parse_date_it(s: str) -> Optional[str]:
     """Converte 'dd/mm/yyyy' → 'yyyy-mm-dd'."""
     if not s:
         return None
     s = s.strip()
-    m = re.match(r"(\d{2})/(\d{2})/(\d{4})", s)
+    m = _RE_DATA_IT.match(s)
     if m:
         return f"{m.group(3)}-{m.group(2)}-{m.group(1)}"
     return s
@@ -209,8 +166,8 @@ def _normalize_desc(descrizione: str) -> str:
     Due formati CSV diversi della stessa banca producono lo stesso risultato."""
     d = (descrizione or "").strip().lower()
     # Rimuovi tutta la punteggiatura e trattini
-    d = re.sub(r"[^\w\s]", " ", d)
-    d = re.sub(r"\s+", " ", d).strip()
+    d = _RE_PUNTEGGIATURA.sub(" ", d)
+    d = _RE_SPAZI.sub(" ", d).strip()
     return d[:40]
 
 
@@ -234,6 +191,20 @@ def _parse_categoria(cat_raw: str):
     return cat_raw, ""
 
 
+def _csv_column_index(fieldnames: list, *names: str) -> Optional[int]:
+    """Indice della colonna con le stesse regole di _get_csv_field (match
+    esatto prima, poi case-insensitive con strip). Risolto una volta per file
+    invece che a ogni riga."""
+    for name in names:
+        if name in fieldnames:
+            return len(fieldnames) - 1 - fieldnames[::-1].index(name)
+    names_lower = [n.lower().strip() for n in names]
+    for i, key in enumerate(fieldnames):
+        if (key or "").strip().lower() in names_lower:
+            return i
+    return None
+
+
 def _get_csv_field(row: dict, *names: str) -> str:
     """Cerca un campo nel dict CSV provando diversi nomi (case-insensitive, strip spazi).
     Banco BPM cambia leggermente i nomi colonna tra versioni di export."""
@@ -254,13 +225,24 @@ def _get_csv_field(row: dict, *names: str) -> str:
 # 1. IMPORT CSV
 # ═══════════════════════════════════════════════════════
 
+# Righe "nuove" restituite nell'anteprima del dry-run.
+DRY_RUN_MAX_RIGHE = 500
+
+
 @router.post("/import")
-async def import_csv(file: UploadFile = File(...)):
+async def import_csv(
+    file: UploadFile = File(...),
+    dry_run: bool = Query(False, description="Solo anteprima: cosa verrebbe importato, senza scrivere"),
+):
     """
     Importa CSV export Banco BPM.
     Colonne attese: Ragione Sociale, Data contabile, Data valuta, Banca,
                     Rapporto, Importo, Divisa, Descrizione,
                     Categoria/sottocategoria, Hashtag
+
+    Idempotente: reimportare lo stesso estratto (o uno che si sovrappone)
+    non crea duplicati. Con ?dry_run=true restituisce il diff (nuovi,
+    duplicati per tipo, anteprima) senza toccare il DB.
     """
     if not file.filename.endswith(".csv"):
         raise HTTPException(400, "Il file deve essere in formato .csv")
@@ -311,33 +293,41 @@ async def import_csv(file: UploadFile = File(...)):
             f"L'import procede best-effort ma i dati potrebbero essere incompleti — verifica."
         )
 
-    conn = get_db()
-    cur = conn.cursor()
-
-    num_rows = 0
-    num_new = 0
-    num_dup = 0
-    date_min = None
-    date_max = None
-
-    # Crea log entry
-    cur.execute(
-        "INSERT INTO banca_import_log (filename) VALUES (?)",
-        (file.filename,)
-    )
-    import_id = cur.lastrowid
-
-    for row in reader:
+    # ── Parsing a colonne risolte una volta sola ──
+    # Prima ogni riga passava da DictReader + _get_csv_field (scansione
+    # case-insensitive delle chiavi per ogni campo) e da una SELECT di soft
+    # dedup + INSERT singola. Ora: parse di tutto il file in memoria, hash
+    # calcolati in blocco, UN range read dei movimenti già presenti nelle
+    # date del file, UN executemany nella stessa transazione.
+    fieldnames = list(reader.fieldnames or [])
+    col = {
+        "ragione": _csv_column_index(fieldnames, "Ragione Sociale", "Ragione sociale", "ragione sociale"),
+        "data_c": _csv_column_index(fieldnames, "Data contabile", "Data Contabile", "data contabile"),
+        "data_v": _csv_column_index(fieldnames, "Data valuta", "Data Valuta", "data valuta"),
+        "banca": _csv_column_index(fieldnames, "Banca", "banca"),
+        "rapporto": _csv_column_index(fieldnames, "Rapporto", "rapporto"),
+        "importo": _csv_column_index(fieldnames, "Importo", "importo"),
+        "divisa": _csv_column_index(fieldnames, "Divisa", "divisa"),
+        "descrizione": _csv_column_index(fieldnames, "Descrizione", "descrizione"),
+        "cat": _csv_column_index(fieldnames, "Categoria/sottocategoria", "Categoria/Sottocategoria",
+                                 "categoria/sottocategoria", "Categoria"),
+        "hashtag": _csv_column_index(fieldnames, "Hashtag", "hashtag"),
+        "canale": _csv_column_index(fieldnames, "Canale", "canale"),
+    }
 
-        num_rows += 1
+    def _campo(row: list, nome: str) -> str:
+        i = col[nome]
+        if i is None or i >= len(row):
+            return ""
+        return (row[i] or "").strip()
 
-        # Parse campi — usa _get_csv_field per matching robusto dei nomi colonna
-        ragione = _get_csv_field(row, "Ragione Sociale", "Ragione sociale", "ragione sociale")
-        data_c = _parse_date_it(_get_csv_field(row, "Data contabile", "Data Contabile", "data contabile"))
-        data_v = _parse_date_it(_get_csv_field(row, "Data valuta", "Data Valuta", "data valuta"))
-        banca = _get_csv_field(row, "Banca", "banca")
-        rapporto = _get_csv_field(row, "Rapporto", "rapporto")
-        causale = _get_csv_field(row, "Causale", "causale")
+    righe = []
+    for row in reader.reader:   # csv.reader sottostante, header già consumato
+        if not row:
+            continue
+        ragione = _campo(row, "ragione")
+        banca = _campo(row, "banca")
+        rapporto = _campo(row, "rapporto")
         # CC.8 (2026-06-13): l'export "MovimentiCC_OnLine" recente di BPM ha
         # 7 colonne (Data contabile, Data valuta, Importo, Divisa, Causale,
         # Descrizione, Canale) — manca completamente Banca/Rapporto. Il vecchio
@@ -354,95 +344,170 @@ async def import_csv(file: UploadFile = File(...)):
         if not banca and not rapporto:
             banca = "05034 - BANCO BPM S.P.A."
             rapporto = "11102 - 400200012200"
-        importo = _parse_importo_it(_get_csv_field(row, "Importo", "importo") or "0")
-        divisa = _get_csv_field(row, "Divisa", "divisa") or "EUR"
-        descrizione = _get_csv_field(row, "Descrizione", "descrizione")
-        cat_raw = _get_csv_field(row, "Categoria/sottocategoria", "Categoria/Sottocategoria",
-                                  "categoria/sottocategoria", "Categoria")
-        hashtag = _get_csv_field(row, "Hashtag", "hashtag")
-        canale = _get_csv_field(row, "Canale", "canale")
+        descrizione = _campo(row, "descrizione")
+        hashtag = _campo(row, "hashtag")
         # Se non c'è Hashtag ma c'è Canale (formato MovimentiCC), salva canale in hashtag
-        if not hashtag and canale:
-            hashtag = canale
-
-        cat, subcat = _parse_categoria(cat_raw)
-        dhash = _dedup_hash(data_c, importo, descrizione)
-
-        # Track date range
-        if data_c:
-            if not date_min or data_c < date_min:
-                date_min = data_c
-            if not date_max or data_c > date_max:
-                date_max = data_c
-
-        # Soft dedup check: pattern "formato vuoto+pieno" (vedi mig 058).
-        # Lo stesso movimento può apparire in due export CSV diversi della
-        # banca: uno con ragione_sociale+banca pieni (uppercase), l'altro
-        # con campi vuoti (lowercase). Il dedup_hash non cattura perché le
-        # descrizioni normalizzate hanno prefisso comune troppo corto.
-        # Strategia: se esiste un record con stessa data+importo e pattern
-        # ragione_sociale "opposto" (uno vuoto, uno pieno), è lo stesso
-        # movimento → skip import del nuovo (tieni il record esistente).
-        ragione_clean = (ragione or "").strip()
-        existing = cur.execute("""
-            SELECT id, ragione_sociale
+        if not hashtag:
+            hashtag = _campo(row, "canale")
+        cat, subcat = _parse_categoria(_campo(row, "cat"))
+        righe.append({
+            "ragione": ragione,
+            "data_c": _parse_date_it(_campo(row, "data_c")),
+            "data_v": _parse_date_it(_campo(row, "data_v")),
+            "banca": banca,
+            "rapporto": rapporto,
+            "importo": _parse_importo_it(_campo(row, "importo") or "0"),
+            "divisa": _campo(row, "divisa") or "EUR",
+            "descrizione": descrizione,
+            "cat": cat,
+            "subcat": subcat,
+            "hashtag": hashtag,
+        })
+
+    num_rows = len(righe)
+    date_note = [r["data_c"] for r in righe if r["data_c"]]
+    date_min = min(date_note) if date_note else None
+    date_max = max(date_note) if date_note else None
+    hashes = [_dedup_hash(r["data_c"], r["importo"], r["descrizione"]) for r in righe]
+
+    conn = get_db()
+    cur = conn.cursor()
+
+    # ── Dedup contro il DB: un solo range read sulle date del file ──
+    # Hard: dedup_hash già presente (UNIQUE). Soft: pattern "formato
+    # vuoto+pieno" (vedi mig 058) — lo stesso movimento appare in due export
+    # diversi, uno con ragione_sociale piena e uno vuota: stessa
+    # data+importo e ragione_sociale "opposta" = stesso movimento, si tiene
+    # il record esistente.
+    hash_esistenti: set = set()
+    hash_file: set = set()
+    ragione_piena: dict = {}   # (data, importo) → {True/False: ragione_sociale piena?}
+    if date_min:
+        for ex_hash, ex_data, ex_imp, ex_rs in cur.execute("""
+            SELECT dedup_hash, data_contabile, importo, ragione_sociale
             FROM banca_movimenti
-            WHERE data_contabile = ? AND importo = ?
-        """, (data_c, importo)).fetchall()
-
-        is_soft_dup = False
-        for ex_id, ex_rs in existing:
-            ex_rs_clean = (ex_rs or "").strip()
-            # Pattern opposto: uno vuoto e l'altro pieno
-            if bool(ragione_clean) != bool(ex_rs_clean):
-                is_soft_dup = True
-                break
-
-        if is_soft_dup:
-            num_dup += 1
+            WHERE data_contabile >= ? AND data_contabile <= ?
+        """, (date_min, date_max)):
+            hash_esistenti.add(ex_hash)
+            ragione_piena.setdefault((ex_data, ex_imp), set()).add(bool((ex_rs or "").strip()))
+
+    nuovi = []
+    dup_hash = dup_soft = dup_file = scartati = 0
+    for r, dhash in zip(righe, hashes):
+        if not r["data_c"]:
+            # data_contabile è NOT NULL: prima finiva in IntegrityError → duplicato
+            scartati += 1
+            continue
+        if dhash in hash_esistenti:
+            dup_hash += 1
+            continue
+        if dhash in hash_file:
+            dup_file += 1
             continue
+        piena = bool(r["ragione"])
+        visti = ragione_piena.setdefault((r["data_c"], r["importo"]), set())
+        if (not piena) in visti:
+            dup_soft += 1
+            continue
+        visti.add(piena)
+        hash_file.add(dhash)
+        nuovi.append({**r, "dedup_hash": dhash})
 
-        try:
-            cur.execute("""
-                INSERT INTO banca_movimenti
-                    (import_id, ragione_sociale, data_contabile, data_valuta,
-                     banca, rapporto, importo, divisa, descrizione,
-                     categoria_banca, sottocategoria_banca, hashtag, dedup_hash)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (import_id, ragione, data_c, data_v, banca, rapporto,
-                  importo, divisa, descrizione, cat, subcat, hashtag, dhash))
-            num_new += 1
-        except sqlite3.IntegrityError:
-            # Duplicato hard (hash identico)
-            num_dup += 1
+    num_new = len(nuovi)
+    num_dup = dup_hash + dup_soft + dup_file + scartati
 
     # Se tutte le righe sono "duplicate" e nessuna data trovata → probabile mismatch colonne
     warning = None
     if num_rows > 0 and num_new == 0 and date_min is None:
         # Nessuna data parsata + zero inserimenti → colonne CSV non riconosciute
-        col_list = list(reader.fieldnames) if reader.fieldnames else []
-        conn.rollback()
         conn.close()
         raise HTTPException(
             400,
             f"Nessuna colonna riconosciuta nel CSV. "
-            f"Colonne trovate: {', '.join(col_list) if col_list else '(nessuna)'}. "
+            f"Colonne trovate: {', '.join(fieldnames) if fieldnames else '(nessuna)'}. "
             f"Attese: Ragione Sociale, Data contabile, Data valuta, Importo, Descrizione..."
         )
 
     if num_rows > 0 and num_new == 0:
         warning = "Tutti i movimenti risultano già importati (duplicati)."
 
-    # Aggiorna log
-    cur.execute("""
-        UPDATE banca_import_log
-        SET num_rows = ?, num_new = ?, num_duplicates = ?,
-            date_from = ?, date_to = ?
-        WHERE id = ?
-    """, (num_rows, num_new, num_dup, date_min, date_max, import_id))
+    dettaglio_dup = {"hash": dup_hash, "soft": dup_soft, "nel_file": dup_file, "senza_data": scartati}
 
-    conn.commit()
-    conn.close()
+    if dry_run:
+        # Anteprima: nessuna scrittura, nemmeno il log.
+        conn.close()
+        anteprima = nuovi[:DRY_RUN_MAX_RIGHE]
+        result = {
+            "dry_run": True,
+            "filename": file.filename,
+            "total_rows": num_rows,
+            "new": num_new,
+            "duplicates": num_dup,
+            "duplicates_detail": dettaglio_dup,
+            "date_from": date_min,
+            "date_to": date_max,
+            "formato_csv": formato_csv,
+            "warnings": warnings,
+            "anteprima": [
+                {"data_contabile": n["data_c"], "importo": n["importo"],
+                 "descrizione": n["descrizione"], "ragione_sociale": n["ragione"],
+                 "categoria_suggerita": cod}
+                for n, cod in zip(anteprima, banca_categorie_engine.categorizza_batch(
+                    None, [(n["descrizione"], n["importo"]) for n in anteprima]
+                ))
+            ],
+        }
+        if warning:
+            result["warning"] = warning
+        return result
+
+    try:
+        cur.execute(
+            "INSERT INTO banca_import_log (filename) VALUES (?)",
+            (file.filename,)
+        )
+        import_id = cur.lastrowid
+        # Saldi giornalieri: trigger spenti durante l'executemany e un solo
+        # ricalcolo dalla data più vecchia dei nuovi movimenti (riga per
+        # riga ogni INSERT riscriveva la coda dei saldi del rapporto).
+        saldi_sospesi = bool(nuovi) and liquidita_service.sospendi_saldi(conn)
+        # OR IGNORE: rete di sicurezza se un altro import ha scritto gli
+        # stessi hash tra il range read e qui — l'indice UNIQUE resta l'arbitro.
+        cur.executemany("""
+            INSERT OR IGNORE INTO banca_movimenti
+                (import_id, ragione_sociale, data_contabile, data_valuta,
+                 banca, rapporto, importo, divisa, descrizione,
+                 categoria_banca, sottocategoria_banca, hashtag, dedup_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (import_id, n["ragione"], n["data_c"], n["data_v"], n["banca"], n["rapporto"],
+             n["importo"], n["divisa"], n["descrizione"], n["cat"], n["subcat"],
+             n["hashtag"], n["dedup_hash"])
+            for n in nuovi
+        ])
+        # rowcount = righe inserite davvero (somma su executemany, senza le
+        # scritture dei trigger: total_changes contava anche i saldi giornalieri)
+        inseriti = cur.rowcount
+        if saldi_sospesi:
+            liquidita_service.riprendi_saldi(conn, min(n["data_c"] for n in nuovi))
+        if inseriti < num_new:
+            dettaglio_dup["hash"] += num_new - inseriti
+            num_dup += num_new - inseriti
+            num_new = inseriti
+
+        # Aggiorna log
+        cur.execute("""
+            UPDATE banca_import_log
+            SET num_rows = ?, num_new = ?, num_duplicates = ?,
+                date_from = ?, date_to = ?
+            WHERE id = ?
+        """, (num_rows, num_new, num_dup, date_min, date_max, import_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
     result = {
         "import_id": import_id,
@@ -450,6 +515,7 @@ async def import_csv(file: UploadFile = File(...)):
         "total_rows": num_rows,
         "new": num_new,
         "duplicates": num_dup,
+        "duplicates_detail": dettaglio_dup,
         "date_from": date_min,
         "date_to": date_max,
         # CC.8.b — formato CSV rilevato e warning su anomalie
@@ -788,7 +854,11 @@ def _score_match(nome: str, totale_match: float, data_ref, target: float,
     return score
 
 
-@router.get("/cross-ref")
+@router.get("/cross-ref", dependencies=[http_cache.condizionale(
+    ("foodcost.db", ["banca_movimenti", "banca_fatture_link", "carta_estratti", "cg_entrate",
+                     "cg_uscite", "fe_fatture", "fe_fornitore_categoria",
+                     "banca_categorie_registrazione"]),
+)])
 def get_cross_ref(
     data_da: Optional[str] = None,
     data_a: Optional[str] = None,
@@ -955,6 +1025,7 @@ def get_cross_ref(
 
     # ── 5. Assembla risultato per ogni movimento ──
     movimenti = []
+    da_categorizzare = []   # movimenti che ricevono auto_categoria (batch in fondo)
     for mov in raw_movimenti:
         mid = mov["id"]
         abs_imp = abs(mov["importo"])
@@ -1001,9 +1072,7 @@ def get_cross_ref(
         # Entrata senza link → auto-categoria per registrazione
         if mov["importo"] >= 0 and not links:
             mov["possibili_match"] = []
-            mov["auto_categoria"] = _auto_detect_categoria(
-                mov.get("descrizione", ""), mov["importo"]
-            )
+            da_categorizzare.append(mov)
             movimenti.append(mov)
             continue
 
@@ -1012,9 +1081,7 @@ def get_cross_ref(
         if target <= 0.5:
             mov["possibili_match"] = []
             if not links:
-                mov["auto_categoria"] = _auto_detect_categoria(
-                    mov.get("descrizione", ""), mov["importo"]
-                )
+                da_categorizzare.append(mov)
             movimenti.append(mov)
             continue
 
@@ -1178,11 +1245,16 @@ def get_cross_ref(
         mov["possibili_match"] = suggestions[:8]
 
         if not suggestions and not links:
-            mov["auto_categoria"] = _auto_detect_categoria(
-                mov.get("descrizione", ""), mov["importo"]
-            )
+            da_categorizzare.append(mov)
         movimenti.append(mov)
 
+    # Auto-categoria in un colpo solo sul motore compilato
+    codici = banca_categorie_engine.categorizza_batch(
+        conn, [(m.get("descrizione", ""), m["importo"]) for m in da_categorizzare]
+    )
+    for m, codice in zip(da_categorizzare, codici):
+        m["auto_categoria"] = codice
+
     conn.close()
     return movimenti
 
@@ -1667,6 +1739,7 @@ def create_categoria_registrazione(req: CategoriaRegistrazioneRequest):
             VALUES (?, ?, ?, ?, ?, ?)
         """, (req.codice.upper().replace(" ", "_"), req.label, req.tipo, req.pattern, req.colore, req.ordine))
         conn.commit()
+        banca_categorie_engine.invalida()
         new_id = conn.execute("SELECT last_insert_rowid() as id").fetchone()["id"]
     except Exception as e:
         conn.close()
@@ -1685,6 +1758,7 @@ def update_categoria_registrazione(cat_id: int, req: CategoriaRegistrazioneReque
         WHERE id = ?
     """, (req.label, req.tipo, req.pattern, req.colore, req.ordine, cat_id))
     conn.commit()
+    banca_categorie_engine.invalida()
     conn.close()
     return {"ok": True}
 
@@ -1701,6 +1775,7 @@ def toggle_categoria_registrazione(cat_id: int):
     new_state = 0 if row["attiva"] else 1
     cur.execute("UPDATE banca_categorie_registrazione SET attiva = ? WHERE id = ?", (new_state, cat_id))
     conn.commit()
+    banca_categorie_engine.invalida()
     conn.close()
     return {"attiva": bool(new_state)}
 
@@ -1725,6 +1800,38 @@ def auto_categoria(movimento_id: int):
     }
 
 
+class AutoCategoriaBulkRequest(BaseModel):
+    movimento_ids: List[int]
+
+
+@router.post("/cross-ref/auto-categoria-bulk")
+def auto_categoria_bulk(req: AutoCategoriaBulkRequest):
+    """Auto-categoria per più movimenti (ricategorizzazione in blocco prima di registra-bulk)."""
+    if not req.movimento_ids:
+        return {"movimenti": []}
+    conn = get_db()
+    ph = ",".join("?" * len(req.movimento_ids))
+    movs = conn.execute(
+        f"SELECT id, importo, descrizione FROM banca_movimenti WHERE id IN ({ph})",
+        req.movimento_ids,
+    ).fetchall()
+    codici = banca_categorie_engine.categorizza_batch(
+        conn, [(m["descrizione"], m["importo"]) for m in movs]
+    )
+    conn.close()
+    return {
+        "movimenti": [
+            {
+                "id": m["id"],
+                "categoria": cod,
+                "tipo": "entrata" if m["importo"] > 0 else "uscita",
+                "descrizione_suggerita": (m["descrizione"] or "").strip()[:100],
+            }
+            for m, cod in zip(movs, codici)
+        ]
+    }
+
+
 @router.post("/cross-ref/registra")
 def registra_movimento(req: RegistraMovimentoRequest):
     """
@@ -19,6 +19,8 @@ Permessi:
 - viewer                          → 403 (nessun accesso)
 
 Changelog:
+- v1.4 (2026-10-19): POST /bevande/carta/pubblica/ (mattone M.J) + auto-
+                  pubblicazione opt-in dopo le modifiche (FTP_AUTOPUBLISH).
 - v1.1 (Fase 3): endpoint export /bevande/carta, /bevande/carta/pdf, /pdf-staff,
                   /docx, /bevande/sezioni/{key}/preview.
 - v1.0 (Fase 1): CRUD sezioni + voci + reorder + bulk-import.
@@ -34,9 +36,8 @@ from pathlib import Path
 from typing import Any, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, Response
 from pydantic import BaseModel, Field
-from weasyprint import HTML, CSS
 
 from app.models.bevande_db import (
     count_voci_by_sezione,
@@ -46,6 +47,8 @@ from app.models.bevande_db import (
     list_sezioni,
 )
 from app.services.auth_service import get_current_user
+from app.services import pdf_render_cache
+from app.services import ftp_publish_service as web_publish
 from app.services.carta_bevande_service import (
     build_carta_bevande_docx,
     build_carta_bevande_html,
@@ -296,6 +299,7 @@ def update_sezione(key: str, patch: SezioneUpdate, user: dict = Depends(get_curr
         conn.commit()
     finally:
         conn.close()
+    _segnala_carta_modificata()
     return {"status": "ok", "key": key}
 
 
@@ -318,6 +322,7 @@ def reorder_sezioni(items: list[SezioneReorderItem], user: dict = Depends(get_cu
         conn.commit()
     finally:
         conn.close()
+    _segnala_carta_modificata()
     return {"status": "ok", "count": len(items)}
 
 
@@ -414,6 +419,7 @@ def update_tipologie_sezione(key: str, payload: TipologieUpdate, user: dict = De
     finally:
         conn.close()
 
+    _segnala_carta_modificata()
     return {
         "status": "ok",
         "key": key,
@@ -531,6 +537,7 @@ def create_voce(voce: VoceBase, user: dict = Depends(get_current_user)):
         conn.commit()
     finally:
         conn.close()
+    _segnala_carta_modificata()
     return {"status": "ok", "id": new_id}
 
 
@@ -565,6 +572,7 @@ def update_voce(voce_id: int, patch: VoceUpdate, user: dict = Depends(get_curren
         conn.commit()
     finally:
         conn.close()
+    _segnala_carta_modificata()
     return {"status": "ok", "id": voce_id}
 
 
@@ -597,6 +605,7 @@ def delete_voce(
         conn.commit()
     finally:
         conn.close()
+    _segnala_carta_modificata()
     return {"status": "ok", "id": voce_id, "mode": "hard" if hard else "soft"}
 
 
@@ -625,6 +634,7 @@ def reorder_voci(payload: VociReorder, user: dict = Depends(get_current_user)):
         conn.commit()
     finally:
         conn.close()
+    _segnala_carta_modificata()
     return {"status": "ok", "count": len(payload.order)}
 
 
@@ -683,6 +693,7 @@ def bulk_import_voci(payload: BulkImport, user: dict = Depends(get_current_user)
         conn.commit()
     finally:
         conn.close()
+    _segnala_carta_modificata()
     return {"status": "ok", "imported": imported, "sezione_key": payload.sezione_key}
 
 
@@ -745,6 +756,57 @@ def _html_pdf_wrapper(body_html: str, frontespizio: str, toc: str) -> str:
 </html>"""
 
 
+def _render_carta_bevande_pdf(staff: bool = False) -> bytes:
+    """
+    PDF della Carta delle Bevande (bytes), cliente o staff.
+
+    Render via render cache (2026-10-19): stessa carta, stessi bytes, nessun
+    nuovo WeasyPrint. Niente piu' `static/carta_bevande*.pdf`: `static/` e'
+    servito senza auth e la versione staff contiene le note interne.
+    """
+    _ensure_db()
+    frontespizio = build_copertina_html(
+        logo_path=str(LOGO_PATH) if LOGO_PATH.exists() else None,
+        staff=staff,
+    )
+    sezioni_attive = [
+        _row_to_dict(s) for s in list_sezioni(only_active=True)
+    ]
+    toc = build_toc_html(sezioni_attive)
+    body = build_carta_bevande_html(include_vini=True, for_pdf=True, staff=staff)
+    html = _html_pdf_wrapper(body, frontespizio, toc)
+
+    return pdf_render_cache.render_pdf(
+        html,
+        tipo="carta_bevande_staff" if staff else "carta_bevande",
+        css_files=[CSS_PDF],
+        base_url=str(BASE_DIR),
+    )
+
+
+# La carta bevande include i vini: si rigenera in background sia per le
+# modifiche alle voci (qui sotto) sia per quelle in cantina (vini_magazzino_db).
+pdf_render_cache.registra_prerender("carta_bevande", lambda: _render_carta_bevande_pdf(staff=False))
+pdf_render_cache.registra_prerender("carta_bevande_staff", lambda: _render_carta_bevande_pdf(staff=True))
+
+
+def _segnala_carta_modificata() -> None:
+    pdf_render_cache.segnala_modifica("carta_bevande", "carta_bevande_staff")
+    web_publish.pianifica_autopubblicazione("carta_bevande")
+
+
+def _produci_carta_pubblica():
+    """Produttore M.J: SOLO la versione cliente (le note staff restano interne)."""
+    _ensure_db()
+    return (
+        _render_carta_bevande_pdf(staff=False),
+        f"carta bevande del {datetime.now().strftime('%d/%m/%Y %H:%M')}",
+    )
+
+
+web_publish.registra_produttore("carta_bevande", _produci_carta_pubblica)
+
+
 @router.get("/carta", response_class=HTMLResponse)
 def carta_bevande_html(user: dict = Depends(get_current_user)):
     """Preview HTML master della Carta delle Bevande (per iframe/browser)."""
@@ -759,23 +821,12 @@ def carta_bevande_pdf(user: dict = Depends(get_current_user)):
     """PDF cliente (no note staff) — Carta delle Bevande completa."""
     _require_reader(user)
     _ensure_db()
-    frontespizio = build_copertina_html(
-        logo_path=str(LOGO_PATH) if LOGO_PATH.exists() else None,
-        staff=False,
+    pdf_bytes = _render_carta_bevande_pdf(staff=False)
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": 'attachment; filename="carta-bevande.pdf"'},
     )
-    sezioni_attive = [
-        _row_to_dict(s) for s in list_sezioni(only_active=True)
-    ]
-    toc = build_toc_html(sezioni_attive)
-    body = build_carta_bevande_html(include_vini=True, for_pdf=True, staff=False)
-    html = _html_pdf_wrapper(body, frontespizio, toc)
-
-    out = STATIC_DIR / "carta_bevande.pdf"
-    HTML(string=html, base_url=str(BASE_DIR)).write_pdf(
-        str(out),
-        stylesheets=[CSS(filename=str(CSS_PDF))],
-    )
-    return FileResponse(out, filename="carta-bevande.pdf")
 
 
 @router.get("/carta/pdf-staff")
@@ -783,23 +834,30 @@ def carta_bevande_pdf_staff(user: dict = Depends(get_current_user)):
     """PDF staff — include note_interne su ogni voce che le ha."""
     _require_reader(user)
     _ensure_db()
-    frontespizio = build_copertina_html(
-        logo_path=str(LOGO_PATH) if LOGO_PATH.exists() else None,
-        staff=True,
+    pdf_bytes = _render_carta_bevande_pdf(staff=True)
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": 'attachment; filename="carta-bevande-staff.pdf"'},
     )
-    sezioni_attive = [
-        _row_to_dict(s) for s in list_sezioni(only_active=True)
-    ]
-    toc = build_toc_html(sezioni_attive)
-    body = build_carta_bevande_html(include_vini=True, for_pdf=True, staff=True)
-    html = _html_pdf_wrapper(body, frontespizio, toc)
 
-    out = STATIC_DIR / "carta_bevande_staff.pdf"
-    HTML(string=html, base_url=str(BASE_DIR)).write_pdf(
-        str(out),
-        stylesheets=[CSS(filename=str(CSS_PDF))],
-    )
-    return FileResponse(out, filename="carta-bevande-staff.pdf")
+
+@router.post("/carta/pubblica/")
+def pubblica_carta_bevande_sul_sito(
+    forza: bool = Query(False, description="Ricarica anche se la carta online e' identica"),
+    user: dict = Depends(get_current_user),
+):
+    """Carica la carta bevande cliente sull'FTP del sito (mattone M.J)."""
+    _require_editor(user)
+    if not web_publish.is_configured():
+        raise HTTPException(
+            status_code=503,
+            detail="FTP non configurato: mancano " + ", ".join(web_publish.mancanti()) + " in .env",
+        )
+    esito = web_publish.pubblica_registrati(["carta_bevande"], forza=forza)[0]
+    if not esito.ok:
+        raise HTTPException(status_code=502, detail=f"Pubblicazione fallita: {esito.errore}")
+    return esito.to_dict()
 
 
 @router.get("/carta/docx")
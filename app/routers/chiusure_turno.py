@@ -11,6 +11,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status
 from pydantic import BaseModel, Field
 
 from app.services.auth_service import get_current_user
+from app.services.vendite_aggregator import ensure_vendite_giornaliere
 
 # ---------------------------------------------------------
 # DATABASE
@@ -127,6 +128,10 @@ def ensure_shift_closures_tables(conn: sqlite3.Connection) -> None:
 
     conn.commit()
 
+    # Fact table vendite_giornaliere (vendite_aggregator v1.1, mig 171):
+    # self-heal per i DB nati dopo la migrazione. Una query se c'è già.
+    ensure_vendite_giornaliere(conn)
+
 
 # ---------------------------------------------------------
 # ROUTER SETUP
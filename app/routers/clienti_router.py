@@ -3,7 +3,7 @@
 # Router Clienti CRM — TRGB Gestionale
 # ============================================================
 
-# @version: v1.0-clienti-router
+# @version: v1.1-etag
 # -*- coding: utf-8 -*-
 """
 Router Clienti CRM — TRGB Gestionale
@@ -34,6 +34,8 @@ from pydantic import BaseModel, Field
 
 from app.models.clienti_db import get_clienti_conn, init_clienti_db
 from app.services.auth_service import get_current_user
+from app.services import eventi_hub
+from app.services import http_cache
 
 logger = logging.getLogger("trgb.clienti")
 
@@ -764,6 +766,10 @@ async def import_prenotazioni(
                 errori += 1
 
         conn.commit()
+        if inseriti or aggiornati:
+            # un solo evento per import: mappe tavoli e planning ricaricano
+            eventi_hub.pubblica("prenotazione", {"azione": "import_thefork",
+                                                 "inseriti": inseriti, "aggiornati": aggiornati})
 
         return JSONResponse({
             "status": "ok",
@@ -1821,7 +1827,10 @@ def segmenti_conteggi(
 # ============================================================
 # ENDPOINT: LISTA CLIENTI (con ricerca e filtri)
 # ============================================================
-@router.get("/")
+@router.get("/", dependencies=[http_cache.condizionale(
+    ("clienti.sqlite3", ["clienti", "clienti_tag", "clienti_tag_assoc", "clienti_prenotazioni",
+                         "clienti_impostazioni"]),
+)])
 def lista_clienti(
     q: Optional[str] = None,
     vip: Optional[bool] = None,
@@ -20,7 +20,11 @@ from app.services.vendite_aggregator import (
     totali_periodo as vendite_totali_periodo,
     totali_mensili_anno as vendite_totali_mensili_anno,
 )
-from app.services.liquidita_service import dashboard_liquidita
+from app.services.liquidita_service import (
+    dashboard_liquidita,
+    saldo_al as banca_saldo_al,
+    totali_periodo as banca_totali_periodo,
+)
 
 router = APIRouter(prefix="/controllo-gestione", tags=["controllo-gestione"])
 
@@ -180,27 +184,10 @@ def dashboard(
 
     # ─── 3. BANCA (da foodcost.db — banca_movimenti) ───
 
-    banca_mese = fc.execute("""
-        SELECT
-            COUNT(*) AS num_movimenti,
-            COALESCE(SUM(CASE WHEN importo > 0 THEN importo ELSE 0 END), 0) AS entrate,
-            COALESCE(SUM(CASE WHEN importo < 0 THEN importo ELSE 0 END), 0) AS uscite,
-            COALESCE(SUM(importo), 0) AS saldo_periodo
-        FROM banca_movimenti
-        WHERE data_contabile >= ? AND data_contabile < ?
-    """, (primo_giorno, ultimo_giorno)).fetchone()
-
-    # Saldo complessivo banca (ultimo movimento)
-    saldo_banca = fc.execute("""
-        SELECT data_contabile, importo,
-            (SELECT SUM(importo) FROM banca_movimenti) AS saldo_totale
-        FROM banca_movimenti
-        ORDER BY data_contabile DESC, id DESC
-        LIMIT 1
-    """).fetchone()
-
-    b = dict(banca_mese)
-    b["saldo_conto"] = saldo_banca["saldo_totale"] if saldo_banca else 0
+    # Totali e saldo dai saldi giornalieri (liquidita_service, mig. 172):
+    # niente SUM su tutto lo storico dei movimenti a ogni apertura.
+    b = banca_totali_periodo(fc, primo_giorno, ultimo_giorno)
+    b["saldo_conto"] = banca_saldo_al(fc)
     result["banca"] = b
 
     # ─── 4. SCADENZE / RATEIZZAZIONI — TODO (punti 6-7) ───
@@ -257,11 +244,7 @@ def dashboard(
         """, (m_primo, m_ultimo)).fetchone()["tot"]
 
         # Banca uscite mese
-        banca_u = fc.execute("""
-            SELECT COALESCE(SUM(CASE WHEN importo < 0 THEN ABS(importo) ELSE 0 END), 0) AS tot
-            FROM banca_movimenti
-            WHERE data_contabile >= ? AND data_contabile < ?
-        """, (m_primo, m_ultimo)).fetchone()["tot"]
+        banca_u = abs(banca_totali_periodo(fc, m_primo, m_ultimo)["uscite"])
 
         andamento.append({
             "mese": m,
@@ -3,7 +3,7 @@
 # Dashboard Home — endpoint aggregatore per widget Home v3
 # ============================================================
 
-# @version: v1.0-dashboard-home
+# @version: v1.1-stato-materializzato
 # -*- coding: utf-8 -*-
 """
 Endpoint GET /dashboard/home + GET /dashboard/lavagna
@@ -961,8 +961,8 @@ def _acquisti_metrics() -> dict:
                 OR (COALESCE(f.fornitore_piva,'') = '' AND c.fornitore_nome = f.fornitore_nome)
             WHERE COALESCE(f.is_autofattura, 0) = 0
               AND f.rateizzata_in_spesa_fissa_id IS NULL
-              AND COALESCE(f.pagato, 0) = 0
-              AND (u.id IS NULL OR u.stato IN ('PROGRAMMATO','SCADUTO'))
+              AND f.pagato = 0
+              AND (f.cg_uscite_stato IS NULL OR f.cg_uscite_stato IN ('PROGRAMMATO','SCADUTO'))
               AND COALESCE(c.escluso_acquisti, 0) = 0
         """).fetchall()
 
@@ -1069,6 +1069,8 @@ def _fatture_pending() -> FatturePending:
     Strategia "AND": consideriamo una fattura DA PAGARE solo se ENTRAMBE le
     fonti concordano (`pagato=0` E `stato in PROGRAMMATO/SCADUTO o nessuna
     proiezione`). Se UNA delle due dice "pagata", la rispettiamo.
+    Dal mig 177 entrambe stanno su fe_fatture (cg_uscite_stato tenuto dai
+    trigger, pagato derivato): niente più JOIN su cg_uscite.
 
     Filtri sempre attivi:
       - escludi autofatture (`is_autofattura=1`)
@@ -1089,14 +1091,13 @@ def _fatture_pending() -> FatturePending:
             SELECT COUNT(*) AS cnt,
                    COALESCE(SUM(f.totale_fattura), 0) AS importo
             FROM fe_fatture_with_stato f
-            LEFT JOIN cg_uscite u ON u.fattura_id = f.id
             LEFT JOIN fe_fornitore_categoria c
                 ON (c.fornitore_piva = f.fornitore_piva AND COALESCE(f.fornitore_piva, '') != '')
                 OR (COALESCE(f.fornitore_piva, '') = '' AND c.fornitore_nome = f.fornitore_nome)
             WHERE COALESCE(f.is_autofattura, 0) = 0
               AND f.rateizzata_in_spesa_fissa_id IS NULL
-              AND COALESCE(f.pagato, 0) = 0
-              AND (u.id IS NULL OR u.stato IN ('PROGRAMMATO', 'SCADUTO'))
+              AND f.pagato = 0
+              AND (f.cg_uscite_stato IS NULL OR f.cg_uscite_stato IN ('PROGRAMMATO', 'SCADUTO'))
               AND COALESCE(c.escluso_acquisti, 0) = 0
         """).fetchone()
         conn.close()
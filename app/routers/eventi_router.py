@@ -0,0 +1,80 @@
+# ============================================================
+# FILE: app/routers/eventi_router.py
+# Router Eventi server-push (SSE) — TRGB Gestionale (platform)
+# ============================================================
+
+# @version: v1.1-eventi-router
+# -*- coding: utf-8 -*-
+"""
+Router Eventi — canale server-push (Server-Sent Events)
+
+Endpoint:
+    GET /eventi/stream?tipi=prenotazione,tavolo   — stream SSE (text/event-stream)
+
+Un client apre UNA connessione e riceve gli eventi tipizzati pubblicati da
+app/services/eventi_hub.py (notifica, comunicazione, prenotazione, tavolo,
+cantina, fic_sync, più `resync`). `tipi` filtra lato server; senza `tipi`
+arrivano tutti. Header `Last-Event-ID` (o `?last_event_id=`, formato
+`<epoca>-<seq>`) alla riconnessione per recuperare gli eventi persi; dopo un
+riavvio del backend arriva `resync`.
+
+Il frontend usa fetch + ReadableStream (hooks/useEventi.js) e non
+EventSource: così il JWT viaggia nell'header Authorization come per tutte le
+altre chiamate, e non finisce nei log di nginx in query string.
+
+Autenticazione: JWT. Lo stream si chiude alla scadenza del token.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.services import eventi_hub
+from app.services.auth_service import claims_da_scope, get_current_user
+
+router = APIRouter(prefix="/eventi", tags=["Eventi"])
+
+
+@router.get("/stream")
+def stream_eventi(
+    request: Request,
+    tipi: Optional[str] = Query(None, description="Tipi separati da virgola (default: tutti)"),
+    last_event_id: Optional[str] = Query(None, max_length=64),
+    current_user: dict = Depends(get_current_user),
+):
+    if not eventi_hub.abilitato():
+        raise HTTPException(status_code=503, detail="Canale eventi disattivato")
+
+    richiesti = None
+    if tipi:
+        richiesti = {t.strip() for t in tipi.split(",") if t.strip()}
+        sconosciuti = richiesti - set(eventi_hub.TIPI)
+        if sconosciuti:
+            raise HTTPException(status_code=400, detail=f"Tipi evento sconosciuti: {sorted(sconosciuti)}")
+        richiesti.add("resync")
+
+    header_id = (request.headers.get("last-event-id") or "").strip()
+    if header_id:
+        last_event_id = header_id[:64]
+
+    if not eventi_hub.posti_liberi():
+        raise HTTPException(status_code=503, detail="Troppe connessioni eventi aperte")
+
+    claims = claims_da_scope(request.scope) or {}
+    scadenza = claims.get("exp")
+
+    return StreamingResponse(
+        eventi_hub.flusso(
+            current_user["username"],
+            current_user["role"],
+            tipi=richiesti,
+            last_event_id=last_event_id,
+            scadenza=float(scadenza) if scadenza else None,
+        ),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",   # nginx: niente buffering sullo stream
+        },
+    )
@@ -20,6 +20,7 @@ Endpoint:
 
 import json
 import sqlite3
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Optional
@@ -28,6 +29,7 @@ import httpx
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 
+from app.services import eventi_hub
 from app.services.auth_service import get_current_user
 
 # ─── CONFIG ───────────────────────────────────────────────
@@ -106,6 +108,21 @@ def _reset_progress():
     })
 
 
+# Il progresso va anche sull'hub SSE (evento `fic_sync`): la pagina FIC lo
+# riceve in push invece di chiedere /sync/progress ogni 1.5s. Throttling a
+# 0.5s: la fase 2 avanza di un documento per chiamata API.
+_ultimo_evento_sync = 0.0
+
+
+def _pubblica_progress(forza: bool = False) -> None:
+    global _ultimo_evento_sync
+    adesso = time.monotonic()
+    if not forza and adesso - _ultimo_evento_sync < 0.5:
+        return
+    _ultimo_evento_sync = adesso
+    eventi_hub.pubblica("fic_sync", dict(_sync_progress))
+
+
 # ─── MODELS ───────────────────────────────────────────────
 class ConnectRequest(BaseModel):
     access_token: str = Field(..., description="Token personale FIC")
@@ -551,6 +568,7 @@ def fic_sync(
         _reset_progress()
         _sync_progress["running"] = True
         _sync_progress["phase"] = "lista"
+        _pubblica_progress(forza=True)
 
         # ── FASE 1: LISTA (header) ──────────────────────────
         while True:
@@ -777,6 +795,7 @@ def fic_sync(
                     _sync_progress["nuove"] = nuove
                     _sync_progress["aggiornate"] = aggiornate
                     _sync_progress["errori"] = errori
+                    _pubblica_progress()
 
             conn.commit()
 
@@ -790,6 +809,7 @@ def fic_sync(
         _sync_progress["phase"] = "dettaglio"
         _sync_progress["phase2_total"] = len(docs_to_detail)
         _sync_progress["phase2_done"] = 0
+        _pubblica_progress(forza=True)
         for i, (fic_id, fattura_db_id) in enumerate(docs_to_detail):
             try:
                 res = _fetch_detail_and_righe(conn, token, cid, fic_id, fattura_db_id)
@@ -815,6 +835,7 @@ def fic_sync(
 
             _sync_progress["phase2_done"] = i + 1
             _sync_progress["errori"] = errori
+            _pubblica_progress()
 
             # Commit ogni 20 documenti
             if (i + 1) % 20 == 0:
@@ -843,6 +864,7 @@ def fic_sync(
 
         _sync_progress["phase"] = "done"
         _sync_progress["running"] = False
+        _pubblica_progress(forza=True)
 
         return SyncResult(
             nuove=nuove,
@@ -860,6 +882,7 @@ def fic_sync(
     except Exception:
         _sync_progress["phase"] = "done"
         _sync_progress["running"] = False
+        _pubblica_progress(forza=True)
         raise
     finally:
         conn.close()
@@ -1,4 +1,4 @@
-# @version: v1.2-zip-support
+# @version: v1.7-anomalie-baseline
 # -*- coding: utf-8 -*-
 """
 Router per importazione fatture elettroniche XML (uso statistico / controllo acquisti).
@@ -29,7 +29,8 @@ from pathlib import Path
 from typing import Any, Dict, List
 
 from fastapi import APIRouter, Body, Depends, File, HTTPException, Query, UploadFile, status
-from app.services.auth_service import get_current_user
+from app.services.auth_service import get_current_user, is_admin
+from app.services import fatture_stato_service, fe_elenco, fe_stats, http_cache
 
 router = APIRouter(
     prefix="/contabilita/fe",
@@ -126,6 +127,17 @@ def _ensure_tables(conn: sqlite3.Connection) -> None:
         "CREATE INDEX IF NOT EXISTS idx_fe_righe_fattura ON fe_righe(fattura_id)"
     )
 
+    # n_righe materializzato + indice dell'elenco (services/fe_elenco.py,
+    # mig 176) e stato pagamento materializzato (fatture_stato_service,
+    # mig 177), aggregati delle statistiche (services/fe_stats.py, mig 178):
+    # qui per i DB in cui fe_fatture nasce dopo le migrazioni.
+    if not fe_elenco.installato(conn):
+        fe_elenco.installa(conn)
+    if not fatture_stato_service.stato_materializzato(conn):
+        fatture_stato_service.installa_stato_materializzato(conn)
+    if not fe_stats.installato(conn):
+        fe_stats.installa(conn)
+
     conn.commit()
 
 
@@ -870,6 +882,9 @@ def reset_fatture():
 @router.get(
     "/fatture",
     summary="Elenco fatture elettroniche importate con filtri",
+    dependencies=[http_cache.condizionale(
+        ("foodcost.db", ["fe_fatture", "fe_fornitore_categoria", "fe_categorie"]),
+    )],
 )
 def list_fatture(
     search: str | None = Query(None, description="Cerca per fornitore, numero, P.IVA"),
@@ -882,6 +897,10 @@ def list_fatture(
     categoria: str | None = Query(None),
     limit: int = Query(500, ge=1, le=50000),
     offset: int = Query(0, ge=0),
+    dopo: str | None = Query(
+        None,
+        description="Cursore keyset (campo `prossimo` della pagina precedente): se presente offset è ignorato",
+    ),
 ):
     conn = _get_conn()
     _ensure_tables(conn)
@@ -897,11 +916,17 @@ def list_fatture(
         q = f"%{search.upper()}%"
         params.extend([q, f"%{search}%", f"%{search}%"])
 
+    # Anno/mese come range di prefisso su data_fattura ('YYYY-MM-DD'):
+    # stesso risultato di substr(...) = ?, ma usa idx_fe_fatture_data_id.
+    # Il mese da solo (tutti gli anni) resta su substr.
+    mese_ok = month is not None and month.isdigit() and 1 <= int(month) <= 12
     if year is not None:
-        where_parts.append("substr(f.data_fattura, 1, 4) = ?")
-        params.append(str(year))
-
-    if month is not None:
+        da, a = f"{year:04d}", f"{year + 1:04d}"
+        if mese_ok:
+            da, a = f"{year:04d}-{int(month):02d}", f"{year:04d}-{int(month) + 1:02d}"
+        where_parts.append("f.data_fattura >= ? AND f.data_fattura < ?")
+        params.extend([da, a])
+    if month is not None and (year is None or not mese_ok):
         where_parts.append("substr(f.data_fattura, 6, 2) = ?")
         params.append(month.zfill(2))
 
@@ -923,38 +948,49 @@ def list_fatture(
         where_parts.append("COALESCE(f.totale_fattura, 0) <= ?")
         params.append(importo_max)
 
-    need_cat_join = categoria is not None
+    # Mapping fornitore → categoria/esclusione: stessa regola di _CAT_JOIN
+    # (P.IVA se presente, altrimenti nome con P.IVA NULL) ma con due LEFT JOIN
+    # separati al posto dell'OR, così ognuno usa il suo indice.
+    fc_join = """
+        LEFT JOIN fe_fornitore_categoria fcp
+          ON COALESCE(f.fornitore_piva, '') != '' AND fcp.fornitore_piva = f.fornitore_piva
+        LEFT JOIN fe_fornitore_categoria fcn
+          ON COALESCE(f.fornitore_piva, '') = '' AND fcn.fornitore_nome = f.fornitore_nome
+             AND fcn.fornitore_piva IS NULL
+    """
     cat_join = ""
-    if need_cat_join:
-        cat_join = f"""
-            {_CAT_JOIN}
-            LEFT JOIN fe_categorie c ON fc.categoria_id = c.id
+    if categoria is not None:
+        cat_join = fc_join + """
+            LEFT JOIN fe_categorie c ON c.id = COALESCE(fcp.categoria_id, fcn.categoria_id)
         """
         if categoria == "(Non categorizzato)":
-            where_parts.append("fc.categoria_id IS NULL")
+            where_parts.append("COALESCE(fcp.categoria_id, fcn.categoria_id) IS NULL")
         else:
             where_parts.append("c.nome = ?")
             params.append(categoria)
 
     where_sql = " AND ".join(where_parts)
 
-    # Count totale
-    cur.execute(f"""
+    # Totali sull'intero insieme filtrato: uguali per tutte le pagine, in
+    # cache per combinazione di filtri (services/fe_elenco.py).
+    summary = fe_elenco.totali(conn, f"""
         SELECT COUNT(*) AS cnt, ROUND(SUM(COALESCE(f.totale_fattura, 0)), 2) AS tot
         FROM fe_fatture f {cat_join}
         WHERE {where_sql}
     """, params)
-    summary = dict(cur.fetchone())
 
-    # Join esclusione fornitori per flag escluso_acquisti
-    excl_join = """
-        LEFT JOIN fe_fornitore_categoria fc_excl
-          ON (f.fornitore_piva IS NOT NULL AND f.fornitore_piva != '' AND f.fornitore_piva = fc_excl.fornitore_piva)
-          OR (COALESCE(f.fornitore_piva, '') = '' AND f.fornitore_nome = fc_excl.fornitore_nome AND fc_excl.fornitore_piva IS NULL)
-    """
-    # Post G.5: leggiamo da fe_fatture_with_stato (VIEW) che ricostruisce
-    # pagato + stato_pagamento via JOIN cg_uscite. Source of truth è cg_uscite.stato.
-    cur.execute(f"""
+    # Paginazione keyset su (data_fattura, id) DESC, NULL in fondo come prima.
+    # Due fasi: prima le fatture con data (seek sull'indice), poi — se la
+    # pagina non è piena — quelle senza data.
+    pos = fe_elenco.leggi_cursore(dopo) if dopo else None
+    if dopo and pos is None:
+        conn.close()
+        raise HTTPException(status_code=400, detail="Cursore non valido")
+
+    # pagato / stato_pagamento / cg_uscite_stato e n_righe sono materializzati
+    # su fe_fatture (mig 176-177, tenuti dai trigger); fe_fatture_with_stato è
+    # ormai un alias della tabella. Source of truth resta cg_uscite.stato.
+    select_sql = f"""
         SELECT
             f.id, f.fornitore_nome, f.fornitore_piva,
             f.numero_fattura, f.data_fattura,
@@ -965,19 +1001,50 @@ def list_fatture(
             COALESCE(f.stato_pagamento, 'da_pagare') AS stato_pagamento,
             f.cg_uscite_stato,
             f.data_scadenza, f.modalita_pagamento, f.importo_pagamento,
-            (SELECT COUNT(*) FROM fe_righe r WHERE r.fattura_id = f.id) AS n_righe,
+            f.n_righe,
             COALESCE(f.is_autofattura, 0) AS is_autofattura,
             f.rateizzata_in_spesa_fissa_id,
-            COALESCE(fc_excl.escluso_acquisti, 0) AS escluso_acquisti
-        FROM fe_fatture_with_stato f {cat_join} {excl_join}
+            COALESCE(fcp.escluso_acquisti, fcn.escluso_acquisti, 0) AS escluso_acquisti
+        FROM fe_fatture_with_stato f {cat_join or fc_join}
         WHERE {where_sql}
-        ORDER BY COALESCE(f.data_fattura, '') DESC, f.id DESC
-        LIMIT ? OFFSET ?
-    """, params + [limit, offset])
-    rows = [dict(r) for r in cur.fetchall()]
+    """
+
+    rows: list = []
+    if pos is None:
+        cur.execute(
+            select_sql + " ORDER BY f.data_fattura DESC, f.id DESC LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        )
+        rows = [dict(r) for r in cur.fetchall()]
+    else:
+        data_pos, id_pos = pos
+        if data_pos is not None:
+            cur.execute(
+                select_sql + " AND (f.data_fattura, f.id) < (?, ?)"
+                " ORDER BY f.data_fattura DESC, f.id DESC LIMIT ?",
+                params + [data_pos, id_pos, limit],
+            )
+            rows = [dict(r) for r in cur.fetchall()]
+        if len(rows) < limit:
+            senza_data = "f.data_fattura IS NULL" + (" AND f.id < ?" if data_pos is None else "")
+            cur.execute(
+                select_sql + f" AND {senza_data} ORDER BY f.id DESC LIMIT ?",
+                params + ([id_pos] if data_pos is None else []) + [limit - len(rows)],
+            )
+            rows += [dict(r) for r in cur.fetchall()]
     conn.close()
 
-    return {"fatture": rows, "total": summary["cnt"] or 0, "totale_importo": summary["tot"] or 0}
+    prossimo = None
+    if len(rows) == limit:
+        ultima = rows[-1]
+        prossimo = fe_elenco.cursore(ultima["data_fattura"], ultima["id"])
+
+    return {
+        "fatture": rows,
+        "total": summary["cnt"],
+        "totale_importo": summary["tot"],
+        "prossimo": prossimo,
+    }
 
 
 @router.post(
@@ -1099,7 +1166,7 @@ def update_stato_pagamento(
     conn = _get_conn()
     try:
         # Post G.5: set_stato scrive direttamente su cg_uscite
-        # (nessuna sync extra necessaria: la VIEW si aggiorna sola)
+        # (nessuna sync extra: i trigger riallineano fe_fatture.cg_uscite_stato)
         result = set_stato(conn, fattura_id, nuovo_stato)
         if not result.get("ok"):
             return result  # shape {ok: false, error: "..."}
@@ -1217,6 +1284,31 @@ def segna_fatture_non_pagate(
         raise HTTPException(status_code=500, detail=f"Errore segna-non-pagate: {type(e).__name__}: {e}")
 
 
+@router.get(
+    "/stato-pagamento/verifica",
+    summary="Coerenza stato pagamento materializzato su fe_fatture vs cg_uscite (admin)",
+)
+def verifica_stato_pagamento(
+    ripara: bool = Query(False, description="Riallinea le fatture divergenti"),
+    current_user: Any = Depends(get_current_user),
+):
+    """
+    Job di verifica del mig 177: fe_fatture.cg_uscite_stato deve coincidere
+    con cg_uscite.stato (lo tengono i trigger). Ritorna le divergenti;
+    con ripara=true le riallinea.
+    """
+    if not is_admin((current_user or {}).get("role")):
+        raise HTTPException(status_code=403, detail="Solo admin")
+    from app.services.fatture_stato_service import verifica_stato_materializzato
+
+    conn = _get_conn()
+    try:
+        _ensure_tables(conn)
+        return verifica_stato_materializzato(conn, ripara=ripara)
+    finally:
+        conn.close()
+
+
 @router.get(
     "/fatture/{fattura_id}",
     response_model=Dict[str, Any],
@@ -1656,99 +1748,13 @@ def stats_fornitori(
     """
     conn = _get_conn()
     _ensure_tables(conn)
+    fe_stats.aggiorna(conn)
     cur = conn.cursor()
 
-    params: list = []
-    where_clauses: list[str] = ["f.data_fattura IS NOT NULL", "COALESCE(f.is_autofattura, 0) = 0"]
-
-    if year is not None:
-        where_clauses.append("substr(f.data_fattura, 1, 4) = ?")
-        params.append(str(year))
-
-    where_sql = " AND ".join(where_clauses)
-
-    cur.execute(
-        f"""
-        SELECT
-            sub.fornitore_nome,
-            sub.fornitore_piva,
-            sub.numero_fatture,
-            sub.totale_fatture,
-            sub.primo_acquisto,
-            sub.ultimo_acquisto,
-            fc.categoria_id,
-            cat.nome AS categoria_nome,
-            COALESCE(fc.escluso_acquisti, 0) AS escluso_acquisti
-        FROM (
-            SELECT
-                f.fornitore_nome,
-                f.fornitore_piva,
-                COUNT(*) AS numero_fatture,
-                SUM(COALESCE(f.totale_fattura, 0)) AS totale_fatture,
-                MIN(f.data_fattura) AS primo_acquisto,
-                MAX(f.data_fattura) AS ultimo_acquisto
-            FROM fe_fatture f
-            WHERE {where_sql}
-            GROUP BY f.fornitore_nome, f.fornitore_piva
-        ) sub
-        LEFT JOIN fe_fornitore_categoria fc
-            ON (sub.fornitore_piva IS NOT NULL AND sub.fornitore_piva != '' AND sub.fornitore_piva = fc.fornitore_piva)
-            OR (COALESCE(sub.fornitore_piva, '') = '' AND sub.fornitore_nome = fc.fornitore_nome AND fc.fornitore_piva IS NULL)
-        LEFT JOIN fe_categorie cat ON fc.categoria_id = cat.id
-        ORDER BY sub.totale_fatture DESC
-        """,
-        params,
-    )
-
-    rows = [dict(r) for r in cur.fetchall()]
-
-    # ── Conteggi righe con/senza categoria per fornitore ──
-    # Per ogni fornitore conta: righe_totali, righe con categoria_id assegnata
-    cat_params: list = []
-    cat_where = ["f.data_fattura IS NOT NULL", "COALESCE(f.is_autofattura, 0) = 0"]
-    if year is not None:
-        cat_where.append("substr(f.data_fattura, 1, 4) = ?")
-        cat_params.append(str(year))
-
-    cat_where_sql = " AND ".join(cat_where)
-    cur.execute(
-        f"""
-        SELECT
-            CASE WHEN f.fornitore_piva IS NOT NULL AND f.fornitore_piva != '' THEN f.fornitore_piva ELSE f.fornitore_nome END AS forn_key,
-            COUNT(r.id) AS righe_totali,
-            SUM(CASE WHEN r.categoria_id IS NOT NULL THEN 1 ELSE 0 END) AS righe_categorizzate,
-            SUM(CASE WHEN r.categoria_id IS NOT NULL AND COALESCE(r.categoria_auto, 0) = 1 THEN 1 ELSE 0 END) AS righe_auto
-        FROM fe_righe r
-        JOIN fe_fatture f ON r.fattura_id = f.id
-        WHERE {cat_where_sql}
-          AND COALESCE(r.prezzo_totale, 0) != 0
-        GROUP BY forn_key
-        """,
-        cat_params,
-    )
-    cat_map = {r["forn_key"]: (r["righe_totali"], r["righe_categorizzate"], r["righe_auto"]) for r in cur.fetchall()}
-
-    # ── Conteggi dati pagamento per fornitore ──
-    pag_params: list = []
-    pag_where = ["f.data_fattura IS NOT NULL", "COALESCE(f.is_autofattura, 0) = 0"]
-    if year is not None:
-        pag_where.append("substr(f.data_fattura, 1, 4) = ?")
-        pag_params.append(str(year))
-    pag_where_sql = " AND ".join(pag_where)
-
-    cur.execute(
-        f"""
-        SELECT
-            CASE WHEN f.fornitore_piva IS NOT NULL AND f.fornitore_piva != '' THEN f.fornitore_piva ELSE f.fornitore_nome END AS forn_key,
-            COUNT(*) AS fat_totali,
-            SUM(CASE WHEN f.data_scadenza IS NOT NULL THEN 1 ELSE 0 END) AS fat_con_scadenza
-        FROM fe_fatture f
-        WHERE {pag_where_sql}
-        GROUP BY forn_key
-        """,
-        pag_params,
-    )
-    pag_map = {r["forn_key"]: (r["fat_totali"], r["fat_con_scadenza"]) for r in cur.fetchall()}
+    # Aggregati fornitore × mese (services/fe_stats.py): riepilogo, conteggi
+    # righe con/senza categoria e dati pagamento per chiave fornitore.
+    rows = fe_stats.riepilogo_fornitori(conn, year)
+    cat_map, pag_map = fe_stats.conteggi_fornitori(conn, year)
 
     # ── Fornitori con default pagamento ──
     cur.execute("SELECT partita_iva, giorni_pagamento, modalita_pagamento_default FROM suppliers WHERE giorni_pagamento IS NOT NULL OR modalita_pagamento_default IS NOT NULL")
@@ -1854,31 +1860,11 @@ def stats_mensili(
     """
     conn = _get_conn()
     _ensure_tables(conn)
-    cur = conn.cursor()
-
-    where = f"f.data_fattura IS NOT NULL AND {_EXCL_WHERE}"
-    params: list = []
-    if year is not None:
-        where += " AND substr(f.data_fattura, 1, 4) = ?"
-        params.append(str(year))
-
-    cur.execute(f"""
-        SELECT
-            substr(f.data_fattura, 1, 4) AS anno,
-            substr(f.data_fattura, 6, 2) AS mese,
-            COUNT(*) AS numero_fatture,
-            SUM(COALESCE(f.totale_fattura, 0)) AS totale_fatture
-        FROM fe_fatture f
-        {_EXCL_JOIN}
-        WHERE {where}
-        GROUP BY anno, mese
-        ORDER BY {'mese ASC' if year is not None else 'anno DESC, mese ASC'}
-    """, params)
-
-    rows = cur.fetchall()
+    fe_stats.aggiorna(conn)
+    rows = fe_stats.mensili(conn, year)
     conn.close()
 
-    return [dict(r) for r in rows]
+    return rows
 
 
 # -------------------------------------------------------------------
@@ -1892,13 +1878,10 @@ _CAT_JOIN = """
         ON (f.fornitore_piva IS NOT NULL AND f.fornitore_piva != '' AND f.fornitore_piva = fc.fornitore_piva)
         OR (COALESCE(f.fornitore_piva, '') = '' AND f.fornitore_nome = fc.fornitore_nome AND fc.fornitore_piva IS NULL)
 """
-# Filtro base acquisti: autofatture + fornitori esclusi da acquisti.
+# Filtro base acquisti: autofatture + fornitori esclusi da acquisti (con _CAT_JOIN).
 # NOTA: `escluso` è SOLO per Ricette/Matching. `escluso_acquisti` è per Acquisti.
-_EXCL_JOIN = """
-    LEFT JOIN fe_fornitore_categoria fc
-        ON (f.fornitore_piva IS NOT NULL AND f.fornitore_piva != '' AND f.fornitore_piva = fc.fornitore_piva)
-        OR (COALESCE(f.fornitore_piva, '') = '' AND f.fornitore_nome = fc.fornitore_nome AND fc.fornitore_piva IS NULL)
-"""
+# Gli altri endpoint stats leggono gli aggregati di services/fe_stats.py, che
+# applicano lo stesso filtro.
 _EXCL_WHERE = "COALESCE(f.is_autofattura, 0) = 0 AND COALESCE(fc.escluso_acquisti, 0) = 0"
 
 
@@ -2022,15 +2005,9 @@ def stats_drill(
         """, params)
         rows = [dict(r) for r in cur.fetchall()]
 
-        cur.execute(f"""
-            SELECT
-                COUNT(*) AS n_fatture,
-                ROUND(SUM(COALESCE(f.totale_fattura, 0)), 2) AS totale
-            FROM fe_fatture f
-            {_CAT_JOIN}
-            WHERE {where_sql}
-        """, params)
-        summary = dict(cur.fetchone())
+        # Conteggio e totale dagli aggregati per mese (services/fe_stats.py)
+        fe_stats.aggiorna(conn)
+        summary = fe_stats.totali_periodo(conn, year, month.zfill(2) if month is not None else None)
 
     conn.close()
     return {"fatture": rows, "n_fatture": summary["n_fatture"], "totale": summary["totale"]}
@@ -2047,27 +2024,13 @@ def stats_kpi(
     """
     conn = _get_conn()
     _ensure_tables(conn)
-    cur = conn.cursor()
+
+    # Aggregati fornitore × mese (services/fe_stats.py); con max_date il
+    # mese del taglio si legge in diretta.
+    fe_stats.aggiorna(conn)
 
     def _kpi_for_year(y: int | None, max_date: str | None = None):
-        where = f"f.data_fattura IS NOT NULL AND {_EXCL_WHERE}"
-        params: list = []
-        if y is not None:
-            where += " AND substr(f.data_fattura, 1, 4) = ?"
-            params.append(str(y))
-        if max_date is not None:
-            where += " AND f.data_fattura <= ?"
-            params.append(max_date)
-        cur.execute(f"""
-            SELECT
-                ROUND(SUM(COALESCE(f.totale_fattura, 0)), 2) AS totale_spesa,
-                COUNT(*) AS n_fatture,
-                COUNT(DISTINCT CASE WHEN f.fornitore_piva IS NOT NULL AND f.fornitore_piva != '' THEN f.fornitore_piva ELSE f.fornitore_nome END) AS n_fornitori,
-                COUNT(DISTINCT substr(f.data_fattura, 1, 7)) AS n_mesi
-            FROM fe_fatture f {_EXCL_JOIN}
-            WHERE {where}
-        """, params)
-        row = dict(cur.fetchone())
+        row = fe_stats.kpi(conn, y, max_date)
         n_mesi = row.pop("n_mesi", 1) or 1
         row["spesa_media_mensile"] = round((row["totale_spesa"] or 0) / n_mesi, 2)
         return row
@@ -2078,14 +2041,7 @@ def stats_kpi(
     # Confronto anno precedente — stesso periodo (es. gen-mar 2026 vs gen-mar 2025)
     if year is not None:
         # Trova la data piu' recente nell'anno selezionato
-        cur.execute(f"""
-            SELECT MAX(f.data_fattura) FROM fe_fatture f
-            {_EXCL_JOIN}
-            WHERE substr(f.data_fattura, 1, 4) = ? AND f.data_fattura IS NOT NULL
-              AND {_EXCL_WHERE}
-        """, (str(year),))
-        max_row = cur.fetchone()
-        max_date_current = max_row[0] if max_row else None
+        max_date_current = fe_stats.data_massima(conn, year)
 
         # Calcola la data equivalente nell'anno precedente
         prev_max_date = None
@@ -2117,59 +2073,13 @@ def stats_per_categoria_dashboard(
     """Totale spesa raggruppato per categoria prodotto (fe_righe), con dettaglio sottocategorie."""
     conn = _get_conn()
     _ensure_tables(conn)
-    cur = conn.cursor()
 
     # Legge da fe_righe (categoria assegnata ai prodotti) — più granulare e aggiornato
-    # rispetto a fe_fornitore_categoria (categoria del fornitore)
-    where = "f.data_fattura IS NOT NULL AND COALESCE(f.is_autofattura, 0) = 0"
-    excl = """LEFT JOIN fe_fornitore_categoria fc_excl
-        ON (f.fornitore_piva IS NOT NULL AND f.fornitore_piva != '' AND f.fornitore_piva = fc_excl.fornitore_piva)
-        OR (COALESCE(f.fornitore_piva, '') = '' AND f.fornitore_nome = fc_excl.fornitore_nome AND fc_excl.fornitore_piva IS NULL)"""
-    where += " AND COALESCE(fc_excl.escluso_acquisti, 0) = 0"
-    # Escludi righe descrittive (prezzo_totale = 0)
-    where += " AND COALESCE(r.prezzo_totale, 0) != 0"
-
-    params: list = []
-    if year is not None:
-        where += " AND substr(f.data_fattura, 1, 4) = ?"
-        params.append(str(year))
-
-    # Categorie principali (da righe fattura)
-    cur.execute(f"""
-        SELECT
-            COALESCE(c.nome, '(Non categorizzato)') AS categoria,
-            ROUND(SUM(COALESCE(r.prezzo_totale, 0)), 2) AS totale,
-            COUNT(DISTINCT f.id) AS n_fatture
-        FROM fe_righe r
-        JOIN fe_fatture f ON r.fattura_id = f.id
-        {excl}
-        LEFT JOIN fe_categorie c ON r.categoria_id = c.id
-        WHERE {where}
-          AND r.descrizione IS NOT NULL AND r.descrizione != ''
-        GROUP BY c.nome
-        ORDER BY totale DESC
-    """, params)
-    rows = [dict(r) for r in cur.fetchall()]
-
-    # Sottocategorie (solo dove r.sottocategoria_id IS NOT NULL)
-    cur.execute(f"""
-        SELECT
-            COALESCE(c.nome, '(Non categorizzato)') AS categoria,
-            s.nome AS sottocategoria,
-            ROUND(SUM(COALESCE(r.prezzo_totale, 0)), 2) AS totale,
-            COUNT(DISTINCT f.id) AS n_fatture
-        FROM fe_righe r
-        JOIN fe_fatture f ON r.fattura_id = f.id
-        {excl}
-        LEFT JOIN fe_categorie c ON r.categoria_id = c.id
-        LEFT JOIN fe_sottocategorie s ON r.sottocategoria_id = s.id
-        WHERE {where}
-          AND r.descrizione IS NOT NULL AND r.descrizione != ''
-          AND r.sottocategoria_id IS NOT NULL
-        GROUP BY c.nome, s.nome
-        ORDER BY c.nome, totale DESC
-    """, params)
-    sub_rows = cur.fetchall()
+    # rispetto a fe_fornitore_categoria (categoria del fornitore). Aggregati per
+    # mese × fornitore × categoria in services/fe_stats.py; righe descrittive
+    # (prezzo_totale = 0) già escluse.
+    fe_stats.aggiorna(conn)
+    rows, sub_rows = fe_stats.categorie(conn, year)
 
     # Mappa sottocategorie per categoria
     sub_map: dict = {}
@@ -2196,41 +2106,14 @@ def stats_top_fornitori(
     """Top fornitori per spesa, con percentuale sul totale."""
     conn = _get_conn()
     _ensure_tables(conn)
-    cur = conn.cursor()
-
-    where = f"f.data_fattura IS NOT NULL AND {_EXCL_WHERE}"
-    params: list = []
-    if year is not None:
-        where += " AND substr(f.data_fattura, 1, 4) = ?"
-        params.append(str(year))
-
-    # Totale globale per calcolo %
-    cur.execute(f"""
-        SELECT ROUND(SUM(COALESCE(f.totale_fattura, 0)), 2) AS totale_globale
-        FROM fe_fatture f {_EXCL_JOIN}
-        WHERE {where}
-    """, params)
-    totale_globale = cur.fetchone()["totale_globale"] or 1
 
-    cur.execute(f"""
-        SELECT
-            f.fornitore_nome,
-            f.fornitore_piva,
-            ROUND(SUM(COALESCE(f.totale_fattura, 0)), 2) AS totale,
-            COUNT(*) AS n_fatture,
-            COALESCE(c.nome, '') AS categoria
-        FROM fe_fatture f
-        {_CAT_JOIN}
-        LEFT JOIN fe_categorie c ON fc.categoria_id = c.id
-        WHERE {where}
-        GROUP BY f.fornitore_nome, f.fornitore_piva
-        ORDER BY totale DESC
-        LIMIT ?
-    """, params + [limit])
+    # Totale globale per calcolo % + top per spesa (services/fe_stats.py)
+    fe_stats.aggiorna(conn)
+    totale_globale, top = fe_stats.top_fornitori(conn, year, limit)
+    totale_globale = totale_globale or 1
 
     rows = []
-    for r in cur.fetchall():
-        d = dict(r)
+    for d in top:
         d["pct"] = round(d["totale"] / totale_globale * 100, 1) if totale_globale else 0
         rows.append(d)
 
@@ -2248,24 +2131,11 @@ def stats_confronto_annuale(
     """
     conn = _get_conn()
     _ensure_tables(conn)
-    cur = conn.cursor()
+    fe_stats.aggiorna(conn)
 
     results = []
     for y in [year - 1, year]:
-        cur.execute(f"""
-            SELECT
-                substr(f.data_fattura, 6, 2) AS mese,
-                ROUND(SUM(COALESCE(f.totale_fattura, 0)), 2) AS totale
-            FROM fe_fatture f
-            {_EXCL_JOIN}
-            WHERE f.data_fattura IS NOT NULL
-              AND substr(f.data_fattura, 1, 4) = ?
-              AND {_EXCL_WHERE}
-            GROUP BY mese
-            ORDER BY mese ASC
-        """, (str(y),))
-        data = {r["mese"]: r["totale"] for r in cur.fetchall()}
-        results.append({"year": y, "data": data})
+        results.append({"year": y, "data": fe_stats.mesi_anno(conn, y)})
 
     # Costruisci array 12 mesi
     MESI = ["01", "02", "03", "04", "05", "06", "07", "08", "09", "10", "11", "12"]
@@ -2291,89 +2161,101 @@ def stats_anomalie(
     soglia_pct: float = Query(30, description="Soglia variazione % per segnalazione"),
 ):
     """
-    Identifica fornitori con variazioni significative anno su anno:
+    Identifica fornitori con variazioni significative:
     - Nuovi fornitori (non presenti anno precedente)
     - Fornitori scomparsi (presenti anno prec, non quest'anno)
-    - Variazioni > soglia_pct
+    - Variazioni anno su anno > soglia_pct
+    - Fornitori abituali (fe_stats.MESI_ATTIVI_ABITUALE) con la spesa
+      dell'ultimo mese chiuso lontana > soglia_pct dalla baseline mobile
+      (media mensile dei 12 mesi prima): tipo sopra_media / sotto_media
+    Ogni voce porta anche la baseline del fornitore in quel mese: media_12m,
+    totale_mese e delta_media_pct.
     """
     conn = _get_conn()
     _ensure_tables(conn)
-    cur = conn.cursor()
+
+    # Aggregati fornitore × mese (services/fe_stats.py)
+    fe_stats.aggiorna(conn)
 
     # Trova la data piu' recente nell'anno selezionato per confronto stesso periodo
-    cur.execute(f"""
-        SELECT MAX(f.data_fattura) FROM fe_fatture f
-        {_EXCL_JOIN}
-        WHERE substr(f.data_fattura, 1, 4) = ? AND f.data_fattura IS NOT NULL
-          AND {_EXCL_WHERE}
-    """, (str(year),))
-    max_row = cur.fetchone()
-    max_date_current = max_row[0] if max_row else None
+    max_date_current = fe_stats.data_massima(conn, year)
     prev_max_date = str(year - 1) + max_date_current[4:] if max_date_current else None
 
     def _fornitori_per_anno(y, max_date=None):
-        extra = ""
-        params = [str(y)]
-        if max_date:
-            extra = " AND f.data_fattura <= ?"
-            params.append(max_date)
-        cur.execute(f"""
-            SELECT
-                CASE WHEN f.fornitore_piva IS NOT NULL AND f.fornitore_piva != '' THEN f.fornitore_piva ELSE f.fornitore_nome END AS chiave,
-                f.fornitore_nome,
-                ROUND(SUM(COALESCE(f.totale_fattura, 0)), 2) AS totale,
-                COUNT(*) AS n_fatture
-            FROM fe_fatture f
-            {_EXCL_JOIN}
-            WHERE f.data_fattura IS NOT NULL
-              AND substr(f.data_fattura, 1, 4) = ?
-              AND {_EXCL_WHERE}
-              {extra}
-            GROUP BY chiave
-        """, params)
-        return {r["chiave"]: dict(r) for r in cur.fetchall()}
+        return fe_stats.per_fornitore(conn, y, max_date)
 
     curr = _fornitori_per_anno(year)
     prev = _fornitori_per_anno(year - 1, max_date=prev_max_date)
 
+    # Baseline mobile precalcolata (fe_stats_baseline) sull'ultimo mese
+    # chiuso: un mese a metà sembrerebbe sempre sotto media.
+    mese_rif = fe_stats.mese_chiuso(max_date_current) if max_date_current else None
+    base = fe_stats.baseline(conn, mese_rif, set(curr) | set(prev)) if mese_rif else {}
+
+    def _con_baseline(k, voce):
+        b = base.get(k)
+        voce["mese_baseline"] = mese_rif
+        voce["media_12m"] = b["media_12m"] if b else None
+        voce["totale_mese"] = b["totale_mese"] if b else None
+        voce["delta_media_pct"] = (
+            round((b["totale_mese"] - b["media_12m"]) / b["media_12m"] * 100, 1)
+            if b and b["media_12m"] else None
+        )
+        return voce
+
     anomalie = []
 
     # Nuovi fornitori (non in anno precedente)
     for k, v in curr.items():
         if k not in prev:
-            anomalie.append({
+            anomalie.append(_con_baseline(k, {
                 "tipo": "nuovo",
                 "fornitore": v["fornitore_nome"],
                 "totale_corrente": v["totale"],
                 "totale_precedente": 0,
                 "delta_pct": None,
                 "n_fatture": v["n_fatture"],
-            })
-        else:
-            p = prev[k]
-            if p["totale"] and p["totale"] > 0:
-                delta = round((v["totale"] - p["totale"]) / p["totale"] * 100, 1)
-                if abs(delta) >= soglia_pct:
-                    anomalie.append({
-                        "tipo": "aumento" if delta > 0 else "diminuzione",
-                        "fornitore": v["fornitore_nome"],
-                        "totale_corrente": v["totale"],
-                        "totale_precedente": p["totale"],
-                        "delta_pct": delta,
-                        "n_fatture": v["n_fatture"],
-                    })
+            }))
+            continue
+        p = prev[k]
+        if p["totale"] and p["totale"] > 0:
+            delta = round((v["totale"] - p["totale"]) / p["totale"] * 100, 1)
+            if abs(delta) >= soglia_pct:
+                anomalie.append(_con_baseline(k, {
+                    "tipo": "aumento" if delta > 0 else "diminuzione",
+                    "fornitore": v["fornitore_nome"],
+                    "totale_corrente": v["totale"],
+                    "totale_precedente": p["totale"],
+                    "delta_pct": delta,
+                    "n_fatture": v["n_fatture"],
+                }))
+                continue
+        # Stesso fornitore, anno in linea: il mese chiuso contro la sua media
+        b = base.get(k)
+        if not b or not b["media_12m"] or b["mesi_attivi_12m"] < fe_stats.MESI_ATTIVI_ABITUALE:
+            continue
+        voce = _con_baseline(k, {
+            "fornitore": v["fornitore_nome"],
+            "totale_corrente": b["totale_mese"],
+            "totale_precedente": b["media_12m"],
+            "n_fatture": v["n_fatture"],
+        })
+        if abs(voce["delta_media_pct"]) >= soglia_pct:
+            voce["tipo"] = "sopra_media" if voce["delta_media_pct"] > 0 else "sotto_media"
+            voce["delta_pct"] = voce["delta_media_pct"]
+            anomalie.append(voce)
 
     # Fornitori scomparsi
     for k, p in prev.items():
         if k not in curr:
-            anomalie.append({
+            anomalie.append(_con_baseline(k, {
                 "tipo": "scomparso",
                 "fornitore": p["fornitore_nome"],
                 "totale_corrente": 0,
                 "totale_precedente": p["totale"],
                 "delta_pct": -100,
                 "n_fatture": 0,
-            })
+            }))
 
     # Ordina per impatto economico
     anomalie.sort(key=lambda x: abs(x.get("totale_corrente", 0) - x.get("totale_precedente", 0)), reverse=True)
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-# @version: v1.4-foodcost-ingredients-conversions
+# @version: v1.5-allergeni-propagazione — modifica allergeni/merge ingrediente ricalcola le ricette a valle
 # -*- coding: utf-8 -*-
 """
 Router anagrafica ingredienti (foodcost)
@@ -30,6 +30,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 
 from app.models.cucina_db import get_cucina_connection
+from app.services.allergeni_service import avvisa_pubblicazioni, propaga_allergeni
 from app.services.auth_service import get_current_user
 
 
@@ -591,7 +592,14 @@ def update_ingredient(ingredient_id: int, payload: IngredientUpdate):
             cur.execute(
                 f"UPDATE ingredients SET {', '.join(updates)} WHERE id = ?", params
             )
+            # Allergeni cambiati: ricette che lo usano (e quelle a valle) nella
+            # stessa transazione
+            esito_allergeni = None
+            if payload.allergeni is not None and "allergeni" in cols_present:
+                esito_allergeni = propaga_allergeni(conn, ingredient_ids=[ingredient_id])
             conn.commit()
+            if esito_allergeni:
+                avvisa_pubblicazioni(esito_allergeni)
 
         row = _fetch_ingredient_detail(cur, ingredient_id)
         return IngredientDetail(**dict(row))
@@ -651,8 +659,12 @@ def merge_ingredient(ingredient_id: int, payload: IngredientMergeRequest):
             (payload.target_id, ingredient_id),
         )
         cur.execute("DELETE FROM ingredients WHERE id = ?", (ingredient_id,))
+        # Le voci spostate ora portano gli allergeni del target
+        esito_allergeni = propaga_allergeni(conn, ingredient_ids=[payload.target_id]) if n_voci else None
 
         conn.commit()
+        if esito_allergeni:
+            avvisa_pubblicazioni(esito_allergeni)
         return {
             "status": "ok",
             "target_id": payload.target_id,
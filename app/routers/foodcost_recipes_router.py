@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+# @version: v2.3-allergeni-propagazione (2026-10-19) — ricalcolo allergeni anche sulle ricette che usano quella modificata
 # @version: v2.2-foodcost-recipes-router-import (2026-05-23)
 # Modulo: ricette
 # -*- coding: utf-8 -*-
@@ -35,7 +36,8 @@ from pydantic import BaseModel, Field
 from app.models.cucina_db import get_cucina_connection
 from app.services.auth_service import get_current_user
 from app.services.allergeni_service import (
-    update_recipe_allergens_cache,
+    avvisa_pubblicazioni,
+    propaga_allergeni,
     recompute_all_recipes_allergens,
 )
 from app.services.foodcost_history_service import compute_recipe_fc_history
@@ -1332,7 +1334,7 @@ def create_ricetta(payload: RecipeCreate):
 
         # Modulo C: ricalcolo allergeni cache (best-effort, no fail su errore)
         try:
-            update_recipe_allergens_cache(recipe_id, conn=conn)
+            propaga_allergeni(conn, recipe_ids=[recipe_id])
         except Exception as _e:
             import logging
             logging.getLogger("foodcost").warning(f"[allergeni] ricalcolo create fail recipe={recipe_id}: {_e}")
@@ -1881,15 +1883,13 @@ def import_conferma_ricette(payload: ImportConfermaPayload):
 
         conn.commit()
 
-        # 4. Ricalcolo allergeni (best-effort, dopo il commit dei dati)
-        for rid in recipe_ids_in_order:
-            if rid is None:
-                continue
-            try:
-                update_recipe_allergens_cache(rid, conn=conn)
-            except Exception:
-                pass
-        conn.commit()
+        # 4. Ricalcolo allergeni (best-effort, dopo il commit dei dati):
+        #    un solo giro sul grafo per tutte le ricette importate
+        try:
+            propaga_allergeni(conn, recipe_ids=[rid for rid in recipe_ids_in_order if rid is not None])
+            conn.commit()
+        except Exception:
+            conn.rollback()
 
         return {
             "status": "ok",
@@ -2026,14 +2026,18 @@ def update_ricetta(recipe_id: int, payload: RecipeUpdate):
 
         # Modulo C: ricalcolo allergeni cache se gli items sono stati toccati
         # (anche su update header-only ricalcoliamo per allinearsi a eventuali
-        # cambi ingredients.allergeni avvenuti nel frattempo — costo trascurabile)
+        # cambi ingredients.allergeni avvenuti nel frattempo — costo trascurabile).
+        # Propagato alle ricette che la usano come sub-ricetta, stessa transazione.
+        esito_allergeni = None
         try:
-            update_recipe_allergens_cache(recipe_id, conn=conn)
+            esito_allergeni = propaga_allergeni(conn, recipe_ids=[recipe_id])
         except Exception as _e:
             import logging
             logging.getLogger("foodcost").warning(f"[allergeni] ricalcolo update fail recipe={recipe_id}: {_e}")
 
         conn.commit()
+        if esito_allergeni:
+            avvisa_pubblicazioni(esito_allergeni)
         return _fetch_recipe_full(conn, recipe_id)
 
     except HTTPException:
@@ -2176,20 +2180,20 @@ class AllergeniBatchOut(BaseModel):
 @router.post("/ricette/{recipe_id}/ricalcola-allergeni", response_model=AllergeniRecalcOut)
 def ricalcola_allergeni_singola(recipe_id: int):
     """
-    Ricalcola allergeni di una singola ricetta (cache aggiornata).
-    Trigger automatico esiste su POST/PUT ricetta. Questo endpoint serve
-    quando Marco modifica gli allergeni di un ingrediente e vuole
-    rifrescare manualmente le ricette che lo usano (in attesa che qualcuno
-    le risalvi).
+    Ricalcola allergeni di una singola ricetta (cache aggiornata) e delle
+    ricette che la usano come sub-ricetta.
+    Trigger automatico esiste su POST/PUT ricetta e, dalla v2.3, su
+    PUT/merge ingrediente: questo endpoint resta per riallineare a mano.
     """
     conn = get_cucina_connection()
     try:
         existing = conn.execute("SELECT id FROM recipes WHERE id = ?", (recipe_id,)).fetchone()
         if not existing:
             raise HTTPException(status_code=404, detail="Ricetta non trovata")
-        csv = update_recipe_allergens_cache(recipe_id, conn=conn)
+        esito = propaga_allergeni(conn, recipe_ids=[recipe_id])
         conn.commit()
-        return AllergeniRecalcOut(recipe_id=recipe_id, allergeni_calcolati=csv)
+        avvisa_pubblicazioni(esito)
+        return AllergeniRecalcOut(recipe_id=recipe_id, allergeni_calcolati=esito["valori"].get(recipe_id, ""))
     finally:
         conn.close()
 
@@ -2559,7 +2563,7 @@ def clone_ricetta(recipe_id: int):
 
         # Trigger allergeni (Modulo C)
         try:
-            update_recipe_allergens_cache(new_id, conn=conn)
+            propaga_allergeni(conn, recipe_ids=[new_id])
         except Exception as _e:
             import logging
             logging.getLogger("foodcost").warning(f"[allergeni] clone ricalcolo fail recipe={new_id}: {_e}")
@@ -341,6 +341,7 @@ def upsert_menu_endpoint(payload: MenuIn, user=Depends(get_current_user)):
         )
         dt_ms = int((time.time() - t0) * 1000)
         logger.info(f"[pranzo.upsert] OK dt_ms={dt_ms} menu_id={menu.get('id') if menu else '?'} n_righe_saved={len(menu.get('righe', [])) if menu else 0}")
+        _segnala_menu_modificato(repo.lunedi_di(payload.settimana))
         return menu
     except HTTPException:
         raise
@@ -441,12 +442,43 @@ def stato_pubblicazione_menu(settimana: str, user=Depends(get_current_user)):
     }
 
 
+def _lunedi_corrente() -> str:
+    oggi = date_cls.today()
+    return (oggi - timedelta(days=oggi.weekday())).isoformat()
+
+
+def _produci_menu_pubblico():
+    """Produttore M.J: PDF cliente della settimana corrente + descrizione storico."""
+    monday = _lunedi_corrente()
+    menu = repo.get_menu_by_settimana(monday)
+    if not menu:
+        raise ValueError(f"nessun menu per la settimana del {monday}")
+    from app.services.pranzo_pdf_service import genera_pdf_menu_pranzo
+    return genera_pdf_menu_pranzo(menu, repo.get_settings()), f"settimana {monday}"
+
+
+def _segnala_menu_modificato(settimana: Optional[str] = None) -> None:
+    """Auto-pubblicazione (se attiva): solo se cambia la settimana in corso."""
+    if settimana is not None and settimana != _lunedi_corrente():
+        return
+    try:
+        from app.services import ftp_publish_service as web
+        web.pianifica_autopubblicazione("menu_pranzo")
+    except Exception:
+        pass
+
+
 @router.post("/menu/{settimana}/pubblica/")
-def pubblica_menu_sul_sito(settimana: str, user=Depends(get_current_user)):
+def pubblica_menu_sul_sito(
+    settimana: str,
+    forza: bool = Query(False, description="Ricarica anche se il PDF online e' identico"),
+    user=Depends(get_current_user),
+):
     """
     Genera il PDF cliente della settimana e lo carica sull'FTP del sito.
     Errore FTP → 502 con il messaggio vero (l'utente deve poter capire se e'
     la password sbagliata o la cartella che non esiste).
+    Se lo stesso PDF e' gia' online non si ricarica (esito `invariato`).
     """
     _check_admin(user)
     _validate_data(settimana)
@@ -475,6 +507,7 @@ def pubblica_menu_sul_sito(settimana: str, user=Depends(get_current_user)):
         nome_file=web.nome_file_per("menu_pranzo"),
         contenuto=pdf_bytes,
         descrizione=f"settimana {monday}",
+        forza=forza,
     )
     if not esito.ok:
         raise HTTPException(status_code=502, detail=f"Pubblicazione fallita: {esito.errore}")
@@ -536,4 +569,12 @@ def get_settings_endpoint():
 @router.put("/settings/")
 def update_settings_endpoint(payload: SettingsUpdate, user=Depends(get_current_user)):
     _check_admin(user)
-    return repo.update_settings(**payload.dict(exclude_unset=True))
+    settings = repo.update_settings(**payload.dict(exclude_unset=True))
+    _segnala_menu_modificato()
+    return settings
+
+
+# Produttore per la pubblicazione in batch / auto-pubblicazione (mattone M.J)
+from app.services import ftp_publish_service as _web  # noqa: E402
+
+_web.registra_produttore("menu_pranzo", _produci_menu_pubblico)
@@ -3,13 +3,13 @@
 # Router Prenotazioni — TRGB Gestionale (Fase 1: Agenda)
 # ============================================================
 
-# @version: v1.0-prenotazioni-router
+# @version: v1.2-prenotazioni-router (delta-sync planning)
 # -*- coding: utf-8 -*-
 """
 Router Prenotazioni — TRGB Gestionale
 
 Fase 1 — Agenda:
-- Planning giornaliero (pranzo + cena)
+- Planning giornaliero (pranzo + cena), anche in delta (?since=)
 - CRUD prenotazioni manuali
 - Cambio stato rapido
 - Riepilogo settimanale
@@ -29,11 +29,12 @@ import secrets
 from datetime import date, datetime, timedelta
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 
 from app.models.clienti_db import get_clienti_conn, init_clienti_db
+from app.services import delta_sync, eventi_hub
 from app.services.auth_service import get_current_user
 from app.utils.whatsapp import build_wa_link, fill_template
 
@@ -84,6 +85,27 @@ def _calcola_turno(ora: str, soglia: str = "15:00") -> str:
     return "pranzo" if ora_clean < soglia else "cena"
 
 
+def _pubblica_prenotazione(conn, pren_id: int, azione: str, prima=None) -> None:
+    """
+    Evento SSE dopo il commit (eventi_hub): mappa tavoli e planning di quel
+    giorno/turno ricaricano solo loro. `prima` = riga pre-modifica, per
+    avvisare anche la vista da cui la prenotazione è stata spostata.
+    """
+    row = conn.execute(
+        "SELECT data_pasto, turno FROM clienti_prenotazioni WHERE id = ?", (pren_id,)
+    ).fetchone()
+    dati = {
+        "azione": azione,
+        "id": pren_id,
+        "data_pasto": row["data_pasto"] if row else None,
+        "turno": row["turno"] if row else None,
+    }
+    if prima is not None and row and (prima["data_pasto"], prima["turno"]) != (row["data_pasto"], row["turno"]):
+        dati["data_pasto_prec"] = prima["data_pasto"]
+        dati["turno_prec"] = prima["turno"]
+    eventi_hub.pubblica("prenotazione", dati)
+
+
 def _backfill_turno_fonte(conn, soglia: str = "15:00"):
     """Backfill turno e fonte per prenotazioni esistenti (una tantum)."""
     # Backfill turno
@@ -169,14 +191,88 @@ class StatoUpdate(BaseModel):
 # ENDPOINT: PLANNING GIORNALIERO
 # ============================================================
 
+_STATI_ESCLUSI = ("CANCELED", "NO_SHOW", "REFUSED")
+
+
+def _righe_planning(conn, data: str, soglia: str, ids=None) -> List[Dict[str, Any]]:
+    """Prenotazioni della giornata con dati cliente e tag (`ids`: solo quelle)."""
+    cond_ids, params_ids = delta_sync.filtro_ids("p.id", ids)
+    # nome / cognome usano COALESCE: preferiamo il dato CRM (aggiornabile),
+    # fallback allo snapshot TheFork salvato in p.nome_ospite / p.cognome_ospite
+    # (utile quando cliente_id e' NULL — vedi migrazione 068)
+    rows = conn.execute(f"""
+        SELECT
+            p.id, p.cliente_id, p.data_pasto, p.ora_pasto, p.stato, p.pax,
+            p.tavolo, p.canale, p.occasione, p.nota_ristorante, p.nota_cliente,
+            p.data_prenotazione, p.prenotato_da, p.turno, p.fonte,
+            p.allergie_segnalate, p.tavolo_esterno, p.seggioloni,
+            p.menu_preset, p.degustazione, p.offerta_speciale, p.yums,
+            p.thefork_booking_id, p.creato_da,
+            p.nome_ospite, p.cognome_ospite,
+            COALESCE(c.nome, p.nome_ospite) AS nome,
+            COALESCE(c.cognome, p.cognome_ospite) AS cognome,
+            c.nome2, c.cognome2,
+            c.telefono, c.email, c.vip, c.allergie,
+            c.pref_cibo, c.restrizioni_dietetiche, c.protetto,
+            (SELECT COUNT(*) FROM clienti_prenotazioni
+             WHERE cliente_id = c.id AND stato IN ('SEATED','LEFT','ARRIVED','BILL'))
+                as visite_totali
+        FROM clienti_prenotazioni p
+        LEFT JOIN clienti c ON p.cliente_id = c.id
+        WHERE p.data_pasto = ? AND {cond_ids}
+        ORDER BY p.ora_pasto, p.id
+    """, (data, *params_ids)).fetchall()
+
+    items = []
+    for r in rows:
+        item = dict(r)
+        item["turno"] = item.get("turno") or _calcola_turno(item.get("ora_pasto"), soglia)
+
+        # Tag CRM del cliente
+        if item["cliente_id"]:
+            tags = conn.execute("""
+                SELECT t.nome, t.colore FROM clienti_tag t
+                JOIN clienti_tag_assoc a ON t.id = a.tag_id
+                WHERE a.cliente_id = ?
+            """, (item["cliente_id"],)).fetchall()
+            item["tags"] = [{"nome": t["nome"], "colore": t["colore"]} for t in tags]
+        else:
+            item["tags"] = []
+        items.append(item)
+    return items
+
+
+def _contatori_planning(items, config: dict) -> Dict[str, int]:
+    """Contatori della giornata da righe con turno/stato/pax/tavolo."""
+    attive = [i for i in items if i["stato"] not in _STATI_ESCLUSI]
+    pranzo = [i for i in attive if i["turno"] == "pranzo"]
+    cena = [i for i in attive if i["turno"] != "pranzo"]
+    return {
+        "pranzo_count": len(pranzo),
+        "cena_count": len(cena),
+        "pranzo_pax": sum(i.get("pax") or 0 for i in pranzo),
+        "cena_pax": sum(i.get("pax") or 0 for i in cena),
+        "senza_tavolo": len([i for i in attive if not i.get("tavolo")]),
+        "capienza_pranzo": int(config.get("capienza_pranzo", 35)),
+        "capienza_cena": int(config.get("capienza_cena", 50)),
+    }
+
+
 @router.get("/planning/{data}")
 def get_planning(
     data: str,
+    response: Response,
+    since: Optional[int] = Query(None, ge=0, description="Cursore delta-sync (header X-Sync-Cursor)"),
     user: dict = Depends(get_current_user),
 ):
     """
     Planning completo di una giornata.
     Ritorna prenotazioni divise per turno (pranzo/cena) con dati cliente.
+
+    `?since=<cursore>` (2026-10-19): {data, cursor, reset, upserts, deletes,
+    contatori} con le sole prenotazioni cambiate (una spostata ad altro
+    giorno arriva in `deletes`); i contatori sono sempre quelli della
+    giornata intera. Vedi services/delta_sync.py.
     """
     conn = get_clienti_conn()
     try:
@@ -186,81 +282,33 @@ def get_planning(
         # Backfill turno/fonte se servono (lazy, max 5000 per chiamata)
         _backfill_turno_fonte(conn, soglia)
 
-        # nome / cognome usano COALESCE: preferiamo il dato CRM (aggiornabile),
-        # fallback allo snapshot TheFork salvato in p.nome_ospite / p.cognome_ospite
-        # (utile quando cliente_id e' NULL — vedi migrazione 068)
-        rows = conn.execute("""
-            SELECT
-                p.id, p.cliente_id, p.data_pasto, p.ora_pasto, p.stato, p.pax,
-                p.tavolo, p.canale, p.occasione, p.nota_ristorante, p.nota_cliente,
-                p.data_prenotazione, p.prenotato_da, p.turno, p.fonte,
-                p.allergie_segnalate, p.tavolo_esterno, p.seggioloni,
-                p.menu_preset, p.degustazione, p.offerta_speciale, p.yums,
-                p.thefork_booking_id, p.creato_da,
-                p.nome_ospite, p.cognome_ospite,
-                COALESCE(c.nome, p.nome_ospite) AS nome,
-                COALESCE(c.cognome, p.cognome_ospite) AS cognome,
-                c.nome2, c.cognome2,
-                c.telefono, c.email, c.vip, c.allergie,
-                c.pref_cibo, c.restrizioni_dietetiche, c.protetto,
-                (SELECT COUNT(*) FROM clienti_prenotazioni
-                 WHERE cliente_id = c.id AND stato IN ('SEATED','LEFT','ARRIVED','BILL'))
-                    as visite_totali
-            FROM clienti_prenotazioni p
-            LEFT JOIN clienti c ON p.cliente_id = c.id
-            WHERE p.data_pasto = ?
-            ORDER BY p.ora_pasto, p.id
-        """, (data,)).fetchall()
-
-        pranzo = []
-        cena = []
-        pax_pranzo = 0
-        pax_cena = 0
-        senza_tavolo = 0
-
-        for r in rows:
-            item = dict(r)
-            turno = item.get("turno") or _calcola_turno(item.get("ora_pasto"), soglia)
-            item["turno"] = turno
-
-            # Tag CRM del cliente
-            if item["cliente_id"]:
-                tags = conn.execute("""
-                    SELECT t.nome, t.colore FROM clienti_tag t
-                    JOIN clienti_tag_assoc a ON t.id = a.tag_id
-                    WHERE a.cliente_id = ?
-                """, (item["cliente_id"],)).fetchall()
-                item["tags"] = [{"nome": t["nome"], "colore": t["colore"]} for t in tags]
-            else:
-                item["tags"] = []
-
-            # Contatori
-            if item["stato"] not in ("CANCELED", "NO_SHOW", "REFUSED"):
-                if not item.get("tavolo"):
-                    senza_tavolo += 1
+        cursore, ids, reset = delta_sync.leggi(conn, since, ("clienti_prenotazioni",), "clienti")
+        response.headers["X-Sync-Cursor"] = str(cursore)
+        items = _righe_planning(conn, data, soglia, ids)
 
-            if turno == "pranzo":
-                pranzo.append(item)
-                if item["stato"] not in ("CANCELED", "NO_SHOW", "REFUSED"):
-                    pax_pranzo += item.get("pax") or 0
+        if since is not None:
+            if reset:
+                tutte = items
             else:
-                cena.append(item)
-                if item["stato"] not in ("CANCELED", "NO_SHOW", "REFUSED"):
-                    pax_cena += item.get("pax") or 0
+                tutte = [
+                    {"turno": r["turno"] or _calcola_turno(r["ora_pasto"], soglia),
+                     "stato": r["stato"], "pax": r["pax"], "tavolo": r["tavolo"]}
+                    for r in conn.execute(
+                        "SELECT ora_pasto, turno, stato, pax, tavolo "
+                        "FROM clienti_prenotazioni WHERE data_pasto = ?", (data,)
+                    ).fetchall()
+                ]
+            return {
+                "data": data,
+                **delta_sync.risposta_delta(cursore, items, ids, reset=reset),
+                "contatori": _contatori_planning(tutte, config),
+            }
 
         return {
             "data": data,
-            "pranzo": pranzo,
-            "cena": cena,
-            "contatori": {
-                "pranzo_count": len([p for p in pranzo if p["stato"] not in ("CANCELED", "NO_SHOW", "REFUSED")]),
-                "cena_count": len([c for c in cena if c["stato"] not in ("CANCELED", "NO_SHOW", "REFUSED")]),
-                "pranzo_pax": pax_pranzo,
-                "cena_pax": pax_cena,
-                "senza_tavolo": senza_tavolo,
-                "capienza_pranzo": int(config.get("capienza_pranzo", 35)),
-                "capienza_cena": int(config.get("capienza_cena", 50)),
-            },
+            "pranzo": [i for i in items if i["turno"] == "pranzo"],
+            "cena": [i for i in items if i["turno"] != "pranzo"],
+            "contatori": _contatori_planning(items, config),
         }
     finally:
         conn.close()
@@ -433,6 +481,7 @@ def crea_prenotazione(
             token,
         ))
         conn.commit()
+        _pubblica_prenotazione(conn, cur.lastrowid, "creata")
 
         return {
             "id": cur.lastrowid,
@@ -675,6 +724,7 @@ def crea_tavolo(
             req.forma, req.note, req.ordine,
         ))
         conn.commit()
+        eventi_hub.pubblica("tavolo", {"azione": "creato", "id": cur.lastrowid})
         return {"id": cur.lastrowid, "message": f"Tavolo '{req.nome}' creato"}
     except Exception as e:
         if "UNIQUE" in str(e):
@@ -709,6 +759,7 @@ def modifica_tavolo(
         values.append(tavolo_id)
         conn.execute(f"UPDATE tavoli SET {', '.join(updates)} WHERE id = ?", values)
         conn.commit()
+        eventi_hub.pubblica("tavolo", {"azione": "modificato", "id": tavolo_id})
         return {"message": "Tavolo aggiornato", "id": tavolo_id}
     except HTTPException:
         raise
@@ -744,6 +795,7 @@ async def aggiorna_posizioni_batch(
             ))
             count += 1
         conn.commit()
+        eventi_hub.pubblica("tavolo", {"azione": "posizioni", "n": count})
         return {"message": f"{count} tavoli aggiornati"}
     finally:
         conn.close()
@@ -759,6 +811,7 @@ def disattiva_tavolo(
     try:
         conn.execute("UPDATE tavoli SET attivo = 0 WHERE id = ?", (tavolo_id,))
         conn.commit()
+        eventi_hub.pubblica("tavolo", {"azione": "disattivato", "id": tavolo_id})
         return {"message": "Tavolo disattivato", "id": tavolo_id}
     finally:
         conn.close()
@@ -860,6 +913,7 @@ def attiva_layout(
                 ))
 
         conn.commit()
+        eventi_hub.pubblica("tavolo", {"azione": "layout_attivato", "id": layout_id})
         return {"message": "Layout attivato", "id": layout_id}
     except Exception as e:
         logger.exception("Errore attivazione layout")
@@ -913,6 +967,7 @@ def crea_combinazione(
             VALUES (?, ?, ?, ?, ?)
         """, (req.nome, req.tavoli_ids, req.posti, req.uso_frequente, req.note))
         conn.commit()
+        eventi_hub.pubblica("tavolo", {"azione": "combinazione", "id": cur.lastrowid})
         return {"id": cur.lastrowid, "message": f"Combinazione '{req.nome}' creata"}
     finally:
         conn.close()
@@ -928,6 +983,7 @@ def elimina_combinazione(
     try:
         conn.execute("DELETE FROM tavoli_combinazioni WHERE id = ?", (combo_id,))
         conn.commit()
+        eventi_hub.pubblica("tavolo", {"azione": "combinazione", "id": combo_id})
         return {"message": "Combinazione eliminata"}
     finally:
         conn.close()
@@ -1042,6 +1098,7 @@ async def assegna_tavolo(
             (tavolo, pren_id),
         )
         conn.commit()
+        _pubblica_prenotazione(conn, pren_id, "tavolo")
         return {"message": f"Tavolo assegnato: '{tavolo}'" if tavolo else "Tavolo rimosso", "id": pren_id}
     finally:
         conn.close()
@@ -1106,6 +1163,7 @@ def modifica_prenotazione(
             values,
         )
         conn.commit()
+        _pubblica_prenotazione(conn, pren_id, "modificata", prima=existing)
 
         return {"message": "Prenotazione aggiornata", "id": pren_id}
     except HTTPException:
@@ -1153,6 +1211,7 @@ def cambio_stato(
             (req.stato, pren_id),
         )
         conn.commit()
+        _pubblica_prenotazione(conn, pren_id, "stato")
 
         return {"message": f"Stato aggiornato: {stato_attuale} → {req.stato}", "id": pren_id}
     except HTTPException:
@@ -1187,6 +1246,7 @@ def cancella_prenotazione(
             (pren_id,),
         )
         conn.commit()
+        _pubblica_prenotazione(conn, pren_id, "cancellata")
 
         return {"message": "Prenotazione cancellata", "id": pren_id}
     finally:
@@ -1,4 +1,4 @@
-# @version: v1.0 — Mattone M.J "Pubblicazione web" (2026-08-03)
+# @version: v1.1 — Mattone M.J "Pubblicazione web": pubblicazione in batch (2026-10-19)
 # -*- coding: utf-8 -*-
 """
 Router Pubblicazione web — TRGB Gestionale
@@ -14,17 +14,24 @@ import tra router di moduli diversi), chiamando il servizio platform.
   GET  /pubblicazione/stato/       config FTP (senza password) + ultime pubblicazioni
   POST /pubblicazione/test/        login + listing della cartella, non scrive nulla
   GET  /pubblicazione/storico/     ultime N pubblicazioni (tutte o per chiave)
+  POST /pubblicazione/batch/       ripubblica più chiavi in UNA sessione FTP
+
+Il batch non importa i router dei moduli: usa i produttori che ogni modulo
+registra nel servizio (`registra_produttore`). Se un modulo non è attivo sul
+locale, la sua chiave risulta "non disponibile".
 
 Chi pubblica cosa:
   POST /pranzo/menu/{settimana}/pubblica/   → menu del pranzo (modulo menu_carta/pranzo)
   POST /vini/carta/pubblica/                → carta vini cliente (modulo vini)
+  POST /bevande/carta/pubblica/             → carta bevande cliente (modulo vini)
 """
 
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
 
 from app.services import ftp_publish_service as web
 from app.services.auth_service import get_current_user
@@ -36,7 +43,7 @@ router = APIRouter(
 )
 
 # Chiavi note: servono solo a dare alla UI un riepilogo ordinato.
-_CHIAVI = ("menu_pranzo", "carta_vini")
+_CHIAVI = ("menu_pranzo", "carta_vini", "carta_bevande")
 
 
 def _check_admin(user: Dict[str, Any]) -> None:
@@ -83,3 +90,28 @@ def storico_pubblicazioni(
     """Solo admin: il campo `errore` contiene le risposte grezze del server FTP."""
     _check_admin(user)
     return {"righe": web.storico(chiave=chiave, limit=limit)}
+
+
+class BatchIn(BaseModel):
+    chiavi: Optional[List[str]] = None   # None → tutte quelle registrate
+    forza: bool = False
+
+
+@router.post("/batch/")
+def pubblica_batch(payload: BatchIn, user=Depends(get_current_user)):
+    """
+    Rigenera e pubblica più contenuti riusando una sola connessione FTP/FTPS.
+    I file identici a quelli già online non vengono ricaricati (`invariato`).
+    Ritorna 200 con l'esito per chiave: un file fallito non annulla gli altri.
+    """
+    _check_admin(user)
+    if not web.is_configured():
+        raise HTTPException(
+            status_code=503,
+            detail="FTP non configurato: mancano " + ", ".join(web.mancanti()) + " in .env",
+        )
+    esiti = web.pubblica_registrati(payload.chiavi, forza=payload.forza)
+    return {
+        "ok": all(e.ok for e in esiti),
+        "esiti": [e.to_dict() for e in esiti],
+    }
@@ -1,4 +1,4 @@
-# @version: v1.2.1-statistiche
+# @version: v1.6-etag
 # -*- coding: utf-8 -*-
 # Modulo: statistiche
 """
@@ -7,6 +7,7 @@ TRGB — Router Statistiche (Modulo Statistiche)
 Endpoint per import dati iPratico e query analytics.
 
 1. POST /statistiche/import-ipratico   — Import export iPratico (.xls HTML)
+1b. POST /statistiche/import-ipratico-multi — Import di più mesi in una transazione
 2. GET  /statistiche/mesi              — Lista mesi importati
 3. GET  /statistiche/categorie         — Riepilogo categorie (filtro anno/mese)
 4. GET  /statistiche/prodotti          — Dettaglio prodotti (filtro anno/mese/categoria)
@@ -18,6 +19,7 @@ Endpoint per import dati iPratico e query analytics.
 10. GET /statistiche/coperto           — Spesa per coperto per categoria (mese per mese)
 11. GET /statistiche/movimenti         — Prodotti in crescita/calo mese su mese
 12. GET /statistiche/storico/giorni    — Incassi giornalieri di un mese (cucitura daily+shift)
+13. GET /statistiche/riepilogo         — Payload unico della Dashboard (3+5+6+2+11)
 
 NOTA cross-modulo: gli endpoint 8-10 leggono `admin_finance.sqlite3`
 (daily_closures + shift_closures, modulo cassa/banca) in SOLA LETTURA.
@@ -28,6 +30,19 @@ Cucitura storica (pre-K.12): `daily_closures` copre 2021 → cutover,
 `shift_closures` dal cutover in poi. Il cutover è dinamico =
 MIN(date) di shift_closures, quindi il codice sopravvive al refactor
 K.12 (quando daily_closures verrà dismessa il ramo daily restituirà 0 righe).
+v1.3 (2026-10-19): la cucitura non si rifà più qui. Le righe arrivano da
+vendite_aggregator (fact table `vendite_giornaliere`, stessa regola
+"shift vince, daily fallback" di CG e CE) e lo YoY dal rollup
+`vendite_mensili`. Un giorno dopo il cutover senza turni ma con import
+daily ora conta, come già contava nel CG.
+v1.4 (2026-10-19): import iPratico senza pandas né file temporaneo
+(ipratico_parser su html.parser), insert con executemany, e
+/import-ipratico-multi per caricare più mesi in una transazione.
+v1.5 (2026-10-19): categorie, prodotti, top, trend, coperto e movimenti
+leggono il cubo precalcolato (services/ipratico_cubo.py, migrazione 173),
+ricalcolato solo per il mese importato/eliminato. Filtri che il cubo non
+indirizza (mese senza anno) o cubo assente → query sulle tabelle grezze
+come prima. /riepilogo dà alla Dashboard tutti i grafici in una chiamata.
 
 SEMANTICA CUMULATIVA shift_closures (verificata sui dati 2026-07-02):
 la riga CENA contiene la chiusura RT CUMULATIVA DI GIORNATA (la Z del
@@ -50,20 +65,19 @@ ancora pranzo+cena+preconti: da rivedere con Marco (K.12).
 
 from __future__ import annotations
 
-import os
 import sqlite3
-import tempfile
 from datetime import date as date_type
-from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, status
 from fastapi.responses import JSONResponse
 
 from app.services.auth_service import get_current_user, is_admin
-from app.services.ipratico_parser import parse_ipratico_html
 from app.models.foodcost_db import get_foodcost_connection
 from app.utils.locale_data import locale_data_path
+from app.services.ipratico_parser import parse_ipratico_bytes
+from app.services import http_cache, ipratico_cubo
+from app.services.vendite_aggregator import giorni_merged, mensili_storico
 
 
 router = APIRouter(
@@ -71,6 +85,14 @@ router = APIRouter(
     tags=["Statistiche"],
 )
 
+# ETag/304 per gli endpoint che leggono solo le tabelle iPratico (e il cubo
+# derivato). /coperto e /storico/* leggono anche le chiusure cassa: esclusi.
+_ETAG_IPRATICO = [http_cache.condizionale(
+    ("foodcost.db", ["ipratico_imports", "ipratico_categorie", "ipratico_prodotti",
+                     "ipratico_cubo_mesi", "ipratico_cubo_categorie", "ipratico_cubo_prodotti"]),
+    giornaliero=False,
+)]
+
 
 # ---------------------------------------------------------
 # HELPER: connessione DB
@@ -95,6 +117,65 @@ def _require_admin(current_user: Any):
 # =============================================================
 # 1. IMPORT iPRATICO
 # =============================================================
+def _scrivi_mese_ipratico(
+    cur: sqlite3.Cursor,
+    anno: int,
+    mese: int,
+    filename: Optional[str],
+    categorie: List[Dict],
+    prodotti: List[Dict],
+) -> Dict[str, Any]:
+    """Sostituisce i dati di (anno, mese) — DELETE + executemany. Niente commit né cubo."""
+    # Elimina dati precedenti per questo mese (upsert)
+    cur.execute("DELETE FROM ipratico_categorie WHERE anno = ? AND mese = ?", (anno, mese))
+    cur.execute("DELETE FROM ipratico_prodotti WHERE anno = ? AND mese = ?", (anno, mese))
+    cur.execute("DELETE FROM ipratico_imports WHERE anno = ? AND mese = ?", (anno, mese))
+
+    cur.executemany(
+        """INSERT INTO ipratico_categorie (anno, mese, categoria, quantita, totale_cent)
+           VALUES (?, ?, ?, ?, ?)""",
+        [(anno, mese, c["categoria"], c["quantita"], c["totale_cent"]) for c in categorie],
+    )
+    cur.executemany(
+        """INSERT INTO ipratico_prodotti
+           (anno, mese, categoria, prodotto, quantita, totale_cent, plu, barcode)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        [
+            (anno, mese, p["categoria"], p["prodotto"], p["quantita"],
+             p["totale_cent"], p["plu"], p["barcode"])
+            for p in prodotti
+        ],
+    )
+
+    # Log import
+    totale = sum(c["totale_cent"] for c in categorie)
+    cur.execute(
+        """INSERT INTO ipratico_imports (anno, mese, filename, n_categorie, n_prodotti, totale_euro)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        (anno, mese, filename, len(categorie), len(prodotti), totale / 100.0),
+    )
+    return {
+        "anno": anno,
+        "mese": mese,
+        "categorie": len(categorie),
+        "prodotti": len(prodotti),
+        "totale_euro": round(totale / 100.0, 2),
+    }
+
+
+def _parse_upload_ipratico(content: bytes, filename: Optional[str]):
+    """Parsa un export in memoria; errori di formato → 400 col nome file."""
+    try:
+        categorie, prodotti = parse_ipratico_bytes(content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{filename}: {e}" if filename else str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Errore parsing file {filename or ''}: {e}")
+    if not categorie and not prodotti:
+        raise HTTPException(status_code=400, detail=f"Nessun dato trovato nel file {filename or ''}".strip())
+    return categorie, prodotti
+
+
 @router.post("/import-ipratico", summary="Importa export mensile iPratico")
 async def import_ipratico(
     anno: int = Query(..., description="Anno (es. 2025)"),
@@ -108,92 +189,173 @@ async def import_ipratico(
     """
     _require_admin(current_user)
 
-    # Salva file temporaneo
-    suffix = Path(file.filename or "export.xls").suffix
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-    try:
-        content = await file.read()
-        tmp.write(content)
-        tmp.close()
+    categorie, prodotti = _parse_upload_ipratico(await file.read(), file.filename)
 
-        categorie, prodotti = parse_ipratico_html(tmp.name)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Errore parsing file: {e}")
+    conn = _get_conn()
+    try:
+        esito = _scrivi_mese_ipratico(conn.cursor(), anno, mese, file.filename, categorie, prodotti)
+        ipratico_cubo.aggiorna_mesi(conn, [(anno, mese)])
+        conn.commit()
     finally:
-        os.unlink(tmp.name)
+        conn.close()
 
-    if not categorie and not prodotti:
-        raise HTTPException(status_code=400, detail="Nessun dato trovato nel file")
+    return {"status": "ok", **esito}
 
-    conn = _get_conn()
-    cur = conn.cursor()
 
-    # Elimina dati precedenti per questo mese (upsert)
-    cur.execute("DELETE FROM ipratico_categorie WHERE anno = ? AND mese = ?", (anno, mese))
-    cur.execute("DELETE FROM ipratico_prodotti WHERE anno = ? AND mese = ?", (anno, mese))
-    cur.execute("DELETE FROM ipratico_imports WHERE anno = ? AND mese = ?", (anno, mese))
-
-    # Inserisci categorie
-    for c in categorie:
-        cur.execute(
-            """INSERT INTO ipratico_categorie (anno, mese, categoria, quantita, totale_cent)
-               VALUES (?, ?, ?, ?, ?)""",
-            (anno, mese, c["categoria"], c["quantita"], c["totale_cent"]),
-        )
+@router.post("/import-ipratico-multi", summary="Importa più export mensili iPratico")
+async def import_ipratico_multi(
+    periodi: str = Query(
+        ..., description="Mesi 'YYYY-MM' separati da virgola, uno per file e nello stesso ordine"
+    ),
+    files: List[UploadFile] = File(...),
+    current_user: Any = Depends(get_current_user),
+):
+    """
+    Import di più mesi in un colpo (es. recupero di un anno intero). Tutti i
+    file vengono parsati prima di scrivere: se uno è illeggibile non si
+    scrive niente. Poi una sola transazione per tutti i mesi.
+    """
+    _require_admin(current_user)
 
-    # Inserisci prodotti
-    for p in prodotti:
-        cur.execute(
-            """INSERT INTO ipratico_prodotti
-               (anno, mese, categoria, prodotto, quantita, totale_cent, plu, barcode)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-            (anno, mese, p["categoria"], p["prodotto"], p["quantita"],
-             p["totale_cent"], p["plu"], p["barcode"]),
+    mesi = [p.strip() for p in periodi.split(",") if p.strip()]
+    if len(mesi) != len(files):
+        raise HTTPException(
+            status_code=400,
+            detail=f"{len(files)} file ma {len(mesi)} periodi: serve un 'YYYY-MM' per file",
         )
+    chiavi = []
+    for p in mesi:
+        try:
+            a, m = (int(x) for x in p.split("-"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Periodo non valido: {p!r} (atteso YYYY-MM)")
+        if not 1 <= m <= 12:
+            raise HTTPException(status_code=400, detail=f"Mese non valido in {p!r}")
+        chiavi.append((a, m))
+    if len(set(chiavi)) != len(chiavi):
+        raise HTTPException(status_code=400, detail="Lo stesso mese compare due volte")
 
-    # Log import
-    totale = sum(c["totale_cent"] for c in categorie)
-    cur.execute(
-        """INSERT INTO ipratico_imports (anno, mese, filename, n_categorie, n_prodotti, totale_euro)
-           VALUES (?, ?, ?, ?, ?, ?)""",
-        (anno, mese, file.filename, len(categorie), len(prodotti), totale / 100.0),
-    )
+    parsati = []
+    for f in files:
+        parsati.append((f.filename, *_parse_upload_ipratico(await f.read(), f.filename)))
 
-    conn.commit()
-    conn.close()
+    conn = _get_conn()
+    try:
+        cur = conn.cursor()
+        esiti = [
+            {"filename": fn, **_scrivi_mese_ipratico(cur, a, m, fn, cat, prod)}
+            for (a, m), (fn, cat, prod) in zip(chiavi, parsati)
+        ]
+        ipratico_cubo.aggiorna_mesi(conn, chiavi)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
     return {
         "status": "ok",
-        "anno": anno,
-        "mese": mese,
-        "categorie": len(categorie),
-        "prodotti": len(prodotti),
-        "totale_euro": round(totale / 100.0, 2),
+        "mesi": esiti,
+        "totale_euro": round(sum(e["totale_euro"] for e in esiti), 2),
     }
 
 
 # =============================================================
 # 2. LISTA MESI IMPORTATI
 # =============================================================
-@router.get("/mesi", summary="Lista mesi importati")
-def lista_mesi(current_user: Any = Depends(get_current_user)):
-    conn = _get_conn()
+def _dati_mesi(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
     rows = conn.execute(
         """SELECT anno, mese, filename, n_categorie, n_prodotti,
                   totale_euro, imported_at
            FROM ipratico_imports
            ORDER BY anno DESC, mese DESC"""
     ).fetchall()
-    conn.close()
     return [dict(r) for r in rows]
 
 
+@router.get("/mesi", summary="Lista mesi importati", dependencies=_ETAG_IPRATICO)
+def lista_mesi(current_user: Any = Depends(get_current_user)):
+    conn = _get_conn()
+    try:
+        return _dati_mesi(conn)
+    finally:
+        conn.close()
+
+
+# =============================================================
+# HELPER: cubo vendite (v1.5)
+# =============================================================
+def _livello_cubo(conn: sqlite3.Connection, anno: Optional[int], mese: Optional[int]) -> Optional[tuple]:
+    """
+    (anno, mese) del livello di cubo che risponde al filtro, o None se il
+    cubo non c'è o il filtro non è un suo livello (mese senza anno = stesso
+    mese di tutti gli anni → tabelle grezze).
+    """
+    if mese and not anno:
+        return None
+    if not ipratico_cubo.cubo_pronto(conn):
+        return None
+    return (anno or 0, mese or 0)
+
+
+def _riga_prodotto(r) -> Dict[str, Any]:
+    qta = r["quantita"]
+    tot = r["totale_cent"] / 100.0
+    return {
+        "categoria": r["categoria"],
+        "prodotto": r["prodotto"],
+        "quantita": qta,
+        "totale_euro": round(tot, 2),
+        "prezzo_medio": round(tot / qta, 2) if qta > 0 else 0,
+    }
+
+
 # =============================================================
 # 3. RIEPILOGO CATEGORIE
 # =============================================================
-@router.get("/categorie", summary="Riepilogo categorie per mese o totale")
+def _dati_categorie(conn: sqlite3.Connection, anno: Optional[int], mese: Optional[int]) -> List[Dict[str, Any]]:
+    livello = _livello_cubo(conn, anno, mese)
+    if livello:
+        rows = conn.execute(
+            """SELECT categoria, quantita, totale_cent FROM ipratico_cubo_categorie
+               WHERE anno = ? AND mese = ? ORDER BY rank""",
+            livello,
+        ).fetchall()
+    else:
+        sql = """
+            SELECT categoria,
+                   SUM(quantita) as quantita,
+                   SUM(totale_cent) as totale_cent
+            FROM ipratico_categorie
+        """
+        params = []
+        conditions = []
+
+        if anno:
+            conditions.append("anno = ?")
+            params.append(anno)
+        if mese:
+            conditions.append("mese = ?")
+            params.append(mese)
+
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        sql += " GROUP BY categoria ORDER BY SUM(totale_cent) DESC"
+        rows = conn.execute(sql, params).fetchall()
+
+    return [
+        {
+            "categoria": r["categoria"],
+            "quantita": r["quantita"],
+            "totale_euro": round(r["totale_cent"] / 100.0, 2),
+        }
+        for r in rows
+    ]
+
+
+@router.get("/categorie", summary="Riepilogo categorie per mese o totale", dependencies=_ETAG_IPRATICO)
 def riepilogo_categorie(
     anno: Optional[int] = Query(None),
     mese: Optional[int] = Query(None),
@@ -205,45 +367,16 @@ def riepilogo_categorie(
     Se niente: aggregato totale.
     """
     conn = _get_conn()
-
-    sql = """
-        SELECT categoria,
-               SUM(quantita) as quantita,
-               SUM(totale_cent) as totale_cent
-        FROM ipratico_categorie
-    """
-    params = []
-    conditions = []
-
-    if anno:
-        conditions.append("anno = ?")
-        params.append(anno)
-    if mese:
-        conditions.append("mese = ?")
-        params.append(mese)
-
-    if conditions:
-        sql += " WHERE " + " AND ".join(conditions)
-
-    sql += " GROUP BY categoria ORDER BY SUM(totale_cent) DESC"
-
-    rows = conn.execute(sql, params).fetchall()
-    conn.close()
-
-    result = []
-    for r in rows:
-        result.append({
-            "categoria": r["categoria"],
-            "quantita": r["quantita"],
-            "totale_euro": round(r["totale_cent"] / 100.0, 2),
-        })
-    return result
+    try:
+        return _dati_categorie(conn, anno, mese)
+    finally:
+        conn.close()
 
 
 # =============================================================
 # 4. DETTAGLIO PRODOTTI
 # =============================================================
-@router.get("/prodotti", summary="Dettaglio prodotti con filtri")
+@router.get("/prodotti", summary="Dettaglio prodotti con filtri", dependencies=_ETAG_IPRATICO)
 def dettaglio_prodotti(
     anno: Optional[int] = Query(None),
     mese: Optional[int] = Query(None),
@@ -255,21 +388,30 @@ def dettaglio_prodotti(
 ):
     conn = _get_conn()
 
-    sql = """
-        SELECT categoria, prodotto,
-               SUM(quantita) as quantita,
-               SUM(totale_cent) as totale_cent
-        FROM ipratico_prodotti
-    """
-    params = []
+    params: List[Any] = []
     conditions = []
-
-    if anno:
-        conditions.append("anno = ?")
-        params.append(anno)
-    if mese:
-        conditions.append("mese = ?")
-        params.append(mese)
+    livello = _livello_cubo(conn, anno, mese)
+    if livello:
+        # Righe del cubo già aggregate: niente GROUP BY, ordine = rank
+        sql = """
+            SELECT categoria, prodotto, quantita, totale_cent
+            FROM ipratico_cubo_prodotti
+        """
+        conditions.append("anno = ? AND mese = ?")
+        params.extend(livello)
+    else:
+        sql = """
+            SELECT categoria, prodotto,
+                   SUM(quantita) as quantita,
+                   SUM(totale_cent) as totale_cent
+            FROM ipratico_prodotti
+        """
+        if anno:
+            conditions.append("anno = ?")
+            params.append(anno)
+        if mese:
+            conditions.append("mese = ?")
+            params.append(mese)
     if categoria:
         conditions.append("categoria = ?")
         params.append(categoria)
@@ -280,38 +422,31 @@ def dettaglio_prodotti(
     if conditions:
         sql += " WHERE " + " AND ".join(conditions)
 
-    sql += " GROUP BY categoria, prodotto ORDER BY SUM(totale_cent) DESC"
+    if livello:
+        sql += " ORDER BY rank"
+    else:
+        sql += " GROUP BY categoria, prodotto ORDER BY SUM(totale_cent) DESC"
     sql += " LIMIT ? OFFSET ?"
     params.extend([limit, offset])
 
     rows = conn.execute(sql, params).fetchall()
     conn.close()
 
-    result = []
-    for r in rows:
-        qta = r["quantita"]
-        tot = r["totale_cent"] / 100.0
-        result.append({
-            "categoria": r["categoria"],
-            "prodotto": r["prodotto"],
-            "quantita": qta,
-            "totale_euro": round(tot, 2),
-            "prezzo_medio": round(tot / qta, 2) if qta > 0 else 0,
-        })
-    return result
+    return [_riga_prodotto(r) for r in rows]
 
 
 # =============================================================
 # 5. TOP PRODOTTI
 # =============================================================
-@router.get("/top-prodotti", summary="Top N prodotti per fatturato")
-def top_prodotti(
-    anno: Optional[int] = Query(None),
-    mese: Optional[int] = Query(None),
-    n: int = Query(20, ge=1, le=100),
-    current_user: Any = Depends(get_current_user),
-):
-    conn = _get_conn()
+def _dati_top_prodotti(conn: sqlite3.Connection, anno: Optional[int], mese: Optional[int], n: int) -> List[Dict[str, Any]]:
+    livello = _livello_cubo(conn, anno, mese)
+    if livello:
+        rows = conn.execute(
+            """SELECT categoria, prodotto, quantita, totale_cent FROM ipratico_cubo_prodotti
+               WHERE anno = ? AND mese = ? AND rank <= ? ORDER BY rank""",
+            (*livello, n),
+        ).fetchall()
+        return [_riga_prodotto(r) for r in rows]
 
     sql = """
         SELECT categoria, prodotto,
@@ -335,77 +470,98 @@ def top_prodotti(
     sql += " GROUP BY categoria, prodotto ORDER BY SUM(totale_cent) DESC LIMIT ?"
     params.append(n)
 
-    rows = conn.execute(sql, params).fetchall()
-    conn.close()
+    return [_riga_prodotto(r) for r in conn.execute(sql, params).fetchall()]
 
-    result = []
-    for r in rows:
-        qta = r["quantita"]
-        tot = r["totale_cent"] / 100.0
-        result.append({
-            "categoria": r["categoria"],
-            "prodotto": r["prodotto"],
-            "quantita": qta,
-            "totale_euro": round(tot, 2),
-            "prezzo_medio": round(tot / qta, 2) if qta > 0 else 0,
-        })
-    return result
 
-
-# =============================================================
-# 6. TREND MENSILE
-# =============================================================
-@router.get("/trend", summary="Trend mensile per categoria o prodotto")
-def trend_mensile(
+@router.get("/top-prodotti", summary="Top N prodotti per fatturato", dependencies=_ETAG_IPRATICO)
+def top_prodotti(
     anno: Optional[int] = Query(None),
-    categoria: Optional[str] = Query(None),
-    prodotto: Optional[str] = Query(None),
+    mese: Optional[int] = Query(None),
+    n: int = Query(20, ge=1, le=100),
     current_user: Any = Depends(get_current_user),
 ):
-    """
-    Ritorna i dati mese per mese.
-    Se categoria: trend della categoria.
-    Se prodotto: trend del prodotto specifico.
-    Se niente: trend totale.
-    """
     conn = _get_conn()
+    try:
+        return _dati_top_prodotti(conn, anno, mese, n)
+    finally:
+        conn.close()
 
-    if prodotto:
-        sql = """
-            SELECT anno, mese,
-                   SUM(quantita) as quantita,
-                   SUM(totale_cent) as totale_cent
-            FROM ipratico_prodotti
-            WHERE UPPER(prodotto) = UPPER(?)
-        """
-        params = [prodotto]
-    elif categoria:
-        sql = """
-            SELECT anno, mese,
-                   SUM(quantita) as quantita,
-                   SUM(totale_cent) as totale_cent
-            FROM ipratico_categorie
-            WHERE categoria = ?
-        """
-        params = [categoria]
+
+# =============================================================
+# 6. TREND MENSILE
+# =============================================================
+def _dati_trend(
+    conn: sqlite3.Connection,
+    anno: Optional[int],
+    categoria: Optional[str] = None,
+    prodotto: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    if ipratico_cubo.cubo_pronto(conn):
+        # Solo righe mensili del cubo (mese > 0); il totale viene da cubo_mesi
+        if prodotto:
+            sql = """
+                SELECT anno, mese,
+                       SUM(quantita) as quantita,
+                       SUM(totale_cent) as totale_cent
+                FROM ipratico_cubo_prodotti
+                WHERE UPPER(prodotto) = UPPER(?) AND mese > 0
+            """
+            params: List[Any] = [prodotto]
+        elif categoria:
+            sql = """
+                SELECT anno, mese, quantita, totale_cent
+                FROM ipratico_cubo_categorie
+                WHERE categoria = ? AND mese > 0
+            """
+            params = [categoria]
+        else:
+            sql = """
+                SELECT anno, mese, quantita, totale_cent
+                FROM ipratico_cubo_mesi
+                WHERE n_categorie > 0
+            """
+            params = []
+        if anno:
+            sql += " AND anno = ?"
+            params.append(anno)
+        if prodotto:
+            sql += " GROUP BY anno, mese"
+        sql += " ORDER BY anno, mese"
     else:
-        sql = """
-            SELECT anno, mese,
-                   SUM(quantita) as quantita,
-                   SUM(totale_cent) as totale_cent
-            FROM ipratico_categorie
-        """
-        params = []
+        if prodotto:
+            sql = """
+                SELECT anno, mese,
+                       SUM(quantita) as quantita,
+                       SUM(totale_cent) as totale_cent
+                FROM ipratico_prodotti
+                WHERE UPPER(prodotto) = UPPER(?)
+            """
+            params = [prodotto]
+        elif categoria:
+            sql = """
+                SELECT anno, mese,
+                       SUM(quantita) as quantita,
+                       SUM(totale_cent) as totale_cent
+                FROM ipratico_categorie
+                WHERE categoria = ?
+            """
+            params = [categoria]
+        else:
+            sql = """
+                SELECT anno, mese,
+                       SUM(quantita) as quantita,
+                       SUM(totale_cent) as totale_cent
+                FROM ipratico_categorie
+            """
+            params = []
 
-    if anno:
-        sql += " AND anno = ?" if "WHERE" in sql else " WHERE anno = ?"
-        params.append(anno)
+        if anno:
+            sql += " AND anno = ?" if "WHERE" in sql else " WHERE anno = ?"
+            params.append(anno)
 
-    sql += " GROUP BY anno, mese ORDER BY anno, mese"
+        sql += " GROUP BY anno, mese ORDER BY anno, mese"
 
     rows = conn.execute(sql, params).fetchall()
-    conn.close()
-
     return [
         {
             "anno": r["anno"],
@@ -418,6 +574,26 @@ def trend_mensile(
     ]
 
 
+@router.get("/trend", summary="Trend mensile per categoria o prodotto", dependencies=_ETAG_IPRATICO)
+def trend_mensile(
+    anno: Optional[int] = Query(None),
+    categoria: Optional[str] = Query(None),
+    prodotto: Optional[str] = Query(None),
+    current_user: Any = Depends(get_current_user),
+):
+    """
+    Ritorna i dati mese per mese.
+    Se categoria: trend della categoria.
+    Se prodotto: trend del prodotto specifico.
+    Se niente: trend totale.
+    """
+    conn = _get_conn()
+    try:
+        return _dati_trend(conn, anno, categoria, prodotto)
+    finally:
+        conn.close()
+
+
 # =============================================================
 # 7. ELIMINA MESE
 # =============================================================
@@ -435,6 +611,7 @@ def elimina_mese(
     cur.execute("DELETE FROM ipratico_categorie WHERE anno = ? AND mese = ?", (anno, mese))
     cur.execute("DELETE FROM ipratico_prodotti WHERE anno = ? AND mese = ?", (anno, mese))
     cur.execute("DELETE FROM ipratico_imports WHERE anno = ? AND mese = ?", (anno, mese))
+    ipratico_cubo.aggiorna_mesi(conn, [(anno, mese)])
 
     conn.commit()
     conn.close()
@@ -464,72 +641,25 @@ def _storico_daily_rows(anno: Optional[int] = None) -> tuple[Optional[str], List
 
     Ritorna (cutover, rows). Ogni row: date, fatturato, coperti (None se
     fonte daily), fatt_pranzo/fatt_cena/coperti_pranzo/coperti_cena (None se daily).
+
+    La cucitura e la semantica cumulativa vivono in vendite_aggregator
+    (fact table vendite_giornaliere, v1.1): qui si filtra e si rinomina.
+    Giorni daily inclusi solo se hanno un incasso (corrispettivi_tot > 0).
     """
+    da, a = (f"{anno:04d}-01-01", f"{anno + 1:04d}-01-01") if anno else ("0000-00-00", "9999-99-99")
     conn = _get_finance_conn_ro()
     try:
         cutover = conn.execute("SELECT MIN(date) FROM shift_closures").fetchone()[0]
-
-        rows: List[Dict[str, Any]] = []
-
-        # --- Ramo storico: daily_closures fino al cutover ---
-        sql_d = """
-            SELECT date, COALESCE(corrispettivi_tot, 0) AS fatt
-            FROM daily_closures
-            WHERE COALESCE(corrispettivi_tot, 0) > 0
-        """
-        params_d: List[Any] = []
-        if cutover:
-            sql_d += " AND date < ?"
-            params_d.append(cutover)
-        if anno:
-            sql_d += " AND CAST(substr(date, 1, 4) AS INTEGER) = ?"
-            params_d.append(anno)
-        for r in conn.execute(sql_d, params_d):
-            rows.append({
-                "date": r["date"], "fatturato": r["fatt"],
-                "coperti": None, "fatt_pranzo": None, "fatt_cena": None,
-                "coperti_pranzo": None, "coperti_cena": None,
-            })
-
-        # --- Ramo corrente: shift_closures dal cutover in poi ---
-        # ATTENZIONE semantica cumulativa: cena.preconto = Z di GIORNATA
-        # (include il pranzo). Vedi docstring modulo. Aggregazione in Python.
-        if cutover:
-            sql_s = "SELECT date, turno, COALESCE(preconto,0) AS preconto, COALESCE(fatture,0) AS fatture, COALESCE(coperti,0) AS coperti FROM shift_closures"
-            params_s: List[Any] = []
-            if anno:
-                sql_s += " WHERE CAST(substr(date, 1, 4) AS INTEGER) = ?"
-                params_s.append(anno)
-            per_date: Dict[str, Dict[str, Any]] = {}
-            for r in conn.execute(sql_s, params_s):
-                d = per_date.setdefault(r["date"], {})
-                d[r["turno"]] = {"preconto": r["preconto"], "fatture": r["fatture"], "coperti": r["coperti"]}
-
-            for date_str in per_date:
-                turni = per_date[date_str]
-                pranzo, cena = turni.get("pranzo"), turni.get("cena")
-                if pranzo and cena:
-                    # cena.preconto è cumulativo di giornata
-                    fatt = cena["preconto"] + pranzo["fatture"] + cena["fatture"]
-                    fatt_pranzo = pranzo["preconto"] + pranzo["fatture"]
-                    fatt_cena = max(cena["preconto"] - pranzo["preconto"], 0) + cena["fatture"]
-                elif cena:
-                    fatt = cena["preconto"] + cena["fatture"]
-                    fatt_pranzo, fatt_cena = 0, fatt
-                elif pranzo:
-                    fatt = pranzo["preconto"] + pranzo["fatture"]
-                    fatt_pranzo, fatt_cena = fatt, 0
-                else:
-                    continue
-                rows.append({
-                    "date": date_str, "fatturato": fatt,
-                    "coperti": (pranzo["coperti"] if pranzo else 0) + (cena["coperti"] if cena else 0),
-                    "fatt_pranzo": fatt_pranzo, "fatt_cena": fatt_cena,
-                    "coperti_pranzo": pranzo["coperti"] if pranzo else 0,
-                    "coperti_cena": cena["coperti"] if cena else 0,
-                })
-
-        rows.sort(key=lambda x: x["date"])
+        rows: List[Dict[str, Any]] = [
+            {
+                "date": r["date"], "fatturato": r["corrispettivi_tot"],
+                "coperti": r["coperti"],
+                "fatt_pranzo": r["fatt_pranzo"], "fatt_cena": r["fatt_cena"],
+                "coperti_pranzo": r["coperti_pranzo"], "coperti_cena": r["coperti_cena"],
+            }
+            for r in giorni_merged(conn, da, a)
+            if r["_source"] == "shift" or r["corrispettivi_tot"] > 0
+        ]
         return cutover, rows
     finally:
         conn.close()
@@ -545,32 +675,22 @@ def storico_yoy(current_user: Any = Depends(get_current_user)):
     (daily_closures 2021→cutover + shift_closures dal cutover).
     Coperti presenti solo dove la fonte è shift_closures.
     """
-    cutover, rows = _storico_daily_rows()
-
-    mensile: Dict[tuple, Dict[str, Any]] = {}
-    for r in rows:
-        anno = int(r["date"][0:4])
-        mese = int(r["date"][5:7])
-        key = (anno, mese)
-        m = mensile.setdefault(key, {
-            "anno": anno, "mese": mese, "fatturato": 0.0,
-            "giorni": 0, "coperti": 0, "has_coperti": False,
-        })
-        m["fatturato"] += r["fatturato"]
-        m["giorni"] += 1
-        if r["coperti"] is not None:
-            m["coperti"] += r["coperti"]
-            m["has_coperti"] = True
-
-    mensile_out = []
-    for key in sorted(mensile.keys()):
-        m = mensile[key]
-        mensile_out.append({
-            "anno": m["anno"], "mese": m["mese"],
-            "fatturato": round(m["fatturato"], 2),
-            "giorni": m["giorni"],
-            "coperti": m["coperti"] if m["has_coperti"] else None,
-        })
+    # Rollup vendite_mensili (vendite_aggregator v1.1): decine di righe per
+    # tutta la storia invece della cucitura giorno per giorno.
+    conn = _get_finance_conn_ro()
+    try:
+        cutover = conn.execute("SELECT MIN(date) FROM shift_closures").fetchone()[0]
+        mensile_out = [
+            {
+                "anno": m["anno"], "mese": m["mese"],
+                "fatturato": round(m["fatturato"], 2),
+                "giorni": m["giorni"],
+                "coperti": m["coperti"],
+            }
+            for m in mensili_storico(conn)
+        ]
+    finally:
+        conn.close()
 
     annuale: Dict[int, Dict[str, Any]] = {}
     for m in mensile_out:
@@ -717,12 +837,19 @@ def spesa_per_coperto(
 
     # Categorie iPratico per mese
     conn = _get_conn()
-    cat_rows = conn.execute(
-        """SELECT mese, categoria, SUM(quantita) AS quantita, SUM(totale_cent) AS totale_cent
-           FROM ipratico_categorie WHERE anno = ?
-           GROUP BY mese, categoria""",
-        (anno,),
-    ).fetchall()
+    if ipratico_cubo.cubo_pronto(conn):
+        cat_rows = conn.execute(
+            """SELECT mese, categoria, quantita, totale_cent
+               FROM ipratico_cubo_categorie WHERE anno = ? AND mese > 0""",
+            (anno,),
+        ).fetchall()
+    else:
+        cat_rows = conn.execute(
+            """SELECT mese, categoria, SUM(quantita) AS quantita, SUM(totale_cent) AS totale_cent
+               FROM ipratico_categorie WHERE anno = ?
+               GROUP BY mese, categoria""",
+            (anno,),
+        ).fetchall()
     conn.close()
 
     cat_per_mese: Dict[int, List[Any]] = {}
@@ -759,70 +886,94 @@ def spesa_per_coperto(
 # =============================================================
 # 11. MOVIMENTI PRODOTTI — crescita/calo mese su mese
 # =============================================================
-@router.get("/movimenti", summary="Prodotti in crescita/calo rispetto al mese precedente importato")
-def movimenti_prodotti(
-    anno: int = Query(..., description="Anno del mese di riferimento"),
-    mese: int = Query(..., ge=1, le=12, description="Mese di riferimento"),
-    min_euro: float = Query(50, ge=0, description="Soglia minima € (in uno dei due mesi) per filtrare il rumore"),
-    n: int = Query(10, ge=1, le=50, description="Quanti prodotti per lista"),
-    current_user: Any = Depends(get_current_user),
-):
-    """
-    Confronta il mese richiesto con il mese immediatamente precedente
-    tra quelli importati. Ritorna top crescite, top cali, nuovi e spariti.
-    """
-    conn = _get_conn()
+def _item_movimento(r, cur_tot: float, prev_tot: float, cur_qta, prev_qta) -> Dict[str, Any]:
+    return {
+        "categoria": r["categoria"],
+        "prodotto": r["prodotto"],
+        "attuale_euro": round(cur_tot, 2),
+        "precedente_euro": round(prev_tot, 2),
+        "attuale_qta": cur_qta or 0,
+        "precedente_qta": prev_qta or 0,
+        "delta_euro": round(cur_tot - prev_tot, 2),
+        "delta_pct": round((cur_tot - prev_tot) / prev_tot * 100, 1) if prev_tot > 0 else None,
+    }
+
 
-    # Mese precedente = l'import più recente prima di (anno, mese)
-    prev = conn.execute(
-        """SELECT anno, mese FROM ipratico_imports
-           WHERE (anno < ?) OR (anno = ? AND mese < ?)
-           ORDER BY anno DESC, mese DESC LIMIT 1""",
-        (anno, anno, mese),
+def _dati_movimenti(conn: sqlite3.Connection, anno: int, mese: int, min_euro: float, n: int) -> Dict[str, Any]:
+    cubo = ipratico_cubo.cubo_pronto(conn) and conn.execute(
+        "SELECT prev_anno, prev_mese FROM ipratico_cubo_mesi WHERE anno = ? AND mese = ?",
+        (anno, mese),
     ).fetchone()
 
+    if cubo:
+        # Mese importato: il precedente e i valori prev_* sono già nel cubo
+        prev = {"anno": cubo["prev_anno"], "mese": cubo["prev_mese"]} if cubo["prev_anno"] else None
+    else:
+        # Mese precedente = l'import più recente prima di (anno, mese)
+        prev = conn.execute(
+            """SELECT anno, mese FROM ipratico_imports
+               WHERE (anno < ?) OR (anno = ? AND mese < ?)
+               ORDER BY anno DESC, mese DESC LIMIT 1""",
+            (anno, anno, mese),
+        ).fetchone()
+
     if not prev:
-        conn.close()
         return {"corrente": {"anno": anno, "mese": mese}, "precedente": None,
                 "up": [], "down": [], "nuovi": [], "spariti": []}
 
-    def _fetch(a: int, m: int) -> Dict[str, Dict[str, Any]]:
-        rows = conn.execute(
-            """SELECT categoria, prodotto, SUM(quantita) AS quantita, SUM(totale_cent) AS totale_cent
-               FROM ipratico_prodotti WHERE anno = ? AND mese = ?
-               GROUP BY categoria, prodotto""",
-            (a, m),
-        ).fetchall()
-        return {f"{r['categoria']}||{r['prodotto']}": r for r in rows}
-
-    cur_map = _fetch(anno, mese)
-    prev_map = _fetch(prev["anno"], prev["mese"])
-    conn.close()
-
     deltas, nuovi, spariti = [], [], []
-    for key in set(cur_map) | set(prev_map):
-        c, p = cur_map.get(key), prev_map.get(key)
-        cur_tot = (c["totale_cent"] / 100.0) if c else 0.0
-        prev_tot = (p["totale_cent"] / 100.0) if p else 0.0
-        if max(cur_tot, prev_tot) < min_euro:
-            continue
-        r = c or p
-        item = {
-            "categoria": r["categoria"],
-            "prodotto": r["prodotto"],
-            "attuale_euro": round(cur_tot, 2),
-            "precedente_euro": round(prev_tot, 2),
-            "attuale_qta": c["quantita"] if c else 0,
-            "precedente_qta": p["quantita"] if p else 0,
-            "delta_euro": round(cur_tot - prev_tot, 2),
-            "delta_pct": round((cur_tot - prev_tot) / prev_tot * 100, 1) if prev_tot > 0 else None,
-        }
-        if not p:
-            nuovi.append(item)
-        elif not c:
-            spariti.append(item)
-        else:
-            deltas.append(item)
+    if cubo:
+        for r in conn.execute(
+            """SELECT categoria, prodotto, quantita, totale_cent, prev_quantita, prev_totale_cent
+               FROM ipratico_cubo_prodotti
+               WHERE anno = ? AND mese = ?
+                 AND MAX(totale_cent, COALESCE(prev_totale_cent, 0)) / 100.0 >= ?""",
+            (anno, mese, min_euro),
+        ).fetchall():
+            cur_tot = r["totale_cent"] / 100.0
+            if r["prev_totale_cent"] is None:
+                nuovi.append(_item_movimento(r, cur_tot, 0.0, r["quantita"], 0))
+            else:
+                deltas.append(_item_movimento(r, cur_tot, r["prev_totale_cent"] / 100.0,
+                                              r["quantita"], r["prev_quantita"]))
+        for r in conn.execute(
+            """SELECT p.categoria, p.prodotto, p.quantita, p.totale_cent
+               FROM ipratico_cubo_prodotti p
+               WHERE p.anno = ? AND p.mese = ? AND p.totale_cent / 100.0 >= ?
+                 AND NOT EXISTS (
+                     SELECT 1 FROM ipratico_cubo_prodotti c
+                     WHERE c.anno = ? AND c.mese = ?
+                       AND c.categoria = p.categoria AND c.prodotto = p.prodotto)""",
+            (prev["anno"], prev["mese"], min_euro, anno, mese),
+        ).fetchall():
+            spariti.append(_item_movimento(r, 0.0, r["totale_cent"] / 100.0, 0, r["quantita"]))
+    else:
+        def _fetch(a: int, m: int) -> Dict[str, Any]:
+            rows = conn.execute(
+                """SELECT categoria, prodotto, SUM(quantita) AS quantita, SUM(totale_cent) AS totale_cent
+                   FROM ipratico_prodotti WHERE anno = ? AND mese = ?
+                   GROUP BY categoria, prodotto""",
+                (a, m),
+            ).fetchall()
+            return {f"{r['categoria']}||{r['prodotto']}": r for r in rows}
+
+        cur_map = _fetch(anno, mese)
+        prev_map = _fetch(prev["anno"], prev["mese"])
+
+        for key in set(cur_map) | set(prev_map):
+            c, p = cur_map.get(key), prev_map.get(key)
+            cur_tot = (c["totale_cent"] / 100.0) if c else 0.0
+            prev_tot = (p["totale_cent"] / 100.0) if p else 0.0
+            if max(cur_tot, prev_tot) < min_euro:
+                continue
+            item = _item_movimento(c or p, cur_tot, prev_tot,
+                                   c["quantita"] if c else 0, p["quantita"] if p else 0)
+            if not p:
+                nuovi.append(item)
+            elif not c:
+                spariti.append(item)
+            else:
+                deltas.append(item)
 
     up = sorted([d for d in deltas if d["delta_euro"] > 0], key=lambda d: -d["delta_euro"])[:n]
     down = sorted([d for d in deltas if d["delta_euro"] < 0], key=lambda d: d["delta_euro"])[:n]
@@ -836,3 +987,52 @@ def movimenti_prodotti(
         "up": up, "down": down,
         "nuovi": nuovi[:n], "spariti": spariti[:n],
     }
+
+
+@router.get("/movimenti", summary="Prodotti in crescita/calo rispetto al mese precedente importato", dependencies=_ETAG_IPRATICO)
+def movimenti_prodotti(
+    anno: int = Query(..., description="Anno del mese di riferimento"),
+    mese: int = Query(..., ge=1, le=12, description="Mese di riferimento"),
+    min_euro: float = Query(50, ge=0, description="Soglia minima € (in uno dei due mesi) per filtrare il rumore"),
+    n: int = Query(10, ge=1, le=50, description="Quanti prodotti per lista"),
+    current_user: Any = Depends(get_current_user),
+):
+    """
+    Confronta il mese richiesto con il mese immediatamente precedente
+    tra quelli importati. Ritorna top crescite, top cali, nuovi e spariti.
+    """
+    conn = _get_conn()
+    try:
+        return _dati_movimenti(conn, anno, mese, min_euro, n)
+    finally:
+        conn.close()
+
+
+# =============================================================
+# 13. RIEPILOGO DASHBOARD — payload unico
+# =============================================================
+@router.get("/riepilogo", summary="Dati della Dashboard Statistiche in una chiamata", dependencies=_ETAG_IPRATICO)
+def riepilogo_dashboard(
+    anno: Optional[int] = Query(None),
+    mese: Optional[int] = Query(None, ge=1, le=12),
+    n: int = Query(15, ge=1, le=100, description="Quanti top prodotti"),
+    n_movimenti: int = Query(8, ge=1, le=50, description="Quanti prodotti per lista movimenti"),
+    current_user: Any = Depends(get_current_user),
+):
+    """
+    Quello che la Dashboard chiedeva con 5 chiamate (categorie, top-prodotti,
+    trend, mesi, movimenti), dalla stessa connessione e dallo stesso cubo.
+    Filtri come /categorie; il trend è dell'anno (o di tutto lo storico se
+    anno manca); movimenti solo con anno+mese.
+    """
+    conn = _get_conn()
+    try:
+        return {
+            "mesi": _dati_mesi(conn),
+            "categorie": _dati_categorie(conn, anno, mese),
+            "top_prodotti": _dati_top_prodotti(conn, anno, mese, n),
+            "trend": _dati_trend(conn, anno),
+            "movimenti": _dati_movimenti(conn, anno, mese, 50, n_movimenti) if anno and mese else None,
+        }
+    finally:
+        conn.close()
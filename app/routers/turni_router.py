@@ -852,10 +852,11 @@ def get_foglio_pdf(
   </div>
 </body></html>"""
 
-    # Genera PDF con WeasyPrint
+    # Genera PDF con WeasyPrint nel pool renderer (fuori dal thread della
+    # richiesta). Niente render cache: l'HTML contiene l'orario di generazione.
     try:
-        from weasyprint import HTML as WeasyHTML
-        pdf_bytes = WeasyHTML(string=html).write_pdf()
+        from app.services.pdf_render_pool import render_pdf
+        pdf_bytes = render_pdf(html)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Errore generazione PDF: {e}")
 
@@ -34,19 +34,16 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional
 from itertools import groupby
 
-import pandas as pd
 from fastapi import APIRouter, UploadFile, File, Body, Depends, HTTPException, Query, Request, status
 from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, Response
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from weasyprint import HTML, CSS
 
 from app.services.pdf_brand import wrappa_html_brand, safe_filename
 from app.services.auth_service import get_current_user, decode_access_token, is_admin
 from app.models import vini_magazzino_db as mag_db
 # V-H.J (sessione 2026-05-12): vini_model.normalize_dataframe eliminato.
 # Import/Export usa il nuovo formato v2 (service vini_xlsx_v2).
-from app.services import vini_xlsx_v2
+# 2026-10-19: vini_xlsx_v2 (openpyxl) importato dentro gli endpoint, non al
+# boot; via anche pandas/openpyxl/weasyprint importati qui e mai usati.
 from app.services.carta_vini_service import (
     build_carta_body_html,
     build_carta_body_html_htmlsafe,
@@ -234,6 +231,7 @@ def template_v2_download(
     Fogli: Vini (header + esempio), Locazioni (dinamico), Riferimento valori,
     Istruzioni. Usato sia per nuovi locali sia per data entry batch.
     """
+    from app.services import vini_xlsx_v2
     data = vini_xlsx_v2.generate_template_xlsx(include_esempio=include_esempio)
     filename = f"trgb_template_vini_{datetime.now().strftime('%Y%m%d')}.xlsx"
     return Response(
@@ -257,6 +255,8 @@ async def import_v2(
     Non sovrascrive mai i vini esistenti. Per modificare un vino, usa la sua
     scheda dal gestionale.
     """
+    from app.services import vini_xlsx_v2
+
     _require_admin(current_user)
     try:
         content = await file.read()
@@ -293,6 +293,7 @@ def export_v2(
     template. Round-trip: scarica → modifica fuori sistema → reimporta (le
     righe esistenti vengono saltate, le nuove inserite).
     """
+    from app.services import vini_xlsx_v2
     data = vini_xlsx_v2.generate_export_xlsx()
     filename = f"trgb_vini_export_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
     return Response(
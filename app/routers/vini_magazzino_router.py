@@ -1,4 +1,4 @@
-# @version: v1.5-modifica-log
+# @version: v1.7-etag
 # -*- coding: utf-8 -*-
 """
 Tre Gobbi — Router Vini Magazzino
@@ -11,6 +11,8 @@ API per il nuovo DB di magazzino vini:
 - Movimenti di cantina (carico/scarico/vendita/rettifica) con utente
 - Note operative per vino
 - Controllo duplicati in fase di inserimento
+- Delta-sync (`?since=<cursore>`) su lista, carta staff e calici: solo
+  upserts/deletes dal change-log (services/delta_sync.py)
 
 ⚠️ Questo router lavora SOLO su 'vini_magazzino.sqlite3' tramite
     app.models.vini_magazzino_db
@@ -19,11 +21,13 @@ API per il nuovo DB di magazzino vini:
 
 from __future__ import annotations
 
-from typing import Optional, List, Any, Dict, Literal
+from typing import Optional, List, Any, Dict, Literal, Set
 
-from fastapi import APIRouter, Body, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Body, Depends, HTTPException, status, Query, Response
 from pydantic import BaseModel, Field
 
+from app.services import delta_sync
+from app.services import http_cache
 from app.services.auth_service import get_current_user, is_admin, is_vini_manager
 from app.services.wine_pricing import calcola_prezzo_carta, _round_to_half
 from app.models import vini_magazzino_db as db
@@ -283,11 +287,42 @@ def _get_username(current_user: Any) -> str:
 db.init_magazzino_database()
 
 
+# ---------------------------------------------------------
+# DELTA-SYNC (?since=) — sessione 2026-10-19
+# Lista, carta staff e calici: senza `since` rispondono come sempre più
+# l'header X-Sync-Cursor; con `since` → {cursor, reset, upserts, deletes}
+# (vedi services/delta_sync.py). Un movimento conta come modifica del vino.
+# ---------------------------------------------------------
+_SINCE_QUERY = Query(None, ge=0, description="Cursore delta-sync (header X-Sync-Cursor della risposta precedente)")
+_TABELLE_DELTA = ("vini_bottiglie", "vini_magazzino_movimenti")
+
+
+def _apri_delta(since: Optional[int], response: Response):
+    """(cursore, ids da rileggere o None = tutti, reset)."""
+    conn = db.get_magazzino_connection()
+    try:
+        cursore, ids, reset = delta_sync.leggi(conn, since, _TABELLE_DELTA, "vini_magazzino")
+    finally:
+        conn.close()
+    response.headers["X-Sync-Cursor"] = str(cursore)
+    return cursore, ids, reset
+
+
+def _rispondi(since: Optional[int], cursore: int, righe: List[Dict[str, Any]],
+              ids: Optional[Set[int]], reset: bool):
+    if since is None:
+        return righe
+    return delta_sync.risposta_delta(cursore, righe, ids, reset=reset)
+
+
 # ---------------------------------------------------------
 # ENDPOINT: LISTA / RICERCA VINI
 # ---------------------------------------------------------
-@router.get("/", summary="Lista / ricerca vini magazzino")
+@router.get("/", summary="Lista / ricerca vini magazzino", dependencies=[http_cache.condizionale(
+    ("vini_magazzino.sqlite3", ["vini_bottiglie", "vini_magazzino_movimenti"]), giornaliero=False,
+)])
 def list_vini_magazzino(
+    response: Response,
     id: Optional[int] = Query(None, ge=1, description="Ricerca diretta per ID vino"),
     q: Optional[str] = Query(None, description="Ricerca libera (descrizione/produttore/denominazione)"),
     tipologia: Optional[str] = Query(None),
@@ -295,8 +330,10 @@ def list_vini_magazzino(
     produttore: Optional[str] = Query(None),
     solo_in_carta: bool = Query(False),
     min_qta: Optional[int] = Query(None, ge=0),
+    since: Optional[int] = _SINCE_QUERY,
     current_user: Any = Depends(get_current_user),
 ):
+    cursore, ids, reset = _apri_delta(since, response)
     rows = db.search_vini(
         vino_id=id,
         text=q,
@@ -305,8 +342,9 @@ def list_vini_magazzino(
         produttore=produttore,
         solo_in_carta=solo_in_carta,
         min_qta=min_qta,
+        ids=ids,
     )
-    return [dict(r) for r in rows]
+    return _rispondi(since, cursore, [dict(r) for r in rows], ids, reset)
 
 
 # ---------------------------------------------------------
@@ -596,18 +634,27 @@ def autocomplete_vini(
 # Vendite e in Home Sala/Sommelier (toggle on/off al volo).
 # ---------------------------------------------------------
 @router.get("/carta-staff/", summary="Vini in carta — vista sommelier (locazione, prezzo calice, status)")
-def list_carta_staff(current_user: Any = Depends(get_current_user)):
+def list_carta_staff(
+    response: Response,
+    since: Optional[int] = _SINCE_QUERY,
+    current_user: Any = Depends(get_current_user),
+):
     """
     Sessione 58 fase 2 (2026-04-25). Lista flat dei vini in carta per la
     pagina staff `/vini/carta-staff`. Include tutti i campi utili al
     sommelier: locazioni con quantita', prezzo bottiglia + calice
     (con fallback PREZZO_CARTA/5 arrotondato a 0.50), flag in_mescita,
     status calcolato.
+
+    `?since=` (2026-10-19): solo i vini cambiati; un vino tolto dalla carta
+    arriva in `deletes`.
     """
+    cursore, ids, reset = _apri_delta(since, response)
+    cond_ids, params_ids = delta_sync.filtro_ids("id", ids)
     conn = db.get_magazzino_connection()
     cur = conn.cursor()
     rows = cur.execute(
-        """
+        f"""
         SELECT id, id_excel, TIPOLOGIA, NAZIONE, REGIONE, PRODUTTORE, DESCRIZIONE,
                DENOMINAZIONE, ANNATA, VITIGNI, GRADO_ALCOLICO, FORMATO,
                PREZZO_CARTA, PREZZO_CALICE, VENDITA_CALICE, BOTTIGLIA_APERTA,
@@ -619,8 +666,10 @@ def list_carta_staff(current_user: Any = Depends(get_current_user)):
           FROM vini_bottiglie
          WHERE CARTA = 1
            AND TIPOLOGIA IS NOT NULL AND TIPOLOGIA <> 'ERRORE'
+           AND {cond_ids}
         ORDER BY TIPOLOGIA, NAZIONE, REGIONE, PRODUTTORE, DESCRIZIONE
-        """
+        """,
+        params_ids,
     ).fetchall()
     conn.close()
 
@@ -683,13 +732,18 @@ def list_carta_staff(current_user: Any = Depends(get_current_user)):
             "stato_riordino": d.get("STATO_RIORDINO"),
             "status": status,
         })
-    return out
+    return _rispondi(since, cursore, out, ids, reset)
 
 
 @router.get("/calici-disponibili/", summary="Vini con bottiglia aperta in mescita")
-def list_calici_disponibili(current_user: Any = Depends(get_current_user)):
+def list_calici_disponibili(
+    response: Response,
+    since: Optional[int] = _SINCE_QUERY,
+    current_user: Any = Depends(get_current_user),
+):
     """
-    Lista vini con BOTTIGLIA_APERTA=1.
+    Lista vini con BOTTIGLIA_APERTA=1. Con `?since=` solo i cambiati (una
+    bottiglia chiusa arriva in `deletes`).
 
     Sessione 2026-05-11: campo `data_apertura` dalla colonna `DATA_APERTURA`
     (mig 121). Settata automaticamente sia da auto-VENDITA [CALICI] (in
@@ -697,10 +751,12 @@ def list_calici_disponibili(current_user: Any = Depends(get_current_user)):
     `update_vino`). Resa NULL quando BOTTIGLIA_APERTA torna a 0.
     Frontend usa il campo per mostrare alert ⚠ se aperta da >36h.
     """
+    cursore, ids, reset = _apri_delta(since, response)
+    cond_ids, params_ids = delta_sync.filtro_ids("id", ids)
     conn = db.get_magazzino_connection()
     cur = conn.cursor()
     rows = cur.execute(
-        """
+        f"""
         SELECT id, DESCRIZIONE, ANNATA, TIPOLOGIA, PRODUTTORE, REGIONE,
                PREZZO_CALICE, PREZZO_CARTA, QTA_TOTALE, BOTTIGLIA_APERTA,
                VENDITA_CALICE,
@@ -708,8 +764,10 @@ def list_calici_disponibili(current_user: Any = Depends(get_current_user)):
         FROM vini_bottiglie
         WHERE BOTTIGLIA_APERTA = 1
           AND (TIPOLOGIA IS NOT NULL AND TIPOLOGIA <> 'ERRORE')
+          AND {cond_ids}
         ORDER BY TIPOLOGIA, DESCRIZIONE;
-        """
+        """,
+        params_ids,
     ).fetchall()
     conn.close()
 
@@ -724,7 +782,7 @@ def list_calici_disponibili(current_user: Any = Depends(get_current_user)):
             if pc is not None:
                 d["PREZZO_CALICE"] = pc
         out.append(d)
-    return out
+    return _rispondi(since, cursore, out, ids, reset)
 
 
 # ---------------------------------------------------------
@@ -30,7 +30,6 @@ from typing import List, Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
 from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
 from pydantic import BaseModel, Field
-from weasyprint import HTML, CSS
 
 from app.services.carta_vini_service import (
     build_carta_body_html,
@@ -42,6 +41,8 @@ from app.services.carta_vini_service import (
     resolve_regione,
 )
 from app.services.auth_service import get_current_user, decode_access_token
+from app.services import pdf_render_cache
+from app.services import ftp_publish_service as web_publish
 from app.models.vini_magazzino_db import (
     get_vino_by_id,
     list_movimenti_vino,
@@ -364,8 +365,13 @@ def _render_carta_pdf_cliente() -> bytes:
     </html>
     """
 
-    return HTML(string=html, base_url=str(BASE_DIR)).write_pdf(
-        stylesheets=[CSS(filename=str(CSS_PDF))],
+    # Render cache (2026-10-19): la chiave e' l'hash dell'HTML finale + CSS,
+    # quindi un download ripetuto senza modifiche in cantina non rifa' WeasyPrint.
+    return pdf_render_cache.render_pdf(
+        html,
+        tipo="carta_vini",
+        css_files=[CSS_PDF],
+        base_url=str(BASE_DIR),
     )
 
 
@@ -401,8 +407,14 @@ def stato_pubblicazione_carta(user=Depends(get_current_user)):
 
 
 @router.post("/carta/pubblica/")
-def pubblica_carta_sul_sito(user=Depends(get_current_user)):
-    """Rigenera la carta vini cliente e la carica sull'FTP del sito."""
+def pubblica_carta_sul_sito(
+    forza: bool = Query(False, description="Ricarica anche se la carta online e' identica"),
+    user=Depends(get_current_user),
+):
+    """
+    Rigenera la carta vini cliente e la carica sull'FTP del sito. Se gli
+    stessi bytes sono gia' online l'upload si salta (esito `invariato`).
+    """
     if (user or {}).get("role", "") not in _RUOLI_PUBBLICAZIONE:
         raise HTTPException(status_code=403, detail="Operazione riservata ad admin/sommelier")
 
@@ -424,26 +436,15 @@ def pubblica_carta_sul_sito(user=Depends(get_current_user)):
         nome_file=web.nome_file_per("carta_vini"),
         contenuto=pdf_bytes,
         descrizione=f"carta cliente del {datetime.now().strftime('%d/%m/%Y %H:%M')}",
+        forza=forza,
     )
     if not esito.ok:
         raise HTTPException(status_code=502, detail=f"Pubblicazione fallita: {esito.errore}")
     return esito.to_dict()
 
 
-# ------------------------------------------------------------
-# PDF STAFF
-# ------------------------------------------------------------
-@router.get("/carta/pdf-staff")
-def genera_carta_vini_pdf_staff(
-    current_user: Any = Depends(_get_user_flessibile),
-):
-    """
-    Versione STAFF.
-    Per ora identica al PDF cliente, ma con label 'VERSIONE STAFF' nel frontespizio.
-
-    Audit 2026-07-12 (A4): versione INTERNA — ora richiede auth
-    (header Authorization o ?token= per window.open).
-    """
+def _render_carta_pdf_staff() -> bytes:
+    """PDF staff della carta vini (bytes), con label interna nel frontespizio."""
     data_oggi = datetime.now().strftime("%d/%m/%Y")
     rows = list(load_vini_ordinati())
     calici_rows = list(load_vini_calici())
@@ -479,10 +480,48 @@ def genera_carta_vini_pdf_staff(
     # 2026-08-03: niente piu' scrittura in `static/carta_vini_staff.pdf`.
     # `static/` e' servito senza autenticazione: l'audit A4 aveva protetto
     # l'endpoint, ma il FILE restava scaricabile da chiunque ne indovinasse
-    # l'URL. Ora la versione interna vive solo nella risposta HTTP.
-    pdf_bytes = HTML(string=html, base_url=str(BASE_DIR)).write_pdf(
-        stylesheets=[CSS(filename=str(CSS_PDF))],
+    # l'URL. Ora la versione interna vive solo nella risposta HTTP (e nella
+    # render cache sotto locali/<id>/data/, che non e' servita).
+    return pdf_render_cache.render_pdf(
+        html,
+        tipo="carta_vini_staff",
+        css_files=[CSS_PDF],
+        base_url=str(BASE_DIR),
+    )
+
+
+# Pre-render in background quando cambiano vini/prezzi/giacenze
+# (segnalato da vini_magazzino_db): il prossimo download e' immediato.
+pdf_render_cache.registra_prerender("carta_vini", _render_carta_pdf_cliente)
+pdf_render_cache.registra_prerender("carta_vini_staff", _render_carta_pdf_staff)
+
+
+def _produci_carta_pubblica():
+    """Produttore M.J: SOLO la carta cliente, mai la staff."""
+    return (
+        _render_carta_pdf_cliente(),
+        f"carta cliente del {datetime.now().strftime('%d/%m/%Y %H:%M')}",
     )
+
+
+web_publish.registra_produttore("carta_vini", _produci_carta_pubblica)
+
+
+# ------------------------------------------------------------
+# PDF STAFF
+# ------------------------------------------------------------
+@router.get("/carta/pdf-staff")
+def genera_carta_vini_pdf_staff(
+    current_user: Any = Depends(_get_user_flessibile),
+):
+    """
+    Versione STAFF.
+    Per ora identica al PDF cliente, ma con label 'VERSIONE STAFF' nel frontespizio.
+
+    Audit 2026-07-12 (A4): versione INTERNA — ora richiede auth
+    (header Authorization o ?token= per window.open).
+    """
+    pdf_bytes = _render_carta_pdf_staff()
     return Response(
         content=pdf_bytes,
         media_type="application/pdf",
@@ -1,4 +1,4 @@
-# @version: v1.1-alert-engine
+# @version: v1.4-giro-batch (compattazione notifiche)
 # -*- coding: utf-8 -*-
 """
 Alert Engine — TRGB Gestionale (mattone M.F)
@@ -12,6 +12,17 @@ Pattern:
     3. Ogni checker legge la propria config da `alert_config` (DB notifiche).
     4. Anti-duplicato: non crea notifiche se ne esiste già una recente.
 
+Giro batch (run_check / run_all_checks):
+    Un giro apre notifiche.sqlite3 una volta in lettura: tutta alert_config,
+    l'orologio del DB e l'ultima notifica per (tipo, entity_id) nella
+    finestra anti-duplicato più larga (una query su idx_notifiche_created).
+    I checker valutano i candidati contro quell'indice in memoria e
+    accodano le notifiche; alla fine UNA transazione breve le scrive tutte
+    (ricontrollando le righe arrivate nel frattempo) e solo dopo il commit
+    partono eventi SSE e canali WA/email. Durante i checker il DB notifiche
+    non è bloccato. Fuori da un giro gli helper lavorano come prima, riga
+    per riga.
+
 Config da DB (tabella alert_config in notifiche.sqlite3):
     - attivo: 0/1 — se disattivato il checker viene saltato
     - soglia_giorni: interpretazione specifica per checker
@@ -21,7 +32,8 @@ Config da DB (tabella alert_config in notifiche.sqlite3):
 """
 
 import logging
-from datetime import date, timedelta
+import threading
+from datetime import date, datetime, timedelta
 from typing import Callable, Dict, List, Optional
 from dataclasses import dataclass, field, asdict
 
@@ -81,8 +93,25 @@ _DEFAULT_CONFIG = {
 }
 
 
+def _config_da_riga(row) -> dict:
+    return {
+        "attivo": bool(row["attivo"]),
+        "soglia_giorni": row["soglia_giorni"],
+        "antidup_ore": row["antidup_ore"],
+        "dest_ruolo": row["dest_ruolo"],
+        "dest_username": row["dest_username"],
+        "canale_app": bool(row["canale_app"]),
+        "canale_wa": bool(row["canale_wa"]),
+        "canale_email": bool(row["canale_email"]),
+    }
+
+
 def _get_config(checker_name: str) -> dict:
     """Carica la config per un checker dal DB. Fallback su defaults."""
+    giro = _giro_corrente()
+    if giro is not None:
+        cfg = giro.config.get(checker_name)
+        return dict(cfg) if cfg else dict(_DEFAULT_CONFIG)
     try:
         from app.models.notifiche_db import get_notifiche_conn
         conn = get_notifiche_conn()
@@ -91,27 +120,159 @@ def _get_config(checker_name: str) -> dict:
         ).fetchone()
         conn.close()
         if row:
-            return {
-                "attivo": bool(row["attivo"]),
-                "soglia_giorni": row["soglia_giorni"],
-                "antidup_ore": row["antidup_ore"],
-                "dest_ruolo": row["dest_ruolo"],
-                "dest_username": row["dest_username"],
-                "canale_app": bool(row["canale_app"]),
-                "canale_wa": bool(row["canale_wa"]),
-                "canale_email": bool(row["canale_email"]),
-            }
+            return _config_da_riga(row)
     except Exception as e:
         logger.warning(f"Config load per '{checker_name}' fallito, uso defaults: {e}")
     return dict(_DEFAULT_CONFIG)
 
 
+# ─────────────────────────────────────────────
+# GIRO BATCH (vedi docstring del modulo)
+# ─────────────────────────────────────────────
+
+# Finestra minima dell'indice anti-duplicato: copre i default "168h" dei
+# checker utenze/giftcard anche quando alert_config non li ha.
+_FINESTRA_MIN_ORE = 168
+_FMT_DB = "%Y-%m-%d %H:%M:%S"
+
+_locale = threading.local()
+# Un giro alla volta: due Home aperte insieme non devono vedere entrambe
+# "nessuna notifica recente" e scrivere due volte la stessa.
+_giro_lock = threading.Lock()
+
+
+class _Giro:
+    """Stato di un giro: config, indice anti-duplicato, notifiche in coda."""
+
+    def __init__(self):
+        self.config: Dict[str, dict] = {}
+        self.ultime: Dict[tuple, str] = {}    # (tipo, entity_id) → created_at più recente
+        self.adesso = datetime.now()
+        self.finestra_ore = _FINESTRA_MIN_ORE
+        self.max_id = 0
+        self.notifiche: List[dict] = []
+        self.canali: List[tuple] = []         # (canale, titolo) da loggare dopo il commit
+
+    def carica(self) -> None:
+        from app.models.notifiche_db import get_notifiche_conn
+        conn = get_notifiche_conn()
+        try:
+            for row in conn.execute("SELECT * FROM alert_config").fetchall():
+                self.config[row["checker"]] = _config_da_riga(row)
+            self.finestra_ore = max(
+                [_FINESTRA_MIN_ORE] + [int(c["antidup_ore"] or 0) for c in self.config.values()]
+            )
+            adesso, max_id = conn.execute(
+                "SELECT datetime('now', 'localtime'), COALESCE(MAX(id), 0) FROM notifiche"
+            ).fetchone()
+            self.adesso = datetime.strptime(adesso, _FMT_DB)
+            self.max_id = max_id
+            dal = (self.adesso - timedelta(hours=self.finestra_ore)).strftime(_FMT_DB)
+            for row in conn.execute("""
+                SELECT tipo, entity_id, MAX(created_at) AS ultima
+                FROM notifiche
+                WHERE created_at >= ?
+                GROUP BY tipo, entity_id
+            """, (dal,)).fetchall():
+                self.ultime[(row["tipo"], row["entity_id"])] = row["ultima"]
+        finally:
+            conn.close()
+
+    def recente(self, tipo: str, ore: int, entity_id: Optional[int]) -> Optional[bool]:
+        """None se `ore` esce dalla finestra caricata (si chiede al DB)."""
+        if ore > self.finestra_ore:
+            return None
+        ultima = self.ultime.get((tipo, entity_id))
+        return ultima is not None and ultima >= (self.adesso - timedelta(hours=ore)).strftime(_FMT_DB)
+
+    def accoda(self, righe: List[dict]) -> None:
+        self.notifiche.extend(righe)
+        adesso = self.adesso.strftime(_FMT_DB)
+        for r in righe:
+            self.ultime[(r["tipo"], r.get("entity_id"))] = adesso
+
+    def scrivi(self) -> int:
+        """
+        Una transazione per tutte le notifiche del giro. Scarta quelle la cui
+        chiave è comparsa dopo carica() (altro processo): la finestra
+        anti-duplicato le coprirebbe comunque. Ritorna quante ne ha scritte.
+        """
+        if not self.notifiche:
+            _invia_canali(self.canali)
+            return 0
+        from app.models.notifiche_db import get_notifiche_conn
+        from app.services.notifiche_service import inserisci_notifiche, pubblica_create
+
+        conn = get_notifiche_conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            nuove = {
+                (r["tipo"], r["entity_id"])
+                for r in conn.execute(
+                    "SELECT tipo, entity_id FROM notifiche WHERE id > ?", (self.max_id,)
+                ).fetchall()
+            }
+            righe = [r for r in self.notifiche if (r["tipo"], r.get("entity_id")) not in nuove]
+            if len(righe) < len(self.notifiche):
+                logger.info(
+                    "Alert: %d notifiche già create da un altro giro, scartate",
+                    len(self.notifiche) - len(righe),
+                )
+            ids = inserisci_notifiche(conn, righe)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        pubblica_create(righe, ids)
+        _invia_canali(self.canali)
+        return len(ids)
+
+
+
+def _giro_corrente() -> Optional[_Giro]:
+    return getattr(_locale, "giro", None)
+
+
+def _in_giro(fn: Callable, dry_run: bool):
+    """Esegue fn() dentro un giro (o in quello già aperto dal chiamante)."""
+    if _giro_corrente() is not None:
+        return fn()
+    with _giro_lock:
+        giro = _Giro()
+        try:
+            giro.carica()
+        except Exception as e:
+            # DB notifiche illeggibile: gli helper ricadono sul percorso riga per riga
+            logger.warning(f"Alert: giro batch non disponibile, controlli singoli: {e}")
+            return fn()
+        _locale.giro = giro
+        try:
+            esito = fn()
+        finally:
+            _locale.giro = None
+        if not dry_run:
+            try:
+                giro.scrivi()
+            except Exception as e:
+                logger.exception(f"Alert: scrittura notifiche del giro fallita: {e}")
+            # archivio + contatori non lette: throttled, best-effort
+            from app.services.notifiche_contatori import compatta
+            compatta()
+        return esito
+
+
 # ─────────────────────────────────────────────
 # RUNNER
 # ─────────────────────────────────────────────
 
 def run_check(name: str, dry_run: bool = False) -> CheckResult:
     """Esegue un singolo checker per nome."""
+    return _in_giro(lambda: _run_check(name, dry_run), dry_run)
+
+
+def _run_check(name: str, dry_run: bool) -> CheckResult:
     fn = _REGISTRY.get(name)
     if not fn:
         return CheckResult(checker=name, error=f"Checker '{name}' non trovato")
@@ -128,8 +289,8 @@ def run_check(name: str, dry_run: bool = False) -> CheckResult:
 
 
 def run_all_checks(dry_run: bool = False) -> List[CheckResult]:
-    """Esegue tutti i checker registrati."""
-    return [run_check(name, dry_run=dry_run) for name in _REGISTRY]
+    """Esegue tutti i checker registrati (un solo giro batch)."""
+    return _in_giro(lambda: [_run_check(name, dry_run) for name in _REGISTRY], dry_run)
 
 
 # ─────────────────────────────────────────────
@@ -138,6 +299,11 @@ def run_all_checks(dry_run: bool = False) -> List[CheckResult]:
 
 def _notifica_recente_esiste(tipo: str, ore: int = 24, entity_id: int = None) -> bool:
     """Controlla se esiste già una notifica dello stesso tipo nelle ultime N ore."""
+    giro = _giro_corrente()
+    if giro is not None:
+        esito = giro.recente(tipo, ore, entity_id)
+        if esito is not None:
+            return esito
     try:
         from app.models.notifiche_db import get_notifiche_conn
         conn = get_notifiche_conn()
@@ -166,10 +332,11 @@ def _notifica_recente_esiste(tipo: str, ore: int = 24, entity_id: int = None) ->
 
 def _send_notification(config: dict, **kwargs):
     """Crea notifica in-app e/o via WA/email in base alla config canali.
-    dest_username può essere una lista comma-separated → crea una notifica per utente."""
+    dest_username può essere una lista comma-separated → crea una notifica per utente.
+    Dentro un giro accoda soltanto: scrive _Giro.scrivi() a fine giro."""
+    righe = []
     # Canale app (notifica in-app via M.A)
     if config.get("canale_app", True):
-        from app.services.notifiche_service import crea_notifica
         dest_ruolo = config.get("dest_ruolo")
         dest_usernames_raw = config.get("dest_username") or ""
         dest_usernames = [u.strip() for u in dest_usernames_raw.split(",") if u.strip()]
@@ -177,26 +344,40 @@ def _send_notification(config: dict, **kwargs):
         if dest_usernames:
             # Notifica individuale per ogni utente selezionato
             for uname in dest_usernames:
-                crea_notifica(dest_ruolo=None, dest_username=uname, **kwargs)
+                righe.append(dict(kwargs, dest_ruolo=None, dest_username=uname))
             # Anche per il ruolo se impostato (altri utenti con quel ruolo)
             if dest_ruolo:
-                crea_notifica(dest_ruolo=dest_ruolo, dest_username=None, **kwargs)
+                righe.append(dict(kwargs, dest_ruolo=dest_ruolo, dest_username=None))
         else:
             # Solo per ruolo (comportamento default)
-            crea_notifica(dest_ruolo=dest_ruolo, dest_username=None, **kwargs)
-
-    # Canale WhatsApp (M.C) — solo se abilitato
-    if config.get("canale_wa", False):
-        try:
-            from app.utils.whatsapp import build_wa_link
-            # Log: WA alert preparato (invio effettivo richiede numero destinatario)
-            logger.info(f"WA alert: {kwargs.get('titolo', '')} [canale abilitato, invio manuale]")
-        except Exception as e:
-            logger.warning(f"WA notification fallita: {e}")
+            righe.append(dict(kwargs, dest_ruolo=dest_ruolo, dest_username=None))
 
+    # Canale WhatsApp (M.C) — invio effettivo richiede numero destinatario: per ora log
     # Canale email (M.D) — futuro, solo log per ora
+    canali = []
+    if config.get("canale_wa", False):
+        canali.append(("wa", kwargs.get("titolo", "")))
     if config.get("canale_email", False):
-        logger.info(f"Email alert: {kwargs.get('titolo', '')} [M.D non ancora implementato]")
+        canali.append(("email", kwargs.get("titolo", "")))
+
+    giro = _giro_corrente()
+    if giro is not None:
+        giro.accoda(righe)
+        giro.canali.extend(canali)
+        return
+
+    from app.services.notifiche_service import crea_notifica
+    for r in righe:
+        crea_notifica(**r)
+    _invia_canali(canali)
+
+
+def _invia_canali(canali: List[tuple]) -> None:
+    for canale, titolo in canali:
+        if canale == "wa":
+            logger.info(f"WA alert: {titolo} [canale abilitato, invio manuale]")
+        else:
+            logger.info(f"Email alert: {titolo} [M.D non ancora implementato]")
 
 
 # ═════════════════════════════════════════════
@@ -219,20 +400,19 @@ def _check_fatture_scadenza(dry_run: bool = False, config: dict = None) -> Check
     try:
         conn = get_foodcost_connection()
 
-        # Post G.5: legge da fe_fatture_with_stato (pagato derivato da cg_uscite.stato)
+        # pagato è materializzato su fe_fatture (mig 177, derivato da
+        # cg_uscite.stato): range su idx_fe_fatture_pagato_scadenza.
         scadute = conn.execute("""
             SELECT id, fornitore_nome, totale_fattura, data_scadenza
             FROM fe_fatture_with_stato
-            WHERE COALESCE(pagato, 0) = 0
-              AND data_scadenza IS NOT NULL AND data_scadenza != ''
-              AND data_scadenza < ?
+            WHERE pagato = 0
+              AND data_scadenza > '' AND data_scadenza < ?
         """, (oggi,)).fetchall()
 
         in_scadenza = conn.execute("""
             SELECT id, fornitore_nome, totale_fattura, data_scadenza
             FROM fe_fatture_with_stato
-            WHERE COALESCE(pagato, 0) = 0
-              AND data_scadenza IS NOT NULL AND data_scadenza != ''
+            WHERE pagato = 0
               AND data_scadenza >= ? AND data_scadenza <= ?
         """, (oggi, soglia)).fetchall()
 
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+# @version: v1.1-allergeni-propagazione (sessione 2026-10-19) — ricalcolo incrementale sul DAG ricette
 # @version: v1.0-allergeni-recursive (Modulo C, 2026-04-27)
 # -*- coding: utf-8 -*-
 """
@@ -17,10 +18,23 @@ Pipeline:
   speciale ha allergeni diversi da quelli ereditati dalla ricetta.
 
 Trigger di ricalcolo:
-- Automatico in POST/PUT ricetta (modifica items)
+- Automatico in POST/PUT ricetta (modifica items) e in PUT/merge ingrediente
+  → `propaga_allergeni()`: solo le ricette a valle della modifica
 - On-demand via endpoint POST /foodcost/ricette/{id}/ricalcola-allergeni
 - Batch via endpoint POST /foodcost/ricette/ricalcola-allergeni-tutti
 
+Propagazione (v1.1): gli allergeni di una ricetta sono l'unione di quelli
+dichiarati sugli ingredienti di TUTTE le ricette raggiungibili scendendo per
+sub_recipe_id (lei compresa) — è ciò che calcola la ricorsione con
+protezione cicli. `propaga_allergeni()` legge il grafo una volta, risale
+dalle ricette toccate ai loro "genitori" (chiusura inversa), calcola i
+valori per componenti fortemente connesse (i cicli hanno tutti lo stesso
+insieme) dalle foglie in su e scrive solo le righe cambiate, senza commit:
+il chiamante chiude tutto in una transazione. Le pubblicazioni del menu
+carta (edizioni non archiviate) delle ricette cambiate tornano nell'esito;
+quelle con allergeni_dichiarati ormai diversi dal calcolato vanno
+riviste → `avvisa_pubblicazioni()` (M.A) dopo il commit.
+
 Format CSV: lowercase, separato da virgola, ordinato alfabeticamente.
 Esempio: "glutine,latte,uova,sedano".
 
@@ -34,10 +48,13 @@ invece di "anidride solforosa e solfiti") — il service rispetta cio' che trova
 """
 from __future__ import annotations
 
-from typing import Optional, Set, List, Dict, Any
+import logging
+from typing import Optional, Set, List, Dict, Any, Iterable, Tuple
 
 from app.models.cucina_db import get_cucina_connection
 
+logger = logging.getLogger("foodcost.allergeni")
+
 
 # ─────────────────────────────────────────────────────────────
 # Helpers parsing CSV
@@ -151,6 +168,8 @@ def recompute_all_recipes_allergens() -> Dict[str, Any]:
     """
     Ricalcola allergeni per tutte le ricette attive.
     Job batch: utile dopo modifica massiva ingredienti.allergeni.
+    Un solo passaggio sul grafo (vedi `propaga_allergeni`), scrive solo le
+    ricette il cui valore cambia.
 
     Ritorna stats:
       - totale_ricette: numero di ricette processate
@@ -163,17 +182,19 @@ def recompute_all_recipes_allergens() -> Dict[str, Any]:
         rows = conn.execute(
             "SELECT id, name FROM recipes WHERE is_active = 1 ORDER BY id"
         ).fetchall()
+        esito = propaga_allergeni(conn, recipe_ids=[r["id"] for r in rows], risali=False)
+        conn.commit()
+        avvisa_pubblicazioni(esito)
         dettaglio: List[Dict[str, Any]] = []
         n_con = 0
         n_senza = 0
         for r in rows:
-            csv = update_recipe_allergens_cache(r["id"], conn=conn)
+            csv = esito["valori"].get(r["id"], "")
             dettaglio.append({"id": r["id"], "name": r["name"], "allergeni_calcolati": csv})
             if csv:
                 n_con += 1
             else:
                 n_senza += 1
-        conn.commit()
         return {
             "totale_ricette": len(rows),
             "con_allergeni": n_con,
@@ -184,6 +205,250 @@ def recompute_all_recipes_allergens() -> Dict[str, Any]:
         conn.close()
 
 
+# ─────────────────────────────────────────────────────────────
+# Propagazione incrementale sul DAG ricette
+# ─────────────────────────────────────────────────────────────
+def _leggi_grafo(conn) -> Tuple[Dict[int, Set[str]], Dict[int, Set[int]], Dict[int, Set[int]]]:
+    """
+    Due query per tutto il ricettario:
+      propri[r]  → allergeni degli ingredienti diretti di r
+      figli[r]   → sub-ricette di r
+      usata_da[s] → ricette che usano s come sub-ricetta (archi inversi)
+    Stessa regola di compute_recipe_allergens: se la voce ha ingredient_id,
+    sub_recipe_id viene ignorato.
+    """
+    allergeni_ing = {
+        r[0]: parse_allergeni_csv(r[1])
+        for r in conn.execute(
+            "SELECT id, allergeni FROM ingredients WHERE allergeni IS NOT NULL AND allergeni != ''"
+        ).fetchall()
+    }
+    propri: Dict[int, Set[str]] = {}
+    figli: Dict[int, Set[int]] = {}
+    usata_da: Dict[int, Set[int]] = {}
+    for recipe_id, ing_id, sub_id in conn.execute(
+        "SELECT recipe_id, ingredient_id, sub_recipe_id FROM recipe_items"
+    ).fetchall():
+        if ing_id:
+            if ing_id in allergeni_ing:
+                propri.setdefault(recipe_id, set()).update(allergeni_ing[ing_id])
+        elif sub_id:
+            figli.setdefault(recipe_id, set()).add(sub_id)
+            usata_da.setdefault(sub_id, set()).add(recipe_id)
+    return propri, figli, usata_da
+
+
+def _componenti(radici: Iterable[int], figli: Dict[int, Set[int]]) -> List[List[int]]:
+    """
+    Componenti fortemente connesse del sottografo raggiungibile dalle
+    radici (Tarjan iterativo). Ordine di uscita: prima le sub-ricette, poi
+    chi le usa — l'ordine topologico in cui calcolare e scrivere.
+    """
+    indice: Dict[int, int] = {}
+    minimo: Dict[int, int] = {}
+    pila: List[int] = []
+    in_pila: Set[int] = set()
+    out: List[List[int]] = []
+    contatore = 0
+    for radice in radici:
+        if radice in indice:
+            continue
+        lavoro = [(radice, iter(sorted(figli.get(radice, ()))))]
+        indice[radice] = minimo[radice] = contatore
+        contatore += 1
+        pila.append(radice)
+        in_pila.add(radice)
+        while lavoro:
+            nodo, it = lavoro[-1]
+            avanti = False
+            for f in it:
+                if f not in indice:
+                    indice[f] = minimo[f] = contatore
+                    contatore += 1
+                    pila.append(f)
+                    in_pila.add(f)
+                    lavoro.append((f, iter(sorted(figli.get(f, ())))))
+                    avanti = True
+                    break
+                if f in in_pila:
+                    minimo[nodo] = min(minimo[nodo], indice[f])
+            if avanti:
+                continue
+            lavoro.pop()
+            if lavoro:
+                padre = lavoro[-1][0]
+                minimo[padre] = min(minimo[padre], minimo[nodo])
+            if minimo[nodo] == indice[nodo]:
+                comp = []
+                while True:
+                    x = pila.pop()
+                    in_pila.discard(x)
+                    comp.append(x)
+                    if x == nodo:
+                        break
+                out.append(comp)
+    return out
+
+
+def propaga_allergeni(
+    conn,
+    ingredient_ids: Iterable[int] = (),
+    recipe_ids: Iterable[int] = (),
+    risali: bool = True,
+) -> Dict[str, Any]:
+    """
+    Ricalcola allergeni_calcolati delle ricette toccate da una modifica:
+    quelle che usano direttamente `ingredient_ids`, le `recipe_ids` e (se
+    `risali`) tutte le ricette che le contengono come sub-ricetta, a
+    qualsiasi profondità. Scrive solo i valori cambiati. Non fa commit.
+
+    Ritorna:
+      - ricette_coinvolte: quante ricette sono state ricalcolate
+      - valori: {recipe_id: csv} delle ricette ricalcolate
+      - aggiornate: [recipe_id] con valore cambiato (ordine topologico)
+      - pubblicazioni: publication menu carta (edizioni non archiviate)
+        delle ricette aggiornate, con `da_rivedere` se allergeni_dichiarati
+        non coincide più col calcolato
+    """
+    propri, figli, usata_da = _leggi_grafo(conn)
+
+    ingredienti = {int(i) for i in ingredient_ids if i}
+    partenza = {int(r) for r in recipe_ids if r}
+    if ingredienti:
+        segnaposti = ",".join("?" * len(ingredienti))
+        partenza |= {
+            r[0] for r in conn.execute(
+                f"SELECT DISTINCT recipe_id FROM recipe_items WHERE ingredient_id IN ({segnaposti})",
+                tuple(ingredienti),
+            ).fetchall()
+        }
+
+    # chiusura inversa: chi usa (anche indirettamente) le ricette di partenza
+    coinvolte = set(partenza)
+    if risali:
+        da_visitare = list(partenza)
+        while da_visitare:
+            for genitore in usata_da.get(da_visitare.pop(), ()):
+                if genitore not in coinvolte:
+                    coinvolte.add(genitore)
+                    da_visitare.append(genitore)
+
+    # valori per componente, dalle foglie in su
+    valori: Dict[int, Set[str]] = {}
+    ordine: List[int] = []
+    for comp in _componenti(sorted(coinvolte), figli):
+        membri = set(comp)
+        acc: Set[str] = set()
+        for x in comp:
+            acc |= propri.get(x, set())
+            for f in figli.get(x, ()):
+                if f not in membri:
+                    acc |= valori[f]
+        for x in comp:
+            valori[x] = acc
+            if x in coinvolte:
+                ordine.append(x)
+
+    attuali: Dict[int, Optional[str]] = {}
+    lista = sorted(coinvolte)
+    for i in range(0, len(lista), 500):
+        blocco = lista[i:i + 500]
+        for r in conn.execute(
+            f"SELECT id, allergeni_calcolati FROM recipes WHERE id IN ({','.join('?' * len(blocco))})",
+            tuple(blocco),
+        ).fetchall():
+            attuali[r[0]] = r[1]
+
+    csv_per_id = {x: format_allergeni_csv(valori[x]) for x in ordine}
+    aggiornate = [x for x in ordine if x in attuali and attuali[x] != csv_per_id[x]]
+    if aggiornate:
+        conn.executemany(
+            """UPDATE recipes
+                  SET allergeni_calcolati = ?,
+                      updated_at = datetime('now', 'localtime')
+                WHERE id = ?""",
+            [(csv_per_id[x], x) for x in aggiornate],
+        )
+
+    return {
+        "ricette_coinvolte": len(ordine),
+        "valori": {x: csv_per_id[x] for x in ordine if x in attuali},
+        "aggiornate": aggiornate,
+        "pubblicazioni": _pubblicazioni_coinvolte(conn, {x: valori[x] for x in aggiornate}),
+    }
+
+
+def _pubblicazioni_coinvolte(conn, nuovi: Dict[int, Set[str]]) -> List[Dict[str, Any]]:
+    if not nuovi:
+        return []
+    n = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' "
+        "AND name IN ('menu_dish_publications', 'menu_editions')"
+    ).fetchone()[0]
+    if n < 2:
+        return []
+    ids = sorted(nuovi)
+    out: List[Dict[str, Any]] = []
+    for i in range(0, len(ids), 500):
+        blocco = ids[i:i + 500]
+        for r in conn.execute(
+            f"""
+            SELECT p.id, p.edition_id, p.recipe_id, p.allergeni_dichiarati,
+                   e.nome AS edizione, e.stato
+            FROM menu_dish_publications p
+            JOIN menu_editions e ON e.id = p.edition_id
+            WHERE p.recipe_id IN ({','.join('?' * len(blocco))})
+              AND e.stato != 'archiviata'
+            ORDER BY p.edition_id, p.id
+            """,
+            tuple(blocco),
+        ).fetchall():
+            dichiarati = r["allergeni_dichiarati"]
+            out.append({
+                "id": r["id"],
+                "edition_id": r["edition_id"],
+                "edizione": r["edizione"],
+                "stato_edizione": r["stato"],
+                "recipe_id": r["recipe_id"],
+                "allergeni_dichiarati": dichiarati,
+                "allergeni_calcolati": format_allergeni_csv(nuovi[r["recipe_id"]]),
+                "da_rivedere": bool(dichiarati and dichiarati.strip())
+                and parse_allergeni_csv(dichiarati) != nuovi[r["recipe_id"]],
+            })
+    return out
+
+
+def avvisa_pubblicazioni(esito: Dict[str, Any]) -> None:
+    """
+    Mattone M.A — dopo il commit: se piatti del menu carta hanno allergeni
+    dichiarati a mano che non coincidono più con quelli calcolati, una
+    notifica per edizione. I piatti senza override mostrano già il calcolato
+    (fallback del menu pubblico). Non solleva mai.
+    """
+    per_edizione: Dict[int, List[Dict[str, Any]]] = {}
+    for p in esito.get("pubblicazioni", []):
+        if p["da_rivedere"]:
+            per_edizione.setdefault(p["edition_id"], []).append(p)
+    if not per_edizione:
+        return
+    try:
+        from app.services.notifiche_service import crea_notifica
+        for edition_id, pubs in per_edizione.items():
+            crea_notifica(
+                tipo="allergeni",
+                titolo=f"Allergeni da rivedere: {len(pubs)} piatti in \"{pubs[0]['edizione']}\"",
+                messaggio="Gli allergeni calcolati dalle ricette sono cambiati e non coincidono "
+                          "più con quelli dichiarati sul menu.",
+                link=f"/menu-carta/{edition_id}",
+                icona="⚠️",
+                urgenza="alta" if pubs[0]["stato_edizione"] == "in_carta" else "normale",
+                modulo="ricette",
+                entity_id=edition_id,
+            )
+    except Exception as e:
+        logger.warning("Notifica allergeni da rivedere non creata: %s", e)
+
+
 # ─────────────────────────────────────────────────────────────
 # Helpers usabili da altri moduli (es. menu carta publication)
 # ─────────────────────────────────────────────────────────────
@@ -10,7 +10,9 @@ Per cambiare password tramite CLI: python scripts/gen_passwords.py
 import json
 import secrets
 from datetime import timedelta
-from fastapi import HTTPException, status, Depends
+from typing import Optional
+
+from fastapi import HTTPException, Request, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 
 from app.core import security
@@ -202,7 +204,7 @@ def authenticate_user(username: str, password: str):
 # ---------------------------------------------------------------------------
 def decode_access_token(token: str):
     try:
-        return security.decode_access_token(token)
+        return security.decode_access_token_cached(token)
     except ValueError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -212,8 +214,42 @@ def decode_access_token(token: str):
 # ---------------------------------------------------------------------------
 # UTENTE CORRENTE
 # ---------------------------------------------------------------------------
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    payload = decode_access_token(token)
+_SCOPE_TOKEN = "auth_token"
+_SCOPE_CLAIMS = "auth_claims"
+
+
+def claims_da_scope(scope: dict) -> Optional[dict]:
+    """
+    Claims del bearer token della richiesta, decodificati UNA volta e messi
+    in scope["state"] (= request.state): il middleware viewer li calcola,
+    get_current_user li ritrova. None se manca l'header o il token non vale.
+    """
+    state = scope.setdefault("state", {})
+    if _SCOPE_TOKEN in state:
+        return state[_SCOPE_CLAIMS]
+    token = claims = None
+    for k, v in scope.get("headers") or ():
+        if k == b"authorization":
+            auth = v.decode("latin-1")
+            if auth[:7].lower() == "bearer ":
+                token = auth[7:].strip()
+            break
+    if token:
+        try:
+            claims = security.decode_access_token_cached(token)
+        except ValueError:
+            claims = None
+    state[_SCOPE_TOKEN] = token
+    state[_SCOPE_CLAIMS] = claims
+    return claims
+
+
+def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
+    claims = claims_da_scope(request.scope)
+    if claims is not None and request.scope["state"].get(_SCOPE_TOKEN) == token:
+        payload = claims
+    else:
+        payload = decode_access_token(token)
 
     username: str = payload.get("sub")
     role: str = payload.get("role")
@@ -0,0 +1,186 @@
+# @version: v1.0 — Motore categorie registrazione banca (sessione 2026-10-19)
+# -*- coding: utf-8 -*-
+"""
+Motore di categorizzazione movimenti banca — TRGB Gestionale
+
+Modulo: banca
+Classificazione: [core]
+
+PERCHÉ ESISTE
+-------------
+`banca_router._auto_detect_categoria` apriva una connessione, rileggeva
+`banca_categorie_registrazione`, riordinava le categorie e spezzava i
+pattern "A|B|C" a OGNI movimento. Il cross-ref lo chiama per ogni movimento
+senza link: centinaia di connessioni e di split per una sola pagina.
+
+COME FUNZIONA
+-------------
+Le regole vengono compilate una volta sola e tenute in memoria finché una
+categoria non cambia (il CRUD in banca_router chiama `invalida()`):
+  - per ogni tipo (entrata/uscita), le categorie in ordine di priorità
+    (`ordine`), ognuna con UNA regex che è l'alternanza dei suoi pattern
+    testuali (escaped, case-sensitive come prima: la descrizione è già in
+    maiuscolo) + le eventuali regole con soglia ("DEBIT PAGAMENTO<50",
+    "DEBIT PAGAMENTO>=50");
+  - una regex globale per tipo con TUTTI i pattern testuali fa da filtro:
+    se non trova niente e non ci sono regole a soglia applicabili, si va
+    dritti al fallback ALTRO_<TIPO> senza provare le categorie una a una.
+
+La priorità resta quella di prima: vince la prima categoria (per ordine) che
+ha almeno un pattern presente nella descrizione.
+
+`banca_categorie_map` (categoria banca → categoria custom) non passa da qui:
+è una lookup esatta già risolta con una JOIN nelle query di dashboard e
+categorie.
+
+Uso:
+    from app.services.banca_categorie_engine import categorizza, categorizza_batch
+
+    codice = categorizza(conn, descrizione, importo)
+    codici = categorizza_batch(conn, [(descrizione, importo), ...])
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.utils.locale_data import locale_data_path
+
+# Fallback se la tabella non esiste ancora (stesso set di banca_router).
+_CATEGORIE_DEFAULT = {
+    "SPESA_BANCARIA": {"label": "Spese bancarie", "tipo": "uscita", "pattern": "", "colore": "#6b7280", "ordine": 1},
+    "ALTRO_USCITA": {"label": "Altra uscita", "tipo": "uscita", "pattern": "", "colore": "#9ca3af", "ordine": 99},
+    "INCASSO_POS": {"label": "Incasso POS", "tipo": "entrata", "pattern": "", "colore": "#059669", "ordine": 1},
+    "ALTRO_ENTRATA": {"label": "Altra entrata", "tipo": "entrata", "pattern": "", "colore": "#9ca3af", "ordine": 99},
+}
+
+_lock = threading.Lock()
+_cache: Optional["_Motore"] = None
+
+
+class _Motore:
+    """Regole compilate: categorie (dict come da DB) + matcher per tipo."""
+
+    def __init__(self, categorie: Dict[str, dict]):
+        self.categorie = categorie
+        # tipo → (regex_globale | None, [(codice, regex | None, [(testo, op, soglia)])])
+        self.per_tipo: Dict[str, Tuple[Optional[re.Pattern], list]] = {}
+        for tipo in ("uscita", "entrata"):
+            ordinate = sorted(
+                [(k, v) for k, v in categorie.items() if v["tipo"] == tipo and v.get("pattern")],
+                key=lambda x: x[1].get("ordine", 50),
+            )
+            regole = []
+            tutti: List[str] = []
+            for codice, info in ordinate:
+                testi, soglie = _compila_pattern(info.get("pattern") or "")
+                rx = re.compile("|".join(map(re.escape, testi))) if testi else None
+                regole.append((codice, rx, soglie))
+                tutti.extend(testi)
+            globale = re.compile("|".join(map(re.escape, tutti))) if tutti else None
+            self.per_tipo[tipo] = (globale, regole)
+
+    def categorizza(self, descrizione: str, importo: float) -> str:
+        d = (descrizione or "").upper()
+        tipo = "entrata" if importo > 0 else "uscita"
+        globale, regole = self.per_tipo.get(tipo, (None, []))
+        testo_trovato = globale is not None and globale.search(d) is not None
+        abs_imp = abs(importo)
+        for codice, rx, soglie in regole:
+            if testo_trovato and rx is not None and rx.search(d):
+                return codice
+            for testo, op, soglia in soglie:
+                if testo in d and (abs_imp < soglia if op == "<" else abs_imp >= soglia):
+                    return codice
+        return f"ALTRO_{tipo.upper()}"
+
+
+def _compila_pattern(pattern: str) -> Tuple[List[str], List[Tuple[str, str, float]]]:
+    """
+    Spezza "A|B<50|C>=50" in testi semplici e regole con soglia sull'importo.
+    Stesse regole di prima: '<' / '>=' non in testa e soglia numerica,
+    altrimenti il pattern intero è testo.
+    """
+    testi: List[str] = []
+    soglie: List[Tuple[str, str, float]] = []
+    for pat in (p.strip() for p in pattern.split("|")):
+        if not pat:
+            continue
+        if "<" in pat and not pat.startswith("<"):
+            op = "<"
+        elif ">=" in pat and not pat.startswith(">="):
+            op = ">="
+        else:
+            testi.append(pat)
+            continue
+        testo, soglia = pat.rsplit(op, 1)
+        try:
+            soglie.append((testo.strip(), op, float(soglia)))
+        except ValueError:
+            testi.append(pat)
+    return testi, soglie
+
+
+def _carica(conn: sqlite3.Connection) -> Dict[str, dict]:
+    try:
+        rows = conn.execute(
+            "SELECT codice, label, tipo, pattern, colore, ordine FROM banca_categorie_registrazione "
+            "WHERE attiva = 1 ORDER BY tipo, ordine"
+        ).fetchall()
+    except sqlite3.Error:
+        return {k: dict(v) for k, v in _CATEGORIE_DEFAULT.items()}
+    return {
+        r[0]: {"codice": r[0], "label": r[1], "tipo": r[2], "pattern": r[3], "colore": r[4], "ordine": r[5]}
+        for r in rows
+    }
+
+
+def motore(conn: Optional[sqlite3.Connection] = None) -> _Motore:
+    """
+    Il motore compilato. Alla prima chiamata (o dopo `invalida`) legge le
+    categorie da `conn`, o da foodcost.db se conn è None.
+    """
+    global _cache
+    m = _cache
+    if m is not None:
+        return m
+    with _lock:
+        if _cache is None:
+            own = conn is None
+            if own:
+                conn = sqlite3.connect(str(locale_data_path("foodcost.db")))
+            try:
+                _cache = _Motore(_carica(conn))
+            finally:
+                if own:
+                    conn.close()
+        return _cache
+
+
+def invalida() -> None:
+    """Una categoria è cambiata: la prossima chiamata ricompila."""
+    global _cache
+    with _lock:
+        _cache = None
+
+
+def categorie(conn: Optional[sqlite3.Connection] = None) -> Dict[str, dict]:
+    """Categorie attive {codice: {label, tipo, pattern, colore, ordine}} dalla cache."""
+    return {k: dict(v) for k, v in motore(conn).categorie.items()}
+
+
+def categorizza(conn: Optional[sqlite3.Connection], descrizione: str, importo: float) -> str:
+    """Codice categoria registrazione per un movimento."""
+    return motore(conn).categorizza(descrizione, importo)
+
+
+def categorizza_batch(
+    conn: Optional[sqlite3.Connection],
+    movimenti: Iterable[Tuple[str, float]],
+) -> List[str]:
+    """Codici categoria per una lista di (descrizione, importo), stesso ordine."""
+    m = motore(conn)
+    return [m.categorizza(d, i) for d, i in movimenti]
@@ -0,0 +1,577 @@
+# @version: v1.1 — Ledger mensile Conto Economico, range spalmatura allineato alla query (sessione 2026-10-19)
+# -*- coding: utf-8 -*-
+"""
+Ledger mensile del Conto Economico — TRGB Gestionale
+
+Modulo: controllo_gestione
+Classificazione: [core]
+
+PERCHÉ ESISTE
+-------------
+compute_pl (services/conto_economico.py) ricalcolava da zero, per ogni mese
+del range, le righe di costo: join fatture × righe × categorie con la
+spalmatura, spese fisse (due rami) e stipendi. La vista "Anno" del CE, il
+PDF e la dashboard CG pagavano 12 × 4 query pesanti anche per mesi chiusi
+da mesi.
+
+COME FUNZIONA
+-------------
+Le righe del CE (schema unificato: categoria, sottocategoria, tipo_riga, id,
+spesa_fissa_id, data, descrizione, ref, importo) si salvano per
+(periodo, modalita, fonte) in `ce_ledger` (mig 170). Una lettura:
+  1. drena `ce_ledger_dirty`, riempita dai trigger su fatture, righe,
+     categorie fornitore, spese fisse e cg_uscite, e cancella i mesi toccati;
+  2. per gli stipendi, che vengono da dipendenti.sqlite3 (altro DB, niente
+     trigger), confronta un'impronta economica del mese (conteggi/somme di
+     dipendenti_costo_consuntivo e buste_paga + amministratori);
+  3. serve dal ledger i mesi freschi e ricalcola SOLO gli altri, con le
+     stesse funzioni _aggregate_* di sempre, poi li salva.
+
+La spalmatura è già dentro le righe: una fattura spalmata su 12 mesi
+produce la sua quota in ciascun mese, e la modifica di quella fattura
+sporca tutti e 12.
+
+Se il ledger non c'è (migrazione non applicata), è spento
+(TRGB_CE_LEDGER=0) o una scrittura fallisce, si calcola in diretta come
+prima: il risultato è identico, cambia solo il tempo.
+
+Uso:
+    from app.services import ce_ledger
+    mesi = ce_ledger.righe_mesi(fc_conn, dip_conn, ["2026-01", "2026-02"], "competenza")
+    mesi["2026-01"]["fatture"]  → list[dict]
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger("trgb.ce_ledger")
+
+FONTI = ("fatture", "spese_fisse", "stipendi")
+
+# Limite di sicurezza per un range in coda (spalmature assurde, dati sporchi).
+_MAX_MESI_RANGE = 240
+
+_lock = threading.Lock()
+_stats = {"mesi_ledger": 0, "mesi_ricalcolati": 0, "fallback": 0}
+
+
+def _abilitato() -> bool:
+    return (os.getenv("TRGB_CE_LEDGER") or "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _conta(chiave: str, n: int = 1) -> None:
+    with _lock:
+        _stats[chiave] += n
+
+
+# ─────────────────────────────────────────────
+# CALCOLO DIRETTO (le funzioni di sempre)
+# ─────────────────────────────────────────────
+
+def calcola_mese(
+    fc_conn: sqlite3.Connection,
+    dip_conn: Optional[sqlite3.Connection],
+    periodo: str,
+    modalita: str,
+) -> dict:
+    """Righe del CE di un mese, calcolate in diretta dalle tabelle sorgente."""
+    from app.services import conto_economico as ce
+
+    anno, mese = int(periodo[:4]), int(periodo[5:7])
+    primo, ultimo, _ = ce._range_periodo(anno, mese)
+    stipendi, meta = ce._aggregate_stipendi(
+        fc_conn, periodo, dip_conn=dip_conn, anno=anno, mese=mese
+    )
+    return {
+        "fatture": ce._aggregate_fatture_per_categoria(fc_conn, primo, ultimo),
+        "spese_fisse": ce._aggregate_spese_fisse_per_categoria(fc_conn, periodo, modalita=modalita),
+        "stipendi": stipendi,
+        "stipendi_meta": meta,
+    }
+
+
+# ─────────────────────────────────────────────
+# INVALIDAZIONE
+# ─────────────────────────────────────────────
+
+def _tabelle_presenti(fc_conn: sqlite3.Connection) -> bool:
+    n = fc_conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type='table' "
+        "AND name IN ('ce_ledger', 'ce_ledger_mesi', 'ce_ledger_dirty')"
+    ).fetchone()[0]
+    return n == 3
+
+
+def _espandi(periodo_da: str, n_mesi: int) -> List[str]:
+    try:
+        anno, mese = int(periodo_da[:4]), int(periodo_da[5:7])
+    except (TypeError, ValueError):
+        return []
+    if not 1 <= mese <= 12:
+        return []
+    out = []
+    for _ in range(max(1, min(int(n_mesi or 1), _MAX_MESI_RANGE))):
+        out.append(f"{anno:04d}-{mese:02d}")
+        mese += 1
+        if mese > 12:
+            anno, mese = anno + 1, 1
+    return out
+
+
+# ─────────────────────────────────────────────
+# TRIGGER DI INVALIDAZIONE (mig 170, range spalmatura corretto dalla mig 181)
+# ─────────────────────────────────────────────
+#
+# Il range accodato deve essere ESATTAMENTE quello che le query del CE
+# coprono. _aggregate_fatture_per_categoria e il ramo spalmato di
+# _aggregate_spese_fisse_per_categoria includono il mese P se
+#     data_inizio <= P || '-01'
+#     AND strftime('%Y-%m', date(data_inizio, '+N months', '-1 day')) >= P
+# quindi una spalmatura che parte a metà mese inizia dal mese DOPO e finisce
+# nel mese di (inizio + N mesi - 1 giorno). La mig 170 accodava N mesi da
+# substr(data_inizio, 1, 7): l'ultimo mese coperto restava vecchio.
+# SQLite non ammette CTE nei trigger: le espressioni si incollano.
+
+def _mese_inizio(d: str) -> str:
+    """Primo mese P con P || '-01' >= d (stesso confronto stringa della query)."""
+    return (
+        f"CASE WHEN {d} <= substr({d}, 1, 7) || '-01' THEN substr({d}, 1, 7) "
+        f"ELSE strftime('%Y-%m', date(substr({d}, 1, 7) || '-01', '+1 month')) END"
+    )
+
+
+def _mese_fine(d: str, n: str) -> str:
+    return f"strftime('%Y-%m', date({d}, '+' || {n} || ' months', '-1 day'))"
+
+
+def _indice_mese(m: str) -> str:
+    return f"(CAST(substr({m}, 1, 4) AS INTEGER) * 12 + CAST(substr({m}, 6, 2) AS INTEGER))"
+
+
+def _n_mesi(d: str, n: str) -> str:
+    """Mesi coperti da inizio a fine inclusi; 1 se la data non si legge."""
+    return (
+        f"COALESCE(MAX(1, {_indice_mese(_mese_fine(d, n))} - {_indice_mese(_mese_inizio(d))} + 1), 1)"
+    )
+
+
+def _spalmata(f: str) -> str:
+    return f"COALESCE({f}.spalmatura_mesi, 0) > 0 AND {f}.spalmatura_data_inizio IS NOT NULL"
+
+
+def _fattura_da(f: str) -> str:
+    return (
+        f"CASE WHEN {_spalmata(f)} THEN {_mese_inizio(f + '.spalmatura_data_inizio')} "
+        f"ELSE COALESCE({f}.competenza_anno_mese, strftime('%Y-%m', {f}.data_fattura)) END"
+    )
+
+
+def _fattura_n(f: str) -> str:
+    return (
+        f"CASE WHEN {_spalmata(f)} "
+        f"THEN {_n_mesi(f + '.spalmatura_data_inizio', f + '.spalmatura_mesi')} ELSE 1 END"
+    )
+
+
+def _accoda_fattura(alias: str) -> str:
+    return (
+        "INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) VALUES ("
+        f"{_fattura_da(alias)}, {_fattura_n(alias)});"
+    )
+
+
+def _accoda_fattura_da_riga(alias: str) -> str:
+    return (
+        f"INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) SELECT {_fattura_da('f')}, {_fattura_n('f')}"
+        f" FROM fe_fatture f WHERE f.id = {alias}.fattura_id;"
+    )
+
+
+def _accoda_fatture_fornitore(alias: str) -> str:
+    return (
+        f"INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) SELECT DISTINCT {_fattura_da('f')}, {_fattura_n('f')}"
+        f" FROM fe_fatture f WHERE f.fornitore_piva = {alias}.fornitore_piva;"
+    )
+
+
+def _accoda_spesa_fissa(alias: str) -> str:
+    d = f"{alias}.spalmatura_data_inizio"
+    return (
+        f"INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) SELECT {_mese_inizio(d)}, "
+        f"{_n_mesi(d, alias + '.spalmatura_mesi')} WHERE {_spalmata(alias)};"
+        " INSERT INTO ce_ledger_dirty (periodo_da, n_mesi)"
+        " SELECT DISTINCT periodo_riferimento, 1 FROM cg_uscite"
+        f" WHERE spesa_fissa_id = {alias}.id AND periodo_riferimento IS NOT NULL;"
+    )
+
+
+def _accoda_uscita(alias: str) -> str:
+    return (
+        "INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) SELECT "
+        f"{alias}.periodo_riferimento, 1 WHERE {alias}.periodo_riferimento IS NOT NULL;"
+    )
+
+
+_TUTTO = "INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) VALUES ('*', 0);"
+
+# Colonne che entrano nel CE: gli UPDATE su altre colonne (stato pagamento,
+# note, xml, ...) non sporcano niente.
+_COL_FATTURE = (
+    "data_fattura, competenza_anno_mese, spalmatura_mesi, spalmatura_data_inizio, "
+    "is_autofattura, tipo_documento, fornitore_piva, fornitore_nome, numero_fattura"
+)
+_COL_RIGHE = "fattura_id, prezzo_totale, categoria_id, sottocategoria_id"
+_COL_FORNITORE = "fornitore_piva, categoria_id, sottocategoria_id, escluso_acquisti"
+_COL_USCITE = (
+    "tipo_uscita, periodo_riferimento, spesa_fissa_id, totale, fornitore_nome, "
+    "numero_fattura, data_pagamento, data_scadenza, data_fattura"
+)
+_COL_SPESE = (
+    "tipo, titolo, importo, attiva, categoria_id, sottocategoria_id, "
+    "spalmatura_mesi, spalmatura_data_inizio"
+)
+_USCITA_CE = "{f}.tipo_uscita IN ('SPESA_FISSA', 'STIPENDIO')"
+
+
+def _triggers() -> List[tuple]:
+    """(nome, evento, corpo) — tabella nell'evento."""
+    t = [
+        ("trg_ce_ledger_fatture_ins", "AFTER INSERT ON fe_fatture", _accoda_fattura("NEW")),
+        ("trg_ce_ledger_fatture_del", "AFTER DELETE ON fe_fatture", _accoda_fattura("OLD")),
+        (
+            "trg_ce_ledger_fatture_upd",
+            f"AFTER UPDATE OF {_COL_FATTURE} ON fe_fatture",
+            _accoda_fattura("OLD") + " " + _accoda_fattura("NEW"),
+        ),
+        ("trg_ce_ledger_righe_ins", "AFTER INSERT ON fe_righe", _accoda_fattura_da_riga("NEW")),
+        ("trg_ce_ledger_righe_del", "AFTER DELETE ON fe_righe", _accoda_fattura_da_riga("OLD")),
+        (
+            "trg_ce_ledger_righe_upd",
+            f"AFTER UPDATE OF {_COL_RIGHE} ON fe_righe",
+            _accoda_fattura_da_riga("OLD") + " " + _accoda_fattura_da_riga("NEW"),
+        ),
+        (
+            "trg_ce_ledger_fornitore_ins", "AFTER INSERT ON fe_fornitore_categoria",
+            _accoda_fatture_fornitore("NEW"),
+        ),
+        (
+            "trg_ce_ledger_fornitore_del", "AFTER DELETE ON fe_fornitore_categoria",
+            _accoda_fatture_fornitore("OLD"),
+        ),
+        (
+            "trg_ce_ledger_fornitore_upd",
+            f"AFTER UPDATE OF {_COL_FORNITORE} ON fe_fornitore_categoria",
+            _accoda_fatture_fornitore("OLD") + " " + _accoda_fatture_fornitore("NEW"),
+        ),
+    ]
+    for tab in ("fe_categorie", "fe_sottocategorie"):
+        t.append((f"trg_ce_ledger_{tab}_upd", f"AFTER UPDATE OF nome ON {tab}", _TUTTO))
+        t.append((f"trg_ce_ledger_{tab}_del", f"AFTER DELETE ON {tab}", _TUTTO))
+    t += [
+        (
+            "trg_ce_ledger_uscite_ins",
+            "AFTER INSERT ON cg_uscite FOR EACH ROW WHEN " + _USCITA_CE.format(f="NEW"),
+            _accoda_uscita("NEW"),
+        ),
+        (
+            "trg_ce_ledger_uscite_del",
+            "AFTER DELETE ON cg_uscite FOR EACH ROW WHEN " + _USCITA_CE.format(f="OLD"),
+            _accoda_uscita("OLD"),
+        ),
+        (
+            "trg_ce_ledger_uscite_upd",
+            f"AFTER UPDATE OF {_COL_USCITE} ON cg_uscite FOR EACH ROW WHEN "
+            + _USCITA_CE.format(f="OLD") + " OR " + _USCITA_CE.format(f="NEW"),
+            _accoda_uscita("OLD") + " " + _accoda_uscita("NEW"),
+        ),
+        ("trg_ce_ledger_spese_ins", "AFTER INSERT ON cg_spese_fisse", _accoda_spesa_fissa("NEW")),
+        ("trg_ce_ledger_spese_del", "AFTER DELETE ON cg_spese_fisse", _accoda_spesa_fissa("OLD")),
+        (
+            "trg_ce_ledger_spese_upd",
+            f"AFTER UPDATE OF {_COL_SPESE} ON cg_spese_fisse",
+            _accoda_spesa_fissa("OLD") + " " + _accoda_spesa_fissa("NEW"),
+        ),
+    ]
+    return t
+
+
+def installa_trigger(fc_conn: sqlite3.Connection) -> int:
+    """
+    (Ri)crea i trigger di invalidazione sulle tabelle presenti (regola S52-1)
+    e ritorna quanti ne ha creati. Non fa commit.
+    """
+    tabelle = {
+        r[0] for r in fc_conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+    }
+    creati = 0
+    for nome, evento, corpo in _triggers():
+        if evento.split(" ON ")[1].split()[0] not in tabelle:
+            continue
+        fc_conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        fc_conn.execute(f"CREATE TRIGGER {nome} {evento} BEGIN {corpo} END")
+        creati += 1
+    return creati
+
+
+def _drena_dirty(fc_conn: sqlite3.Connection) -> None:
+    """Cancella dal ledger i mesi accodati dai trigger. Non committa."""
+    righe = fc_conn.execute("SELECT id, periodo_da, n_mesi FROM ce_ledger_dirty").fetchall()
+    if not righe:
+        return
+    max_id = max(r[0] for r in righe)
+    if any(r[1] == "*" for r in righe):
+        fc_conn.execute("DELETE FROM ce_ledger")
+        fc_conn.execute("DELETE FROM ce_ledger_mesi")
+    else:
+        mesi = set()
+        for _id, periodo_da, n_mesi in righe:
+            if periodo_da:
+                mesi.update(_espandi(periodo_da, n_mesi))
+        if mesi:
+            params = [(m,) for m in sorted(mesi)]
+            fc_conn.executemany("DELETE FROM ce_ledger WHERE periodo = ?", params)
+            fc_conn.executemany("DELETE FROM ce_ledger_mesi WHERE periodo = ?", params)
+    # Solo fino a max_id: quello che un'altra richiesta accoda nel frattempo
+    # resta in coda per la prossima lettura.
+    fc_conn.execute("DELETE FROM ce_ledger_dirty WHERE id <= ?", (max_id,))
+
+
+def invalida(fc_conn: sqlite3.Connection, periodi: Optional[Iterable[str]] = None) -> None:
+    """
+    Forza il ricalcolo di alcuni mesi (o di tutto, periodi=None). Serve solo
+    per scritture che bypassano i trigger (restore, script): per l'uso
+    normale ci pensano i trigger (installa_trigger, mig 170/181).
+    """
+    if periodi is None:
+        fc_conn.execute("INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) VALUES ('*', 0)")
+    else:
+        fc_conn.executemany(
+            "INSERT INTO ce_ledger_dirty (periodo_da, n_mesi) VALUES (?, 1)",
+            [(p,) for p in periodi],
+        )
+    fc_conn.commit()
+
+
+# ─────────────────────────────────────────────
+# IMPRONTA STIPENDI (dipendenti.sqlite3)
+# ─────────────────────────────────────────────
+
+def _tabella_esiste(conn: sqlite3.Connection, nome: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (nome,)
+    ).fetchone() is not None
+
+
+def _impronte_stipendi(
+    dip_conn: Optional[sqlite3.Connection], periodi: List[str]
+) -> Dict[str, str]:
+    """
+    Un'impronta per mese di tutto ciò che _aggregate_stipendi legge da
+    dipendenti.sqlite3. Tre query in totale, non per mese.
+    """
+    if dip_conn is None:
+        return {p: "no-dip" for p in periodi}
+    chiavi = [int(p[:4]) * 100 + int(p[5:7]) for p in periodi]
+    da, a = min(chiavi), max(chiavi)
+    dcc: Dict[int, tuple] = {}
+    bp: Dict[int, tuple] = {}
+    amm = ""
+    try:
+        if _tabella_esiste(dip_conn, "dipendenti_costo_consuntivo"):
+            for r in dip_conn.execute(
+                """
+                SELECT anno * 100 + mese, COUNT(*), MAX(id),
+                       ROUND(TOTAL(costo_totale), 2), ROUND(TOTAL(inail_mese), 2),
+                       ROUND(TOTAL(retribuzione_lorda), 2),
+                       ROUND(TOTAL(contributi_lordo) + TOTAL(contributi_su_ratei), 2),
+                       TOTAL(COALESCE(dipendente_id, 0))
+                FROM dipendenti_costo_consuntivo
+                WHERE anno * 100 + mese BETWEEN ? AND ?
+                GROUP BY anno, mese
+                """,
+                (da, a),
+            ).fetchall():
+                dcc[r[0]] = tuple(r[1:])
+        if _tabella_esiste(dip_conn, "buste_paga"):
+            for r in dip_conn.execute(
+                """
+                SELECT anno * 100 + mese, COUNT(*), MAX(id), ROUND(TOTAL(netto), 2)
+                FROM buste_paga
+                WHERE anno * 100 + mese BETWEEN ? AND ?
+                GROUP BY anno, mese
+                """,
+                (da, a),
+            ).fetchall():
+                bp[r[0]] = tuple(r[1:])
+        cols = {c[1] for c in dip_conn.execute("PRAGMA table_info(dipendenti)").fetchall()}
+        if "is_amministratore" in cols:
+            amm = ",".join(
+                str(r[0]) for r in dip_conn.execute(
+                    "SELECT id FROM dipendenti WHERE is_amministratore = 1 ORDER BY id"
+                ).fetchall()
+            )
+    except sqlite3.Error as e:
+        # Impronta non calcolabile → mesi sempre "sporchi" per gli stipendi
+        logger.warning("Impronta stipendi non disponibile: %s", e)
+        return {p: None for p in periodi}
+    return {
+        p: f"{dcc.get(k)}|{bp.get(k)}|{amm}"
+        for p, k in zip(periodi, chiavi)
+    }
+
+
+# ─────────────────────────────────────────────
+# LETTURA / SCRITTURA LEDGER
+# ─────────────────────────────────────────────
+
+_COLONNE = (
+    "categoria", "sottocategoria", "tipo_riga", "id", "spesa_fissa_id",
+    "data", "descrizione", "ref", "importo",
+)
+
+
+def _leggi_mese(fc_conn: sqlite3.Connection, periodo: str, modalita: str, meta_json: str) -> dict:
+    mese = {f: [] for f in FONTI}
+    for r in fc_conn.execute(
+        """
+        SELECT fonte, categoria, sottocategoria, tipo_riga, ref_id, spesa_fissa_id,
+               data, descrizione, ref, importo
+        FROM ce_ledger
+        WHERE periodo = ? AND modalita = ?
+        ORDER BY fonte, ordine
+        """,
+        (periodo, modalita),
+    ).fetchall():
+        mese[r[0]].append(dict(zip(_COLONNE, tuple(r)[1:])))
+    mese["stipendi_meta"] = json.loads(meta_json) if meta_json else {}
+    return mese
+
+
+def _salva_mese(
+    fc_conn: sqlite3.Connection, periodo: str, modalita: str,
+    impronta: Optional[str], mese: dict,
+) -> None:
+    fc_conn.execute(
+        "DELETE FROM ce_ledger WHERE periodo = ? AND modalita = ?", (periodo, modalita)
+    )
+    righe = []
+    for fonte in FONTI:
+        for i, r in enumerate(mese[fonte]):
+            righe.append((
+                periodo, modalita, fonte, i,
+                r.get("categoria"), r.get("sottocategoria"), r.get("tipo_riga"),
+                r.get("id"), r.get("spesa_fissa_id"), r.get("data"),
+                r.get("descrizione"), r.get("ref"), r.get("importo") or 0,
+            ))
+    fc_conn.executemany(
+        """
+        INSERT INTO ce_ledger (
+            periodo, modalita, fonte, ordine, categoria, sottocategoria, tipo_riga,
+            ref_id, spesa_fissa_id, data, descrizione, ref, importo
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        righe,
+    )
+    fc_conn.execute(
+        """
+        INSERT OR REPLACE INTO ce_ledger_mesi
+            (periodo, modalita, impronta_stipendi, stipendi_meta, calcolato_il)
+        VALUES (?, ?, ?, ?, datetime('now','localtime'))
+        """,
+        (periodo, modalita, impronta, json.dumps(mese["stipendi_meta"], ensure_ascii=False)),
+    )
+
+
+def righe_mesi(
+    fc_conn: sqlite3.Connection,
+    dip_conn: Optional[sqlite3.Connection],
+    periodi: List[str],
+    modalita: str = "competenza",
+) -> Dict[str, dict]:
+    """
+    Per ogni periodo 'YYYY-MM': {"fatture": [...], "spese_fisse": [...],
+    "stipendi": [...], "stipendi_meta": {...}} — identico a calcola_mese,
+    ma dal ledger quando il mese è fresco.
+    """
+    periodi = list(periodi)
+    if not periodi:
+        return {}
+    try:
+        if not _abilitato() or not _tabelle_presenti(fc_conn):
+            raise LookupError("ledger non disponibile")
+        _drena_dirty(fc_conn)
+        impronte = _impronte_stipendi(dip_conn, periodi)
+        salvati = {
+            r[0]: (r[1], r[2])
+            for r in fc_conn.execute(
+                f"""
+                SELECT periodo, impronta_stipendi, stipendi_meta FROM ce_ledger_mesi
+                WHERE modalita = ? AND periodo IN ({','.join('?' * len(periodi))})
+                """,
+                (modalita, *periodi),
+            ).fetchall()
+        }
+        out: Dict[str, dict] = {}
+        ricalcolati = 0
+        for p in periodi:
+            s = salvati.get(p)
+            if s is not None and impronte[p] is not None and s[0] == impronte[p]:
+                out[p] = _leggi_mese(fc_conn, p, modalita, s[1])
+                continue
+            out[p] = calcola_mese(fc_conn, dip_conn, p, modalita)
+            _salva_mese(fc_conn, p, modalita, impronte[p], out[p])
+            ricalcolati += 1
+        fc_conn.commit()
+        _conta("mesi_ledger", len(periodi) - ricalcolati)
+        _conta("mesi_ricalcolati", ricalcolati)
+        return out
+    except (LookupError, sqlite3.Error) as e:
+        if not isinstance(e, LookupError):
+            logger.warning("Ledger CE non utilizzabile, calcolo diretto: %s", e)
+            try:
+                fc_conn.rollback()
+            except sqlite3.Error:
+                pass
+        _conta("fallback")
+        return {p: calcola_mese(fc_conn, dip_conn, p, modalita) for p in periodi}
+
+
+def verifica(
+    fc_conn: sqlite3.Connection,
+    dip_conn: Optional[sqlite3.Connection],
+    periodi: List[str],
+    modalita: str = "competenza",
+) -> List[str]:
+    """
+    Mesi in cui il ledger (dopo il drenaggio della coda) NON coincide col
+    calcolo diretto. Lista vuota = ledger allineato. Per controlli e
+    diagnostica: rifà il calcolo diretto di ogni mese.
+    """
+    dal_ledger = righe_mesi(fc_conn, dip_conn, periodi, modalita=modalita)
+    diversi = []
+    for p in periodi:
+        diretto = calcola_mese(fc_conn, dip_conn, p, modalita)
+        if any(
+            json.dumps(dal_ledger[p][k], sort_keys=True, default=str)
+            != json.dumps(diretto[k], sort_keys=True, default=str)
+            for k in FONTI
+        ):
+            diversi.append(p)
+    return diversi
+
+
+def stato(fc_conn: sqlite3.Connection) -> dict:
+    """Diagnostica: mesi nel ledger, coda sporca, contatori del processo."""
+    with _lock:
+        contatori = dict(_stats)
+    if not _tabelle_presenti(fc_conn):
+        return {"abilitato": False, **contatori}
+    mesi = fc_conn.execute("SELECT COUNT(*) FROM ce_ledger_mesi").fetchone()[0]
+    coda = fc_conn.execute("SELECT COUNT(*) FROM ce_ledger_dirty").fetchone()[0]
+    return {"abilitato": _abilitato(), "mesi": mesi, "in_coda": coda, **contatori}
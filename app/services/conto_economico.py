@@ -36,6 +36,12 @@ GERARCHIA DI CATEGORIZZAZIONE (Marco 2026-05-16, dopo bug fix):
   Una fattura con righe in più categorie viene SPEZZATA nel CE (es.
   Sogegross 475€ → 5,99 MATERIE PRIME + 35,76 BEVANDE + ... + non cat).
 
+LEDGER MENSILE (2026-10-19):
+  Le righe di costo per mese (fatture con spalmatura, spese fisse, stipendi)
+  passano da services/ce_ledger.py: salvate in `ce_ledger` (mig 170) e
+  ricalcolate solo per i mesi toccati (trigger + impronta stipendi). Le
+  _aggregate_* qui sotto restano la fonte di verità del calcolo.
+
 OUTPUT (dict JSON-serializable):
 {
   "anno": 2026, "mese": 5, "modalita": "competenza",
@@ -73,6 +79,8 @@ import sqlite3
 from datetime import date
 from typing import Optional
 
+from app.services import ce_ledger
+
 
 # Categorie che concorrono al COSTO MERCE (food cost lordo). Tutto il resto
 # è classificato come costo operativo. Marco 2026-05-14.
@@ -913,13 +921,14 @@ def compute_pl(
     # G.3.7a: per range multi-mese, aggrego tutte le fatture nei mesi del range.
     # _aggregate_fatture_per_categoria filtra internamente per
     # competenza_anno_mese (mig 133) che è singolo: itero sui periodi.
+    # Ledger mensile (ce_ledger, mig 170): i mesi non toccati dall'ultimo
+    # calcolo arrivano già pronti, gli altri si ricalcolano con le stesse
+    # _aggregate_* e si salvano. Stesse righe, stesso ordine.
+    mesi_ce = ce_ledger.righe_mesi(fc_conn, dip_conn, periodi_rif, modalita=modalita)
+
     rows_fatture = []
     for periodo_rif in periodi_rif:
-        anno_m, mese_m = int(periodo_rif[:4]), int(periodo_rif[5:7])
-        p_primo, p_ultimo, _ = _range_periodo(anno_m, mese_m)
-        rows_fatture.extend(
-            _aggregate_fatture_per_categoria(fc_conn, p_primo, p_ultimo)
-        )
+        rows_fatture.extend(mesi_ce[periodo_rif]["fatture"])
     fatture_count = len({r["id"] for r in rows_fatture})
 
     # ─── 3. SPESE FISSE righe singole (da cg_uscite SPESA_FISSA) ───────
@@ -928,11 +937,7 @@ def compute_pl(
     # G.3.7a: itero su tutti i mesi del range.
     rows_spese_fisse = []
     for periodo_rif_m in periodi_rif:
-        rows_spese_fisse.extend(
-            _aggregate_spese_fisse_per_categoria(
-                fc_conn, periodo_rif_m, modalita=modalita
-            )
-        )
+        rows_spese_fisse.extend(mesi_ce[periodo_rif_m]["spese_fisse"])
     spese_fisse_count = len(rows_spese_fisse)
 
     # ─── 4. STIPENDI righe singole (cg_uscite STIPENDIO, anti-doppio) ──
@@ -942,10 +947,8 @@ def compute_pl(
     rows_stipendi = []
     stipendi_meta_combined = {"modalita_costo": "completo", "fonte": "dipendenti_costo_consuntivo", "warnings": []}
     for periodo_rif_m in periodi_rif:
-        anno_m, mese_m = int(periodo_rif_m[:4]), int(periodo_rif_m[5:7])
-        rs, m = _aggregate_stipendi(
-            fc_conn, periodo_rif_m, dip_conn=dip_conn, anno=anno_m, mese=mese_m
-        )
+        rs = mesi_ce[periodo_rif_m]["stipendi"]
+        m = mesi_ce[periodo_rif_m]["stipendi_meta"]
         rows_stipendi.extend(rs)
         # Se anche solo un mese è in fallback netti, segnala il range come parziale
         if m.get("modalita_costo") == "netti_fallback":
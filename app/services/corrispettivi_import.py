@@ -1,9 +1,9 @@
 # app/services/corrispettivi_import.py
-# @version: v2.2
+# @version: v2.3 — pandas/numpy caricati al primo parse, non all'import del modulo
+
+from __future__ import annotations
 
 import re
-import pandas as pd
-import numpy as np
 import sqlite3
 
 from pathlib import Path
@@ -72,6 +72,9 @@ def _normalize_colname(col: str) -> str:
 
 
 def _parse_euro(val) -> float:
+    import numpy as np
+    import pandas as pd
+
     if val is None or (isinstance(val, float) and pd.isna(val)):
         return 0.0
 
@@ -96,7 +99,9 @@ def _parse_euro(val) -> float:
 # LOAD EXCEL
 # ==============================================================
 
-def load_corrispettivi_from_excel(path: Path, year: str) -> pd.DataFrame:
+def load_corrispettivi_from_excel(path: Path, year: str) -> "pd.DataFrame":
+    import pandas as pd
+
     year_str = str(year)
     is_archivio = (year_str.lower() == "archivio")
 
@@ -241,7 +246,8 @@ def load_corrispettivi_from_excel(path: Path, year: str) -> pd.DataFrame:
 # IMPORT IN DB
 # ==============================================================
 
-def import_df_into_db(df: pd.DataFrame, conn: sqlite3.Connection, created_by="import"):
+def import_df_into_db(df: "pd.DataFrame", conn: sqlite3.Connection, created_by="import"):
+    import pandas as pd
 
     ensure_table(conn)
     cur = conn.cursor()
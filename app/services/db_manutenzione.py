@@ -0,0 +1,447 @@
+# @version: v1.1 — Manutenzione SQLite programmata + controllo stato pagamento fatture (sessione 2026-10-19)
+# -*- coding: utf-8 -*-
+"""
+Manutenzione database SQLite — TRGB Gestionale
+
+Modulo: platform
+Classificazione: [core]
+
+PERCHÉ ESISTE
+-------------
+I ~10 DB del locale (foodcost.db, admin_finance, vini_magazzino, clienti,
+dipendenti, notifiche, tasks, bevande, vini, vini_settings) girano in WAL
+e nessuno:
+  - aggiorna le statistiche del planner (ANALYZE / PRAGMA optimize): le
+    tabelle cresciute dopo l'ultimo ANALYZE — o mai analizzate — hanno
+    piani scelti "alla cieca";
+  - fa il checkpoint del WAL in un momento scelto: lo fa SQLite in
+    automatico quando capita, anche in pieno servizio, e il -wal resta
+    grande quanto il picco (i `.prev-wal` in app/data vengono da lì);
+  - recupera le pagine libere lasciate da DELETE massivi (potature,
+    archivio notifiche, reimport).
+
+COME FUNZIONA
+-------------
+Un thread daemon (avviato da main.py) si sveglia ogni 5 minuti; dentro una
+delle finestre TRGB_DB_MANUTENZIONE_FINESTRE (fuori servizio, lontano dai
+backup cron delle 03:00 e 18:00) esegue `esegui()` una volta per finestra.
+Per ogni DB della cartella data del locale (stessa discovery del backup):
+  1. pulizie applicative già esistenti, forzate: potatura sync_changelog
+     (delta_sync) dove c'è, archivio notifiche (notifiche_contatori);
+     controlli di coerenza: su foodcost.db lo stato pagamento materializzato
+     delle fatture (fatture_stato_service.verifica_stato_materializzato,
+     mig 177) — le divergenze si riallineano, finiscono nel log e in una
+     notifica;
+  2. statistiche: ANALYZE se il DB non è mai stato analizzato o l'ultimo
+     ANALYZE è più vecchio di TRGB_DB_ANALYZE_GIORNI, altrimenti
+     `PRAGMA optimize` (rianalizza solo le tabelle che ne hanno bisogno,
+     con analysis_limit per restare nei millisecondi);
+  3. spazio: con auto_vacuum=INCREMENTAL `PRAGMA incremental_vacuum`; con
+     auto_vacuum=NONE e pagine libere oltre TRGB_DB_VACUUM_SOGLIA la prima
+     volta si converte (auto_vacuum=INCREMENTAL + VACUUM), da lì in poi
+     basta l'incrementale;
+  4. `PRAGMA wal_checkpoint(TRUNCATE)`: WAL riportato a zero.
+Ogni passo è indipendente: un SQLITE_BUSY ne salta uno, non il giro.
+Prima/dopo si misurano dimensione file, dimensione WAL, pagine totali e
+libere; con la durata finiscono in `.db_manutenzione.json` (cartella data
+del locale, ultime 30 esecuzioni) e in GET /system/db-manutenzione.
+
+CONFIG (.env)
+-------------
+    TRGB_DB_MANUTENZIONE=1                          # 0 → scheduler spento
+    TRGB_DB_MANUTENZIONE_FINESTRE=04:00-05:30,16:15-17:30
+    TRGB_DB_ANALYZE_GIORNI=7
+    TRGB_DB_VACUUM_SOGLIA=0.2                       # pagine libere / pagine
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.locale_data import locale_data_dir, locale_data_path
+
+logger = logging.getLogger("trgb.db_manutenzione")
+
+_DEFAULT_FINESTRE = "04:00-05:30,16:15-17:30"
+_DEFAULT_ANALYZE_GIORNI = 7
+_DEFAULT_VACUUM_SOGLIA = 0.2
+_MIN_PAGINE_LIBERE = 256          # sotto questa soglia non vale un VACUUM
+_ANALYSIS_LIMIT = 400
+_RISVEGLIO_S = 300
+_MAX_ESECUZIONI = 30
+_FILE_STATO = ".db_manutenzione.json"
+
+_lock = threading.Lock()
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+# ─────────────────────────────────────────────
+# CONFIG
+# ─────────────────────────────────────────────
+
+def abilitato() -> bool:
+    return (os.getenv("TRGB_DB_MANUTENZIONE") or "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def finestre() -> List[Tuple[str, str]]:
+    """[(inizio, fine)] in HH:MM. Una finestra con inizio > fine scavalca la mezzanotte."""
+    out = []
+    for pezzo in (os.getenv("TRGB_DB_MANUTENZIONE_FINESTRE") or _DEFAULT_FINESTRE).split(","):
+        inizio, sep, fine = pezzo.strip().partition("-")
+        try:
+            datetime.strptime(inizio, "%H:%M")
+            datetime.strptime(fine, "%H:%M")
+        except ValueError:
+            if pezzo.strip():
+                logger.warning("finestra manutenzione non valida: %r", pezzo)
+            continue
+        out.append((inizio, fine))
+    return out
+
+
+def _analyze_giorni() -> int:
+    try:
+        return max(int(os.getenv("TRGB_DB_ANALYZE_GIORNI") or _DEFAULT_ANALYZE_GIORNI), 1)
+    except ValueError:
+        return _DEFAULT_ANALYZE_GIORNI
+
+
+def _vacuum_soglia() -> float:
+    try:
+        return float(os.getenv("TRGB_DB_VACUUM_SOGLIA") or _DEFAULT_VACUUM_SOGLIA)
+    except ValueError:
+        return _DEFAULT_VACUUM_SOGLIA
+
+
+def finestra_attiva(adesso: Optional[datetime] = None) -> Optional[str]:
+    """
+    Chiave della finestra in corso ("YYYY-MM-DD HH:MM", data e ora d'inizio)
+    oppure None. La chiave serve a girare una volta sola per finestra.
+    """
+    adesso = adesso or datetime.now()
+    ora = adesso.strftime("%H:%M")
+    for inizio, fine in finestre():
+        if inizio <= fine:
+            if inizio <= ora < fine:
+                return f"{adesso:%Y-%m-%d} {inizio}"
+        elif ora >= inizio:
+            return f"{adesso:%Y-%m-%d} {inizio}"
+        elif ora < fine:
+            return f"{adesso - timedelta(days=1):%Y-%m-%d} {inizio}"
+    return None
+
+
+# ─────────────────────────────────────────────
+# DISCOVERY + MISURE
+# ─────────────────────────────────────────────
+
+def database() -> List[Path]:
+    """DB del locale: stesse regole di backup_router._discover_databases."""
+    cartella = locale_data_dir()
+    if not cartella.exists():
+        return []
+    out = []
+    for p in sorted(cartella.iterdir()):
+        nome = p.name
+        if not p.is_file() or nome.startswith("."):
+            continue
+        if nome.endswith((".wal", ".shm", ".prev", ".bak")) or ".pre-" in nome:
+            continue
+        if nome.endswith((".sqlite3", ".db")):
+            out.append(p)
+    return out
+
+
+def _dimensione(p: Path) -> int:
+    try:
+        return p.stat().st_size
+    except OSError:
+        return 0
+
+
+def _misura(conn: sqlite3.Connection, path: Path) -> Dict[str, Any]:
+    return {
+        "file_bytes": _dimensione(path),
+        "wal_bytes": _dimensione(path.with_name(path.name + "-wal")),
+        "pagine": conn.execute("PRAGMA page_count").fetchone()[0],
+        "pagine_libere": conn.execute("PRAGMA freelist_count").fetchone()[0],
+    }
+
+
+# ─────────────────────────────────────────────
+# STATO PERSISTENTE (.db_manutenzione.json)
+# ─────────────────────────────────────────────
+
+def _leggi_stato() -> Dict[str, Any]:
+    try:
+        with open(locale_data_path(_FILE_STATO), "r", encoding="utf-8") as f:
+            stato = json.load(f)
+        if isinstance(stato, dict):
+            stato.setdefault("db", {})
+            stato.setdefault("esecuzioni", [])
+            return stato
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.warning("stato manutenzione illeggibile, riparto da zero: %s", e)
+    return {"db": {}, "esecuzioni": []}
+
+
+def _scrivi_stato(stato: Dict[str, Any]) -> None:
+    path = locale_data_path(_FILE_STATO)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(stato, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+# ─────────────────────────────────────────────
+# MANUTENZIONE DI UN DB
+# ─────────────────────────────────────────────
+
+def _pulizie(conn: sqlite3.Connection, path: Path, passi: List[str]) -> None:
+    """Pulizie applicative che esistono già, qui forzate (non throttled)."""
+    if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sync_changelog'"
+    ).fetchone():
+        from app.services import delta_sync
+        n = delta_sync.pota(conn, path.stem, forza=True)
+        passi.append(f"pota_sync_changelog:{n}")
+    if path.name == "notifiche.sqlite3":
+        from app.services import notifiche_contatori
+        esito = notifiche_contatori.compatta(forza=True)
+        if esito.get("eseguita"):
+            passi.append(f"archivio_notifiche:{esito['archiviate']}")
+
+
+def _controlli(conn: sqlite3.Connection, path: Path, passi: List[str]) -> None:
+    """Controlli di coerenza dei dati materializzati da trigger."""
+    if path.name != "foodcost.db":
+        return
+    from app.services import fatture_stato_service
+    esito = fatture_stato_service.verifica_stato_materializzato(conn, ripara=True, max_dettagli=10)
+    if not esito.get("ok"):
+        return
+    passi.append(f"stato_pagamento:{esito['divergenti']}")
+    if esito["divergenti"]:
+        ids = ", ".join(str(d["fattura_id"]) for d in esito["dettagli"])
+        logger.warning(
+            "stato pagamento materializzato divergente su %d fatture (riallineate): %s",
+            esito["divergenti"], ids,
+        )
+        try:
+            from app.services.notifiche_service import crea_notifica
+            # globale: dest_ruolo='admin' non arriva al superadmin (vedi turni_service)
+            crea_notifica(
+                tipo="sistema",
+                titolo=f"Stato pagamento riallineato su {esito['divergenti']} fatture",
+                messaggio=(
+                    "La manutenzione programmata ha trovato fatture con stato pagamento "
+                    "diverso dallo scadenzario e le ha riallineate. Qualcosa scrive "
+                    f"cg_uscite senza passare dai trigger. Fatture: {ids}"
+                ),
+                icona="🧾",
+                urgenza="alta",
+                modulo="controllo_gestione",
+            )
+        except Exception as e:
+            logger.warning("notifica stato pagamento non creata: %s", e)
+
+
+def manutieni(path: Path, ultima_analyze: Optional[str] = None,
+              completa: bool = False) -> Dict[str, Any]:
+    """
+    Manutenzione di un DB (vedi docstring del modulo). `completa` forza
+    ANALYZE. Non solleva: gli errori finiscono in "errori".
+    """
+    t0 = time.perf_counter()
+    esito: Dict[str, Any] = {"db": path.name, "passi": [], "errori": []}
+    passi, errori = esito["passi"], esito["errori"]
+    try:
+        conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+    except sqlite3.Error as e:
+        errori.append(f"apertura: {e}")
+        return esito
+    try:
+        conn.execute("PRAGMA busy_timeout=30000")
+        esito["prima"] = _misura(conn, path)
+
+        try:
+            _pulizie(conn, path, passi)
+        except Exception as e:
+            errori.append(f"pulizie: {e}")
+        try:
+            _controlli(conn, path, passi)
+        except Exception as e:
+            errori.append(f"controlli: {e}")
+
+        # statistiche del planner
+        try:
+            mai = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+            ).fetchone() is None
+            vecchia = ultima_analyze is None or (
+                datetime.now() - datetime.fromisoformat(ultima_analyze)
+            ) >= timedelta(days=_analyze_giorni())
+            if completa or mai or vecchia:
+                conn.execute(f"PRAGMA analysis_limit={_ANALYSIS_LIMIT}")
+                conn.execute("ANALYZE")
+                esito["analyze"] = datetime.now().isoformat(timespec="seconds")
+                passi.append("analyze")
+            else:
+                conn.execute(f"PRAGMA analysis_limit={_ANALYSIS_LIMIT}")
+                conn.execute("PRAGMA optimize")
+                passi.append("optimize")
+        except (sqlite3.Error, ValueError) as e:
+            errori.append(f"statistiche: {e}")
+
+        # pagine libere
+        try:
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            pagine, libere = esito["prima"]["pagine"], conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if auto_vacuum == 2 and libere:
+                conn.execute("PRAGMA incremental_vacuum").fetchall()
+                passi.append(f"incremental_vacuum:{libere}")
+            elif auto_vacuum == 0 and libere >= max(_MIN_PAGINE_LIBERE, _vacuum_soglia() * pagine):
+                # conversione una tantum: da qui in poi basta l'incrementale
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+                passi.append(f"vacuum_conversione:{libere}")
+        except sqlite3.Error as e:
+            errori.append(f"vacuum: {e}")
+
+        # checkpoint WAL
+        try:
+            if (conn.execute("PRAGMA journal_mode").fetchone()[0] or "").lower() == "wal":
+                occupato, log, copiate = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+                esito["checkpoint"] = {"occupato": bool(occupato), "pagine_wal": log, "copiate": copiate}
+                passi.append("checkpoint" if not occupato else "checkpoint_parziale")
+        except sqlite3.Error as e:
+            errori.append(f"checkpoint: {e}")
+
+        esito["dopo"] = _misura(conn, path)
+    except sqlite3.Error as e:
+        errori.append(str(e))
+    finally:
+        conn.close()
+    esito["durata_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return esito
+
+
+# ─────────────────────────────────────────────
+# GIRO SU TUTTI I DB
+# ─────────────────────────────────────────────
+
+def esegui(completa: bool = False, solo: Optional[List[str]] = None,
+           finestra: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Manutenzione di tutti i DB del locale (o dei nomi in `solo`), uno dopo
+    l'altro. Un giro alla volta: se ce n'è già uno in corso ritorna subito.
+    """
+    if not _lock.acquire(blocking=False):
+        return {"eseguita": False, "motivo": "giro già in corso"}
+    try:
+        t0 = time.perf_counter()
+        stato = _leggi_stato()
+        esiti = []
+        for path in database():
+            if solo and path.name not in solo:
+                continue
+            info = stato["db"].setdefault(path.name, {})
+            esito = manutieni(path, ultima_analyze=info.get("ultima_analyze"), completa=completa)
+            if "analyze" in esito:
+                info["ultima_analyze"] = esito.pop("analyze")
+            info["ultimo_esito"] = esito
+            esiti.append(esito)
+            if esito["errori"]:
+                logger.warning("manutenzione %s: %s", path.name, "; ".join(esito["errori"]))
+        giro = {
+            "quando": datetime.now().isoformat(timespec="seconds"),
+            "finestra": finestra,
+            "durata_ms": round((time.perf_counter() - t0) * 1000, 1),
+            "db": len(esiti),
+            "errori": sum(1 for e in esiti if e["errori"]),
+            "bytes_recuperati": sum(
+                (e.get("prima", {}).get("file_bytes", 0) + e.get("prima", {}).get("wal_bytes", 0))
+                - (e.get("dopo", {}).get("file_bytes", 0) + e.get("dopo", {}).get("wal_bytes", 0))
+                for e in esiti if "dopo" in e
+            ),
+        }
+        stato["esecuzioni"] = (stato["esecuzioni"] + [giro])[-_MAX_ESECUZIONI:]
+        if finestra:
+            stato["ultima_finestra"] = finestra
+        try:
+            _scrivi_stato(stato)
+        except OSError as e:
+            logger.warning("stato manutenzione non salvato: %s", e)
+        logger.info(
+            "manutenzione DB: %d db in %s ms, %d byte recuperati, %d con errori",
+            giro["db"], giro["durata_ms"], giro["bytes_recuperati"], giro["errori"],
+        )
+        return {"eseguita": True, **giro, "esiti": esiti}
+    finally:
+        _lock.release()
+
+
+def stato() -> Dict[str, Any]:
+    """Per /system/db-manutenzione: config, finestra in corso, ultimi esiti per DB."""
+    s = _leggi_stato()
+    attuali = {}
+    for path in database():
+        attuali[path.name] = {
+            "file_bytes": _dimensione(path),
+            "wal_bytes": _dimensione(path.with_name(path.name + "-wal")),
+        }
+    return {
+        "abilitato": abilitato(),
+        "scheduler_attivo": _thread is not None and _thread.is_alive(),
+        "finestre": [f"{a}-{b}" for a, b in finestre()],
+        "finestra_attiva": finestra_attiva(),
+        "ultima_finestra": s.get("ultima_finestra"),
+        "analyze_giorni": _analyze_giorni(),
+        "vacuum_soglia": _vacuum_soglia(),
+        "attuali": attuali,
+        "db": s["db"],
+        "esecuzioni": s["esecuzioni"],
+    }
+
+
+# ─────────────────────────────────────────────
+# SCHEDULER
+# ─────────────────────────────────────────────
+
+def _ciclo() -> None:
+    while not _stop.wait(_RISVEGLIO_S):
+        try:
+            chiave = finestra_attiva()
+            if chiave and _leggi_stato().get("ultima_finestra") != chiave:
+                esegui(finestra=chiave)
+        except Exception as e:
+            logger.exception("scheduler manutenzione DB: %s", e)
+
+
+def avvia() -> bool:
+    """Avvia il thread daemon (idempotente). False se spento da config."""
+    global _thread
+    if not abilitato():
+        logger.info("manutenzione DB disattivata (TRGB_DB_MANUTENZIONE=0)")
+        return False
+    if _thread is not None and _thread.is_alive():
+        return True
+    _stop.clear()
+    _thread = threading.Thread(target=_ciclo, name="db-manutenzione", daemon=True)
+    _thread.start()
+    return True
+
+
+def ferma() -> None:
+    _stop.set()
@@ -0,0 +1,234 @@
+# @version: v1.0 — change-log per delta-sync (sessione 2026-10-19)
+# -*- coding: utf-8 -*-
+"""
+Change-log con cursore per le liste ricaricate dai tablet — TRGB Gestionale
+
+Modulo: platform
+Classificazione: [core]
+
+PERCHÉ ESISTE
+-------------
+Carta staff, calici in mescita e planning prenotazioni a ogni refresh
+(evento SSE o polling di fallback) riscaricano TUTTO: l'intera carta con
+locazioni e prezzi, la giornata intera con i dati cliente. Sul Wi-Fi del
+locale a sala piena sono centinaia di KB per dire "è cambiata una riga".
+
+COME FUNZIONA
+-------------
+In ogni DB interessato c'è una tabella `sync_changelog`:
+
+    seq     INTEGER PRIMARY KEY AUTOINCREMENT   -- cursore monotono, mai riusato
+    tabella TEXT                                -- tabella sorgente
+    pk      INTEGER                             -- id della riga toccata
+    rif     INTEGER                             -- id dell'entità "lista" (vedi sotto)
+    op      'U' | 'D'                           -- insert/update → U, delete → D
+
+alimentata da trigger AFTER INSERT/UPDATE/DELETE creati da `installa()`
+(vedi TABELLE): chi scrive non deve ricordarsi niente, import massivi e
+script compresi. `rif` è la riga della lista a cui la modifica si riferisce:
+per vini_bottiglie e clienti_prenotazioni è l'id stesso, per
+vini_magazzino_movimenti è il vino_id (un movimento cambia le giacenze del
+vino).
+
+Un endpoint che supporta il delta:
+    1. legge `cursore(conn)` PRIMA dei dati (una scrittura concorrente al
+       massimo verrà rimandata al giro dopo, mai persa);
+    2. senza `?since` risponde come sempre + header `X-Sync-Cursor`;
+    3. con `?since=N` chiama `toccati(conn, N, tabelle)`: gli `rif` modificati
+       dopo N. Rilegge SOLO quelle righe col filtro della lista: quelle che
+       tornano sono `upserts`, le altre (cancellate o uscite dal filtro, es.
+       vino tolto dalla carta) sono `deletes`. Vedi `risposta_delta()`.
+    4. se N è troppo vecchio (log potato) o non valido (DB ripristinato da
+       backup), o se sono cambiate più di MAX_TOCCATI righe (import massivo:
+       tanto vale la lista intera) → `reset: true` e lista completa negli
+       upserts.
+
+Potatura: `pota()` tiene le ultime TRGB_SYNC_LOG_RIGHE righe (default
+20000), chiamata al più ogni 10 minuti dagli endpoint delta. Un tablet
+rimasto spento più a lungo riceve un reset: è il caso giusto.
+
+Cosa NON copre: modifiche a tabelle collegate senza trigger (anagrafica
+clienti e tag nel planning, widget_settings per il prezzo calice di
+fallback). Il client fa comunque un giro completo su `resync` e al cambio
+pagina.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+logger = logging.getLogger("trgb.delta_sync")
+
+# tabella → colonna da usare come `rif` nei trigger
+TABELLE: Dict[str, str] = {
+    "vini_bottiglie": "id",
+    "vini_magazzino_movimenti": "vino_id",
+    "clienti_prenotazioni": "id",
+}
+
+_DEFAULT_RIGHE = 20000
+MAX_TOCCATI = 500          # oltre: reset (e `id IN (...)` resta sotto il limite di variabili)
+_POTATURA_OGNI_S = 600.0
+_ultima_potatura: Dict[str, float] = {}
+
+
+def _righe_max() -> int:
+    try:
+        return max(int(os.getenv("TRGB_SYNC_LOG_RIGHE") or _DEFAULT_RIGHE), 100)
+    except ValueError:
+        return _DEFAULT_RIGHE
+
+
+def _esiste(conn: sqlite3.Connection, tipo: str, nome: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (tipo, nome)
+    ).fetchone() is not None
+
+
+# ─────────────────────────────────────────────
+# DDL (idempotente, regola S52-1: check su sqlite_master prima di creare)
+# ─────────────────────────────────────────────
+
+def installa(conn: sqlite3.Connection, tabelle: Iterable[str]) -> int:
+    """
+    Crea sync_changelog e i trigger per le tabelle indicate (solo quelle che
+    esistono nel DB). Ritorna il numero di trigger creati. Non fa commit.
+    """
+    creati = 0
+    if not _esiste(conn, "table", "sync_changelog"):
+        conn.execute(
+            """
+            CREATE TABLE sync_changelog (
+                seq     INTEGER PRIMARY KEY AUTOINCREMENT,
+                tabella TEXT    NOT NULL,
+                pk      INTEGER NOT NULL,
+                rif     INTEGER,
+                op      TEXT    NOT NULL CHECK (op IN ('U', 'D')),
+                ts      TEXT    NOT NULL DEFAULT (datetime('now'))
+            )
+            """
+        )
+    if not _esiste(conn, "index", "idx_sync_changelog_tabella"):
+        conn.execute("CREATE INDEX idx_sync_changelog_tabella ON sync_changelog (tabella, seq)")
+
+    for tabella in tabelle:
+        rif = TABELLE[tabella]
+        if not _esiste(conn, "table", tabella):
+            continue
+        for evento, riga, op in (("INSERT", "NEW", "U"), ("UPDATE", "NEW", "U"), ("DELETE", "OLD", "D")):
+            nome = f"trg_sync_{tabella}_{evento.lower()}"
+            if _esiste(conn, "trigger", nome):
+                continue
+            conn.execute(
+                f"""
+                CREATE TRIGGER {nome} AFTER {evento} ON {tabella}
+                BEGIN
+                    INSERT INTO sync_changelog (tabella, pk, rif, op)
+                    VALUES ('{tabella}', {riga}.id, {riga}.{rif}, '{op}');
+                END
+                """
+            )
+            creati += 1
+    return creati
+
+
+# ─────────────────────────────────────────────
+# LETTURA
+# ─────────────────────────────────────────────
+
+def cursore(conn: sqlite3.Connection) -> int:
+    """Ultimo seq assegnato (anche se la riga è già stata potata)."""
+    row = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'sync_changelog'"
+    ).fetchone()
+    return int(row[0]) if row else 0
+
+
+def toccati(conn: sqlite3.Connection, since: int, tabelle: Sequence[str],
+            fino_a: Optional[int] = None) -> Optional[Set[int]]:
+    """
+    `rif` modificati con since < seq <= fino_a nelle tabelle indicate.
+    None = serve un reset: log potato oltre `since`, cursore dal futuro
+    (restore da backup) o più di MAX_TOCCATI righe cambiate.
+    """
+    fino_a = cursore(conn) if fino_a is None else fino_a
+    if since < 0 or since > fino_a:
+        return None
+    if since == fino_a:
+        return set()
+    primo = conn.execute("SELECT MIN(seq) FROM sync_changelog").fetchone()[0]
+    if primo is None or since < primo - 1:
+        return None
+    segnaposti = ",".join("?" * len(tabelle))
+    righe = conn.execute(
+        f"SELECT DISTINCT rif FROM sync_changelog "
+        f"WHERE seq > ? AND seq <= ? AND tabella IN ({segnaposti}) AND rif IS NOT NULL "
+        f"LIMIT ?",
+        (since, fino_a, *tabelle, MAX_TOCCATI + 1),
+    ).fetchall()
+    if len(righe) > MAX_TOCCATI:
+        return None
+    return {int(r[0]) for r in righe}
+
+
+def filtro_ids(colonna: str, ids: Optional[Set[int]]) -> tuple:
+    """(condizione SQL, params) per rileggere solo `ids`; "1" se ids è None (lista intera)."""
+    if ids is None:
+        return "1", []
+    if not ids:
+        return "0", []
+    return f"{colonna} IN ({','.join('?' * len(ids))})", sorted(ids)
+
+
+def leggi(conn: sqlite3.Connection, since: Optional[int], tabelle: Sequence[str],
+          chiave_db: str) -> tuple:
+    """
+    Primo passo di ogni endpoint delta: (cursore, ids, reset).
+    ids None = serve la lista intera (niente `since`, oppure reset).
+    """
+    attuale = cursore(conn)
+    ids = None if since is None else toccati(conn, since, tabelle, fino_a=attuale)
+    pota(conn, chiave_db)
+    return attuale, ids, since is not None and ids is None
+
+
+def risposta_delta(cursore_attuale: int, upserts: List[Dict[str, Any]], toccati_ids: Optional[Set[int]],
+                   chiave: str = "id", reset: bool = False) -> Dict[str, Any]:
+    """Corpo standard della risposta `?since=`: upserts + deletes (id)."""
+    presenti = {u[chiave] for u in upserts}
+    return {
+        "cursor": cursore_attuale,
+        "reset": reset,
+        "upserts": upserts,
+        "deletes": [] if reset else sorted((toccati_ids or set()) - presenti),
+    }
+
+
+# ─────────────────────────────────────────────
+# MANUTENZIONE
+# ─────────────────────────────────────────────
+
+def pota(conn: sqlite3.Connection, chiave_db: str, forza: bool = False) -> int:
+    """
+    Tiene le ultime TRGB_SYNC_LOG_RIGHE righe del log. Throttled per DB
+    (`chiave_db`), best-effort: un errore non deve far fallire la lettura.
+    """
+    adesso = time.monotonic()
+    if not forza and adesso - _ultima_potatura.get(chiave_db, 0.0) < _POTATURA_OGNI_S:
+        return 0
+    _ultima_potatura[chiave_db] = adesso
+    try:
+        soglia = cursore(conn) - _righe_max()
+        if soglia <= 0:
+            return 0
+        cur = conn.execute("DELETE FROM sync_changelog WHERE seq <= ?", (soglia,))
+        conn.commit()
+        return cur.rowcount
+    except sqlite3.Error as e:
+        logger.warning("potatura sync_changelog (%s) fallita: %s", chiave_db, e)
+        return 0
+
@@ -0,0 +1,286 @@
+# @version: v1.1 — Hub eventi SSE, id evento con epoca di avvio (sessione 2026-10-19)
+# -*- coding: utf-8 -*-
+"""
+Hub eventi server-push (SSE) — TRGB Gestionale
+
+Modulo: platform
+Classificazione: [core]
+
+PERCHÉ ESISTE
+-------------
+Durante il servizio i tablet restano aperti su mappa tavoli, carta staff e
+cantina mobile e ognuno ricarica tutto a intervallo fisso (30-90s), più la
+campanella che chiede /notifiche/contatore ogni minuto. Quasi sempre non è
+cambiato niente: il grosso delle richieste del locale a sala piena è
+polling a vuoto, e quando qualcosa cambia lo si vede comunque in ritardo.
+
+COME FUNZIONA
+-------------
+Chi scrive pubblica un evento tipizzato DOPO il commit:
+
+    from app.services import eventi_hub
+    eventi_hub.pubblica("prenotazione", {"id": 42, "data_pasto": "2026-10-19",
+                                         "turno": "cena", "azione": "stato"})
+
+Tipi in uso: notifica, comunicazione, prenotazione, tavolo, cantina,
+fic_sync (vedi TIPI). Il payload è piccolo: dice COSA è cambiato, il client
+ricarica solo la vista interessata (niente dati sensibili nello stream).
+
+Ogni client apre UNA connessione `GET /eventi/stream` (eventi_router) e
+riceve `id: <epoca>-<seq>` / `event: <tipo>` / `data: <json>`. Le notifiche
+rispettano i destinatari (dest_username / dest_ruolo / globali), come
+notifiche_service.get_notifiche_utente.
+
+- Un solo worker uvicorn → hub in memoria, niente broker. `pubblica()` è
+  thread-safe: gli endpoint sync girano nel threadpool, la consegna passa
+  per `loop.call_soon_threadsafe` verso la coda asyncio del client.
+- Gli ultimi TRGB_SSE_BUFFER eventi (default 500) restano in un ring buffer:
+  alla riconnessione il browser manda Last-Event-ID e riceve quelli persi.
+  Se il buffer non copre il buco (o la coda del client si è riempita) arriva
+  un evento `resync`: il client ricarica tutto una volta.
+- La sequenza riparte da 1 a ogni avvio del backend: l'id porta anche
+  l'epoca di avvio (`_EPOCA`). Un Last-Event-ID di un altro avvio, illeggibile
+  o più avanti della sequenza corrente → `resync` (altrimenti il client, con
+  un numero più alto di quelli nuovi, perderebbe in silenzio gli eventi).
+- Ping (commento SSE) ogni TRGB_SSE_PING_S (default 20s) per tenere viva la
+  connessione attraverso nginx; `X-Accel-Buffering: no` sulla risposta.
+- Ogni stream dura al massimo TRGB_SSE_DURATA_S (default 900s) e mai oltre
+  la scadenza del token: il client si riconnette (con Last-Event-ID) e il
+  token viene rivalidato. Tiene anche corti i restart del backend.
+- TRGB_SSE=0 spegne l'hub: /eventi/stream risponde 503 e i client restano
+  sul polling (che è il loro fallback).
+
+Diagnostica: `stato()` → GET /system/eventi (admin).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+logger = logging.getLogger("trgb.eventi_hub")
+
+TIPI = ("notifica", "comunicazione", "prenotazione", "tavolo", "cantina", "fic_sync")
+
+_DEFAULT_BUFFER = 500
+_DEFAULT_CODA = 200
+_DEFAULT_PING_S = 20.0
+_DEFAULT_DURATA_S = 900.0
+_DEFAULT_MAX_CONNESSIONI = 100
+
+_lock = threading.Lock()
+# Epoca di avvio (ms in esadecimale): distingue gli id di due avvii diversi
+_EPOCA = format(int(time.time() * 1000), "x")
+_seq = 0
+_buffer: deque = deque(maxlen=_DEFAULT_BUFFER)
+_iscritti: Dict[int, "_Iscritto"] = {}
+_stats = {"pubblicati": 0, "consegnati": 0, "resync": 0, "connessioni_totali": 0, "rifiutate": 0}
+_per_tipo: Dict[str, int] = {}
+
+
+# ─────────────────────────────────────────────
+# CONFIG
+# ─────────────────────────────────────────────
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+def abilitato() -> bool:
+    """TRGB_SSE=0 spegne l'hub (i client tornano al polling)."""
+    return (os.getenv("TRGB_SSE") or "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _dimensiona_buffer() -> None:
+    global _buffer
+    n = int(_env_num("TRGB_SSE_BUFFER", _DEFAULT_BUFFER))
+    if n != _buffer.maxlen:
+        _buffer = deque(_buffer, maxlen=max(n, 10))
+
+
+# ─────────────────────────────────────────────
+# ISCRITTI
+# ─────────────────────────────────────────────
+
+class _Iscritto:
+    """Un client connesso: coda asyncio sul loop del server + filtri."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, username: str, ruolo: str,
+                 tipi: Optional[Iterable[str]]):
+        self.loop = loop
+        self.username = username
+        self.ruolo = ruolo
+        self.tipi = set(tipi) if tipi else None
+        self.coda: asyncio.Queue = asyncio.Queue(maxsize=int(_env_num("TRGB_SSE_CODA", _DEFAULT_CODA)))
+        self.aperto_il = time.time()
+        self.consegnati = 0
+
+    def vuole(self, evento: dict) -> bool:
+        if self.tipi is not None and evento["tipo"] not in self.tipi:
+            return False
+        dest_u, dest_r = evento.get("_dest") or (None, None)
+        if dest_u is None and dest_r is None:
+            return True
+        return dest_u == self.username or dest_r == self.ruolo
+
+    def metti(self, evento: dict) -> None:
+        """Gira sul loop del server (via call_soon_threadsafe)."""
+        try:
+            self.coda.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Client troppo lento (tablet in standby con la TCP ancora su):
+            # buttiamo la coda e gli diciamo di ricaricare tutto.
+            while not self.coda.empty():
+                self.coda.get_nowait()
+            self.coda.put_nowait({"id": evento["id"], "seq": evento["seq"], "tipo": "resync",
+                                  "dati": {"motivo": "coda_piena"}})
+            with _lock:
+                _stats["resync"] += 1
+
+
+def pubblica(tipo: str, dati: Optional[Dict[str, Any]] = None, *,
+             dest_username: Optional[str] = None, dest_ruolo: Optional[str] = None) -> int:
+    """
+    Pubblica un evento a tutti i client interessati. Ritorna il numero di
+    sequenza (0 se l'hub è spento). Best-effort: non solleva mai, chi scrive
+    non deve fallire perché nessuno sta ascoltando.
+    """
+    global _seq
+    if not abilitato():
+        return 0
+    try:
+        with _lock:
+            _dimensiona_buffer()
+            _seq += 1
+            evento = {"id": f"{_EPOCA}-{_seq}", "seq": _seq, "tipo": tipo,
+                      "ts": time.time(), "dati": dati or {}}
+            if dest_username is not None or dest_ruolo is not None:
+                evento["_dest"] = (dest_username, dest_ruolo)
+            _buffer.append(evento)
+            _stats["pubblicati"] += 1
+            _per_tipo[tipo] = _per_tipo.get(tipo, 0) + 1
+            destinatari = [i for i in _iscritti.values() if i.vuole(evento)]
+        for iscritto in destinatari:
+            try:
+                iscritto.loop.call_soon_threadsafe(iscritto.metti, evento)
+            except RuntimeError:
+                pass  # loop chiuso (shutdown): lo stream sta già finendo
+        return evento["seq"]
+    except Exception as e:
+        logger.warning("pubblica(%s) fallita: %s", tipo, e)
+        return 0
+
+
+def _formatta(evento: dict) -> str:
+    dati = json.dumps(evento["dati"], ensure_ascii=False, default=str)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {dati}\n\n"
+
+
+def _resync(motivo: str) -> dict:
+    """Sotto _lock."""
+    _stats["resync"] += 1
+    return {"id": f"{_EPOCA}-{_seq}", "seq": _seq, "tipo": "resync", "dati": {"motivo": motivo}}
+
+
+def _arretrati(iscritto: _Iscritto, last_event_id: Optional[str]) -> List[dict]:
+    """Eventi persi durante la disconnessione, o un resync se non si possono ricostruire."""
+    if not last_event_id:
+        return []
+    epoca, _, seq = last_event_id.partition("-")
+    with _lock:
+        if not seq.isdigit():
+            return [_resync("id_non_valido")]
+        if epoca != _EPOCA or int(seq) > _seq:
+            # Backend riavviato: la sequenza è ripartita, gli eventi persi
+            # prima del riavvio non sono più da nessuna parte.
+            return [_resync("riavvio")]
+        ultimo = int(seq)
+        if ultimo == _seq:
+            return []
+        primo = _buffer[0]["seq"] if _buffer else _seq + 1
+        if ultimo < primo - 1:
+            return [_resync("buffer_superato")]
+        return [e for e in _buffer if e["seq"] > ultimo and iscritto.vuole(e)]
+
+
+def posti_liberi() -> bool:
+    with _lock:
+        ok = len(_iscritti) < int(_env_num("TRGB_SSE_MAX_CONNESSIONI", _DEFAULT_MAX_CONNESSIONI))
+        if not ok:
+            _stats["rifiutate"] += 1
+        return ok
+
+
+async def flusso(username: str, ruolo: str, tipi: Optional[Iterable[str]] = None,
+                 last_event_id: Optional[str] = None,
+                 scadenza: Optional[float] = None) -> AsyncIterator[str]:
+    """
+    Generatore SSE per StreamingResponse. Termina da solo dopo
+    TRGB_SSE_DURATA_S o alla `scadenza` (epoch) del token, se prima.
+    La disconnessione del client lo cancella (Starlette): il finally deregistra.
+    """
+    iscritto = _Iscritto(asyncio.get_running_loop(), username, ruolo, tipi)
+    chiave = id(iscritto)
+    with _lock:
+        _iscritti[chiave] = iscritto
+        _stats["connessioni_totali"] += 1
+    ping_s = max(_env_num("TRGB_SSE_PING_S", _DEFAULT_PING_S), 1.0)
+    fine = time.monotonic() + _env_num("TRGB_SSE_DURATA_S", _DEFAULT_DURATA_S)
+    if scadenza is not None:
+        fine = min(fine, time.monotonic() + max(scadenza - time.time(), 0))
+    try:
+        # retry: attesa del browser prima di riconnettersi a stream chiuso
+        yield f"retry: 5000\n: trgb eventi epoca={_EPOCA} seq={_seq}\n\n"
+        for evento in _arretrati(iscritto, last_event_id):
+            iscritto.consegnati += 1
+            yield _formatta(evento)
+        while True:
+            resta = fine - time.monotonic()
+            if resta <= 0:
+                return
+            try:
+                evento = await asyncio.wait_for(iscritto.coda.get(), timeout=min(ping_s, resta))
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            iscritto.consegnati += 1
+            with _lock:
+                _stats["consegnati"] += 1
+            yield _formatta(evento)
+    finally:
+        with _lock:
+            _iscritti.pop(chiave, None)
+
+
+# ─────────────────────────────────────────────
+# DIAGNOSTICA
+# ─────────────────────────────────────────────
+
+def stato() -> dict:
+    adesso = time.time()
+    with _lock:
+        return {
+            "abilitato": abilitato(),
+            "epoca": _EPOCA,
+            "seq": _seq,
+            "buffer": {"eventi": len(_buffer), "max": _buffer.maxlen,
+                       "primo_id": _buffer[0]["id"] if _buffer else None},
+            **_stats,
+            "per_tipo": dict(_per_tipo),
+            "connessi": [
+                {"username": i.username, "ruolo": i.ruolo,
+                 "tipi": sorted(i.tipi) if i.tipi else None,
+                 "da_s": round(adesso - i.aperto_il), "consegnati": i.consegnati,
+                 "in_coda": i.coda.qsize()}
+                for i in _iscritti.values()
+            ],
+        }
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-# @version: v2.1-3-dimensioni (2026-05-18)
+# @version: v2.2-stato-materializzato (2026-10-19)
 # -*- coding: utf-8 -*-
 """
 Servizio gestione stati pagamento fattura — UNIFICATO post G.5.
@@ -13,8 +13,19 @@ MODELLO 3-DIMENSIONI (vedi docs/stato_pagamento_unificato.md §15):
 
 Da G.5 in poi, c'è UNA SOLA fonte di verità: `cg_uscite.stato`.
 Le ex colonne `fe_fatture.pagato` e `fe_fatture.stato_pagamento` sono state
-rimosse fisicamente (mig 112). La VIEW `fe_fatture_with_stato` le ricostruisce
-al volo per le query di lettura.
+rimosse fisicamente (mig 112). La VIEW `fe_fatture_with_stato` le ricostruiva
+al volo con una JOIN su cg_uscite a ogni lettura.
+
+Dal 2026-10-19 (mig 177) lo stato è MATERIALIZZATO su fe_fatture:
+  - `cg_uscite_stato`: copia di cg_uscite.stato, scritta SOLO dai trigger
+    trg_fe_stato_* su cg_uscite (insert/delete/update di stato o fattura_id).
+    Ogni transizione di questo service passa da UPDATE cg_uscite, quindi
+    resta allineata senza codice in più.
+  - `pagato`, `stato_pagamento`, `cg_uscite_stato_macro`: colonne GENERATED
+    VIRTUAL derivate da cg_uscite_stato (stessa mappatura della VIEW).
+  - indici su (pagato, data_scadenza) e cg_uscite_stato per i filtri caldi.
+La VIEW resta come alias `SELECT * FROM fe_fatture` per il codice esistente.
+Rete di sicurezza: `verifica_stato_materializzato()` confronta e ripara.
 
 Mappatura semantica stato_pagamento (legacy esposto al frontend) ↔ cg_uscite.stato:
     'da_pagare'        ⟷  'PROGRAMMATO'
@@ -76,6 +87,150 @@ CG_TO_LEGACY = {
 }
 
 
+# ─────────────────────────────────────────────
+# Stato materializzato su fe_fatture (mig 177)
+# ─────────────────────────────────────────────
+
+# Stato dell'uscita collegata a una fattura (alias `{f}` = id fattura).
+# Se le uscite sono più d'una vince la prima, come in _get_cg_uscita_id.
+_SQL_STATO_USCITA = (
+    "(SELECT u.stato FROM cg_uscite u WHERE u.fattura_id = {f} ORDER BY u.id LIMIT 1)"
+)
+
+# Colonne derivate: stessa mappatura della VIEW fe_fatture_with_stato (mig 116)
+_COLONNE_GENERATE = {
+    "pagato": (
+        "INTEGER GENERATED ALWAYS AS (CASE cg_uscite_stato "
+        "WHEN 'PAGATO' THEN 1 WHEN 'PAGATO_MANUALE' THEN 1 ELSE 0 END) VIRTUAL"
+    ),
+    "stato_pagamento": (
+        "TEXT GENERATED ALWAYS AS (CASE cg_uscite_stato "
+        "WHEN 'PAGATO' THEN 'pagato' WHEN 'PAGATO_MANUALE' THEN 'pagato_manuale' "
+        "WHEN 'VERIFICARE' THEN 'da_verificare' WHEN 'PARZIALE' THEN 'da_verificare' "
+        "ELSE 'da_pagare' END) VIRTUAL"
+    ),
+    "cg_uscite_stato_macro": (
+        "TEXT GENERATED ALWAYS AS (CASE WHEN cg_uscite_stato IN ('PAGATO', 'PAGATO_MANUALE') "
+        "THEN 'CHIUSO' ELSE 'APERTO' END) VIRTUAL"
+    ),
+}
+
+
+def _ricalcola(alias: str) -> str:
+    return (
+        f"UPDATE fe_fatture SET cg_uscite_stato = {_SQL_STATO_USCITA.format(f=alias + '.fattura_id')} "
+        f"WHERE id = {alias}.fattura_id;"
+    )
+
+
+_TRIGGER_STATO = {
+    "trg_fe_stato_uscite_ins": (
+        "AFTER INSERT ON cg_uscite FOR EACH ROW WHEN NEW.fattura_id IS NOT NULL",
+        _ricalcola("NEW"),
+    ),
+    "trg_fe_stato_uscite_del": (
+        "AFTER DELETE ON cg_uscite FOR EACH ROW WHEN OLD.fattura_id IS NOT NULL",
+        _ricalcola("OLD"),
+    ),
+    "trg_fe_stato_uscite_upd": (
+        "AFTER UPDATE OF stato, fattura_id ON cg_uscite FOR EACH ROW "
+        "WHEN OLD.stato IS NOT NEW.stato OR OLD.fattura_id IS NOT NEW.fattura_id",
+        _ricalcola("OLD") + " " + _ricalcola("NEW"),
+    ),
+}
+
+_VIEW_STATO = "CREATE VIEW fe_fatture_with_stato AS SELECT * FROM fe_fatture"
+
+
+def stato_materializzato(conn) -> bool:
+    """True se colonne e trigger del mig 177 sono presenti."""
+    n = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?, ?)",
+        tuple(_TRIGGER_STATO),
+    ).fetchone()[0]
+    return n == len(_TRIGGER_STATO)
+
+
+def installa_stato_materializzato(conn) -> bool:
+    """
+    Colonne (cg_uscite_stato + generate), backfill, trigger su cg_uscite,
+    indici e VIEW alias. Idempotente (regola S52-1). Non fa commit.
+    False se fe_fatture o cg_uscite non esistono ancora.
+    """
+    tabelle = {
+        r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('fe_fatture', 'cg_uscite')"
+        ).fetchall()
+    }
+    if tabelle != {"fe_fatture", "cg_uscite"}:
+        return False
+
+    # table_xinfo: include le colonne GENERATED (table_info le nasconde)
+    colonne = {r[1] for r in conn.execute("PRAGMA table_xinfo(fe_fatture)").fetchall()}
+    if "cg_uscite_stato" not in colonne:
+        conn.execute("ALTER TABLE fe_fatture ADD COLUMN cg_uscite_stato TEXT")
+    for nome, definizione in _COLONNE_GENERATE.items():
+        if nome not in colonne:
+            conn.execute(f"ALTER TABLE fe_fatture ADD COLUMN {nome} {definizione}")
+
+    if not stato_materializzato(conn):
+        conn.execute(
+            f"UPDATE fe_fatture SET cg_uscite_stato = {_SQL_STATO_USCITA.format(f='fe_fatture.id')}"
+        )
+        for nome, (evento, corpo) in _TRIGGER_STATO.items():
+            conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+            conn.execute(f"CREATE TRIGGER {nome} {evento} BEGIN {corpo} END")
+
+    indici = {
+        r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+    }
+    if "idx_fe_fatture_pagato_scadenza" not in indici:
+        conn.execute("CREATE INDEX idx_fe_fatture_pagato_scadenza ON fe_fatture(pagato, data_scadenza)")
+    if "idx_fe_fatture_cg_stato" not in indici:
+        conn.execute("CREATE INDEX idx_fe_fatture_cg_stato ON fe_fatture(cg_uscite_stato)")
+
+    view = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'fe_fatture_with_stato'"
+    ).fetchone()
+    if view is None or "JOIN" in (view[0] or "").upper():
+        conn.execute("DROP VIEW IF EXISTS fe_fatture_with_stato")
+        conn.execute(_VIEW_STATO)
+    return True
+
+
+def verifica_stato_materializzato(conn, ripara: bool = True, max_dettagli: int = 50) -> dict:
+    """
+    Job di coerenza: fatture con fe_fatture.cg_uscite_stato diverso da
+    cg_uscite.stato (scritture con trigger disattivati, restore parziali,
+    DB copiati a mano). Con ripara=True le riallinea e fa commit.
+    """
+    if not stato_materializzato(conn):
+        return {"ok": False, "error": "stato materializzato non installato (mig 177)"}
+    divergenti = conn.execute(f"""
+        SELECT f.id, f.cg_uscite_stato AS materializzato, {_SQL_STATO_USCITA.format(f='f.id')} AS atteso
+        FROM fe_fatture f
+        WHERE f.cg_uscite_stato IS NOT {_SQL_STATO_USCITA.format(f='f.id')}
+    """).fetchall()
+    riparate = 0
+    if divergenti and ripara:
+        for r in divergenti:
+            conn.execute("UPDATE fe_fatture SET cg_uscite_stato = ? WHERE id = ?", (r[2], r[0]))
+        conn.commit()
+        riparate = len(divergenti)
+        logger.warning(f"[stato_pagamento] {riparate} fatture con stato materializzato riallineate")
+    totale = conn.execute("SELECT COUNT(*) FROM fe_fatture").fetchone()[0]
+    return {
+        "ok": True,
+        "fatture": totale,
+        "divergenti": len(divergenti),
+        "riparate": riparate,
+        "dettagli": [
+            {"fattura_id": r[0], "materializzato": r[1], "atteso": r[2]}
+            for r in divergenti[:max_dettagli]
+        ],
+    }
+
+
 def _get_cg_uscita_id(conn, fattura_id: int) -> Optional[int]:
     """Ritorna l'id della riga cg_uscite per la fattura, o None se manca."""
     row = conn.execute(
@@ -177,7 +332,7 @@ def set_stato(conn, fattura_id: int, nuovo_stato: str, *, force: bool = False) -
     Internamente:
       - Mappa nuovo_stato → cg_uscite.stato canonico
       - Crea cg_uscite stub se manca
-      - UPDATE cg_uscite.stato → la VIEW fe_fatture_with_stato si aggiorna automaticamente
+      - UPDATE cg_uscite.stato → i trigger trg_fe_stato_* riallineano fe_fatture
 
     Returns:
         {ok: bool, fattura_id, vecchio_stato, nuovo_stato, error?}
@@ -0,0 +1,171 @@
+# @version: v1.0 — elenco fatture: n_righe materializzato + totali in cache (sessione 2026-10-19)
+# -*- coding: utf-8 -*-
+"""
+Supporto all'elenco fatture (GET /contabilita/fe/fatture) — TRGB Gestionale
+
+Modulo: acquisti
+Classificazione: [core]
+
+PERCHÉ ESISTE
+-------------
+L'elenco fatture faceva, a ogni pagina:
+  - un COUNT(*)/SUM sull'intero insieme filtrato (uguale per tutte le pagine);
+  - un `(SELECT COUNT(*) FROM fe_righe ...)` correlato per OGNI riga;
+  - LIMIT/OFFSET fino a 50.000: la pagina N rilegge e scarta le N-1 prima.
+
+COME FUNZIONA
+-------------
+1. `fe_fatture.n_righe` è tenuto allineato da trigger su fe_righe
+   (insert/delete/spostamento di fattura_id). `installa()` aggiunge la
+   colonna, la popola una volta e crea i trigger: la chiama la migrazione
+   176 e, per i DB nati dopo, `fe_import._ensure_tables`.
+
+2. `totali()` tiene in memoria COUNT/SUM per combinazione di filtri. La
+   chiave include i contatori di versione di http_cache (cache_versioni)
+   delle tabelle lette: un import, una modifica fattura o una
+   ricategorizzazione fornitore cambiano la chiave, niente invalidazioni
+   a mano. Senza contatori (trigger assenti) si calcola ogni volta.
+
+3. Paginazione keyset: `cursore()` / `leggi_cursore()` codificano
+   l'ultima riga servita (data_fattura, id). La pagina dopo riparte con
+   `(data_fattura, id) < (?, ?)` sull'indice idx_fe_fatture_data_id invece
+   di saltare OFFSET righe.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence, Tuple
+
+from app.services import http_cache
+
+logger = logging.getLogger("trgb.fe_elenco")
+
+# Tabelle lette dalla query dei totali (chiave della cache)
+TABELLE_TOTALI = ("fe_fatture", "fe_fornitore_categoria", "fe_categorie")
+
+_MAX_VOCI = 256
+_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+_lock = threading.Lock()
+
+_TRIGGER = {
+    "trg_fe_righe_n_ins": (
+        "AFTER INSERT ON fe_righe",
+        "UPDATE fe_fatture SET n_righe = n_righe + 1 WHERE id = NEW.fattura_id;",
+    ),
+    "trg_fe_righe_n_del": (
+        "AFTER DELETE ON fe_righe",
+        "UPDATE fe_fatture SET n_righe = n_righe - 1 WHERE id = OLD.fattura_id;",
+    ),
+    "trg_fe_righe_n_upd": (
+        "AFTER UPDATE OF fattura_id ON fe_righe FOR EACH ROW WHEN OLD.fattura_id IS NOT NEW.fattura_id",
+        "UPDATE fe_fatture SET n_righe = n_righe - 1 WHERE id = OLD.fattura_id; "
+        "UPDATE fe_fatture SET n_righe = n_righe + 1 WHERE id = NEW.fattura_id;",
+    ),
+}
+
+
+# ─────────────────────────────────────────────
+# SCHEMA (idempotente, regola S52-1)
+# ─────────────────────────────────────────────
+
+def installato(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?, ?)",
+        tuple(_TRIGGER),
+    ).fetchone()[0] == len(_TRIGGER)
+
+
+def installa(conn: sqlite3.Connection) -> bool:
+    """
+    Colonna n_righe (+ backfill), trigger di allineamento e indice
+    (data_fattura, id). False se fe_fatture/fe_righe non esistono ancora.
+    Non fa commit.
+    """
+    tabelle = {
+        r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('fe_fatture', 'fe_righe')"
+        ).fetchall()
+    }
+    if tabelle != {"fe_fatture", "fe_righe"}:
+        return False
+
+    colonne = {r[1] for r in conn.execute("PRAGMA table_info(fe_fatture)").fetchall()}
+    if "n_righe" not in colonne:
+        conn.execute("ALTER TABLE fe_fatture ADD COLUMN n_righe INTEGER NOT NULL DEFAULT 0")
+    if not installato(conn):
+        # backfill nello stesso giro dei trigger: da qui in poi li tengono loro
+        conn.execute(
+            """
+            UPDATE fe_fatture SET n_righe = (
+                SELECT COUNT(*) FROM fe_righe r WHERE r.fattura_id = fe_fatture.id
+            )
+            """
+        )
+        for nome, (evento, corpo) in _TRIGGER.items():
+            conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+            conn.execute(f"CREATE TRIGGER {nome} {evento} BEGIN {corpo} END")
+    if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_fe_fatture_data_id'"
+    ).fetchone() is None:
+        conn.execute("CREATE INDEX idx_fe_fatture_data_id ON fe_fatture(data_fattura, id)")
+    return True
+
+
+# ─────────────────────────────────────────────
+# TOTALI PER FILTRO
+# ─────────────────────────────────────────────
+
+def totali(conn: sqlite3.Connection, sql: str, params: Sequence) -> dict:
+    """
+    Esegue (o recupera dalla cache) la query dei totali `sql` — deve
+    ritornare una riga (cnt, tot) e leggere solo TABELLE_TOTALI.
+    """
+    try:
+        versioni = http_cache.versioni("foodcost.db", TABELLE_TOTALI)
+    except sqlite3.Error as e:
+        logger.warning("contatori non leggibili, totali senza cache: %s", e)
+        versioni = None
+
+    chiave = None
+    if versioni is not None:
+        chiave = (sql, tuple(params), tuple(versioni[t] for t in TABELLE_TOTALI))
+        with _lock:
+            trovato = _cache.get(chiave)
+            if trovato is not None:
+                _cache.move_to_end(chiave)
+                return dict(trovato)
+
+    riga = conn.execute(sql, params).fetchone()
+    risultato = {"cnt": riga[0] or 0, "tot": riga[1] or 0}
+    if chiave is not None:
+        with _lock:
+            _cache[chiave] = risultato
+            while len(_cache) > _MAX_VOCI:
+                _cache.popitem(last=False)
+    return dict(risultato)
+
+
+def svuota() -> None:
+    with _lock:
+        _cache.clear()
+
+
+# ─────────────────────────────────────────────
+# CURSORE KEYSET
+# ─────────────────────────────────────────────
+
+def cursore(data_fattura: Optional[str], fattura_id: int) -> str:
+    """"<id>:<data>" — senza ':' quando la data è NULL."""
+    return str(fattura_id) if data_fattura is None else f"{fattura_id}:{data_fattura}"
+
+
+def leggi_cursore(valore: str) -> Optional[Tuple[Optional[str], int]]:
+    """(data_fattura, id) oppure None se il cursore non è valido."""
+    testa, sep, data = valore.partition(":")
+    if not testa.isdigit():
+        return None
+    return (data if sep else None), int(testa)
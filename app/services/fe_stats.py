@@ -0,0 +1,748 @@
+# @version: v1.2 — aggregati fornitore × mese × categoria per le statistiche acquisti, baseline nel rilevamento anomalie (sessione 2026-10-19)
+# -*- coding: utf-8 -*-
+"""
+Aggregati per le statistiche Acquisti (/contabilita/fe/stats/*) — TRGB Gestionale
+
+Modulo: acquisti
+Classificazione: [core]
+
+PERCHÉ ESISTE
+-------------
+La dashboard Acquisti apre in parallelo kpi, per-categoria, top-fornitori,
+mensili, confronto-annuale e anomalie; l'elenco fornitori chiama
+stats/fornitori. Ognuno rifaceva da zero la sua aggregazione su
+fe_fatture / fe_righe (con l'OR-join su fe_fornitore_categoria riga per
+riga): sei scansioni complete dello storico per disegnare una pagina,
+tutte uguali finché non arriva una fattura nuova.
+
+COME FUNZIONA
+-------------
+Due tabelle di aggregati, una riga per (mese, fornitore[, categoria]):
+
+  fe_stats_fornitori_mese   periodo 'YYYY-MM', fornitore_nome, fornitore_piva,
+                            chiave (piva, o nome se piva vuota), n_fatture,
+                            totale, primo/ultimo acquisto, n_con_scadenza
+  fe_stats_righe_mese       stessa chiave + categoria_id, livello 'C' (per
+                            categoria) o 'S' (per categoria+sottocategoria):
+                            n_righe, n_auto, e le stesse misure sulle sole
+                            righe con descrizione (n_righe_desc, totale_desc,
+                            n_fatture_desc)
+
+Autofatture e fatture senza data sono escluse in partenza, come in tutte
+le statistiche. Gli aggregati NON contengono categoria ed esclusione del
+fornitore: fe_fornitore_categoria e fe_categorie si agganciano in lettura
+(tabelle piccole), quindi ricategorizzare un fornitore non sporca niente.
+
+Aggiornamento incrementale: i trigger su fe_fatture e fe_righe accodano in
+`fe_stats_dirty` il mese della fattura toccata (import, modifica,
+ricategorizzazione di una riga). `aggiorna()`, chiamata all'inizio di ogni
+endpoint stats, svuota la coda e ricalcola SOLO quei mesi; '*' (messo da
+`installa()`) = ricostruzione completa. Un ricalcolo alla volta per
+processo: le richieste parallele della dashboard aspettano il primo e
+trovano la coda vuota.
+
+Baseline per le anomalie: `fe_stats_baseline` tiene per (chiave, mese) la
+spesa del mese e la media mensile dei 12 mesi precedenti. Si ricalcola
+insieme ai mesi sporchi (un mese entra nella finestra dei 12 successivi).
+/stats/anomalie la usa per i fornitori abituali (attivi in almeno
+MESI_ATTIVI_ABITUALE dei 12 mesi): spesa dell'ultimo mese chiuso contro la
+media.
+
+Il confronto "stesso periodo dell'anno prima" (kpi, anomalie) taglia a un
+giorno preciso: i mesi interi vengono dagli aggregati, il mese del taglio
+si legge in diretta da fe_fatture (un mese, su indice).
+
+Uso:
+    from app.services import fe_stats
+    fe_stats.aggiorna(conn)
+    fe_stats.mensili(conn, 2026)
+"""
+
+from __future__ import annotations
+
+import datetime
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger("trgb.fe_stats")
+
+_lock = threading.Lock()
+# Un solo aggiorna() alla volta: la dashboard chiama sei endpoint stats in
+# parallelo e senza questo ognuno ricalcolerebbe gli stessi mesi (dopo
+# installa() sei ricostruzioni complete) contendendosi il lock di scrittura.
+_lock_aggiorna = threading.Lock()
+_stats = {"mesi_ricalcolati": 0, "ricostruzioni": 0}
+
+TABELLE = ("fe_stats_fornitori_mese", "fe_stats_righe_mese", "fe_stats_baseline", "fe_stats_dirty")
+
+# Finestra della baseline (mesi precedenti al mese di riferimento)
+MESI_BASELINE = 12
+# Sotto questi mesi attivi nella finestra la media (su 12) non dice niente:
+# un fornitore occasionale risulta "sopra media" in ogni mese in cui compra
+MESI_ATTIVI_ABITUALE = 10
+
+# Colonne di fe_fatture / fe_righe che cambiano gli aggregati
+_COL_FATTURE = "data_fattura, totale_fattura, fornitore_nome, fornitore_piva, is_autofattura, data_scadenza"
+_COL_RIGHE = "fattura_id, prezzo_totale, descrizione, categoria_id, sottocategoria_id, categoria_auto"
+
+_CHIAVE_F = (
+    "CASE WHEN f.fornitore_piva IS NOT NULL AND f.fornitore_piva != '' "
+    "THEN f.fornitore_piva ELSE f.fornitore_nome END"
+)
+_DESC_OK = "r.descrizione IS NOT NULL AND r.descrizione != ''"
+
+# Categoria / esclusione fornitore agganciate in lettura (alias s = aggregato).
+# Stesso OR-join di fe_import._CAT_JOIN: piva NULL o "" → match per nome.
+_FC_JOIN = """
+    LEFT JOIN fe_fornitore_categoria fc
+        ON (s.fornitore_piva IS NOT NULL AND s.fornitore_piva != '' AND s.fornitore_piva = fc.fornitore_piva)
+        OR (COALESCE(s.fornitore_piva, '') = '' AND s.fornitore_nome = fc.fornitore_nome AND fc.fornitore_piva IS NULL)
+"""
+_NON_ESCLUSO = "COALESCE(fc.escluso_acquisti, 0) = 0"
+
+
+def _accoda(alias: str) -> str:
+    return (
+        f"INSERT INTO fe_stats_dirty (periodo) SELECT substr({alias}.data_fattura, 1, 7) "
+        f"WHERE {alias}.data_fattura IS NOT NULL;"
+    )
+
+
+def _accoda_da_riga(alias: str) -> str:
+    return (
+        "INSERT INTO fe_stats_dirty (periodo) SELECT substr(f.data_fattura, 1, 7) "
+        f"FROM fe_fatture f WHERE f.id = {alias}.fattura_id AND f.data_fattura IS NOT NULL;"
+    )
+
+
+_TRIGGER = {
+    "trg_fe_stats_fatture_ins": ("AFTER INSERT ON fe_fatture", _accoda("NEW")),
+    "trg_fe_stats_fatture_del": ("AFTER DELETE ON fe_fatture", _accoda("OLD")),
+    "trg_fe_stats_fatture_upd": (
+        f"AFTER UPDATE OF {_COL_FATTURE} ON fe_fatture",
+        _accoda("OLD") + " " + _accoda("NEW"),
+    ),
+    "trg_fe_stats_righe_ins": ("AFTER INSERT ON fe_righe", _accoda_da_riga("NEW")),
+    "trg_fe_stats_righe_del": ("AFTER DELETE ON fe_righe", _accoda_da_riga("OLD")),
+    "trg_fe_stats_righe_upd": (
+        f"AFTER UPDATE OF {_COL_RIGHE} ON fe_righe",
+        _accoda_da_riga("OLD") + " " + _accoda_da_riga("NEW"),
+    ),
+}
+
+
+def _conta(chiave: str, n: int = 1) -> None:
+    with _lock:
+        _stats[chiave] += n
+
+
+def _esiste(conn: sqlite3.Connection, tipo: str, nome: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (tipo, nome)
+    ).fetchone() is not None
+
+
+# ─────────────────────────────────────────────
+# SCHEMA (idempotente, regola S52-1)
+# ─────────────────────────────────────────────
+
+def installato(conn: sqlite3.Connection) -> bool:
+    n = conn.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' "
+        f"AND name IN ({','.join('?' * len(_TRIGGER))})",
+        tuple(_TRIGGER),
+    ).fetchone()[0]
+    return n == len(_TRIGGER) and all(_esiste(conn, "table", t) for t in TABELLE)
+
+
+def installa(conn: sqlite3.Connection) -> bool:
+    """
+    Tabelle aggregate, coda, trigger. Accoda '*': la prima `aggiorna()`
+    ricostruisce tutto. False se fe_fatture/fe_righe non esistono ancora.
+    Non fa commit.
+    """
+    if not (_esiste(conn, "table", "fe_fatture") and _esiste(conn, "table", "fe_righe")):
+        return False
+
+    if not _esiste(conn, "table", "fe_stats_fornitori_mese"):
+        conn.execute(
+            """
+            CREATE TABLE fe_stats_fornitori_mese (
+                periodo         TEXT    NOT NULL,   -- substr(data_fattura, 1, 7)
+                anno            TEXT    NOT NULL,   -- substr(data_fattura, 1, 4)
+                mese            TEXT    NOT NULL,   -- substr(data_fattura, 6, 2)
+                fornitore_nome  TEXT,
+                fornitore_piva  TEXT,
+                chiave          TEXT,               -- piva, o nome se piva vuota
+                n_fatture       INTEGER NOT NULL,
+                totale          REAL    NOT NULL,
+                primo           TEXT,
+                ultimo          TEXT,
+                n_con_scadenza  INTEGER NOT NULL
+            )
+            """
+        )
+    if not _esiste(conn, "index", "idx_fe_stats_fornitori_mese"):
+        conn.execute("CREATE INDEX idx_fe_stats_fornitori_mese ON fe_stats_fornitori_mese (anno, periodo)")
+
+    if not _esiste(conn, "table", "fe_stats_righe_mese"):
+        conn.execute(
+            """
+            CREATE TABLE fe_stats_righe_mese (
+                periodo           TEXT    NOT NULL,
+                anno              TEXT    NOT NULL,
+                mese              TEXT    NOT NULL,
+                fornitore_nome    TEXT,
+                fornitore_piva    TEXT,
+                chiave            TEXT,
+                livello           TEXT    NOT NULL CHECK (livello IN ('C', 'S')),
+                categoria_id      INTEGER,
+                sottocategoria_id INTEGER,          -- solo livello 'S'
+                n_righe           INTEGER NOT NULL, -- righe con prezzo_totale != 0
+                n_auto            INTEGER NOT NULL, -- ...di cui categoria ereditata
+                n_righe_desc      INTEGER NOT NULL, -- ...di cui con descrizione
+                totale_desc       REAL    NOT NULL,
+                n_fatture_desc    INTEGER NOT NULL
+            )
+            """
+        )
+    if not _esiste(conn, "index", "idx_fe_stats_righe_mese"):
+        conn.execute("CREATE INDEX idx_fe_stats_righe_mese ON fe_stats_righe_mese (livello, anno, periodo)")
+
+    if not _esiste(conn, "table", "fe_stats_baseline"):
+        conn.execute(
+            """
+            CREATE TABLE fe_stats_baseline (
+                chiave          TEXT    NOT NULL,
+                periodo         TEXT    NOT NULL,
+                totale_mese     REAL    NOT NULL,   -- spesa nel mese
+                media_12m       REAL    NOT NULL,   -- media mensile dei 12 mesi prima
+                mesi_attivi_12m INTEGER NOT NULL,   -- mesi con fatture nella finestra
+                PRIMARY KEY (periodo, chiave)
+            )
+            """
+        )
+
+    if not _esiste(conn, "table", "fe_stats_dirty"):
+        conn.execute(
+            """
+            CREATE TABLE fe_stats_dirty (
+                id      INTEGER PRIMARY KEY AUTOINCREMENT,
+                periodo TEXT NOT NULL               -- 'YYYY-MM' oppure '*'
+            )
+            """
+        )
+
+    if not installato(conn):
+        for nome, (evento, corpo) in _TRIGGER.items():
+            conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+            conn.execute(f"CREATE TRIGGER {nome} {evento} BEGIN {corpo} END")
+        # trigger (ri)creati: quanto c'è negli aggregati non è più garantito
+        conn.execute("INSERT INTO fe_stats_dirty (periodo) VALUES ('*')")
+    return True
+
+
+# ─────────────────────────────────────────────
+# RICALCOLO
+# ─────────────────────────────────────────────
+
+_SELECT_FATTURE = f"""
+    SELECT
+        substr(f.data_fattura, 1, 7) AS periodo,
+        substr(f.data_fattura, 1, 4) AS anno,
+        substr(f.data_fattura, 6, 2) AS mese,
+        f.fornitore_nome,
+        f.fornitore_piva,
+        {_CHIAVE_F} AS chiave,
+        COUNT(*) AS n_fatture,
+        SUM(COALESCE(f.totale_fattura, 0)) AS totale,
+        MIN(f.data_fattura) AS primo,
+        MAX(f.data_fattura) AS ultimo,
+        SUM(CASE WHEN f.data_scadenza IS NOT NULL THEN 1 ELSE 0 END) AS n_con_scadenza
+    FROM fe_fatture f
+    WHERE f.data_fattura IS NOT NULL AND COALESCE(f.is_autofattura, 0) = 0 AND {{filtro}}
+    GROUP BY periodo, f.fornitore_nome, f.fornitore_piva
+"""
+
+_SELECT_RIGHE = f"""
+    SELECT
+        substr(f.data_fattura, 1, 7) AS periodo,
+        substr(f.data_fattura, 1, 4) AS anno,
+        substr(f.data_fattura, 6, 2) AS mese,
+        f.fornitore_nome,
+        f.fornitore_piva,
+        {_CHIAVE_F} AS chiave,
+        {{livello}} AS livello,
+        r.categoria_id,
+        {{sottocategoria}} AS sottocategoria_id,
+        COUNT(*) AS n_righe,
+        SUM(CASE WHEN r.categoria_id IS NOT NULL AND COALESCE(r.categoria_auto, 0) = 1 THEN 1 ELSE 0 END) AS n_auto,
+        SUM(CASE WHEN {_DESC_OK} THEN 1 ELSE 0 END) AS n_righe_desc,
+        SUM(CASE WHEN {_DESC_OK} THEN COALESCE(r.prezzo_totale, 0) ELSE 0 END) AS totale_desc,
+        COUNT(DISTINCT CASE WHEN {_DESC_OK} THEN f.id END) AS n_fatture_desc
+    FROM fe_righe r
+    JOIN fe_fatture f ON r.fattura_id = f.id
+    WHERE f.data_fattura IS NOT NULL AND COALESCE(f.is_autofattura, 0) = 0
+      AND COALESCE(r.prezzo_totale, 0) != 0
+      AND {{filtro}}
+    GROUP BY periodo, f.fornitore_nome, f.fornitore_piva, r.categoria_id{{gruppo}}
+"""
+
+_COLONNE_FORNITORI = (
+    "periodo, anno, mese, fornitore_nome, fornitore_piva, chiave, "
+    "n_fatture, totale, primo, ultimo, n_con_scadenza"
+)
+_COLONNE_RIGHE = (
+    "periodo, anno, mese, fornitore_nome, fornitore_piva, chiave, livello, categoria_id, "
+    "sottocategoria_id, n_righe, n_auto, n_righe_desc, totale_desc, n_fatture_desc"
+)
+
+# Un mese: range di prefisso (usa l'indice su data_fattura) + uguaglianza esatta
+_FILTRO_MESE = "f.data_fattura >= ? AND f.data_fattura < ? || '~' AND substr(f.data_fattura, 1, 7) = ?"
+
+
+def _ricalcola(conn: sqlite3.Connection, periodi: Optional[Set[str]]) -> None:
+    """Riscrive gli aggregati dei `periodi` (None = tutto). Non committa."""
+    if periodi is None:
+        conn.execute("DELETE FROM fe_stats_fornitori_mese")
+        conn.execute("DELETE FROM fe_stats_righe_mese")
+        filtri = [("1", ())]
+    else:
+        filtri = []
+        for p in sorted(periodi):
+            conn.execute("DELETE FROM fe_stats_fornitori_mese WHERE periodo = ?", (p,))
+            conn.execute("DELETE FROM fe_stats_righe_mese WHERE periodo = ?", (p,))
+            filtri.append((_FILTRO_MESE, (p, p, p)))
+
+    for filtro, params in filtri:
+        conn.execute(
+            f"INSERT INTO fe_stats_fornitori_mese ({_COLONNE_FORNITORI}) "
+            + _SELECT_FATTURE.format(filtro=filtro),
+            params,
+        )
+        conn.execute(
+            f"INSERT INTO fe_stats_righe_mese ({_COLONNE_RIGHE}) "
+            + _SELECT_RIGHE.format(livello="'C'", sottocategoria="NULL", gruppo="", filtro=filtro),
+            params,
+        )
+        conn.execute(
+            f"INSERT INTO fe_stats_righe_mese ({_COLONNE_RIGHE}) "
+            + _SELECT_RIGHE.format(
+                livello="'S'", sottocategoria="r.sottocategoria_id", gruppo=", r.sottocategoria_id",
+                filtro=f"{filtro} AND r.sottocategoria_id IS NOT NULL AND {_DESC_OK}",
+            ),
+            params,
+        )
+
+
+def _sposta(periodo: str, mesi: int) -> Optional[str]:
+    try:
+        anno, mese = int(periodo[:4]), int(periodo[5:7])
+    except (TypeError, ValueError):
+        return None
+    if len(periodo) != 7 or not 1 <= mese <= 12:
+        return None
+    n = anno * 12 + (mese - 1) + mesi
+    return f"{n // 12:04d}-{n % 12 + 1:02d}"
+
+
+def _ricalcola_baseline(conn: sqlite3.Connection, periodi: Optional[Set[str]]) -> None:
+    """
+    Baseline dei mesi che hanno nella finestra un mese ricalcolato (None =
+    tutti). Solo mesi presenti negli aggregati. Non committa.
+    """
+    presenti = {
+        r[0] for r in conn.execute("SELECT DISTINCT periodo FROM fe_stats_fornitori_mese").fetchall()
+    }
+    if periodi is None:
+        conn.execute("DELETE FROM fe_stats_baseline")
+        bersagli = presenti
+    else:
+        bersagli = set()
+        for p in periodi:
+            for k in range(MESI_BASELINE + 1):
+                q = _sposta(p, k)
+                if q is not None:
+                    bersagli.add(q)
+        for q in bersagli:
+            conn.execute("DELETE FROM fe_stats_baseline WHERE periodo = ?", (q,))
+        bersagli &= presenti
+
+    for p in sorted(bersagli):
+        da = _sposta(p, -MESI_BASELINE)
+        if da is None:
+            continue
+        conn.execute(
+            """
+            INSERT INTO fe_stats_baseline (chiave, periodo, totale_mese, media_12m, mesi_attivi_12m)
+            SELECT
+                chiave, ?,
+                TOTAL(CASE WHEN periodo = ? THEN totale END),
+                ROUND(TOTAL(CASE WHEN periodo < ? THEN totale END) / ?, 2),
+                COUNT(DISTINCT CASE WHEN periodo < ? THEN periodo END)
+            FROM fe_stats_fornitori_mese
+            WHERE periodo >= ? AND periodo <= ? AND chiave IS NOT NULL
+            GROUP BY chiave
+            """,
+            (p, p, p, float(MESI_BASELINE), p, da, p),
+        )
+
+
+def aggiorna(conn: sqlite3.Connection) -> int:
+    """
+    Svuota fe_stats_dirty ricalcolando i mesi accodati (+ baseline).
+    Ritorna i mesi ricalcolati (-1 = ricostruzione completa). Best-effort:
+    se fallisce si servono gli aggregati com'erano e la coda resta.
+
+    Coda vuota (il caso normale) → una SELECT e via, senza lock. Altrimenti
+    si serializza su _lock_aggiorna e si rilegge la coda: chi arriva mentre
+    un'altra richiesta sta ricalcolando aspetta e poi la trova già vuota.
+    """
+    if conn.execute("SELECT 1 FROM fe_stats_dirty LIMIT 1").fetchone() is None:
+        return 0
+    with _lock_aggiorna:
+        return _aggiorna(conn)
+
+
+def _aggiorna(conn: sqlite3.Connection) -> int:
+    righe = conn.execute("SELECT id, periodo FROM fe_stats_dirty").fetchall()
+    if not righe:
+        return 0
+    max_id = max(r[0] for r in righe)
+    tutto = any(r[1] == "*" for r in righe)
+    periodi = None if tutto else {r[1] for r in righe if r[1]}
+    try:
+        _ricalcola(conn, periodi)
+        _ricalcola_baseline(conn, periodi)
+        conn.execute("DELETE FROM fe_stats_dirty WHERE id <= ?", (max_id,))
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.warning("aggiornamento aggregati stats fallito: %s", e)
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+        return 0
+    if tutto:
+        _conta("ricostruzioni")
+        return -1
+    _conta("mesi_ricalcolati", len(periodi))
+    return len(periodi)
+
+
+# ─────────────────────────────────────────────
+# LETTURA
+# ─────────────────────────────────────────────
+
+def _sorgente(anno: Optional[int], fino_a: Optional[str] = None) -> tuple:
+    """
+    (subquery, params) con le colonne di fe_stats_fornitori_mese, filtrata
+    per anno e, se `fino_a` ('YYYY-MM-DD'), fino a quel giorno: mesi interi
+    dagli aggregati, il mese del taglio in diretta da fe_fatture.
+    """
+    where, params = ["1"], []
+    if anno is not None:
+        where.append("anno = ?")
+        params.append(str(anno))
+    if fino_a is None:
+        return f"SELECT * FROM fe_stats_fornitori_mese WHERE {' AND '.join(where)}", params
+
+    taglio = fino_a[:7]
+    filtro = _FILTRO_MESE + " AND f.data_fattura <= ?"
+    params_live = [taglio, taglio, taglio, fino_a]
+    if anno is not None:
+        filtro += " AND substr(f.data_fattura, 1, 4) = ?"
+        params_live.append(str(anno))
+    sql = (
+        f"SELECT {_COLONNE_FORNITORI} FROM fe_stats_fornitori_mese "
+        f"WHERE {' AND '.join(where)} AND periodo < ? "
+        f"UNION ALL SELECT {_COLONNE_FORNITORI} FROM ({_SELECT_FATTURE.format(filtro=filtro)})"
+    )
+    return sql, params + [taglio] + params_live
+
+
+def data_massima(conn: sqlite3.Connection, anno: int) -> Optional[str]:
+    """Ultima data fattura dell'anno (fornitori esclusi da acquisti a parte)."""
+    return conn.execute(
+        f"""
+        SELECT MAX(s.ultimo) FROM fe_stats_fornitori_mese s {_FC_JOIN}
+        WHERE s.anno = ? AND {_NON_ESCLUSO}
+        """,
+        (str(anno),),
+    ).fetchone()[0]
+
+
+def mensili(conn: sqlite3.Connection, anno: Optional[int]) -> List[Dict[str, Any]]:
+    sql, params = _sorgente(anno)
+    return [dict(r) for r in conn.execute(
+        f"""
+        SELECT s.anno, s.mese, SUM(s.n_fatture) AS numero_fatture, SUM(s.totale) AS totale_fatture
+        FROM ({sql}) s {_FC_JOIN}
+        WHERE {_NON_ESCLUSO}
+        GROUP BY s.anno, s.mese
+        ORDER BY {'s.mese ASC' if anno is not None else 's.anno DESC, s.mese ASC'}
+        """,
+        params,
+    ).fetchall()]
+
+
+def kpi(conn: sqlite3.Connection, anno: Optional[int], fino_a: Optional[str] = None) -> Dict[str, Any]:
+    """totale_spesa, n_fatture, n_fornitori, n_mesi (fornitori esclusi a parte)."""
+    sql, params = _sorgente(anno, fino_a)
+    return dict(conn.execute(
+        f"""
+        SELECT
+            ROUND(SUM(s.totale), 2) AS totale_spesa,
+            COALESCE(SUM(s.n_fatture), 0) AS n_fatture,
+            COUNT(DISTINCT s.chiave) AS n_fornitori,
+            COUNT(DISTINCT s.periodo) AS n_mesi
+        FROM ({sql}) s {_FC_JOIN}
+        WHERE {_NON_ESCLUSO}
+        """,
+        params,
+    ).fetchone())
+
+
+def per_fornitore(conn: sqlite3.Connection, anno: Optional[int],
+                  fino_a: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """chiave → {chiave, fornitore_nome (dell'ultima fattura), totale, n_fatture}."""
+    sql, params = _sorgente(anno, fino_a)
+    righe = conn.execute(
+        f"""
+        SELECT s.chiave, s.fornitore_nome, ROUND(SUM(s.totale), 2) AS totale,
+               SUM(s.n_fatture) AS n_fatture, MAX(s.ultimo) AS ultimo
+        FROM ({sql}) s {_FC_JOIN}
+        WHERE {_NON_ESCLUSO}
+        GROUP BY s.chiave
+        """,
+        params,
+    ).fetchall()
+    return {
+        r["chiave"]: {k: r[k] for k in ("chiave", "fornitore_nome", "totale", "n_fatture")}
+        for r in righe
+    }
+
+
+def riepilogo_fornitori(conn: sqlite3.Connection, anno: Optional[int]) -> List[Dict[str, Any]]:
+    """Per (nome, piva): numero/totale fatture, primo/ultimo acquisto, categoria fornitore."""
+    sql, params = _sorgente(anno)
+    return [dict(r) for r in conn.execute(
+        f"""
+        SELECT
+            sub.fornitore_nome,
+            sub.fornitore_piva,
+            sub.numero_fatture,
+            sub.totale_fatture,
+            sub.primo_acquisto,
+            sub.ultimo_acquisto,
+            fc.categoria_id,
+            cat.nome AS categoria_nome,
+            COALESCE(fc.escluso_acquisti, 0) AS escluso_acquisti
+        FROM (
+            SELECT
+                s.fornitore_nome,
+                s.fornitore_piva,
+                SUM(s.n_fatture) AS numero_fatture,
+                SUM(s.totale) AS totale_fatture,
+                MIN(s.primo) AS primo_acquisto,
+                MAX(s.ultimo) AS ultimo_acquisto
+            FROM ({sql}) s
+            GROUP BY s.fornitore_nome, s.fornitore_piva
+        ) sub
+        LEFT JOIN fe_fornitore_categoria fc
+            ON (sub.fornitore_piva IS NOT NULL AND sub.fornitore_piva != '' AND sub.fornitore_piva = fc.fornitore_piva)
+            OR (COALESCE(sub.fornitore_piva, '') = '' AND sub.fornitore_nome = fc.fornitore_nome AND fc.fornitore_piva IS NULL)
+        LEFT JOIN fe_categorie cat ON fc.categoria_id = cat.id
+        ORDER BY sub.totale_fatture DESC
+        """,
+        params,
+    ).fetchall()]
+
+
+def conteggi_fornitori(conn: sqlite3.Connection, anno: Optional[int]) -> tuple:
+    """
+    Per chiave fornitore (esclusi compresi):
+      righe → (righe_totali, righe_categorizzate, righe_auto)
+      pagamenti → (fatture, fatture con scadenza)
+    """
+    where, params = "s.livello = 'C'", []
+    if anno is not None:
+        where += " AND s.anno = ?"
+        params.append(str(anno))
+    righe = {
+        r[0]: (r[1], r[2], r[3]) for r in conn.execute(
+            f"""
+            SELECT s.chiave, SUM(s.n_righe),
+                   SUM(CASE WHEN s.categoria_id IS NOT NULL THEN s.n_righe ELSE 0 END),
+                   SUM(s.n_auto)
+            FROM fe_stats_righe_mese s
+            WHERE {where}
+            GROUP BY s.chiave
+            """,
+            params,
+        ).fetchall()
+    }
+    sql, params = _sorgente(anno)
+    pagamenti = {
+        r[0]: (r[1], r[2]) for r in conn.execute(
+            f"SELECT s.chiave, SUM(s.n_fatture), SUM(s.n_con_scadenza) FROM ({sql}) s GROUP BY s.chiave",
+            params,
+        ).fetchall()
+    }
+    return righe, pagamenti
+
+
+def top_fornitori(conn: sqlite3.Connection, anno: Optional[int], limite: int) -> tuple:
+    """(totale_globale, righe top per (nome, piva) con categoria fornitore)."""
+    sql, params = _sorgente(anno)
+    totale = conn.execute(
+        f"SELECT ROUND(SUM(s.totale), 2) FROM ({sql}) s {_FC_JOIN} WHERE {_NON_ESCLUSO}",
+        params,
+    ).fetchone()[0]
+    righe = [dict(r) for r in conn.execute(
+        f"""
+        SELECT
+            s.fornitore_nome,
+            s.fornitore_piva,
+            ROUND(SUM(s.totale), 2) AS totale,
+            SUM(s.n_fatture) AS n_fatture,
+            COALESCE(c.nome, '') AS categoria
+        FROM ({sql}) s
+        {_FC_JOIN}
+        LEFT JOIN fe_categorie c ON fc.categoria_id = c.id
+        WHERE {_NON_ESCLUSO}
+        GROUP BY s.fornitore_nome, s.fornitore_piva
+        ORDER BY totale DESC
+        LIMIT ?
+        """,
+        params + [limite],
+    ).fetchall()]
+    return totale, righe
+
+
+def mesi_anno(conn: sqlite3.Connection, anno: int) -> Dict[str, float]:
+    """mese '01'..'12' → totale spesa (per il confronto annuale)."""
+    return {
+        r[0]: r[1] for r in conn.execute(
+            f"""
+            SELECT s.mese, ROUND(SUM(s.totale), 2)
+            FROM fe_stats_fornitori_mese s {_FC_JOIN}
+            WHERE s.anno = ? AND {_NON_ESCLUSO}
+            GROUP BY s.mese
+            ORDER BY s.mese ASC
+            """,
+            (str(anno),),
+        ).fetchall()
+    }
+
+
+def totali_periodo(conn: sqlite3.Connection, anno: Optional[int], mese: Optional[str]) -> Dict[str, Any]:
+    """{n_fatture, totale} di anno e/o mese (drill senza categoria)."""
+    where, params = [_NON_ESCLUSO], []
+    if anno is not None:
+        where.append("s.anno = ?")
+        params.append(str(anno))
+    if mese is not None:
+        where.append("s.mese = ?")
+        params.append(mese)
+    return dict(conn.execute(
+        f"""
+        SELECT COALESCE(SUM(s.n_fatture), 0) AS n_fatture, ROUND(SUM(s.totale), 2) AS totale
+        FROM fe_stats_fornitori_mese s {_FC_JOIN}
+        WHERE {' AND '.join(where)}
+        """,
+        params,
+    ).fetchone())
+
+
+def categorie(conn: sqlite3.Connection, anno: Optional[int]) -> tuple:
+    """
+    Spesa per categoria prodotto (righe con descrizione, fornitori esclusi
+    a parte): (righe per categoria, righe per categoria+sottocategoria).
+    """
+    where, params = _NON_ESCLUSO + " AND s.n_righe_desc > 0", []
+    if anno is not None:
+        where += " AND s.anno = ?"
+        params.append(str(anno))
+    per_cat = [dict(r) for r in conn.execute(
+        f"""
+        SELECT
+            COALESCE(c.nome, '(Non categorizzato)') AS categoria,
+            ROUND(SUM(s.totale_desc), 2) AS totale,
+            SUM(s.n_fatture_desc) AS n_fatture
+        FROM fe_stats_righe_mese s
+        {_FC_JOIN}
+        LEFT JOIN fe_categorie c ON s.categoria_id = c.id
+        WHERE s.livello = 'C' AND {where}
+        GROUP BY c.nome
+        ORDER BY totale DESC
+        """,
+        params,
+    ).fetchall()]
+    per_sub = conn.execute(
+        f"""
+        SELECT
+            COALESCE(c.nome, '(Non categorizzato)') AS categoria,
+            sc.nome AS sottocategoria,
+            ROUND(SUM(s.totale_desc), 2) AS totale,
+            SUM(s.n_fatture_desc) AS n_fatture
+        FROM fe_stats_righe_mese s
+        {_FC_JOIN}
+        LEFT JOIN fe_categorie c ON s.categoria_id = c.id
+        LEFT JOIN fe_sottocategorie sc ON s.sottocategoria_id = sc.id
+        WHERE s.livello = 'S' AND {where}
+        GROUP BY c.nome, sc.nome
+        ORDER BY c.nome, totale DESC
+        """,
+        params,
+    ).fetchall()
+    return per_cat, per_sub
+
+
+def mese_chiuso(data: str) -> Optional[str]:
+    """'YYYY-MM' dell'ultimo mese completo fino a `data` (YYYY-MM-DD) inclusa."""
+    try:
+        giorno = datetime.date.fromisoformat(data[:10])
+    except (TypeError, ValueError):
+        return None
+    if (giorno + datetime.timedelta(days=1)).month != giorno.month:
+        return data[:7]
+    return _sposta(data[:7], -1)
+
+
+def baseline(conn: sqlite3.Connection, periodo: str, chiavi: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """chiave → {totale_mese, media_12m, mesi_attivi_12m} per il mese `periodo`."""
+    chiavi = [c for c in chiavi if c is not None]
+    if not chiavi:
+        return {}
+    out: Dict[str, Dict[str, Any]] = {}
+    # a blocchi: resta sotto il limite di variabili di SQLite
+    for i in range(0, len(chiavi), 500):
+        blocco = chiavi[i:i + 500]
+        for r in conn.execute(
+            f"""
+            SELECT chiave, totale_mese, media_12m, mesi_attivi_12m FROM fe_stats_baseline
+            WHERE periodo = ? AND chiave IN ({','.join('?' * len(blocco))})
+            """,
+            (periodo, *blocco),
+        ).fetchall():
+            out[r[0]] = {"totale_mese": r[1], "media_12m": r[2], "mesi_attivi_12m": r[3]}
+    return out
+
+
+def stato(conn: sqlite3.Connection) -> dict:
+    """Diagnostica: righe negli aggregati, coda, contatori del processo."""
+    with _lock:
+        contatori = dict(_stats)
+    if not installato(conn):
+        return {"installato": False, **contatori}
+    return {
+        "installato": True,
+        "righe_fornitori": conn.execute("SELECT COUNT(*) FROM fe_stats_fornitori_mese").fetchone()[0],
+        "righe_categorie": conn.execute("SELECT COUNT(*) FROM fe_stats_righe_mese").fetchone()[0],
+        "righe_baseline": conn.execute("SELECT COUNT(*) FROM fe_stats_baseline").fetchone()[0],
+        "in_coda": conn.execute("SELECT COUNT(*) FROM fe_stats_dirty").fetchone()[0],
+        **contatori,
+    }
@@ -1,4 +1,4 @@
-# @version: v1.0 — Mattone M.J "Pubblicazione web" (sessione 2026-08-03)
+# @version: v1.2 — Mattone M.J "Pubblicazione web": upload solo se cambia + batch, esiti per chiave (2026-10-19)
 # -*- coding: utf-8 -*-
 """
 FTP publish service — TRGB Gestionale (mattone M.J)
@@ -28,6 +28,24 @@ NON fa parte di questa versione:
   - invalidazione cache CDN
   - retry asincroni in coda (qui il retry è l'utente che ripreme il bottone)
 
+UPLOAD SOLO SE CAMBIA (v1.1, 2026-10-19)
+----------------------------------------
+Lo storico salva lo SHA-256 dei bytes pubblicati. Se l'ultima pubblicazione
+riuscita della stessa chiave sullo stesso nome file ha lo stesso hash, non si
+apre nemmeno la connessione: esito ok con `invariato=True`. `forza=True`
+ricarica comunque (es. il file sul sito è stato toccato a mano).
+
+Più chiavi (menu_pranzo, carta_vini, carta_bevande) si pubblicano in un colpo
+solo con `pubblica_batch`: UNA sessione FTP/FTPS (un solo handshake TLS) per
+tutti i file cambiati. I moduli registrano il proprio produttore di bytes con
+`registra_produttore(chiave, fn)`, così il router platform può pubblicare
+"tutto" senza importare i router dei moduli (regola 2).
+
+Auto-pubblicazione (opt-in, FTP_AUTOPUBLISH=carta_vini,carta_bevande): dopo
+una modifica i moduli chiamano `pianifica_autopubblicazione(chiave)`. Il
+timer (FTP_AUTOPUBLISH_DELAY_S, default 300) riparte a ogni segnalazione:
+una modifica prezzi in blocco produce UN upload a fine raffica, non cento.
+
 UPLOAD ATOMICO
 --------------
 Si carica su un nome temporaneo (`<nome>.<pid>.<random>.part`) e solo a
@@ -55,6 +73,8 @@ CONFIG (.env sul VPS, letta a ogni chiamata: cambi .env + restart e basta)
     FTP_TIMEOUT=30
     FTP_PASSIVE=1
     FTP_BASE_URL=https://www.tregobbi.it/privata   # solo per mostrare il link in UI
+    FTP_AUTOPUBLISH=                # chiavi da ripubblicare da sole dopo le modifiche
+    FTP_AUTOPUBLISH_DELAY_S=300     # debounce dell'auto-pubblicazione
 
 FTP_TLS=auto → prova FTPS esplicito (AUTH TLS) e, se il server non lo supporta,
 ricade su FTP in chiaro. In chiaro la password viaggia leggibile sulla rete:
@@ -72,15 +92,17 @@ La password non finisce mai nei log, in `stato()`, o nelle risposte API.
 from __future__ import annotations
 
 import ftplib
+import hashlib
 import io
 import logging
 import os
 import socket
 import sqlite3
+import threading
 import uuid
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 from app.models.notifiche_db import get_notifiche_conn
 
@@ -102,6 +124,8 @@ class EsitoPubblicazione:
     errore: Optional[str] = None
     tls: bool = False
     quando: Optional[str] = None
+    sha256: Optional[str] = None
+    invariato: bool = False      # True → stesso contenuto già online, upload saltato
 
     def to_dict(self) -> dict:
         return {
@@ -113,9 +137,19 @@ class EsitoPubblicazione:
             "errore": self.errore,
             "tls": self.tls,
             "quando": self.quando,
+            "invariato": self.invariato,
         }
 
 
+@dataclass
+class VocePubblicazione:
+    """Un file da pubblicare in un batch."""
+    chiave: str
+    nome_file: str
+    contenuto: bytes
+    descrizione: Optional[str] = None
+
+
 # ─────────────────────────────────────────────
 # CONFIG
 # ─────────────────────────────────────────────
@@ -373,12 +407,65 @@ def _promuovi(ftp, tmp_name: str, nome_file: str) -> None:
         raise
 
 
+def _sha256(contenuto: bytes) -> str:
+    return hashlib.sha256(contenuto).hexdigest()
+
+
+def _valida(voce: VocePubblicazione, quando: str) -> Optional[EsitoPubblicazione]:
+    """Esito di errore se la voce non è pubblicabile, altrimenti None."""
+    if not voce.nome_file:
+        return EsitoPubblicazione(ok=False, chiave=voce.chiave, errore="Nome file mancante", quando=quando)
+    if not voce.contenuto:
+        return EsitoPubblicazione(ok=False, chiave=voce.chiave, nome_file=voce.nome_file,
+                                  errore="Contenuto vuoto: non pubblico un file da 0 byte",
+                                  quando=quando)
+    return None
+
+
+def _esito_invariato(voce: VocePubblicazione, sha: str, quando: str) -> Optional[EsitoPubblicazione]:
+    """Esito 'già online' se l'ultima pubblicazione riuscita ha lo stesso hash."""
+    if _ultimo_hash(voce.chiave, voce.nome_file) != sha:
+        return None
+    logger.info("Pubblicazione %s saltata: contenuto invariato (%s)", voce.nome_file, sha[:12])
+    return EsitoPubblicazione(
+        ok=True,
+        chiave=voce.chiave,
+        nome_file=voce.nome_file,
+        url=url_pubblico(voce.nome_file),
+        quando=quando,
+        sha256=sha,
+        invariato=True,
+    )
+
+
+def _carica(ftp, voce: VocePubblicazione) -> None:
+    """
+    Upload atomico di una voce su una sessione già aperta e posizionata in
+    FTP_DIR: STOR su nome temporaneo unico + promozione. In caso di errore
+    prova a togliere il temporaneo e rilancia.
+    """
+    # Nome temporaneo unico per tentativo: due pubblicazioni contemporanee
+    # non devono scrivere sullo stesso .part e promuovere un file misto.
+    tmp_name = f"{voce.nome_file}.{os.getpid()}.{uuid.uuid4().hex[:8]}{_PART_SUFFIX}"
+    try:
+        ftp.storbinary(f"STOR {tmp_name}", io.BytesIO(voce.contenuto))
+        _promuovi(ftp, tmp_name, voce.nome_file)
+    except Exception:
+        # Pulizia best-effort del temporaneo rimasto a metà
+        try:
+            ftp.delete(tmp_name)
+        except Exception:
+            pass
+        raise
+
+
 def pubblica(
     chiave: str,
     nome_file: str,
     contenuto: bytes,
     descrizione: Optional[str] = None,
     notifica_su_errore: bool = True,
+    forza: bool = False,
 ) -> EsitoPubblicazione:
     """
     Carica `contenuto` sull'FTP come `nome_file` dentro FTP_DIR, in modo atomico.
@@ -386,66 +473,103 @@ def pubblica(
     chiave: identificatore stabile della pubblicazione ('menu_pranzo',
             'carta_vini'), usato per lo storico e per la UI.
     descrizione: testo libero mostrato nello storico (es. "settimana 2026-08-03").
+    forza: ricarica anche se gli stessi bytes risultano già pubblicati.
 
     Non solleva eccezioni: ritorna sempre un EsitoPubblicazione. Chi chiama
     decide se mostrare l'errore o alzare un 502.
     """
-    quando = datetime.now().isoformat(timespec="seconds")
-    nome_file = (nome_file or "").strip().lstrip("/")
-    if not nome_file:
-        return EsitoPubblicazione(ok=False, chiave=chiave, errore="Nome file mancante", quando=quando)
-    if not contenuto:
-        return EsitoPubblicazione(ok=False, chiave=chiave, nome_file=nome_file,
-                                  errore="Contenuto vuoto: non pubblico un file da 0 byte",
-                                  quando=quando)
+    voce = VocePubblicazione(
+        chiave=chiave,
+        nome_file=(nome_file or "").strip().lstrip("/"),
+        contenuto=contenuto,
+        descrizione=descrizione,
+    )
+    return pubblica_batch([voce], notifica_su_errore=notifica_su_errore, forza=forza)[0]
 
-    c = _cfg()
-    ftp = None
-    tls = False
-    # Nome temporaneo unico per tentativo: due pubblicazioni contemporanee
-    # non devono scrivere sullo stesso .part e promuovere un file misto.
-    tmp_name = f"{nome_file}.{os.getpid()}.{uuid.uuid4().hex[:8]}{_PART_SUFFIX}"
-    try:
-        ftp, tls = _connetti()
-        _cd(ftp, c["dir"])
 
-        ftp.storbinary(f"STOR {tmp_name}", io.BytesIO(contenuto))
-        _promuovi(ftp, tmp_name, nome_file)
+def pubblica_batch(
+    voci: Iterable[VocePubblicazione],
+    notifica_su_errore: bool = True,
+    forza: bool = False,
+) -> List[EsitoPubblicazione]:
+    """
+    Pubblica più file riusando UNA sola sessione FTP/FTPS. Le voci il cui
+    contenuto è già online (stesso SHA-256 dell'ultima pubblicazione riuscita)
+    vengono saltate senza connettersi. Un errore su un file non ferma gli
+    altri; se fallisce la connessione, falliscono tutte le voci da caricare.
 
-        esito = EsitoPubblicazione(
-            ok=True,
-            chiave=chiave,
-            nome_file=nome_file,
-            url=url_pubblico(nome_file),
-            bytes_inviati=len(contenuto),
-            tls=tls,
-            quando=quando,
-        )
-        logger.info("Pubblicato %s (%s byte, tls=%s) su %s", nome_file, len(contenuto), tls, c["dir"])
-    except Exception as e:
-        esito = EsitoPubblicazione(
-            ok=False,
-            chiave=chiave,
-            nome_file=nome_file,
-            bytes_inviati=len(contenuto),
-            tls=tls,
-            errore=str(e),
-            quando=quando,
-        )
-        logger.error("Pubblicazione %s FALLITA: %s", nome_file, e)
-        # Pulizia best-effort del temporaneo rimasto a metà
+    Ritorna un esito per voce, nello stesso ordine. Non solleva eccezioni.
+    """
+    quando = datetime.now().isoformat(timespec="seconds")
+    voci = list(voci)
+    esiti: List[Optional[EsitoPubblicazione]] = [None] * len(voci)
+    da_caricare: List[Tuple[int, VocePubblicazione, str]] = []
+
+    for i, voce in enumerate(voci):
+        voce.nome_file = (voce.nome_file or "").strip().lstrip("/")
+        errore = _valida(voce, quando)
+        if errore is not None:
+            esiti[i] = errore
+            continue
+        sha = _sha256(voce.contenuto)
+        invariato = None if forza else _esito_invariato(voce, sha, quando)
+        if invariato is not None:
+            esiti[i] = invariato
+            continue
+        da_caricare.append((i, voce, sha))
+
+    if da_caricare:
+        c = _cfg()
+        ftp = None
+        tls = False
+        errore_connessione = None
         try:
-            if ftp is not None:
-                ftp.delete(tmp_name)
-        except Exception:
-            pass
-        if notifica_su_errore:
-            _notifica_fallimento(chiave, nome_file, str(e))
-    finally:
-        _chiudi(ftp)
+            ftp, tls = _connetti()
+            _cd(ftp, c["dir"])
+        except Exception as e:
+            errore_connessione = str(e)
+            logger.error("Connessione FTP per la pubblicazione FALLITA: %s", e)
+
+        try:
+            for i, voce, sha in da_caricare:
+                if errore_connessione is None:
+                    try:
+                        _carica(ftp, voce)
+                        esiti[i] = EsitoPubblicazione(
+                            ok=True,
+                            chiave=voce.chiave,
+                            nome_file=voce.nome_file,
+                            url=url_pubblico(voce.nome_file),
+                            bytes_inviati=len(voce.contenuto),
+                            tls=tls,
+                            quando=quando,
+                            sha256=sha,
+                        )
+                        logger.info("Pubblicato %s (%s byte, tls=%s) su %s",
+                                    voce.nome_file, len(voce.contenuto), tls, c["dir"])
+                    except Exception as e:
+                        esiti[i] = EsitoPubblicazione(
+                            ok=False, chiave=voce.chiave, nome_file=voce.nome_file,
+                            bytes_inviati=len(voce.contenuto), tls=tls,
+                            errore=str(e), quando=quando, sha256=sha,
+                        )
+                        logger.error("Pubblicazione %s FALLITA: %s", voce.nome_file, e)
+                else:
+                    esiti[i] = EsitoPubblicazione(
+                        ok=False, chiave=voce.chiave, nome_file=voce.nome_file,
+                        bytes_inviati=len(voce.contenuto), tls=tls,
+                        errore=errore_connessione, quando=quando, sha256=sha,
+                    )
+        finally:
+            _chiudi(ftp)
 
-    _log_scrivi(esito, descrizione)
-    return esito
+        for i, voce, _sha in da_caricare:
+            esito = esiti[i]
+            _log_scrivi(esito, voce.descrizione)
+            if not esito.ok and notifica_su_errore:
+                _notifica_fallimento(voce.chiave, voce.nome_file, esito.errore or "")
+
+    return esiti
 
 
 def _notifica_fallimento(chiave: str, nome_file: str, errore: str) -> None:
@@ -501,9 +625,14 @@ def _init_log() -> None:
                 bytes         INTEGER DEFAULT 0,
                 errore        TEXT,
                 url           TEXT,
-                creato_il     TEXT NOT NULL
+                creato_il     TEXT NOT NULL,
+                sha256        TEXT
             )
         """)
+        # v1.1: hash del contenuto pubblicato (tabelle create dalla v1.0)
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(web_publish_log)").fetchall()}
+        if "sha256" not in cols:
+            conn.execute("ALTER TABLE web_publish_log ADD COLUMN sha256 TEXT")
         conn.execute(
             "CREATE INDEX IF NOT EXISTS idx_web_publish_chiave "
             "ON web_publish_log(chiave, creato_il DESC)"
@@ -521,12 +650,12 @@ def _log_scrivi(esito: EsitoPubblicazione, descrizione: Optional[str]) -> None:
         try:
             conn.execute("""
                 INSERT INTO web_publish_log
-                    (chiave, nome_file, descrizione, ok, bytes, errore, url, creato_il)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    (chiave, nome_file, descrizione, ok, bytes, errore, url, creato_il, sha256)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 esito.chiave, esito.nome_file, descrizione,
                 1 if esito.ok else 0, esito.bytes_inviati,
-                esito.errore, esito.url, esito.quando,
+                esito.errore, esito.url, esito.quando, esito.sha256,
             ))
             conn.commit()
         finally:
@@ -555,6 +684,27 @@ def ultima_pubblicazione(chiave: str, solo_ok: bool = True) -> Optional[dict]:
         return None
 
 
+def _ultimo_hash(chiave: str, nome_file: str) -> Optional[str]:
+    """SHA-256 dell'ultima pubblicazione riuscita di `chiave` su `nome_file`."""
+    try:
+        _init_log()
+        conn = get_notifiche_conn()
+        try:
+            row = conn.execute(
+                "SELECT sha256 FROM web_publish_log "
+                "WHERE chiave = ? AND nome_file = ? AND ok = 1 "
+                "ORDER BY creato_il DESC, id DESC LIMIT 1",
+                (chiave, nome_file),
+            ).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        # Nel dubbio si carica: meglio un upload in più che un sito vecchio.
+        logger.warning("Lettura hash ultima pubblicazione fallita: %s", e)
+        return None
+
+
 def storico(chiave: Optional[str] = None, limit: int = 20) -> List[dict]:
     try:
         _init_log()
@@ -586,6 +736,7 @@ def storico(chiave: Optional[str] = None, limit: int = 20) -> List[dict]:
 _NOMI_DEFAULT = {
     "menu_pranzo": "menu-pranzo.pdf",
     "carta_vini": "carta-vini.pdf",
+    "carta_bevande": "carta-bevande.pdf",
 }
 
 
@@ -594,9 +745,125 @@ def nome_file_per(chiave: str) -> str:
     Nome remoto del file per una pubblicazione. Override da .env:
         FTP_FILE_MENU_PRANZO=menu-pranzo.pdf
         FTP_FILE_CARTA_VINI=carta-vini.pdf
+        FTP_FILE_CARTA_BEVANDE=carta-bevande.pdf
     Il nome deve restare STABILE nel tempo: il link su WordPress è fisso.
     """
     env_key = "FTP_FILE_" + chiave.upper()
     nome = (os.getenv(env_key) or "").strip() or _NOMI_DEFAULT.get(chiave, f"{chiave}.pdf")
     # basename: un "../" in .env scriverebbe fuori da FTP_DIR.
     return os.path.basename(nome)
+
+
+# ─────────────────────────────────────────────
+# PRODUTTORI REGISTRATI + AUTO-PUBBLICAZIONE
+# ─────────────────────────────────────────────
+
+# chiave → fn() che ritorna (bytes, descrizione). Registrati dai router dei
+# moduli al loro import: se il modulo non è attivo, la chiave non c'è.
+_produttori: Dict[str, Callable[[], Tuple[bytes, str]]] = {}
+
+_auto_lock = threading.Lock()
+_auto_pending: set = set()
+_auto_timer: Optional[threading.Timer] = None
+
+
+def registra_produttore(chiave: str, fn: Callable[[], Tuple[bytes, str]]) -> None:
+    """Registra chi sa generare il contenuto pubblico di `chiave`."""
+    _produttori[chiave] = fn
+
+
+def chiavi_registrate() -> List[str]:
+    return sorted(_produttori)
+
+
+def pubblica_registrati(
+    chiavi: Optional[Iterable[str]] = None,
+    forza: bool = False,
+    notifica_su_errore: bool = True,
+) -> List[EsitoPubblicazione]:
+    """
+    Genera e pubblica in batch (una sessione FTP) le chiavi richieste, o
+    tutte quelle registrate. Una chiave sconosciuta o il cui produttore
+    fallisce diventa un esito di errore, senza bloccare le altre.
+    """
+    quando = datetime.now().isoformat(timespec="seconds")
+    # dedup (ordine preservato): una chiave richiesta due volte si genera e
+    # si carica una volta sola, ed è un solo esito
+    chiavi = list(dict.fromkeys(chiavi)) if chiavi is not None else chiavi_registrate()
+    voci: List[VocePubblicazione] = []
+    errori: Dict[str, EsitoPubblicazione] = {}
+    for chiave in chiavi:
+        fn = _produttori.get(chiave)
+        if fn is None:
+            errori[chiave] = EsitoPubblicazione(
+                ok=False, chiave=chiave, quando=quando,
+                errore="Pubblicazione non disponibile (modulo non attivo su questo locale)",
+            )
+            continue
+        try:
+            contenuto, descrizione = fn()
+        except Exception as e:
+            errori[chiave] = EsitoPubblicazione(
+                ok=False, chiave=chiave, quando=quando,
+                errore=f"Errore generazione contenuto: {e}",
+            )
+            continue
+        voci.append(VocePubblicazione(
+            chiave=chiave,
+            nome_file=nome_file_per(chiave),
+            contenuto=contenuto,
+            descrizione=descrizione,
+        ))
+
+    esiti = pubblica_batch(voci, notifica_su_errore=notifica_su_errore, forza=forza)
+    per_chiave = {v.chiave: e for v, e in zip(voci, esiti)}
+    return [per_chiave.get(k) or errori[k] for k in chiavi]
+
+
+def _chiavi_autopublish() -> set:
+    return {k.strip() for k in (os.getenv("FTP_AUTOPUBLISH") or "").split(",") if k.strip()}
+
+
+def pianifica_autopubblicazione(*chiavi: str) -> None:
+    """
+    Segnala che il contenuto di queste chiavi è cambiato. Se sono in
+    FTP_AUTOPUBLISH e l'FTP è configurato, vengono ripubblicate in un unico
+    batch dopo FTP_AUTOPUBLISH_DELAY_S secondi di quiete (debounce: ogni
+    nuova segnalazione fa ripartire il timer). Non solleva mai.
+    """
+    global _auto_timer
+    try:
+        attive = _chiavi_autopublish()
+        nuove = [k for k in chiavi if k in attive]
+        if not nuove or not is_configured():
+            return
+        try:
+            ritardo = float(os.getenv("FTP_AUTOPUBLISH_DELAY_S") or 300)
+        except ValueError:
+            ritardo = 300.0
+        with _auto_lock:
+            _auto_pending.update(nuove)
+            if _auto_timer is not None:
+                _auto_timer.cancel()
+            _auto_timer = threading.Timer(ritardo, _esegui_autopubblicazione)
+            _auto_timer.daemon = True
+            _auto_timer.start()
+    except Exception as e:
+        logger.warning("Auto-pubblicazione non pianificata: %s", e)
+
+
+def _esegui_autopubblicazione() -> None:
+    global _auto_timer
+    with _auto_lock:
+        chiavi = sorted(_auto_pending)
+        _auto_pending.clear()
+        _auto_timer = None
+    if not chiavi:
+        return
+    try:
+        esiti = pubblica_registrati(chiavi)
+        for e in esiti:
+            logger.info("Auto-pubblicazione %s: ok=%s invariato=%s %s",
+                        e.chiave, e.ok, e.invariato, e.errore or "")
+    except Exception as e:
+        logger.error("Auto-pubblicazione fallita: %s", e)
@@ -120,7 +120,7 @@ def genera_pdf_giftcard(gc: Dict[str, Any]) -> bytes:
     gc = dict della gift card (come lo serializza il router).
     Ritorna i bytes del PDF A5 orizzontale.
     """
-    from weasyprint import HTML, CSS  # lazy import, come negli altri servizi
+    from app.services.pdf_render_cache import render_pdf  # lazy import, come negli altri servizi
 
     brand = _carica_branding()
     intestatario = (gc.get("intestatario_nome") or "").strip()
@@ -207,6 +207,6 @@ def genera_pdf_giftcard(gc: Dict[str, Any]) -> bytes:
     }}
     """
 
-    return HTML(string=html, base_url=str(STATIC_DIR)).write_pdf(
-        stylesheets=[CSS(string=css)]
-    )
+    # Render cache + pool renderer: ri-scaricare lo stesso buono non rifa'
+    # WeasyPrint, e la stampa non blocca il backend.
+    return render_pdf(html, tipo="giftcard", css_strings=[css], base_url=str(STATIC_DIR))
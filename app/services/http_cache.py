@@ -0,0 +1,386 @@
+# @version: v1.0 — Conditional GET (ETag) e compressione risposte (sessione 2026-10-19)
+# -*- coding: utf-8 -*-
+"""
+Conditional GET e compressione delle risposte — TRGB Gestionale
+
+Modulo: platform
+Classificazione: [core]
+
+PERCHÉ ESISTE
+-------------
+Le pagine di lettura pesanti (elenco fatture fino a 50.000 righe, lista
+clienti fino a 5000, lista cantina, cross-ref banca, statistiche iPratico)
+a ogni apertura o refresh rifanno tutte le query e rispediscono tutto il
+JSON, quasi sempre identico a quello di un minuto prima. Niente validatori,
+niente gzip: centinaia di KB in chiaro sul Wi-Fi del locale.
+
+COME FUNZIONA
+-------------
+1. Contatori per tabella. In ogni DB una tabella `cache_versioni`
+   (tabella → versione) incrementata da trigger AFTER INSERT/UPDATE/DELETE
+   sulle tabelle registrate. Qualunque scrittura (router, import, script)
+   sposta il contatore, senza che chi scrive debba ricordarsene.
+
+2. `condizionale(...)` è una dipendenza FastAPI da mettere nell'endpoint:
+
+       @router.get("/fatture", dependencies=[http_cache.condizionale(
+           ("foodcost.db", ["fe_fatture", "fe_righe", "cg_uscite"]))])
+
+   Prima dell'handler legge i contatori (una query per DB) e calcola un
+   ETag debole da: contatori, URL con query string, utente e ruolo, giorno
+   (le liste con "ultimi N mesi" cambiano a mezzanotte) e avvio del
+   processo (un deploy o un restore seguito da restart invalida tutto).
+   Se coincide con `If-None-Match` → 304 senza eseguire l'handler.
+   Altrimenti la risposta esce con `ETag` e `Cache-Control: private,
+   no-cache`: il browser la tiene in cache e alla richiesta dopo manda da
+   solo `If-None-Match` — lato frontend non cambia niente (apiFetch/fetch).
+
+   Se i trigger di una tabella mancano (tabella creata dopo l'avvio) l'ETag
+   non si emette: meglio una risposta piena che un 304 sbagliato.
+   ATTENZIONE: l'elenco tabelle è il contratto. Se l'endpoint inizia a
+   leggere un'altra tabella, va aggiunta qui, o servirà dati vecchi.
+
+3. `HttpCacheMiddleware` (ASGI puro): riporta l'ETag anche sugli handler
+   che ritornano una JSONResponse propria, e comprime con brotli (se il
+   pacchetto è installato e il client lo accetta) o gzip le risposte
+   JSON/testo sopra TRGB_COMPRESSIONE_MIN byte (default 1024). Gli stream
+   (SSE, download a pezzi) e i contenuti già compressi passano intatti.
+
+TRGB_HTTP_CACHE=0 spegne gli ETag, TRGB_COMPRESSIONE=0 la compressione.
+Diagnostica: `stato()` → GET /system/http-cache (admin).
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import anyio
+from fastapi import Depends, HTTPException, Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.services.auth_service import claims_da_scope
+from app.utils.locale_data import locale_data_path
+
+try:  # opzionale: senza, si comprime solo in gzip
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+logger = logging.getLogger("trgb.http_cache")
+
+# Tabelle con contatore, per DB (nome file in locali/<locale>/data/).
+# La migrazione 175 installa i trigger su tutte; `condizionale` ricontrolla
+# al primo uso nel processo e crea quelli mancanti.
+REGISTRO: Dict[str, Tuple[str, ...]] = {
+    "foodcost.db": (
+        "fe_fatture", "fe_righe", "fe_fornitore_categoria", "fe_categorie",
+        "cg_uscite", "cg_entrate",
+        "banca_movimenti", "banca_fatture_link", "banca_categorie_registrazione",
+        "carta_estratti",
+        "ipratico_imports", "ipratico_categorie", "ipratico_prodotti",
+        "ipratico_cubo_mesi", "ipratico_cubo_categorie", "ipratico_cubo_prodotti",
+    ),
+    "clienti.sqlite3": (
+        "clienti", "clienti_tag", "clienti_tag_assoc", "clienti_prenotazioni",
+        "clienti_impostazioni",
+    ),
+    "vini_magazzino.sqlite3": ("vini_bottiglie", "vini_magazzino_movimenti"),
+}
+
+_BOOT = f"{time.time():.0f}"
+_CACHE_CONTROL = "private, no-cache"
+_DEFAULT_MIN_BYTE = 1024
+_SOGLIA_THREAD = 256 * 1024     # sopra, la compressione va in un thread
+_TIPI_COMPRIMIBILI = ("application/json", "text/", "application/javascript",
+                      "application/xml", "image/svg+xml")
+
+_lock = threading.Lock()
+_pronte: set = set()            # (db, tabella) con trigger verificati in questo processo
+_stats = {"etag_emessi": 0, "risposte_304": 0, "senza_etag": 0,
+          "compresse_gzip": 0, "compresse_br": 0, "byte_prima": 0, "byte_dopo": 0}
+
+
+def _env_on(name: str) -> bool:
+    return (os.getenv(name) or "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+def abilitato() -> bool:
+    """TRGB_HTTP_CACHE=0 spegne ETag/304 (le risposte restano piene)."""
+    return _env_on("TRGB_HTTP_CACHE")
+
+
+# ─────────────────────────────────────────────
+# CONTATORI PER TABELLA (DDL idempotente, regola S52-1)
+# ─────────────────────────────────────────────
+
+def _esiste(conn: sqlite3.Connection, tipo: str, nome: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (tipo, nome)
+    ).fetchone() is not None
+
+
+def installa(conn: sqlite3.Connection, tabelle: Iterable[str]) -> int:
+    """
+    Crea cache_versioni e i trigger contatore per le tabelle indicate che
+    esistono nel DB. Ritorna il numero di trigger creati. Non fa commit.
+    """
+    creati = 0
+    if not _esiste(conn, "table", "cache_versioni"):
+        conn.execute(
+            """
+            CREATE TABLE cache_versioni (
+                tabella  TEXT PRIMARY KEY,
+                versione INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+    for tabella in tabelle:
+        if not _esiste(conn, "table", tabella):
+            continue
+        conn.execute("INSERT OR IGNORE INTO cache_versioni (tabella) VALUES (?)", (tabella,))
+        for evento in ("INSERT", "UPDATE", "DELETE"):
+            nome = f"trg_ver_{tabella}_{evento.lower()}"
+            if _esiste(conn, "trigger", nome):
+                continue
+            conn.execute(
+                f"""
+                CREATE TRIGGER {nome} AFTER {evento} ON {tabella}
+                BEGIN
+                    UPDATE cache_versioni SET versione = versione + 1 WHERE tabella = '{tabella}';
+                END
+                """
+            )
+            creati += 1
+    return creati
+
+
+def _prepara(db: str, tabelle: Sequence[str]) -> bool:
+    """True se tutte le tabelle hanno i trigger (creandoli se mancano)."""
+    mancanti = [t for t in tabelle if (db, t) not in _pronte]
+    if not mancanti:
+        return True
+    conn = sqlite3.connect(locale_data_path(db), timeout=30)
+    try:
+        conn.execute("PRAGMA busy_timeout=30000")
+        installa(conn, mancanti)
+        conn.commit()
+        pronte = [t for t in mancanti
+                  if all(_esiste(conn, "trigger", f"trg_ver_{t}_{e}") for e in ("insert", "update", "delete"))]
+    finally:
+        conn.close()
+    with _lock:
+        _pronte.update((db, t) for t in pronte)
+    return len(pronte) == len(mancanti)
+
+
+def versioni(db: str, tabelle: Sequence[str]) -> Optional[Dict[str, int]]:
+    """Contatori attuali; None se qualche tabella non è (ancora) tracciata."""
+    if not _prepara(db, tabelle):
+        return None
+    conn = sqlite3.connect(locale_data_path(db), timeout=30)
+    try:
+        segnaposti = ",".join("?" * len(tabelle))
+        righe = conn.execute(
+            f"SELECT tabella, versione FROM cache_versioni WHERE tabella IN ({segnaposti})",
+            tuple(tabelle),
+        ).fetchall()
+    finally:
+        conn.close()
+    out = dict(righe)
+    return out if len(out) == len(tabelle) else None
+
+
+# ─────────────────────────────────────────────
+# CONDITIONAL GET
+# ─────────────────────────────────────────────
+
+def _corrisponde(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # confronto debole: W/"x" e "x" sono lo stesso validatore
+    nudo = etag[2:] if etag.startswith("W/") else etag
+    for v in if_none_match.split(","):
+        v = v.strip()
+        if (v[2:] if v.startswith("W/") else v) == nudo:
+            return True
+    return False
+
+
+def _etag(request: Request, claims: dict, sorgenti, giornaliero: bool) -> Optional[str]:
+    h = hashlib.sha1()
+    h.update(f"{_BOOT}|{request.url.path}?{request.url.query}|{claims.get('sub')}|{claims.get('role')}".encode())
+    if giornaliero:
+        h.update(date.today().isoformat().encode())
+    for db, tabelle in sorgenti:
+        v = versioni(db, tabelle)
+        if v is None:
+            return None
+        h.update(f"|{db}:".encode() + ",".join(f"{t}={v[t]}" for t in tabelle).encode())
+    return f'W/"{h.hexdigest()[:20]}"'
+
+
+def condizionale(*sorgenti: Tuple[str, Sequence[str]], giornaliero: bool = True):
+    """
+    Dipendenza per `dependencies=[...]` di un endpoint GET che legge SOLO le
+    tabelle indicate: ("foodcost.db", ["fe_fatture", ...]), (...).
+    giornaliero=False se la risposta non dipende dalla data di oggi.
+    """
+    sorgenti_norm = tuple((db, tuple(tabelle)) for db, tabelle in sorgenti)
+
+    def _dipendenza(request: Request, response: Response) -> None:
+        if request.method not in ("GET", "HEAD") or not abilitato():
+            return
+        claims = claims_da_scope(request.scope)
+        if not claims:
+            return  # l'auth dell'endpoint risponderà 401
+        try:
+            etag = _etag(request, claims, sorgenti_norm, giornaliero)
+        except sqlite3.Error as e:
+            logger.warning("ETag non calcolato per %s: %s", request.url.path, e)
+            etag = None
+        if etag is None:
+            with _lock:
+                _stats["senza_etag"] += 1
+            return
+        intestazioni = {"ETag": etag, "Cache-Control": _CACHE_CONTROL, "Vary": "Authorization"}
+        if _corrisponde(request.headers.get("if-none-match"), etag):
+            with _lock:
+                _stats["risposte_304"] += 1
+            raise HTTPException(status_code=304, headers=intestazioni)
+        with _lock:
+            _stats["etag_emessi"] += 1
+        response.headers.update(intestazioni)
+        request.state.http_cache = intestazioni   # per gli handler che ritornano una Response propria
+
+    return Depends(_dipendenza)
+
+
+# ─────────────────────────────────────────────
+# COMPRESSIONE
+# ─────────────────────────────────────────────
+
+def _comprimi(corpo: bytes, codifica: str) -> bytes:
+    if codifica == "br":
+        return brotli.compress(corpo, quality=5)
+    return gzip.compress(corpo, compresslevel=6)
+
+
+class HttpCacheMiddleware:
+    """
+    1. Riporta ETag/Cache-Control messi da `condizionale` anche sugli
+       endpoint che restituiscono una Response propria (JSONResponse),
+       dove gli header della dipendenza andrebbero persi.
+    2. gzip/brotli per risposte JSON/testo a corpo unico. Le risposte a più
+       pezzi (StreamingResponse: SSE, file, export) non si toccano.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.minimo = int(_env_num("TRGB_COMPRESSIONE_MIN", _DEFAULT_MIN_BYTE))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codifica = None
+        if _env_on("TRGB_COMPRESSIONE"):
+            accetta = Headers(scope=scope).get("accept-encoding", "").lower()
+            codifica = "br" if brotli is not None and "br" in accetta else ("gzip" if "gzip" in accetta else None)
+
+        inizio: Dict[str, Any] = {}
+        passa = False
+
+        async def _send(message):
+            nonlocal passa
+            if message["type"] == "http.response.start":
+                message = _con_etag(scope, message)
+                h = Headers(raw=message["headers"])
+                tipo = h.get("content-type", "")
+                if (codifica is None or h.get("content-encoding")
+                        or tipo.startswith("text/event-stream")
+                        or not tipo.startswith(_TIPI_COMPRIMIBILI)):
+                    passa = True
+                    await send(message)
+                else:
+                    inizio.update(message)
+                return
+            if message["type"] != "http.response.body" or passa or not inizio:
+                await send(message)
+                return
+            corpo = message.get("body", b"")
+            if message.get("more_body", False) or len(corpo) < self.minimo:
+                # streaming o troppo piccolo: in chiaro
+                await send(dict(inizio))
+                inizio.clear()
+                await send(message)
+                return
+            if len(corpo) > _SOGLIA_THREAD:
+                compresso = await anyio.to_thread.run_sync(_comprimi, corpo, codifica)
+            else:
+                compresso = _comprimi(corpo, codifica)
+            start = dict(inizio)
+            inizio.clear()
+            h = MutableHeaders(raw=list(start["headers"]))
+            h["Content-Encoding"] = codifica
+            h["Content-Length"] = str(len(compresso))
+            h.add_vary_header("Accept-Encoding")
+            start["headers"] = h.raw
+            with _lock:
+                _stats["compresse_br" if codifica == "br" else "compresse_gzip"] += 1
+                _stats["byte_prima"] += len(corpo)
+                _stats["byte_dopo"] += len(compresso)
+            await send(start)
+            await send({"type": "http.response.body", "body": compresso, "more_body": False})
+
+        await self.app(scope, receive, _send)
+
+
+def _con_etag(scope, message):
+    """Aggiunge gli header di `condizionale` a una risposta 200 che non li ha."""
+    intestazioni = (scope.get("state") or {}).get("http_cache")
+    if not intestazioni or message["status"] != 200:
+        return message
+    h = MutableHeaders(raw=list(message["headers"]))
+    if "etag" in h:
+        return message
+    h["ETag"] = intestazioni["ETag"]
+    h["Cache-Control"] = intestazioni["Cache-Control"]
+    h.add_vary_header("Authorization")
+    return {**message, "headers": h.raw}
+
+
+# ─────────────────────────────────────────────
+# DIAGNOSTICA
+# ─────────────────────────────────────────────
+
+def stato() -> dict:
+    with _lock:
+        s = dict(_stats)
+        tracciate = sorted(f"{db}:{t}" for db, t in _pronte)
+    s["risparmio_compressione"] = (
+        round(1 - s["byte_dopo"] / s["byte_prima"], 3) if s["byte_prima"] else None
+    )
+    return {
+        "etag_abilitati": abilitato(),
+        "compressione": _env_on("TRGB_COMPRESSIONE"),
+        "brotli": brotli is not None,
+        **s,
+        "tabelle_tracciate": tracciate,
+    }
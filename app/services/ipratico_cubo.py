@@ -0,0 +1,270 @@
+# @version: v1.0 — Cubo vendite iPratico (sessione 2026-10-19)
+# -*- coding: utf-8 -*-
+"""
+Cubo vendite iPratico — TRGB Gestionale
+
+Modulo: statistiche
+Classificazione: [core]
+
+PERCHÉ ESISTE
+-------------
+La Dashboard Statistiche chiedeva categorie, top prodotti e trend con
+GROUP BY al volo su `ipratico_prodotti` / `ipratico_categorie`: in vista
+"anno" o "tutto" ogni grafico riaggregava l'intero storico, e /movimenti
+ricostruiva i due mesi e li confrontava in Python a ogni apertura.
+
+COME FUNZIONA
+-------------
+Tre tabelle in foodcost.db (migrazione 173), ricalcolate SOLO quando un
+mese viene importato o eliminato (`aggiorna_mesi`, chiamata dal router
+dentro la stessa transazione):
+
+  ipratico_cubo_prodotti   (anno, mese, categoria, prodotto)
+  ipratico_cubo_categorie  (anno, mese, categoria)
+      quantita, totale_cent, rank (per fatturato, 1 = primo),
+      prev_quantita / prev_totale_cent = stesso prodotto/categoria nel mese
+      importato immediatamente precedente (solo righe mensili).
+      Livelli: mese > 0 = mese; mese = 0 = anno intero; anno = 0 e
+      mese = 0 = tutto lo storico.
+  ipratico_cubo_mesi       (anno, mese) → prev_anno/prev_mese, totali,
+      n. prodotti e categorie: il "mese precedente importato" una volta sola.
+
+Un import del mese M tocca: le righe di M, quelle del mese importato dopo
+M (il suo "precedente" è cambiato), l'anno di M e il totale.
+`ricostruisci` rifà tutto (migrazione, diagnostica).
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from typing import Iterable, Optional, Set, Tuple
+
+_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS ipratico_cubo_prodotti (
+        anno              INTEGER NOT NULL,   -- 0 = tutto lo storico
+        mese              INTEGER NOT NULL,   -- 0 = anno intero
+        categoria         TEXT    NOT NULL,
+        prodotto          TEXT    NOT NULL,
+        quantita          INTEGER NOT NULL DEFAULT 0,
+        totale_cent       INTEGER NOT NULL DEFAULT 0,
+        rank              INTEGER,            -- per totale_cent nel livello
+        prev_quantita     INTEGER,            -- mese importato precedente (solo mese > 0)
+        prev_totale_cent  INTEGER,
+        PRIMARY KEY (anno, mese, categoria, prodotto)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ipratico_cubo_prod_rank ON ipratico_cubo_prodotti(anno, mese, rank)",
+    # /trend?prodotto= cerca UPPER(prodotto) = UPPER(?): indice sull'espressione
+    "CREATE INDEX IF NOT EXISTS idx_ipratico_cubo_prod_upper ON ipratico_cubo_prodotti(UPPER(prodotto))",
+    """
+    CREATE TABLE IF NOT EXISTS ipratico_cubo_categorie (
+        anno              INTEGER NOT NULL,
+        mese              INTEGER NOT NULL,
+        categoria         TEXT    NOT NULL,
+        quantita          INTEGER NOT NULL DEFAULT 0,
+        totale_cent       INTEGER NOT NULL DEFAULT 0,
+        rank              INTEGER,
+        prev_quantita     INTEGER,
+        prev_totale_cent  INTEGER,
+        PRIMARY KEY (anno, mese, categoria)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ipratico_cubo_mesi (
+        anno          INTEGER NOT NULL,
+        mese          INTEGER NOT NULL,
+        prev_anno     INTEGER,
+        prev_mese     INTEGER,
+        quantita      INTEGER NOT NULL DEFAULT 0,
+        totale_cent   INTEGER NOT NULL DEFAULT 0,
+        n_prodotti    INTEGER NOT NULL DEFAULT 0,
+        n_categorie   INTEGER NOT NULL DEFAULT 0,
+        aggiornato_il TEXT DEFAULT (datetime('now','localtime')),
+        PRIMARY KEY (anno, mese)
+    )
+    """,
+]
+
+# Livello → filtro sulle tabelle sorgente. :a / :m = livello, :pa / :pm = mese precedente.
+_FILTRO = {
+    "mese": "anno = :a AND mese = :m",
+    "anno": "anno = :a",
+    "tutto": "1 = 1",
+}
+
+_SQL_PRODOTTI = """
+    INSERT INTO ipratico_cubo_prodotti
+        (anno, mese, categoria, prodotto, quantita, totale_cent, rank, prev_quantita, prev_totale_cent)
+    SELECT :a, :m, c.categoria, c.prodotto, c.quantita, c.totale_cent,
+           ROW_NUMBER() OVER (ORDER BY c.totale_cent DESC, c.categoria, c.prodotto),
+           p.quantita, p.totale_cent
+    FROM (
+        SELECT categoria, prodotto, SUM(quantita) AS quantita, SUM(totale_cent) AS totale_cent
+        FROM ipratico_prodotti WHERE {filtro}
+        GROUP BY categoria, prodotto
+    ) c
+    LEFT JOIN (
+        SELECT categoria, prodotto, SUM(quantita) AS quantita, SUM(totale_cent) AS totale_cent
+        FROM ipratico_prodotti WHERE anno = :pa AND mese = :pm
+        GROUP BY categoria, prodotto
+    ) p ON p.categoria = c.categoria AND p.prodotto = c.prodotto
+"""
+
+_SQL_CATEGORIE = """
+    INSERT INTO ipratico_cubo_categorie
+        (anno, mese, categoria, quantita, totale_cent, rank, prev_quantita, prev_totale_cent)
+    SELECT :a, :m, c.categoria, c.quantita, c.totale_cent,
+           ROW_NUMBER() OVER (ORDER BY c.totale_cent DESC, c.categoria),
+           p.quantita, p.totale_cent
+    FROM (
+        SELECT categoria, SUM(quantita) AS quantita, SUM(totale_cent) AS totale_cent
+        FROM ipratico_categorie WHERE {filtro}
+        GROUP BY categoria
+    ) c
+    LEFT JOIN (
+        SELECT categoria, SUM(quantita) AS quantita, SUM(totale_cent) AS totale_cent
+        FROM ipratico_categorie WHERE anno = :pa AND mese = :pm
+        GROUP BY categoria
+    ) p ON p.categoria = c.categoria
+"""
+
+
+def ensure_cubo(conn: sqlite3.Connection) -> None:
+    for ddl in _DDL:
+        conn.execute(ddl)
+
+
+def cubo_pronto(conn: sqlite3.Connection) -> bool:
+    """True se le tabelle del cubo esistono (migrazione 173 applicata)."""
+    n = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN "
+        "('ipratico_cubo_prodotti', 'ipratico_cubo_categorie', 'ipratico_cubo_mesi')"
+    ).fetchone()[0]
+    return n == 3
+
+
+def _mese_precedente(conn: sqlite3.Connection, anno: int, mese: int) -> Optional[Tuple[int, int]]:
+    r = conn.execute(
+        """SELECT anno, mese FROM ipratico_imports
+           WHERE (anno < ?) OR (anno = ? AND mese < ?)
+           ORDER BY anno DESC, mese DESC LIMIT 1""",
+        (anno, anno, mese),
+    ).fetchone()
+    return (r[0], r[1]) if r else None
+
+
+def _mese_successivo(conn: sqlite3.Connection, anno: int, mese: int) -> Optional[Tuple[int, int]]:
+    r = conn.execute(
+        """SELECT anno, mese FROM ipratico_imports
+           WHERE (anno > ?) OR (anno = ? AND mese > ?)
+           ORDER BY anno, mese LIMIT 1""",
+        (anno, anno, mese),
+    ).fetchone()
+    return (r[0], r[1]) if r else None
+
+
+def _importato(conn: sqlite3.Connection, anno: int, mese: int) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM ipratico_imports WHERE anno = ? AND mese = ?", (anno, mese)
+    ).fetchone() is not None
+
+
+def _svuota_livello(conn: sqlite3.Connection, anno: int, mese: int) -> None:
+    for tab in ("ipratico_cubo_prodotti", "ipratico_cubo_categorie"):
+        conn.execute(f"DELETE FROM {tab} WHERE anno = ? AND mese = ?", (anno, mese))
+
+
+def _calcola_livello(conn: sqlite3.Connection, livello: str, anno: int, mese: int,
+                     prev: Optional[Tuple[int, int]] = None) -> None:
+    _svuota_livello(conn, anno, mese)
+    p = {"a": anno, "m": mese, "pa": prev[0] if prev else -1, "pm": prev[1] if prev else -1}
+    conn.execute(_SQL_PRODOTTI.format(filtro=_FILTRO[livello]), p)
+    conn.execute(_SQL_CATEGORIE.format(filtro=_FILTRO[livello]), p)
+
+
+def _calcola_mese(conn: sqlite3.Connection, anno: int, mese: int) -> None:
+    """Righe mensili + record in ipratico_cubo_mesi per un mese importato."""
+    prev = _mese_precedente(conn, anno, mese)
+    _calcola_livello(conn, "mese", anno, mese, prev)
+    conn.execute("DELETE FROM ipratico_cubo_mesi WHERE anno = ? AND mese = ?", (anno, mese))
+    conn.execute(
+        """INSERT INTO ipratico_cubo_mesi
+               (anno, mese, prev_anno, prev_mese, quantita, totale_cent, n_prodotti, n_categorie)
+           SELECT ?, ?, ?, ?,
+                  COALESCE((SELECT SUM(quantita) FROM ipratico_cubo_categorie WHERE anno = ? AND mese = ?), 0),
+                  COALESCE((SELECT SUM(totale_cent) FROM ipratico_cubo_categorie WHERE anno = ? AND mese = ?), 0),
+                  (SELECT COUNT(*) FROM ipratico_cubo_prodotti WHERE anno = ? AND mese = ?),
+                  (SELECT COUNT(*) FROM ipratico_cubo_categorie WHERE anno = ? AND mese = ?)""",
+        (anno, mese, prev[0] if prev else None, prev[1] if prev else None,
+         anno, mese, anno, mese, anno, mese, anno, mese),
+    )
+
+
+def aggiorna_mesi(conn: sqlite3.Connection, mesi: Iterable[Tuple[int, int]]) -> None:
+    """
+    I mesi (anno, mese) sono stati importati o eliminati: ricalcola ciascun
+    mese (o lo toglie), il mese importato successivo, i loro anni e il
+    totale — una volta sola anche se i mesi sono tanti (import multiplo).
+    Non fa commit: gira nella transazione dell'import/delete.
+    """
+    if not cubo_pronto(conn):
+        return
+    toccati: Set[Tuple[int, int]] = set()
+    for anno, mese in mesi:
+        toccati.add((anno, mese))
+        succ = _mese_successivo(conn, anno, mese)
+        if succ:
+            toccati.add(succ)
+    for anno, mese in sorted(toccati):
+        if _importato(conn, anno, mese):
+            _calcola_mese(conn, anno, mese)
+        else:
+            _svuota_livello(conn, anno, mese)
+            conn.execute("DELETE FROM ipratico_cubo_mesi WHERE anno = ? AND mese = ?", (anno, mese))
+    for anno in sorted({a for a, _ in toccati}):
+        _calcola_livello(conn, "anno", anno, 0)
+    _calcola_livello(conn, "tutto", 0, 0)
+
+
+def ricostruisci(conn: sqlite3.Connection) -> int:
+    """Ricalcola da zero tutto il cubo. Ritorna i mesi calcolati."""
+    ensure_cubo(conn)
+    for tab in ("ipratico_cubo_prodotti", "ipratico_cubo_categorie", "ipratico_cubo_mesi"):
+        conn.execute(f"DELETE FROM {tab}")
+    mesi = conn.execute("SELECT anno, mese FROM ipratico_imports ORDER BY anno, mese").fetchall()
+    for a, m in mesi:
+        _calcola_mese(conn, a, m)
+    for (a,) in conn.execute("SELECT DISTINCT anno FROM ipratico_imports").fetchall():
+        _calcola_livello(conn, "anno", a, 0)
+    _calcola_livello(conn, "tutto", 0, 0)
+    conn.commit()
+    return len(mesi)
+
+
+def verifica(conn: sqlite3.Connection) -> dict:
+    """
+    Diagnostica: confronta il cubo con le tabelle grezze (righe mensili e
+    totale storico). Ritorna {"ok": bool, "differenze": [...]} (max 50).
+    """
+    diff = []
+    for tab, chiave in (("prodotti", "categoria, prodotto"), ("categorie", "categoria")):
+        for livello, sel, gruppo, filtro in (
+            ("mese", "anno, mese", "anno, mese, ", "anno > 0 AND mese > 0"),
+            ("tutto", "0, 0", "", "anno = 0 AND mese = 0"),
+        ):
+            rows = conn.execute(
+                f"""SELECT {sel}, {chiave}, SUM(quantita), SUM(totale_cent) FROM ipratico_{tab}
+                    GROUP BY {gruppo}{chiave}
+                    EXCEPT
+                    SELECT anno, mese, {chiave}, quantita, totale_cent FROM ipratico_cubo_{tab}
+                    WHERE {filtro}"""
+            ).fetchall()
+            diff.extend({"tabella": tab, "livello": livello, "riga": list(r)} for r in rows)
+            n_cubo = conn.execute(f"SELECT COUNT(*) FROM ipratico_cubo_{tab} WHERE {filtro}").fetchone()[0]
+            n_src = conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM ipratico_{tab} GROUP BY {gruppo}{chiave})"
+            ).fetchone()[0]
+            if n_cubo != n_src:
+                diff.append({"tabella": tab, "livello": livello, "righe_cubo": n_cubo, "righe_sorgente": n_src})
+    return {"ok": not diff, "differenze": diff[:50]}
@@ -6,24 +6,182 @@ iPratico esporta file con estensione .xls ma contenuto HTML.
 Contiene 2 tabelle:
   - Tabella 0: riepilogo categorie (Categoria, Quantità, Totale in centesimi)
   - Tabella 1: dettaglio prodotti (Categoria, Prodotto, Quantità, Totale, PLU, Barcode)
+
+v2 (2026-10-19): niente più pandas. `pd.read_html` + `iterrows()` +
+`pd.to_numeric` per cella costavano più dell'import stesso (e pandas da
+solo ~1s di import a freddo). Ora le celle si estraggono con regex
+compilate (percorso veloce, markup chiuso come lo produce iPratico) o con
+`html.parser` della stdlib se il markup è irregolare, direttamente dai
+bytes dell'upload (niente file temporaneo). Stesse regole di prima: la
+prima riga di ogni tabella è l'header, colonne riconosciute per sottostringa,
+separatore delle migliaia "," tolto da numeri e codici come faceva
+read_html (vedi _senza_migliaia).
+Benchmark: tools/bench_ipratico_parser.py.
 """
 
 from __future__ import annotations
-from typing import List, Dict, Any, Tuple
-import pandas as pd
+
+import html
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple, Union
+
+
+class _TabelleHTML(HTMLParser):
+    """Raccoglie le tabelle come liste di righe di testo (solo tabelle di primo livello)."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tabelle: List[List[List[str]]] = []
+        self._prof = 0              # profondità <table>
+        self._riga: Optional[List[str]] = None
+        self._cella: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self._prof += 1
+            if self._prof == 1:
+                self.tabelle.append([])
+        elif self._prof == 1:
+            if tag == "tr":
+                self._chiudi_riga()
+                self._riga = []
+            elif tag in ("td", "th"):
+                self._chiudi_cella()
+                if self._riga is None:
+                    self._riga = []
+                self._cella = []
+            elif tag == "br" and self._cella is not None:
+                self._cella.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag == "table":
+            if self._prof == 1:
+                self._chiudi_riga()
+            self._prof = max(self._prof - 1, 0)
+        elif self._prof == 1:
+            if tag in ("td", "th"):
+                self._chiudi_cella()
+            elif tag == "tr":
+                self._chiudi_riga()
+
+    def handle_data(self, data):
+        if self._cella is not None:
+            self._cella.append(data)
+
+    def _chiudi_cella(self):
+        if self._cella is not None and self._riga is not None:
+            self._riga.append(" ".join("".join(self._cella).split()))
+        self._cella = None
+
+    def _chiudi_riga(self):
+        self._chiudi_cella()
+        if self._riga is not None and self.tabelle:
+            self.tabelle[-1].append(self._riga)
+        self._riga = None
+
+
+# Percorso veloce: gli export iPratico chiudono sempre </td> e </tr>, quindi
+# bastano tre regex compilate (motore C) invece di un callback Python per tag.
+# Se il markup non torna (tag aperti ≠ chiusi, tabelle annidate) si passa a
+# _TabelleHTML, che gestisce l'HTML "libero".
+_RE_TABLE = re.compile(r"<table\b[^>]*>(.*?)</table\s*>", re.I | re.S)
+_RE_TR = re.compile(r"<tr\b[^>]*>(.*?)</tr\s*>", re.I | re.S)
+_RE_TD = re.compile(r"<t[dh]\b[^>]*>(.*?)</t[dh]\s*>", re.I | re.S)
+_RE_TAG = re.compile(r"<[^>]*>")
+_RE_APERTI = re.compile(r"<(table|tr|td|th)\b", re.I)
+_RE_CHIUSI = re.compile(r"</(table|tr|td|th)\s*>", re.I)
+
+
+def _testo_cella(raw: str) -> str:
+    if "<" in raw:
+        raw = _RE_TAG.sub(" ", raw)
+    if "&" in raw:
+        raw = html.unescape(raw)
+    return " ".join(raw.split())
+
+
+def _estrai_tabelle(text: str) -> List[List[List[str]]]:
+    """Tabelle di primo livello come liste di righe di celle (testo)."""
+    aperti = sorted(m.group(1).lower() for m in _RE_APERTI.finditer(text))
+    chiusi = sorted(m.group(1).lower() for m in _RE_CHIUSI.finditer(text))
+    if aperti == chiusi:
+        tabelle = [
+            [[_testo_cella(c) for c in _RE_TD.findall(tr)] for tr in _RE_TR.findall(body)]
+            for body in _RE_TABLE.findall(text)
+        ]
+        if all("<table" not in t.lower() for t in _RE_TABLE.findall(text)):
+            return [[r for r in t if r] for t in tabelle]
+    p = _TabelleHTML()
+    p.feed(text)
+    p.close()
+    return [[r for r in t if r] for t in p.tabelle]
+
+
+# Separatore delle migliaia come lo toglieva pd.read_html (thousands=","):
+# solo se la cella, senza virgole, è un numero e ogni virgola segue una
+# cifra. "1,500" → "1500", "1,234.5" → "1234.5"; ",500" e "1,,0" restano.
+_RE_NUM_MIGLIAIA = re.compile(r"^[\-\+]?([0-9]+,|[0-9])*(\.[0-9]*)?([0-9]?[Ee]\-?[0-9]+)?$")
+
+
+def _senza_migliaia(s: str) -> str:
+    if "," in s and _RE_NUM_MIGLIAIA.match(s):
+        return s.replace(",", "")
+    return s
 
 
 def _safe_int(val, default=0) -> int:
-    """Converte a int gestendo NaN, None, stringhe vuote."""
-    n = pd.to_numeric(val, errors="coerce")
-    if pd.isna(n):
+    """Converte a int gestendo None, stringhe vuote, migliaia e valori non numerici."""
+    if val is None:
+        return default
+    s = _senza_migliaia(str(val).strip())
+    if not s or "_" in s:   # float() accetta "1_000", pandas no
+        return default
+    try:
+        return int(s)
+    except ValueError:
+        pass
+    try:
+        n = float(s)
+    except ValueError:
+        return default
+    if n != n or n in (float("inf"), float("-inf")):  # NaN / inf
         return default
     return int(n)
 
 
-def parse_ipratico_html(file_path: str) -> Tuple[List[Dict], List[Dict]]:
+def _indici(header: List[str], regole: List[Tuple[str, str]]) -> Dict[str, int]:
+    """
+    Nome logico → indice colonna. Per ogni colonna vince la prima regola
+    (sottostringa) che la descrive, come nella vecchia rename pandas.
+    """
+    out: Dict[str, int] = {}
+    for i, c in enumerate(header):
+        cl = c.lower().strip()
+        for chiave, nome in regole:
+            if chiave in cl:
+                out[nome] = i
+                break
+    return out
+
+
+def _cella(riga: List[str], idx: Dict[str, int], nome: str) -> str:
+    i = idx.get(nome)
+    if i is None or i >= len(riga):
+        return ""
+    return riga[i].strip()
+
+
+_REGOLE_CATEGORIE = [("categ", "categoria"), ("quant", "quantita"), ("total", "totale")]
+_REGOLE_PRODOTTI = [
+    ("categ", "categoria"), ("prodot", "prodotto"), ("quant", "quantita"),
+    ("total", "totale"), ("plu", "plu"), ("barco", "barcode"),
+]
+
+
+def parse_ipratico_bytes(content: Union[bytes, str]) -> Tuple[List[Dict], List[Dict]]:
     """
-    Parsa un file export iPratico e ritorna:
+    Parsa il contenuto di un export iPratico e ritorna:
       (categorie, prodotti)
 
     Ogni categoria: {categoria, quantita, totale_cent}
@@ -31,7 +189,8 @@ def parse_ipratico_html(file_path: str) -> Tuple[List[Dict], List[Dict]]:
 
     I totali sono in centesimi (iPratico li esporta così).
     """
-    tables = pd.read_html(file_path, encoding="utf-8")
+    text = content.decode("utf-8", errors="replace") if isinstance(content, bytes) else content
+    tables = [t for t in _estrai_tabelle(text) if t]
 
     if len(tables) < 2:
         raise ValueError(
@@ -39,78 +198,51 @@ def parse_ipratico_html(file_path: str) -> Tuple[List[Dict], List[Dict]]:
         )
 
     # --- Tabella 0: categorie ---
-    t0 = tables[0]
-    t0.columns = t0.iloc[0]
-    t0 = t0.iloc[1:].reset_index(drop=True)
-
-    # Normalizza nomi colonne (iPratico usa "Quantità" con encoding variabile)
-    col_map_0 = {}
-    for c in t0.columns:
-        cl = str(c).lower().strip()
-        if "categ" in cl:
-            col_map_0[c] = "categoria"
-        elif "quant" in cl:
-            col_map_0[c] = "quantita"
-        elif "total" in cl:
-            col_map_0[c] = "totale"
-    t0 = t0.rename(columns=col_map_0)
-
+    idx0 = _indici(tables[0][0], _REGOLE_CATEGORIE)
     categorie = []
-    for _, r in t0.iterrows():
-        cat = str(r.get("categoria", "")).strip()
+    for r in tables[0][1:]:
+        cat = _cella(r, idx0, "categoria")
         if not cat:
             continue
         categorie.append({
             "categoria": cat,
-            "quantita": _safe_int(r.get("quantita", 0)),
-            "totale_cent": _safe_int(r.get("totale", 0)),
+            "quantita": _safe_int(_cella(r, idx0, "quantita")),
+            "totale_cent": _safe_int(_cella(r, idx0, "totale")),
         })
 
     # --- Tabella 1: prodotti ---
-    t1 = tables[1]
-    t1.columns = t1.iloc[0]
-    t1 = t1.iloc[1:].reset_index(drop=True)
-
-    col_map_1 = {}
-    for c in t1.columns:
-        cl = str(c).lower().strip()
-        if "categ" in cl:
-            col_map_1[c] = "categoria"
-        elif "prodot" in cl:
-            col_map_1[c] = "prodotto"
-        elif "quant" in cl:
-            col_map_1[c] = "quantita"
-        elif "total" in cl:
-            col_map_1[c] = "totale"
-        elif "plu" in cl:
-            col_map_1[c] = "plu"
-        elif "barco" in cl:
-            col_map_1[c] = "barcode"
-    t1 = t1.rename(columns=col_map_1)
+    idx1 = _indici(tables[1][0], _REGOLE_PRODOTTI)
 
     # iPratico può esportare lo stesso prodotto più volte nella stessa categoria
     # (es. "Vino" con prezzi diversi). Aggreghiamo quantità e totale per evitare
     # conflitti col vincolo UNIQUE(anno, mese, categoria, prodotto).
     prodotti_map: Dict[Tuple[str, str], Dict] = {}
-    for _, r in t1.iterrows():
-        cat = str(r.get("categoria", "")).strip()
-        prod = str(r.get("prodotto", "")).strip()
+    for r in tables[1][1:]:
+        cat = _cella(r, idx1, "categoria")
+        prod = _cella(r, idx1, "prodotto")
         if not cat or not prod:
             continue
         key = (cat, prod)
         if key in prodotti_map:
-            prodotti_map[key]["quantita"] += _safe_int(r.get("quantita", 0))
-            prodotti_map[key]["totale_cent"] += _safe_int(r.get("totale", 0))
+            prodotti_map[key]["quantita"] += _safe_int(_cella(r, idx1, "quantita"))
+            prodotti_map[key]["totale_cent"] += _safe_int(_cella(r, idx1, "totale"))
         else:
             prodotti_map[key] = {
                 "categoria": cat,
                 "prodotto": prod,
-                "quantita": _safe_int(r.get("quantita", 0)),
-                "totale_cent": _safe_int(r.get("totale", 0)),
-                "plu": str(r.get("plu", "")).strip() if pd.notna(r.get("plu")) else None,
-                "barcode": str(r.get("barcode", "")).strip() if pd.notna(r.get("barcode")) else None,
+                "quantita": _safe_int(_cella(r, idx1, "quantita")),
+                "totale_cent": _safe_int(_cella(r, idx1, "totale")),
+                # codici: pandas li leggeva come numeri, "1,234" → "1234"
+                "plu": _senza_migliaia(_cella(r, idx1, "plu")) or None,
+                "barcode": _senza_migliaia(_cella(r, idx1, "barcode")) or None,
             }
 
     prodotti = list(prodotti_map.values())
 
     return categorie, prodotti
+
+
+def parse_ipratico_html(file_path: str) -> Tuple[List[Dict], List[Dict]]:
+    """Come parse_ipratico_bytes, da file su disco."""
+    with open(file_path, "rb") as f:
+        return parse_ipratico_bytes(f.read())
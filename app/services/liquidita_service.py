@@ -1,5 +1,5 @@
 # app/services/liquidita_service.py
-# @version: v1.2
+# @version: v1.4
 #
 # Aggregatore Liquidita' per Controllo di Gestione.
 #
@@ -8,6 +8,11 @@
 # PRINCIPIO DI COMPETENZA (vendite attribuite al giorno in cui sono state fatte).
 #
 # Fonte dati unica: banca_movimenti (foodcost.db).
+# v1.3: saldi, trend e KPI di periodo leggono banca_saldi_giornalieri (running
+# balance per rapporto mantenuto da trigger, migrazione 172) invece di
+# sommare lo storico a ogni richiesta. + proiezione_cassa dalle scadenze cg_uscite.
+# v1.4: import in blocco con trigger dei saldi sospesi (sospendi_saldi /
+# riprendi_saldi, migrazione 182) e un solo ricalcolo dalla data più vecchia.
 #
 # Tassonomia ENTRATE custom (la categoria_banca del feed BPM e' incompleta:
 # molti POS arrivano senza categoria, quindi classifichiamo anche per pattern
@@ -35,7 +40,9 @@
 
 import sqlite3
 from datetime import date, timedelta
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from app.services.stati_pagamento import STATI_APERTI
 
 
 # ══════════════════════════════════════════════
@@ -180,6 +187,278 @@ def _fmt_mese(m: int) -> str:
     return nomi[m] if 1 <= m <= 12 else f"M{m}"
 
 
+# ══════════════════════════════════════════════
+# SALDI GIORNALIERI (v1.3) — running balance per rapporto
+# ══════════════════════════════════════════════
+# Saldo attuale, trend 90gg, KPI rolling e la dashboard CG sommavano
+# banca_movimenti da inizio storia a ogni apertura. `banca_saldi_giornalieri`
+# tiene una riga per (rapporto, giorno) con i totali del giorno e il saldo
+# progressivo di fine giornata, mantenuta da trigger su banca_movimenti:
+#   - la riga del giorno toccato viene aggiornata (UPSERT);
+#   - i giorni successivi dello stesso rapporto spostano il saldo di ±importo.
+# Un import di movimenti recenti tocca poche righe in coda; un movimento
+# retrodatato sposta tutti i giorni dopo di lui (sono centinaia, non migliaia).
+# Creata dalla migrazione 172; se manca (DB vecchio) si ricade sulle query
+# dirette su banca_movimenti. `verifica_saldi` confronta con le somme vere.
+#
+# Import in blocco (CSV banca, migliaia di righe): riga per riga i trigger
+# riscrivono ogni volta tutta la coda del rapporto e pesano più
+# dell'INSERT stesso. `sospendi_saldi` mette una riga in
+# banca_saldi_sospesi (i trigger hanno WHEN NOT EXISTS su quella tabella),
+# `riprendi_saldi` la toglie e ricalcola una volta sola i giorni dalla data
+# più vecchia dell'import. Tutto nella transazione dell'import: se va in
+# rollback torna indietro anche la sospensione.
+
+_SALDI_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS banca_saldi_giornalieri (
+        rapporto  TEXT    NOT NULL DEFAULT '',   -- '' = movimenti senza rapporto
+        data      TEXT    NOT NULL,              -- data_contabile YYYY-MM-DD
+        n         INTEGER NOT NULL DEFAULT 0,    -- movimenti del giorno
+        entrate   REAL    NOT NULL DEFAULT 0,    -- somma importi > 0
+        uscite    REAL    NOT NULL DEFAULT 0,    -- somma importi < 0 (negativa)
+        delta     REAL    NOT NULL DEFAULT 0,    -- entrate + uscite
+        saldo     REAL    NOT NULL DEFAULT 0,    -- saldo progressivo a fine giornata
+        PRIMARY KEY (rapporto, data)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_banca_saldi_data ON banca_saldi_giornalieri(data)",
+    # Non vuota = trigger dei saldi spenti (import in blocco in corso)
+    "CREATE TABLE IF NOT EXISTS banca_saldi_sospesi (motivo TEXT)",
+]
+
+_ATTIVI = "FOR EACH ROW WHEN NOT EXISTS (SELECT 1 FROM banca_saldi_sospesi)"
+
+
+def _sql_applica(alias: str, segno: str) -> str:
+    """Corpo trigger: somma (segno='+') o toglie (segno='-') il movimento alias."""
+    r = f"COALESCE({alias}.rapporto, '')"
+    d = f"{alias}.data_contabile"
+    x = f"({segno}COALESCE({alias}.importo, 0))"
+    k = "1" if segno == "+" else "-1"
+    e = f"(CASE WHEN {alias}.importo > 0 THEN {x} ELSE 0 END)"
+    u = f"(CASE WHEN {alias}.importo < 0 THEN {x} ELSE 0 END)"
+    return (
+        "INSERT INTO banca_saldi_giornalieri (rapporto, data, n, entrate, uscite, delta, saldo) "
+        f"VALUES ({r}, {d}, {k}, {e}, {u}, {x}, "
+        f"COALESCE((SELECT s.saldo FROM banca_saldi_giornalieri s WHERE s.rapporto = {r} "
+        f"AND s.data < {d} ORDER BY s.data DESC LIMIT 1), 0) + {x}) "
+        "ON CONFLICT(rapporto, data) DO UPDATE SET "
+        "n = n + excluded.n, entrate = entrate + excluded.entrate, "
+        "uscite = uscite + excluded.uscite, delta = delta + excluded.delta, "
+        "saldo = saldo + excluded.delta; "
+        f"UPDATE banca_saldi_giornalieri SET saldo = saldo + {x} "
+        f"WHERE rapporto = {r} AND data > {d}; "
+        f"DELETE FROM banca_saldi_giornalieri WHERE rapporto = {r} AND data = {d} AND n <= 0;"
+    )
+
+
+def _saldi_triggers() -> List[Tuple[str, str, str]]:
+    """(nome, evento, corpo)."""
+    return [
+        ("trg_banca_saldi_ins", f"AFTER INSERT ON banca_movimenti {_ATTIVI}", _sql_applica("NEW", "+")),
+        ("trg_banca_saldi_del", f"AFTER DELETE ON banca_movimenti {_ATTIVI}", _sql_applica("OLD", "-")),
+        (
+            "trg_banca_saldi_upd",
+            f"AFTER UPDATE OF importo, data_contabile, rapporto ON banca_movimenti {_ATTIVI}",
+            _sql_applica("OLD", "-") + " " + _sql_applica("NEW", "+"),
+        ),
+    ]
+
+
+def saldi_pronti(conn: sqlite3.Connection) -> bool:
+    """True se banca_saldi_giornalieri, la tabella di sospensione e i trigger esistono."""
+    nomi = {
+        r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE name IN "
+            "('banca_saldi_giornalieri', 'banca_saldi_sospesi') "
+            "OR name LIKE 'trg\\_banca\\_saldi\\_%' ESCAPE '\\'"
+        ).fetchall()
+    }
+    return {"banca_saldi_giornalieri", "banca_saldi_sospesi"} <= nomi \
+        and all(n in nomi for n, _e, _c in _saldi_triggers())
+
+
+def installa_trigger_saldi(conn: sqlite3.Connection) -> None:
+    """(Ri)crea tabelle e trigger dei saldi, senza toccare i dati. Non fa commit."""
+    for ddl in _SALDI_DDL:
+        conn.execute(ddl)
+    for nome, evento, corpo in _saldi_triggers():
+        conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        conn.execute(f"CREATE TRIGGER {nome} {evento} BEGIN {corpo} END")
+
+
+def ensure_saldi_giornalieri(conn: sqlite3.Connection) -> bool:
+    """
+    Crea tabella e trigger se mancano e li popola dallo storico (idempotente).
+    Ritorna False se banca_movimenti non esiste ancora.
+    """
+    if saldi_pronti(conn):
+        return True
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'banca_movimenti'"
+    ).fetchone():
+        return False
+    installa_trigger_saldi(conn)
+    ricostruisci_saldi(conn)
+    return True
+
+
+def ricostruisci_saldi(conn: sqlite3.Connection) -> int:
+    """Ricalcola da zero la tabella dei saldi. Ritorna le righe scritte."""
+    conn.execute("DELETE FROM banca_saldi_giornalieri")
+    conn.execute("""
+        INSERT INTO banca_saldi_giornalieri (rapporto, data, n, entrate, uscite, delta, saldo)
+        SELECT rapporto, data, n, entrate, uscite, delta,
+               SUM(delta) OVER (PARTITION BY rapporto ORDER BY data)
+        FROM (
+            SELECT COALESCE(rapporto, '') AS rapporto,
+                   data_contabile AS data,
+                   COUNT(*) AS n,
+                   TOTAL(CASE WHEN importo > 0 THEN importo ELSE 0 END) AS entrate,
+                   TOTAL(CASE WHEN importo < 0 THEN importo ELSE 0 END) AS uscite,
+                   TOTAL(importo) AS delta
+            FROM banca_movimenti
+            WHERE data_contabile IS NOT NULL
+            GROUP BY COALESCE(rapporto, ''), data_contabile
+        )
+    """)
+    conn.commit()
+    return conn.execute("SELECT COUNT(*) FROM banca_saldi_giornalieri").fetchone()[0]
+
+
+def ricostruisci_saldi_da(conn: sqlite3.Connection, data_da: str) -> int:
+    """
+    Ricalcola i giorni da `data_da` (YYYY-MM-DD) in avanti, per tutti i
+    rapporti, ripartendo dal saldo dell'ultimo giorno precedente.
+    Ritorna le righe riscritte. Non fa commit.
+    """
+    conn.execute("DELETE FROM banca_saldi_giornalieri WHERE data >= ?", (data_da,))
+    cur = conn.execute("""
+        INSERT INTO banca_saldi_giornalieri (rapporto, data, n, entrate, uscite, delta, saldo)
+        SELECT g.rapporto, g.data, g.n, g.entrate, g.uscite, g.delta,
+               COALESCE((SELECT s.saldo FROM banca_saldi_giornalieri s
+                         WHERE s.rapporto = g.rapporto AND s.data < ?
+                         ORDER BY s.data DESC LIMIT 1), 0)
+               + SUM(g.delta) OVER (PARTITION BY g.rapporto ORDER BY g.data)
+        FROM (
+            SELECT COALESCE(rapporto, '') AS rapporto,
+                   data_contabile AS data,
+                   COUNT(*) AS n,
+                   TOTAL(CASE WHEN importo > 0 THEN importo ELSE 0 END) AS entrate,
+                   TOTAL(CASE WHEN importo < 0 THEN importo ELSE 0 END) AS uscite,
+                   TOTAL(importo) AS delta
+            FROM banca_movimenti
+            WHERE data_contabile >= ?
+            GROUP BY COALESCE(rapporto, ''), data_contabile
+        ) g
+    """, (data_da, data_da))
+    return cur.rowcount
+
+
+def sospendi_saldi(conn: sqlite3.Connection, motivo: str = "import") -> bool:
+    """
+    Spegne i trigger dei saldi nella transazione corrente, per un import in
+    blocco. False se i saldi non sono installati (niente da sospendere).
+    Va chiusa con riprendi_saldi nella stessa transazione. Non fa commit.
+    """
+    if not saldi_pronti(conn):
+        return False
+    conn.execute("INSERT INTO banca_saldi_sospesi (motivo) VALUES (?)", (motivo,))
+    return True
+
+
+def riprendi_saldi(conn: sqlite3.Connection, data_da: Optional[str]) -> int:
+    """Riaccende i trigger e ricalcola i saldi da `data_da`. Non fa commit."""
+    conn.execute("DELETE FROM banca_saldi_sospesi")
+    if not data_da:
+        return 0
+    return ricostruisci_saldi_da(conn, data_da)
+
+
+def verifica_saldi(conn: sqlite3.Connection) -> Dict:
+    """
+    Diagnostica admin: confronta ogni riga con le somme ricalcolate da
+    banca_movimenti. {"righe": n, "differenze": [(rapporto, data), ...]}.
+    """
+    attese = {
+        (r[0], r[1]): (r[2], r[3], r[4]) for r in conn.execute("""
+            SELECT rapporto, data, n, delta,
+                   SUM(delta) OVER (PARTITION BY rapporto ORDER BY data)
+            FROM (
+                SELECT COALESCE(rapporto, '') AS rapporto, data_contabile AS data,
+                       COUNT(*) AS n, TOTAL(importo) AS delta
+                FROM banca_movimenti
+                WHERE data_contabile IS NOT NULL
+                GROUP BY COALESCE(rapporto, ''), data_contabile
+            )
+        """).fetchall()
+    }
+    reali = {
+        (r[0], r[1]): (r[2], r[3], r[4]) for r in conn.execute(
+            "SELECT rapporto, data, n, delta, saldo FROM banca_saldi_giornalieri"
+        ).fetchall()
+    }
+    diff = []
+    for k in sorted(set(attese) | set(reali)):
+        a, b = attese.get(k), reali.get(k)
+        if a is None or b is None or a[0] != b[0] \
+           or abs(a[1] - b[1]) >= 0.005 or abs(a[2] - b[2]) >= 0.005:
+            diff.append(list(k))
+    return {"righe": len(reali), "differenze": diff[:50], "n_differenze": len(diff)}
+
+
+def saldo_al(conn: sqlite3.Connection, data: Optional[str] = None) -> float:
+    """
+    Saldo complessivo (tutti i rapporti) a fine giornata `data` inclusa;
+    None = ultimo saldo noto. Una seek sull'indice per rapporto.
+    """
+    if saldi_pronti(conn):
+        r = conn.execute("""
+            SELECT TOTAL((
+                SELECT s.saldo FROM banca_saldi_giornalieri s
+                WHERE s.rapporto = r.rapporto AND (:d IS NULL OR s.data <= :d)
+                ORDER BY s.data DESC LIMIT 1
+            ))
+            FROM (SELECT DISTINCT rapporto FROM banca_saldi_giornalieri) r
+        """, {"d": data}).fetchone()
+    else:
+        r = conn.execute("""
+            SELECT TOTAL(importo) FROM banca_movimenti
+            WHERE (:d IS NULL OR data_contabile <= :d)
+        """, {"d": data}).fetchone()
+    return round(r[0] or 0, 2)
+
+
+def totali_periodo(conn: sqlite3.Connection, da: str, a_escl: str) -> Dict:
+    """
+    Movimenti, entrate, uscite (negative) e saldo del periodo [da, a_escl).
+    Stesse chiavi della vecchia query inline della dashboard CG.
+    """
+    if saldi_pronti(conn):
+        r = conn.execute("""
+            SELECT TOTAL(n) AS num_movimenti, TOTAL(entrate) AS entrate,
+                   TOTAL(uscite) AS uscite, TOTAL(delta) AS saldo_periodo
+            FROM banca_saldi_giornalieri
+            WHERE data >= ? AND data < ?
+        """, (da, a_escl)).fetchone()
+    else:
+        r = conn.execute("""
+            SELECT COUNT(*) AS num_movimenti,
+                   TOTAL(CASE WHEN importo > 0 THEN importo ELSE 0 END) AS entrate,
+                   TOTAL(CASE WHEN importo < 0 THEN importo ELSE 0 END) AS uscite,
+                   TOTAL(importo) AS saldo_periodo
+            FROM banca_movimenti
+            WHERE data_contabile >= ? AND data_contabile < ?
+        """, (da, a_escl)).fetchone()
+    return {
+        "num_movimenti": int(r[0] or 0),
+        "entrate": round(r[1] or 0, 2),
+        "uscite": round(r[2] or 0, 2),
+        "saldo_periodo": round(r[3] or 0, 2),
+    }
+
+
 # ══════════════════════════════════════════════
 # SALDO ATTUALE (cumulativo all'ultimo movimento)
 # ══════════════════════════════════════════════
@@ -189,16 +468,20 @@ def saldo_attuale(conn: sqlite3.Connection) -> Dict:
     Saldo cumulativo = somma di tutti gli importi. La data di riferimento e'
     quella dell'ultimo movimento contabile.
     """
-    r = conn.execute("""
-        SELECT COALESCE(SUM(importo), 0) AS saldo,
-               MAX(data_contabile) AS ultima_data,
-               COUNT(*) AS n_movimenti
-        FROM banca_movimenti
-    """).fetchone()
+    if saldi_pronti(conn):
+        r = conn.execute("""
+            SELECT MAX(data) AS ultima_data, TOTAL(n) AS n_movimenti
+            FROM banca_saldi_giornalieri
+        """).fetchone()
+    else:
+        r = conn.execute("""
+            SELECT MAX(data_contabile) AS ultima_data, COUNT(*) AS n_movimenti
+            FROM banca_movimenti
+        """).fetchone()
     return {
-        "saldo": round(r["saldo"] or 0, 2),
+        "saldo": saldo_al(conn),
         "data_riferimento": r["ultima_data"],
-        "num_movimenti_totali": r["n_movimenti"] or 0,
+        "num_movimenti_totali": int(r["n_movimenti"] or 0),
     }
 
 
@@ -292,23 +575,17 @@ def kpi_periodo_90gg(conn: sqlite3.Connection, data_riferimento: str) -> Dict:
     dr = date.fromisoformat(data_riferimento)
     da = (dr - timedelta(days=89)).isoformat()  # 90 giorni inclusivi
 
-    r = conn.execute("""
-        SELECT
-            COUNT(*) AS n,
-            COALESCE(SUM(CASE WHEN importo > 0 THEN importo ELSE 0 END), 0) AS entrate,
-            COALESCE(SUM(CASE WHEN importo < 0 THEN importo ELSE 0 END), 0) AS uscite
-        FROM banca_movimenti
-        WHERE data_contabile >= ? AND data_contabile <= ?
-    """, (da, data_riferimento)).fetchone()
+    a_escl = (dr + timedelta(days=1)).isoformat()
+    t = totali_periodo(conn, da, a_escl)
 
-    entrate = round(r["entrate"] or 0, 2)
-    uscite = round(r["uscite"] or 0, 2)
+    entrate = t["entrate"]
+    uscite = t["uscite"]
     media_entrate = round(entrate / 90, 2)
 
     return {
         "data_inizio": da,
         "data_fine": data_riferimento,
-        "num_movimenti": r["n"] or 0,
+        "num_movimenti": t["num_movimenti"],
         "entrate_totali": entrate,
         "uscite_totali": round(abs(uscite), 2),
         "delta": round(entrate + uscite, 2),
@@ -327,27 +604,34 @@ def trend_saldo(conn: sqlite3.Connection, giorni: int = 90) -> List[Dict]:
     Solo i giorni con movimenti compaiono nel risultato (per non sovraccaricare
     il grafico con ~90 punti identici).
     """
-    dr = conn.execute("SELECT MAX(data_contabile) AS maxd FROM banca_movimenti").fetchone()
+    pronti = saldi_pronti(conn)
+    tab, col = ("banca_saldi_giornalieri", "data") if pronti else ("banca_movimenti", "data_contabile")
+    dr = conn.execute(f"SELECT MAX({col}) AS maxd FROM {tab}").fetchone()
     if not dr["maxd"]:
         return []
     data_fine = dr["maxd"]
     data_inizio = (date.fromisoformat(data_fine) - timedelta(days=giorni - 1)).isoformat()
 
-    # Saldo iniziale = somma di tutti i movimenti prima del periodo
-    saldo0 = conn.execute("""
-        SELECT COALESCE(SUM(importo), 0) AS s
-        FROM banca_movimenti
-        WHERE data_contabile < ?
-    """, (data_inizio,)).fetchone()["s"]
+    # Saldo iniziale = saldo a fine del giorno prima del periodo
+    saldo0 = saldo_al(conn, (date.fromisoformat(data_inizio) - timedelta(days=1)).isoformat())
 
     # Delta giornalieri nel periodo
-    rows = conn.execute("""
-        SELECT data_contabile AS d, COALESCE(SUM(importo), 0) AS delta
-        FROM banca_movimenti
-        WHERE data_contabile >= ? AND data_contabile <= ?
-        GROUP BY data_contabile
-        ORDER BY data_contabile
-    """, (data_inizio, data_fine)).fetchall()
+    if pronti:
+        rows = conn.execute("""
+            SELECT data AS d, TOTAL(delta) AS delta
+            FROM banca_saldi_giornalieri
+            WHERE data >= ? AND data <= ?
+            GROUP BY data
+            ORDER BY data
+        """, (data_inizio, data_fine)).fetchall()
+    else:
+        rows = conn.execute("""
+            SELECT data_contabile AS d, COALESCE(SUM(importo), 0) AS delta
+            FROM banca_movimenti
+            WHERE data_contabile >= ? AND data_contabile <= ?
+            GROUP BY data_contabile
+            ORDER BY data_contabile
+        """, (data_inizio, data_fine)).fetchall()
 
     serie = []
     saldo = saldo0
@@ -407,20 +691,91 @@ def confronto_yoy(conn: sqlite3.Connection, anno: int) -> List[Dict]:
     """
     Entrate mensili anno corrente vs anno precedente.
     Utile per intuire stagionalita'.
+
+    Serve solo il totale per mese (niente classificazione): coi saldi
+    giornalieri e' una GROUP BY su ~730 righe invece di leggere e
+    classificare due anni di movimenti.
     """
-    corrente = entrate_mensili_anno(conn, anno)
-    prec = entrate_mensili_anno(conn, anno - 1)
+    def _totali(a: int) -> Dict[int, float]:
+        if saldi_pronti(conn):
+            q = """
+                SELECT CAST(substr(data, 6, 2) AS INTEGER) AS m, TOTAL(entrate) AS tot
+                FROM banca_saldi_giornalieri
+                WHERE data >= ? AND data < ?
+                GROUP BY m
+            """
+        else:
+            q = """
+                SELECT CAST(substr(data_contabile, 6, 2) AS INTEGER) AS m, TOTAL(importo) AS tot
+                FROM banca_movimenti
+                WHERE data_contabile >= ? AND data_contabile < ? AND importo > 0
+                GROUP BY m
+            """
+        return {r["m"]: round(r["tot"], 2) for r in conn.execute(q, (f"{a}-01-01", f"{a + 1}-01-01"))}
+
+    corrente = _totali(anno)
+    prec = _totali(anno - 1)
     return [
         {
             "mese": m,
             "mese_label": _fmt_mese(m),
-            "anno_corrente": corrente[m - 1]["totale"],
-            "anno_prec": prec[m - 1]["totale"],
+            "anno_corrente": corrente.get(m, 0.0),
+            "anno_prec": prec.get(m, 0.0),
         }
         for m in range(1, 13)
     ]
 
 
+# ══════════════════════════════════════════════
+# PROIEZIONE DI CASSA — saldo attuale meno le scadenze aperte
+# ══════════════════════════════════════════════
+
+# Stati cg_uscite che pesano sulla cassa futura. RATEIZZATO no: la fattura
+# e' stata convertita in spesa fissa e sono le rate a comparire come uscite.
+_STATI_PROIEZIONE = tuple(sorted(STATI_APERTI - {"RATEIZZATO"}))
+
+
+def proiezione_cassa(conn: sqlite3.Connection, giorni: int = 60) -> Dict:
+    """
+    Saldo banca proiettato sui prossimi `giorni`: parte dal saldo attuale e
+    scala, giorno per giorno, il residuo (totale - importo_pagato) delle
+    uscite aperte in scadenza. Le scadute non pagate finiscono in `arretrato`
+    e pesano dal primo giorno. Solo i giorni con scadenze compaiono in serie.
+    """
+    oggi = date.today()
+    fine = (oggi + timedelta(days=giorni)).isoformat()
+    saldo0 = saldo_al(conn)
+    out = {"data_inizio": oggi.isoformat(), "data_fine": fine, "saldo_iniziale": saldo0,
+           "arretrato": 0.0, "serie": [], "saldo_finale": saldo0}
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cg_uscite'"
+    ).fetchone():
+        return out
+
+    ph = ",".join("?" * len(_STATI_PROIEZIONE))
+    rows = conn.execute(f"""
+        SELECT CASE WHEN data_scadenza < ? THEN NULL ELSE data_scadenza END AS d,
+               TOTAL(COALESCE(totale, 0) - COALESCE(importo_pagato, 0)) AS residuo,
+               COUNT(*) AS n
+        FROM cg_uscite
+        WHERE stato IN ({ph}) AND data_scadenza IS NOT NULL AND data_scadenza <= ?
+        GROUP BY d
+        ORDER BY d
+    """, (oggi.isoformat(), *_STATI_PROIEZIONE, fine)).fetchall()
+
+    saldo = saldo0
+    for r in rows:
+        residuo = max(r["residuo"] or 0, 0)
+        saldo -= residuo
+        if r["d"] is None:
+            out["arretrato"] = round(residuo, 2)
+            continue
+        out["serie"].append({"data": r["d"], "uscite": round(residuo, 2),
+                             "n": r["n"], "saldo": round(saldo, 2)})
+    out["saldo_finale"] = round(saldo, 2)
+    return out
+
+
 # ══════════════════════════════════════════════
 # USCITE MENSILI (anno corrente, 12 mesi) — breakdown per tipo
 # ══════════════════════════════════════════════
@@ -539,6 +894,7 @@ def dashboard_liquidita(
     yoy = confronto_yoy(conn, anno)
     ultime_e = ultime_entrate(conn, limit=15)
     ultime_u = ultime_uscite(conn, limit=15)
+    proiezione = proiezione_cassa(conn, giorni=60)
 
     return {
         "anno": anno,
@@ -554,4 +910,5 @@ def dashboard_liquidita(
         "confronto_yoy": yoy,
         "ultime_entrate": ultime_e,
         "ultime_uscite": ultime_u,
+        "proiezione_cassa": proiezione,
     }
@@ -0,0 +1,472 @@
+# @version: v1.0 — contatori non lette + archivio notifiche (sessione 2026-10-19)
+# -*- coding: utf-8 -*-
+"""
+Contatori non lette e archivio notifiche — TRGB Gestionale (mattone M.A)
+
+Modulo: platform
+Classificazione: [core]
+
+PERCHÉ ESISTE
+-------------
+Il badge della campanella (GET /notifiche/contatore, a ogni render
+dell'Header) contava le non lette con un LEFT JOIN notifiche ×
+notifiche_lettura filtrato per username/ruolo, e lo stesso per le
+comunicazioni. La tabella notifiche cresce ogni giorno (alert engine),
+quindi il conteggio rallentava con lo storico.
+
+COME FUNZIONA
+-------------
+1. Le notifiche non hanno utenti destinatari espliciti (ruolo o globale),
+   quindi si conta per "chiave di pubblico":
+     '*'       globale (dest_username e dest_ruolo NULL)
+     'u:<u>'   dest_username
+     'r:<r>'   dest_ruolo
+     'x:<u>|<r>' entrambi valorizzati: la notifica sta sia in 'u:' sia in
+               'r:', la chiave 'x:' si SOTTRAE (inclusione-esclusione) per
+               chi è quell'utente con quel ruolo.
+   notifiche_contatori tiene quante notifiche per (chiave, scadenza),
+   notifiche_contatori_lette quante ne ha lette ogni utente per la stessa
+   chiave. Non lette = Σ (totale − lette) sulle chiavi dell'utente: una
+   manciata di righe lette per chiave primaria, qualunque sia lo storico.
+   La scadenza sta nella chiave perché una notifica scaduta esce dal
+   conteggio senza che nessuno scriva nulla.
+
+2. Comunicazioni: stessa idea con chiave (dest_ruolo, scadenza, visibile),
+   visibile = attiva e tipo 'bacheca'. Modifiche a quei campi spostano
+   totale e letture da una chiave all'altra.
+
+3. Tutto è tenuto da trigger (inserimento, cancellazione, lettura,
+   modifica dei campi che fanno da chiave): qualunque scrittore resta
+   allineato. La cancellazione di una notifica scala le letture in un
+   trigger BEFORE DELETE, perché dopo il CASCADE le righe di
+   notifiche_lettura non ci sono più.
+
+4. `compatta()` sposta in notifiche_archivio le notifiche più vecchie di
+   TRGB_NOTIFICHE_ARCHIVIO_GIORNI (default 90, minimo 14: oltre la finestra
+   anti-duplicato dell'alert engine) e quelle scadute, con l'elenco di chi
+   le aveva lette. Poi ricostruisce i contatori da zero (autoriparazione).
+   Throttled: la chiama l'alert engine a fine giro.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger("trgb.notifiche_contatori")
+
+_DEFAULT_GIORNI = 90
+_MIN_GIORNI = 14
+_COMPATTA_OGNI_S = 6 * 3600
+_ultima_compattazione = 0.0
+_compatta_lock = threading.Lock()
+
+
+def giorni_archivio() -> int:
+    try:
+        return max(int(os.getenv("TRGB_NOTIFICHE_ARCHIVIO_GIORNI") or _DEFAULT_GIORNI), _MIN_GIORNI)
+    except ValueError:
+        return _DEFAULT_GIORNI
+
+
+# ─────────────────────────────────────────────
+# CHIAVI (frammenti SQL condivisi da trigger e ricostruzione)
+# ─────────────────────────────────────────────
+
+def _chiavi(sorgente: str, extra: str = "") -> str:
+    """
+    SELECT [extra,] chiave, scadenza — una riga per ogni chiave di pubblico
+    delle notifiche in `sorgente` (tabella/subquery con dest_username,
+    dest_ruolo, scadenza).
+    """
+    forme = (
+        "CASE WHEN dest_username IS NULL AND dest_ruolo IS NULL THEN '*' END",
+        "'u:' || dest_username",
+        "'r:' || dest_ruolo",
+        "'x:' || dest_username || '|' || dest_ruolo",
+    )
+    bracci = " UNION ALL ".join(
+        f"SELECT {extra}{f} AS chiave, COALESCE(scadenza, '') AS scadenza FROM {sorgente}"
+        for f in forme
+    )
+    return f"SELECT * FROM ({bracci}) WHERE chiave IS NOT NULL"
+
+
+def _riga(alias: str, colonne: tuple) -> str:
+    return "(SELECT " + ", ".join(f"{alias}.{c} AS {c}" for c in colonne) + ")"
+
+
+_N_COL = ("dest_username", "dest_ruolo", "scadenza")
+_C_COL = ("dest_ruolo", "scadenza", "attiva", "tipo")
+
+
+def _chiave_com(sorgente: str, extra: str = "") -> str:
+    return (
+        f"SELECT {extra}COALESCE(dest_ruolo, '') AS dest_ruolo, COALESCE(scadenza, '') AS scadenza, "
+        f"CASE WHEN attiva = 1 AND COALESCE(tipo, 'bacheca') = 'bacheca' THEN 1 ELSE 0 END AS visibile "
+        f"FROM {sorgente}"
+    )
+
+
+def _n_piu(riga: str) -> str:
+    return (
+        "INSERT INTO notifiche_contatori (chiave, scadenza, totale) "
+        f"SELECT chiave, scadenza, 1 FROM ({_chiavi(riga)}) WHERE 1 "
+        "ON CONFLICT(chiave, scadenza) DO UPDATE SET totale = totale + 1;"
+    )
+
+
+def _n_meno(riga: str) -> str:
+    return (
+        "UPDATE notifiche_contatori SET totale = totale - 1 "
+        f"WHERE (chiave, scadenza) IN ({_chiavi(riga)});"
+    )
+
+
+def _n_lettori_piu(riga: str, notifica_id: str) -> str:
+    return (
+        "INSERT INTO notifiche_contatori_lette (username, chiave, scadenza, lette) "
+        f"SELECT nl.username, k.chiave, k.scadenza, 1 FROM notifiche_lettura nl, ({_chiavi(riga)}) k "
+        f"WHERE nl.notifica_id = {notifica_id} "
+        "ON CONFLICT(username, chiave, scadenza) DO UPDATE SET lette = lette + 1;"
+    )
+
+
+def _n_lettori_meno(riga: str, notifica_id: str) -> str:
+    return (
+        "UPDATE notifiche_contatori_lette SET lette = lette - 1 "
+        f"WHERE username IN (SELECT username FROM notifiche_lettura WHERE notifica_id = {notifica_id}) "
+        f"AND (chiave, scadenza) IN ({_chiavi(riga)});"
+    )
+
+
+def _c_piu(riga: str) -> str:
+    return (
+        "INSERT INTO comunicazioni_contatori (dest_ruolo, scadenza, visibile, totale) "
+        f"SELECT dest_ruolo, scadenza, visibile, 1 FROM ({_chiave_com(riga)}) WHERE 1 "
+        "ON CONFLICT(dest_ruolo, scadenza, visibile) DO UPDATE SET totale = totale + 1;"
+    )
+
+
+def _c_meno(riga: str) -> str:
+    return (
+        "UPDATE comunicazioni_contatori SET totale = totale - 1 "
+        f"WHERE (dest_ruolo, scadenza, visibile) IN ({_chiave_com(riga)});"
+    )
+
+
+def _c_lettori_piu(riga: str, com_id: str) -> str:
+    return (
+        "INSERT INTO comunicazioni_contatori_lette (username, dest_ruolo, scadenza, visibile, lette) "
+        f"SELECT cl.username, k.dest_ruolo, k.scadenza, k.visibile, 1 "
+        f"FROM comunicazioni_lettura cl, ({_chiave_com(riga)}) k "
+        f"WHERE cl.comunicazione_id = {com_id} "
+        "ON CONFLICT(username, dest_ruolo, scadenza, visibile) DO UPDATE SET lette = lette + 1;"
+    )
+
+
+def _c_lettori_meno(riga: str, com_id: str) -> str:
+    return (
+        "UPDATE comunicazioni_contatori_lette SET lette = lette - 1 "
+        f"WHERE username IN (SELECT username FROM comunicazioni_lettura WHERE comunicazione_id = {com_id}) "
+        f"AND (dest_ruolo, scadenza, visibile) IN ({_chiave_com(riga)});"
+    )
+
+
+_NEW_N, _OLD_N = _riga("NEW", _N_COL), _riga("OLD", _N_COL)
+_NEW_C, _OLD_C = _riga("NEW", _C_COL), _riga("OLD", _C_COL)
+
+_TRIGGER = {
+    # notifiche
+    "trg_notifiche_cnt_ins": ("AFTER INSERT ON notifiche", _n_piu(_NEW_N)),
+    "trg_notifiche_cnt_del": (
+        "BEFORE DELETE ON notifiche",
+        _n_meno(_OLD_N) + " " + _n_lettori_meno(_OLD_N, "OLD.id"),
+    ),
+    "trg_notifiche_cnt_upd": (
+        "AFTER UPDATE OF dest_username, dest_ruolo, scadenza ON notifiche FOR EACH ROW "
+        "WHEN OLD.dest_username IS NOT NEW.dest_username OR OLD.dest_ruolo IS NOT NEW.dest_ruolo "
+        "OR OLD.scadenza IS NOT NEW.scadenza",
+        " ".join((_n_meno(_OLD_N), _n_lettori_meno(_OLD_N, "NEW.id"),
+                  _n_piu(_NEW_N), _n_lettori_piu(_NEW_N, "NEW.id"))),
+    ),
+    "trg_notifiche_lettura_cnt_ins": (
+        "AFTER INSERT ON notifiche_lettura",
+        "INSERT INTO notifiche_contatori_lette (username, chiave, scadenza, lette) "
+        f"SELECT NEW.username, chiave, scadenza, 1 FROM ({_chiavi('notifiche WHERE id = NEW.notifica_id')}) WHERE 1 "
+        "ON CONFLICT(username, chiave, scadenza) DO UPDATE SET lette = lette + 1;",
+    ),
+    "trg_notifiche_lettura_cnt_del": (
+        "AFTER DELETE ON notifiche_lettura",
+        # dopo un CASCADE la notifica non c'è più: ci ha già pensato trg_notifiche_cnt_del
+        "UPDATE notifiche_contatori_lette SET lette = lette - 1 WHERE username = OLD.username "
+        f"AND (chiave, scadenza) IN ({_chiavi('notifiche WHERE id = OLD.notifica_id')});",
+    ),
+    # comunicazioni
+    "trg_comunicazioni_cnt_ins": ("AFTER INSERT ON comunicazioni", _c_piu(_NEW_C)),
+    "trg_comunicazioni_cnt_del": (
+        "BEFORE DELETE ON comunicazioni",
+        _c_meno(_OLD_C) + " " + _c_lettori_meno(_OLD_C, "OLD.id"),
+    ),
+    "trg_comunicazioni_cnt_upd": (
+        "AFTER UPDATE OF dest_ruolo, scadenza, attiva, tipo ON comunicazioni FOR EACH ROW "
+        "WHEN OLD.dest_ruolo IS NOT NEW.dest_ruolo OR OLD.scadenza IS NOT NEW.scadenza "
+        "OR OLD.attiva IS NOT NEW.attiva OR OLD.tipo IS NOT NEW.tipo",
+        " ".join((_c_meno(_OLD_C), _c_lettori_meno(_OLD_C, "NEW.id"),
+                  _c_piu(_NEW_C), _c_lettori_piu(_NEW_C, "NEW.id"))),
+    ),
+    "trg_comunicazioni_lettura_cnt_ins": (
+        "AFTER INSERT ON comunicazioni_lettura",
+        "INSERT INTO comunicazioni_contatori_lette (username, dest_ruolo, scadenza, visibile, lette) "
+        f"SELECT NEW.username, dest_ruolo, scadenza, visibile, 1 "
+        f"FROM ({_chiave_com('comunicazioni WHERE id = NEW.comunicazione_id')}) WHERE 1 "
+        "ON CONFLICT(username, dest_ruolo, scadenza, visibile) DO UPDATE SET lette = lette + 1;",
+    ),
+    "trg_comunicazioni_lettura_cnt_del": (
+        "AFTER DELETE ON comunicazioni_lettura",
+        "UPDATE comunicazioni_contatori_lette SET lette = lette - 1 WHERE username = OLD.username "
+        f"AND (dest_ruolo, scadenza, visibile) IN ({_chiave_com('comunicazioni WHERE id = OLD.comunicazione_id')});",
+    ),
+}
+
+_TABELLE = {
+    "notifiche_contatori": """
+        CREATE TABLE notifiche_contatori (
+            chiave      TEXT NOT NULL,
+            scadenza    TEXT NOT NULL DEFAULT '',
+            totale      INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (chiave, scadenza)
+        ) WITHOUT ROWID
+    """,
+    "notifiche_contatori_lette": """
+        CREATE TABLE notifiche_contatori_lette (
+            username    TEXT NOT NULL,
+            chiave      TEXT NOT NULL,
+            scadenza    TEXT NOT NULL DEFAULT '',
+            lette       INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, chiave, scadenza)
+        ) WITHOUT ROWID
+    """,
+    "comunicazioni_contatori": """
+        CREATE TABLE comunicazioni_contatori (
+            dest_ruolo  TEXT NOT NULL,
+            scadenza    TEXT NOT NULL DEFAULT '',
+            visibile    INTEGER NOT NULL,
+            totale      INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dest_ruolo, scadenza, visibile)
+        ) WITHOUT ROWID
+    """,
+    "comunicazioni_contatori_lette": """
+        CREATE TABLE comunicazioni_contatori_lette (
+            username    TEXT NOT NULL,
+            dest_ruolo  TEXT NOT NULL,
+            scadenza    TEXT NOT NULL DEFAULT '',
+            visibile    INTEGER NOT NULL,
+            lette       INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, dest_ruolo, scadenza, visibile)
+        ) WITHOUT ROWID
+    """,
+    "notifiche_archivio": """
+        CREATE TABLE notifiche_archivio (
+            id              INTEGER PRIMARY KEY,
+            dest_username   TEXT,
+            dest_ruolo      TEXT,
+            tipo            TEXT NOT NULL,
+            titolo          TEXT NOT NULL,
+            messaggio       TEXT,
+            link            TEXT,
+            icona           TEXT,
+            urgenza         TEXT NOT NULL,
+            modulo          TEXT,
+            entity_id       INTEGER,
+            created_at      TEXT NOT NULL,
+            scadenza        TEXT,
+            letta_da        TEXT,
+            archiviata_at   TEXT NOT NULL DEFAULT (datetime('now','localtime'))
+        )
+    """,
+}
+
+
+# ─────────────────────────────────────────────
+# SCHEMA (idempotente, regola S52-1)
+# ─────────────────────────────────────────────
+
+def installato(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' "
+        f"AND name IN ({','.join('?' * len(_TRIGGER))})",
+        tuple(_TRIGGER),
+    ).fetchone()[0] == len(_TRIGGER)
+
+
+def installa(conn: sqlite3.Connection) -> bool:
+    """
+    Tabelle contatori + archivio, trigger e popolamento iniziale. False se
+    notifiche/comunicazioni non esistono ancora (init_notifiche_db non
+    girato). Non fa commit.
+    """
+    presenti = {
+        r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name IN ('notifiche', 'notifiche_lettura', 'comunicazioni', 'comunicazioni_lettura')"
+        ).fetchall()
+    }
+    if len(presenti) < 4:
+        return False
+    for nome, ddl in _TABELLE.items():
+        if conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nome,)
+        ).fetchone() is None:
+            conn.execute(ddl)
+    if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_notifiche_archivio_created'"
+    ).fetchone() is None:
+        conn.execute("CREATE INDEX idx_notifiche_archivio_created ON notifiche_archivio(created_at)")
+    if not installato(conn):
+        for nome, (evento, corpo) in _TRIGGER.items():
+            conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+            conn.execute(f"CREATE TRIGGER {nome} {evento} BEGIN {corpo} END")
+        ricostruisci(conn)
+    return True
+
+
+def ricostruisci(conn: sqlite3.Connection) -> None:
+    """Ricalcola tutti i contatori dalle tabelle live. Non fa commit."""
+    conn.execute("DELETE FROM notifiche_contatori")
+    conn.execute(
+        "INSERT INTO notifiche_contatori (chiave, scadenza, totale) "
+        f"SELECT chiave, scadenza, COUNT(*) FROM ({_chiavi('notifiche')}) GROUP BY chiave, scadenza"
+    )
+    conn.execute("DELETE FROM notifiche_contatori_lette")
+    conn.execute(
+        "INSERT INTO notifiche_contatori_lette (username, chiave, scadenza, lette) "
+        "SELECT username, chiave, scadenza, COUNT(*) FROM ("
+        + _chiavi("notifiche_lettura JOIN notifiche ON notifiche.id = notifiche_lettura.notifica_id",
+                  extra="notifiche_lettura.username AS username, ")
+        + ") GROUP BY username, chiave, scadenza"
+    )
+    conn.execute("DELETE FROM comunicazioni_contatori")
+    conn.execute(
+        "INSERT INTO comunicazioni_contatori (dest_ruolo, scadenza, visibile, totale) "
+        f"SELECT dest_ruolo, scadenza, visibile, COUNT(*) FROM ({_chiave_com('comunicazioni')}) "
+        "GROUP BY dest_ruolo, scadenza, visibile"
+    )
+    conn.execute("DELETE FROM comunicazioni_contatori_lette")
+    conn.execute(
+        "INSERT INTO comunicazioni_contatori_lette (username, dest_ruolo, scadenza, visibile, lette) "
+        "SELECT username, dest_ruolo, scadenza, visibile, COUNT(*) FROM ("
+        + _chiave_com("comunicazioni_lettura JOIN comunicazioni ON comunicazioni.id = comunicazioni_lettura.comunicazione_id",
+                      extra="comunicazioni_lettura.username AS username, ")
+        + ") GROUP BY username, dest_ruolo, scadenza, visibile"
+    )
+
+
+# ─────────────────────────────────────────────
+# LETTURA
+# ─────────────────────────────────────────────
+
+def conta_notifiche(conn: sqlite3.Connection, username: str, ruolo: str) -> int:
+    """Notifiche non lette (stessa semantica di notifiche_service.conta_non_lette)."""
+    x = f"x:{username}|{ruolo}"
+    row = conn.execute("""
+        SELECT COALESCE(SUM(
+                   CASE WHEN c.chiave = ? THEN -1 ELSE 1 END * (c.totale - COALESCE(l.lette, 0))
+               ), 0)
+        FROM notifiche_contatori c
+        LEFT JOIN notifiche_contatori_lette l
+               ON l.username = ? AND l.chiave = c.chiave AND l.scadenza = c.scadenza
+        WHERE c.chiave IN ('*', ?, ?, ?)
+          AND (c.scadenza = '' OR c.scadenza >= datetime('now','localtime'))
+    """, (x, username, f"u:{username}", f"r:{ruolo}", x)).fetchone()
+    return row[0]
+
+
+def conta_comunicazioni(conn: sqlite3.Connection, username: str, ruolo: str) -> int:
+    """Comunicazioni bacheca attive non lette per ruolo/utente."""
+    row = conn.execute("""
+        SELECT COALESCE(SUM(c.totale - COALESCE(l.lette, 0)), 0)
+        FROM comunicazioni_contatori c
+        LEFT JOIN comunicazioni_contatori_lette l
+               ON l.username = ? AND l.dest_ruolo = c.dest_ruolo
+              AND l.scadenza = c.scadenza AND l.visibile = c.visibile
+        WHERE c.visibile = 1
+          AND c.dest_ruolo IN ('tutti', ?)
+          AND (c.scadenza = '' OR c.scadenza >= date('now','localtime'))
+    """, (username, ruolo)).fetchone()
+    return row[0]
+
+
+# ─────────────────────────────────────────────
+# ARCHIVIO + COMPATTAZIONE
+# ─────────────────────────────────────────────
+
+def compatta(forza: bool = False) -> Dict[str, Any]:
+    """
+    Archivia le notifiche vecchie/scadute e ricostruisce i contatori, in una
+    transazione. Throttled (ogni 6h) salvo `forza`. Best-effort: non solleva.
+    """
+    global _ultima_compattazione
+    adesso = time.monotonic()
+    if not forza and adesso - _ultima_compattazione < _COMPATTA_OGNI_S:
+        return {"eseguita": False}
+    if not _compatta_lock.acquire(blocking=False):
+        return {"eseguita": False}
+    try:
+        _ultima_compattazione = adesso
+        from app.models.notifiche_db import get_notifiche_conn
+
+        t0 = time.perf_counter()
+        conn = get_notifiche_conn()
+        try:
+            if not installa(conn):
+                return {"eseguita": False}
+            conn.commit()
+            conn.execute("BEGIN IMMEDIATE")
+            limite = conn.execute(
+                "SELECT datetime('now','localtime', ?), datetime('now','localtime')",
+                (f"-{giorni_archivio()} days",),
+            ).fetchone()
+            filtro = "created_at < ? OR (scadenza IS NOT NULL AND scadenza < ?)"
+            conn.execute(f"""
+                INSERT OR REPLACE INTO notifiche_archivio
+                    (id, dest_username, dest_ruolo, tipo, titolo, messaggio, link, icona,
+                     urgenza, modulo, entity_id, created_at, scadenza, letta_da)
+                SELECT n.id, n.dest_username, n.dest_ruolo, n.tipo, n.titolo, n.messaggio,
+                       n.link, n.icona, n.urgenza, n.modulo, n.entity_id, n.created_at,
+                       n.scadenza,
+                       (SELECT group_concat(nl.username, ',') FROM notifiche_lettura nl
+                        WHERE nl.notifica_id = n.id)
+                FROM notifiche n
+                WHERE {filtro}
+            """, tuple(limite))
+            archiviate = conn.execute(f"DELETE FROM notifiche WHERE {filtro}", tuple(limite)).rowcount
+            # letture orfane (DB nati prima di foreign_keys=ON)
+            orfane = conn.execute(
+                "DELETE FROM notifiche_lettura WHERE notifica_id NOT IN (SELECT id FROM notifiche)"
+            ).rowcount
+            ricostruisci(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        esito = {
+            "eseguita": True,
+            "archiviate": archiviate,
+            "letture_orfane": orfane,
+            "durata_ms": round((time.perf_counter() - t0) * 1000, 1),
+        }
+        if archiviate:
+            logger.info("notifiche: %d archiviate (%s ms)", archiviate, esito["durata_ms"])
+        return esito
+    except Exception as e:
+        logger.warning("compattazione notifiche fallita: %s", e)
+        return {"eseguita": False, "errore": str(e)}
+    finally:
+        _compatta_lock.release()
@@ -1,4 +1,4 @@
-# @version: v1.0-notifiche-service
+# @version: v1.3-notifiche-service (contatori non lette)
 # -*- coding: utf-8 -*-
 """
 Servizio Notifiche — TRGB Gestionale (mattone M.A)
@@ -16,9 +16,24 @@ Uso da altri moduli:
         dest_ruolo="sala",
         urgenza="normale"
     )
+
+Creazioni e letture pubblicano anche un evento sull'hub SSE
+(app/services/eventi_hub.py): la campanella aggiorna il contatore senza
+polling. Il payload porta solo id/tipo, il testo si rilegge via API.
+
+Chi crea molte notifiche insieme (alert engine) usa inserisci_notifiche()
+dentro la propria transazione e pubblica_create() dopo il commit: stessa
+scrittura di crea_notifica, una sola connessione e un solo commit.
+
+I conteggi non lette (badge campanella) leggono i contatori tenuti da
+trigger in services/notifiche_contatori.py; la query completa resta come
+fallback se le tabelle contatori non ci sono.
 """
 
+import sqlite3
+
 from app.models.notifiche_db import get_notifiche_conn
+from app.services import eventi_hub, notifiche_contatori
 
 
 # ─────────────────────────────────────────────
@@ -47,18 +62,50 @@ def crea_notifica(
 
     Ritorna l'ID della notifica creata.
     """
+    riga = {
+        "tipo": tipo, "titolo": titolo, "messaggio": messaggio, "link": link,
+        "icona": icona, "urgenza": urgenza, "modulo": modulo, "entity_id": entity_id,
+        "dest_username": dest_username, "dest_ruolo": dest_ruolo,
+    }
     conn = get_notifiche_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO notifiche (tipo, titolo, messaggio, link, icona, urgenza,
-                               modulo, entity_id, dest_username, dest_ruolo)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (tipo, titolo, messaggio, link, icona, urgenza,
-          modulo or tipo, entity_id, dest_username, dest_ruolo))
-    conn.commit()
-    nid = cur.lastrowid
-    conn.close()
-    return nid
+    try:
+        ids = inserisci_notifiche(conn, [riga])
+        conn.commit()
+    finally:
+        conn.close()
+    pubblica_create([riga], ids)
+    return ids[0]
+
+
+def inserisci_notifiche(conn, righe: list) -> list:
+    """
+    Inserisce più notifiche sulla connessione data. Ogni riga è un dict con
+    le chiavi di crea_notifica (mancanti = default). Ritorna gli ID nello
+    stesso ordine. Non fa commit e non pubblica eventi: dopo il commit il
+    chiamante passa righe e ID a pubblica_create().
+    """
+    ids = []
+    for r in righe:
+        cur = conn.execute("""
+            INSERT INTO notifiche (tipo, titolo, messaggio, link, icona, urgenza,
+                                   modulo, entity_id, dest_username, dest_ruolo)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (r["tipo"], r["titolo"], r.get("messaggio"), r.get("link"), r.get("icona"),
+              r.get("urgenza") or "normale", r.get("modulo") or r["tipo"], r.get("entity_id"),
+              r.get("dest_username"), r.get("dest_ruolo")))
+        ids.append(cur.lastrowid)
+    return ids
+
+
+def pubblica_create(righe: list, ids: list) -> None:
+    """Eventi SSE 'creata' per righe già committate (vedi inserisci_notifiche)."""
+    for r, nid in zip(righe, ids):
+        eventi_hub.pubblica(
+            "notifica",
+            {"azione": "creata", "id": nid, "tipo": r["tipo"],
+             "modulo": r.get("modulo") or r["tipo"], "urgenza": r.get("urgenza") or "normale"},
+            dest_username=r.get("dest_username"), dest_ruolo=r.get("dest_ruolo"),
+        )
 
 
 def get_notifiche_utente(username: str, ruolo: str, limit: int = 50, offset: int = 0) -> list:
@@ -86,6 +133,13 @@ def get_notifiche_utente(username: str, ruolo: str, limit: int = 50, offset: int
 def conta_non_lette(username: str, ruolo: str) -> int:
     """Conta le notifiche non lette per un utente."""
     conn = get_notifiche_conn()
+    try:
+        return notifiche_contatori.conta_notifiche(conn, username, ruolo)
+    except sqlite3.OperationalError:
+        pass  # contatori non installati: conteggio completo
+    finally:
+        conn.close()
+    conn = get_notifiche_conn()
     row = conn.execute("""
         SELECT COUNT(*) as cnt
         FROM notifiche n
@@ -109,6 +163,10 @@ def segna_letta(notifica_id: int, username: str) -> bool:
         conn.commit()
         changed = conn.total_changes > 0
         conn.close()
+        if changed:
+            # altri dispositivi dello stesso utente: il badge scende anche lì
+            eventi_hub.pubblica("notifica", {"azione": "letta", "id": notifica_id},
+                                dest_username=username)
         return changed
     except Exception:
         conn.close()
@@ -136,6 +194,8 @@ def segna_tutte_lette(username: str, ruolo: str) -> int:
         count += 1
     conn.commit()
     conn.close()
+    if count:
+        eventi_hub.pubblica("notifica", {"azione": "tutte_lette"}, dest_username=username)
     return count
 
 
@@ -171,6 +231,10 @@ def crea_comunicazione(
     conn.commit()
     cid = cur.lastrowid
     conn.close()
+    eventi_hub.pubblica(
+        "comunicazione", {"azione": "creata", "id": cid, "urgenza": urgenza},
+        dest_ruolo=None if dest_ruolo in (None, "tutti") else dest_ruolo,
+    )
     return cid
 
 
@@ -275,6 +339,13 @@ def elimina_comunicazione(com_id: int) -> bool:
 def conta_comunicazioni_non_lette(username: str, ruolo: str) -> int:
     """Conta le comunicazioni attive non lette per un utente."""
     conn = get_notifiche_conn()
+    try:
+        return notifiche_contatori.conta_comunicazioni(conn, username, ruolo)
+    except sqlite3.OperationalError:
+        pass
+    finally:
+        conn.close()
+    conn = get_notifiche_conn()
     row = conn.execute("""
         SELECT COUNT(*) as cnt
         FROM comunicazioni c
@@ -335,6 +406,8 @@ def set_nota_servizio(autore: str, messaggio: str, data_rif: str, turno: str) ->
     conn.commit()
     nid = cur.lastrowid
     conn.close()
+    eventi_hub.pubblica("comunicazione", {"azione": "nota_servizio", "id": nid,
+                                          "data": data_rif, "turno": turno})
     return nid
 
 
@@ -1,4 +1,4 @@
-# @version: v1.0-pdf-brand-service
+# @version: v1.2-pdf-brand-service — render nel pool, fuori dalla render cache
 # -*- coding: utf-8 -*-
 """
 Servizio PDF Brand — TRGB Gestionale (mattone M.B)
@@ -387,21 +387,12 @@ def genera_pdf_html(
     Returns:
         bytes del PDF. Il router chiamante lo ritorna con FastAPI Response.
     """
-    from weasyprint import HTML, CSS  # lazy import
-
     tpl = _env.get_template(template)
     ctx = _context_base(titolo=titolo, sottotitolo=sottotitolo)
     ctx.update(dati or {})
     html_str = tpl.render(**ctx)
 
-    stylesheets = [CSS(string=_base_css_brand(orientamento=orientamento))]
-    if css_extra:
-        stylesheets.append(CSS(string=css_extra))
-
-    pdf_bytes = HTML(string=html_str, base_url=str(_TEMPLATES_DIR)).write_pdf(
-        stylesheets=stylesheets,
-    )
-    return pdf_bytes
+    return _render(html_str, orientamento=orientamento, css_extra=css_extra)
 
 
 # ---------------------------------------------------------------------------
@@ -432,8 +423,6 @@ def wrappa_html_brand(
     Returns:
         bytes del PDF.
     """
-    from weasyprint import HTML, CSS  # lazy import
-
     ctx = _context_base(titolo=titolo, sottotitolo=sottotitolo)
     strip_html = '<div class="gobbette-strip"></div>' if strip else ""
     sottot_html = (
@@ -461,14 +450,27 @@ def wrappa_html_brand(
   {body_html}
 </body></html>"""
 
-    stylesheets = [CSS(string=_base_css_brand(orientamento=orientamento))]
-    if css_extra:
-        stylesheets.append(CSS(string=css_extra))
+    return _render(full_html, orientamento=orientamento, css_extra=css_extra)
 
-    pdf_bytes = HTML(string=full_html, base_url=str(_TEMPLATES_DIR)).write_pdf(
-        stylesheets=stylesheets,
+
+def _render(html_str: str, orientamento: str, css_extra: Optional[str]) -> bytes:
+    """
+    HTML → PDF nel pool renderer (app/services/pdf_render_pool.py), SENZA
+    render cache: l'HTML contiene "Generato il gg/mm/aaaa hh:mm", quindi la
+    chiave cambierebbe a ogni minuto e ogni stampa sarebbe un miss che scrive
+    su disco un documento interno (preventivi, conto economico, ...),
+    spingendo fuori dalla cache le carte che invece si riusano.
+    """
+    from app.services.pdf_render_pool import render_pdf
+
+    css_strings = [_base_css_brand(orientamento=orientamento)]
+    if css_extra:
+        css_strings.append(css_extra)
+    return render_pdf(
+        html_str,
+        css_strings=css_strings,
+        base_url=str(_TEMPLATES_DIR),
     )
-    return pdf_bytes
 
 
 # ---------------------------------------------------------------------------
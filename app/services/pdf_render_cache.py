@@ -0,0 +1,362 @@
+# @version: v1.0 — Render cache PDF (sessione 2026-10-19)
+# -*- coding: utf-8 -*-
+"""
+Render cache PDF — TRGB Gestionale
+
+Modulo: platform
+Classificazione: [core]
+
+PERCHÉ ESISTE
+-------------
+Carta vini (cliente e staff), carta bevande e menu pranzo rifacevano WeasyPrint da zero a ogni richiesta: secondi di CPU
+anche quando nessun vino, prezzo o impostazione era cambiato. Il secondo
+download della carta, o "Pubblica sul sito" subito dopo l'anteprima, pagava
+lo stesso prezzo del primo.
+
+COME FUNZIONA
+-------------
+Cache content-addressed: la chiave è lo SHA-256 di
+    HTML finale + contenuto dei CSS + base_url + versione WeasyPrint + _CACHE_VERSION
+L'HTML finale contiene già le righe del DB, le impostazioni e la data
+("Aggiornata al ..."), quindi non serve inseguire a mano cosa invalida cosa:
+se cambia un prezzo cambia l'HTML, cambia la chiave, si rigenera. Costruire
+l'HTML costa millisecondi, è WeasyPrint quello caro.
+
+I file vivono in `locali/<TRGB_LOCALE>/data/render_cache/<tipo>/<sha>.pdf`.
+NON in `static/`: quella cartella è servita senza auth e la carta staff è un
+documento interno (vedi vini_router, 2026-08-03). Le sottocartelle di data/
+sono escluse dalla discovery del backup (backup_router._discover_databases).
+
+Eviction LRU per mtime: a ogni hit il file viene "toccato"; quando la cache
+supera TRGB_RENDER_CACHE_MB (default 200) o TRGB_RENDER_CACHE_FILES (default
+300) si cancellano i file toccati meno di recente.
+
+PRE-RENDER IN BACKGROUND
+------------------------
+I moduli registrano un renderer per tipo (`registra_prerender("carta_vini",
+fn)`); chi modifica i dati chiama `segnala_modifica("carta_vini")`. Dopo un
+debounce (TRGB_RENDER_PRERENDER_S, default 20s — un bulk edit di prezzi
+produce UNA rigenerazione, non cento) il renderer gira in un thread daemon e
+popola la cache: il prossimo download o "Pubblica sul sito" è immediato.
+Best-effort: un errore nel pre-render si logga e basta, la richiesta vera
+rigenera comunque.
+
+Uso:
+    from app.services.pdf_render_cache import render_pdf
+
+    pdf_bytes = render_pdf(
+        html,
+        tipo="carta_vini",
+        css_files=[CSS_PDF],
+        base_url=str(BASE_DIR),
+    )
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Union
+
+from app.utils.locale_data import locale_data_dir
+
+logger = logging.getLogger("trgb.pdf_render_cache")
+
+# Bump per invalidare tutta la cache (es. cambio asset referenziati via
+# file:// come il logo, che NON entrano nella chiave).
+_CACHE_VERSION = "1"
+
+_DEFAULT_MAX_MB = 200
+_DEFAULT_MAX_FILES = 300
+_DEFAULT_PRERENDER_S = 20.0
+
+_lock = threading.Lock()
+_stats = {"hit": 0, "miss": 0, "evicted": 0, "prerender_ok": 0, "prerender_err": 0}
+
+
+# ─────────────────────────────────────────────
+# CONFIG
+# ─────────────────────────────────────────────
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+def _enabled() -> bool:
+    """TRGB_RENDER_CACHE=0 spegne la cache (debug dei template)."""
+    return (os.getenv("TRGB_RENDER_CACHE") or "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _cache_dir() -> Path:
+    p = locale_data_dir() / "render_cache"
+    p.mkdir(parents=True, exist_ok=True)
+    return p
+
+
+def _safe_tipo(tipo: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in (tipo or "pdf")) or "pdf"
+
+
+# ─────────────────────────────────────────────
+# CHIAVE
+# ─────────────────────────────────────────────
+
+_weasy_version: Optional[str] = None
+_css_digest_cache: Dict[str, tuple] = {}   # path → (mtime_ns, size, digest)
+
+
+def _weasyprint_version() -> str:
+    global _weasy_version
+    if _weasy_version is None:
+        try:
+            from importlib.metadata import version
+            _weasy_version = version("weasyprint")
+        except Exception:
+            _weasy_version = "unknown"
+    return _weasy_version
+
+
+def _css_file_digest(path: Union[str, Path]) -> str:
+    """Digest del contenuto di un CSS, ricalcolato solo se cambia mtime/size."""
+    p = str(path)
+    try:
+        st = os.stat(p)
+    except OSError:
+        return "missing"
+    cached = _css_digest_cache.get(p)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    with open(p, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _css_digest_cache[p] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def chiave_render(
+    html: str,
+    css_files: Iterable[Union[str, Path]] = (),
+    css_strings: Iterable[str] = (),
+    base_url: Optional[str] = None,
+) -> str:
+    """SHA-256 di tutto ciò che determina i bytes del PDF."""
+    h = hashlib.sha256()
+    h.update(f"v{_CACHE_VERSION}|weasy{_weasyprint_version()}|{base_url or ''}\0".encode())
+    for f in css_files:
+        h.update(f"css-file:{_css_file_digest(f)}\0".encode())
+    for s in css_strings:
+        h.update(b"css-str:")
+        h.update((s or "").encode("utf-8"))
+        h.update(b"\0")
+    h.update(html.encode("utf-8"))
+    return h.hexdigest()
+
+
+# ─────────────────────────────────────────────
+# RENDER
+# ─────────────────────────────────────────────
+
+def _weasy_render(
+    html: str,
+    css_files: Iterable[Union[str, Path]],
+    css_strings: Iterable[str],
+    base_url: Optional[str],
+) -> bytes:
+    """Miss: il render vero passa dal pool fuori processo (pdf_render_pool)."""
+    from app.services.pdf_render_pool import render_pdf as render_nel_pool
+
+    return render_nel_pool(html, css_files=css_files, css_strings=css_strings, base_url=base_url)
+
+
+def render_pdf(
+    html: str,
+    tipo: str,
+    css_files: Iterable[Union[str, Path]] = (),
+    css_strings: Iterable[str] = (),
+    base_url: Optional[str] = None,
+) -> bytes:
+    """
+    Bytes del PDF per `html` + stylesheet, dalla cache se già renderizzato.
+
+    tipo: sottocartella della cache ('carta_vini', 'carta_bevande_staff',
+          'menu_pranzo', ...). Serve a `svuota(tipo)` e alla diagnostica, non
+          entra nella chiave.
+    """
+    css_files = list(css_files)
+    css_strings = list(css_strings)
+    if not _enabled():
+        return _weasy_render(html, css_files, css_strings, base_url)
+
+    chiave = chiave_render(html, css_files, css_strings, base_url)
+    cartella = _cache_dir() / _safe_tipo(tipo)
+    path = cartella / f"{chiave}.pdf"
+
+    try:
+        data = path.read_bytes()
+        if data:
+            try:
+                os.utime(path, None)   # LRU: ultimo uso = adesso
+            except OSError:
+                pass
+            with _lock:
+                _stats["hit"] += 1
+            return data
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning("Lettura cache %s fallita: %s", path.name, e)
+
+    with _lock:
+        _stats["miss"] += 1
+    data = _weasy_render(html, css_files, css_strings, base_url)
+
+    # Scrittura atomica: due render concorrenti della stessa chiave producono
+    # gli stessi bytes, vince l'ultimo os.replace — mai un file a metà.
+    try:
+        cartella.mkdir(parents=True, exist_ok=True)
+        tmp = cartella / f".{chiave}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        _evict()
+    except OSError as e:
+        # La cache è un di più: se il disco è pieno il PDF si consegna lo stesso.
+        logger.warning("Scrittura cache %s fallita: %s", path.name, e)
+    return data
+
+
+def _evict() -> None:
+    """Cancella i file meno usati finché la cache sta nei limiti."""
+    max_bytes = int(_env_num("TRGB_RENDER_CACHE_MB", _DEFAULT_MAX_MB) * 1048576)
+    max_files = int(_env_num("TRGB_RENDER_CACHE_FILES", _DEFAULT_MAX_FILES))
+
+    entries = []
+    for p in _cache_dir().rglob("*.pdf"):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+
+    totale = sum(e[1] for e in entries)
+    if totale <= max_bytes and len(entries) <= max_files:
+        return
+
+    entries.sort(key=lambda e: e[0])   # più vecchio (meno usato) prima
+    n = len(entries)
+    for _mtime, size, p in entries:
+        if totale <= max_bytes and n <= max_files:
+            break
+        try:
+            p.unlink()
+            totale -= size
+            n -= 1
+            with _lock:
+                _stats["evicted"] += 1
+        except OSError:
+            pass
+
+
+def svuota(tipo: Optional[str] = None) -> int:
+    """Cancella la cache (di un tipo o tutta). Ritorna il numero di file rimossi."""
+    base = _cache_dir()
+    radice = base / _safe_tipo(tipo) if tipo else base
+    if not radice.exists():
+        return 0
+    n = 0
+    for p in radice.rglob("*.pdf"):
+        try:
+            p.unlink()
+            n += 1
+        except OSError:
+            pass
+    return n
+
+
+def stato() -> dict:
+    """Diagnostica: dimensione, file per tipo, contatori hit/miss del processo."""
+    base = _cache_dir()
+    per_tipo: Dict[str, int] = {}
+    totale = 0
+    for p in base.rglob("*.pdf"):
+        try:
+            totale += p.stat().st_size
+        except OSError:
+            continue
+        per_tipo[p.parent.name] = per_tipo.get(p.parent.name, 0) + 1
+    with _lock:
+        contatori = dict(_stats)
+    return {
+        "abilitata": _enabled(),
+        "file": sum(per_tipo.values()),
+        "per_tipo": per_tipo,
+        "mb": round(totale / 1048576, 2),
+        "limite_mb": _env_num("TRGB_RENDER_CACHE_MB", _DEFAULT_MAX_MB),
+        "prerender_registrati": sorted(_prerender),
+        **contatori,
+    }
+
+
+# ─────────────────────────────────────────────
+# PRE-RENDER IN BACKGROUND
+# ─────────────────────────────────────────────
+
+_prerender: Dict[str, Callable[[], bytes]] = {}
+_timers: Dict[str, threading.Timer] = {}
+
+
+def registra_prerender(tipo: str, fn: Callable[[], bytes]) -> None:
+    """
+    Registra il renderer da rilanciare quando i dati di `tipo` cambiano.
+    `fn` deve passare da `render_pdf` (altrimenti non popola niente).
+    """
+    _prerender[tipo] = fn
+
+
+def _esegui_prerender(tipo: str) -> None:
+    with _lock:
+        _timers.pop(tipo, None)
+    fn = _prerender.get(tipo)
+    if fn is None:
+        return
+    try:
+        fn()
+        with _lock:
+            _stats["prerender_ok"] += 1
+        logger.info("Pre-render %s completato", tipo)
+    except Exception as e:
+        with _lock:
+            _stats["prerender_err"] += 1
+        logger.warning("Pre-render %s fallito: %s", tipo, e)
+
+
+def segnala_modifica(*tipi: str) -> None:
+    """
+    I dati dietro questi PDF sono cambiati: rigenera in background dopo il
+    debounce. Ogni nuova segnalazione dentro la finestra fa ripartire il
+    timer, così un bulk edit produce un solo render. Non solleva mai.
+    """
+    if not _enabled():
+        return
+    ritardo = _env_num("TRGB_RENDER_PRERENDER_S", _DEFAULT_PRERENDER_S)
+    if ritardo < 0:
+        return
+    for tipo in tipi:
+        if tipo not in _prerender:
+            continue
+        try:
+            with _lock:
+                vecchio = _timers.pop(tipo, None)
+                if vecchio is not None:
+                    vecchio.cancel()
+                t = threading.Timer(ritardo, _esegui_prerender, args=(tipo,))
+                t.daemon = True
+                _timers[tipo] = t
+            t.start()
+        except Exception as e:
+            logger.warning("Pre-render %s non pianificato: %s", tipo, e)
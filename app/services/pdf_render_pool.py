@@ -0,0 +1,320 @@
+# @version: v1.1 — Pool renderer PDF: fallback in-process, avvio da startup (sessione 2026-10-19)
+# -*- coding: utf-8 -*-
+"""
+Pool renderer PDF — TRGB Gestionale
+
+Modulo: platform
+Classificazione: [core]
+
+PERCHÉ ESISTE
+-------------
+Ogni endpoint PDF (carta vini, carta bevande, corrispettivi, conto economico,
+giftcard, turni, preventivi, inventario cantina, ...) chiamava WeasyPrint nel
+thread della richiesta. WeasyPrint è CPU-bound e tiene il GIL per secondi:
+uno staff che stampa l'inventario bloccava TUTTO il backend (uvicorn gira con
+un solo worker), compreso il polling notifiche dei tablet in sala.
+
+COME FUNZIONA
+-------------
+Un ProcessPoolExecutor (contesto "spawn": mai fork di un processo uvicorn con
+thread attivi) con N processi renderer pre-scaldati al boot:
+  - initializer: import di WeasyPrint, FontConfiguration condivisa, limite di
+    memoria (RLIMIT_AS) e un render "a vuoto" con i CSS base (carta_pdf.css +
+    brand M.B) così fontconfig e le @font-face sono già caricati al primo PDF
+    vero;
+  - coda: al massimo TRGB_PDF_QUEUE_MAX job in volo; oltre, si aspetta fino a
+    TRGB_PDF_QUEUE_WAIT_S e poi RuntimeError (il router risponde 500/503 come
+    già faceva per gli errori di generazione);
+  - timeout per job (TRGB_PDF_TIMEOUT_S): un render bloccato non si può
+    interrompere dentro il processo, quindi si termina l'intero pool e lo si
+    ricrea al job successivo. Stessa cosa se un worker muore (OOM, segfault
+    di Pango): BrokenProcessPool → pool ricreato;
+  - max_tasks_per_child: ogni processo viene riciclato dopo N job, così la
+    memoria frammentata da documenti grandi torna al sistema.
+
+Il thread della richiesta resta in attesa su future.result(), che rilascia il
+GIL: nel frattempo il backend continua a servire le altre richieste.
+
+CONFIG (.env, letta alla creazione del pool)
+--------------------------------------------
+    TRGB_PDF_POOL=1              # 0 → render in-process (dev, debug)
+    TRGB_PDF_WORKERS=2
+    TRGB_PDF_TIMEOUT_S=90
+    TRGB_PDF_WORKER_MEM_MB=1024  # 0 → nessun limite
+    TRGB_PDF_WORKER_MAX_TASKS=50
+    TRGB_PDF_QUEUE_MAX=16
+    TRGB_PDF_QUEUE_WAIT_S=30
+
+Uso (di norma NON direttamente: passare da pdf_render_cache.render_pdf, che
+usa questo pool sui miss; direttamente solo per PDF che cambiano a ogni
+richiesta, es. con orario di generazione):
+    from app.services.pdf_render_pool import render_pdf
+    pdf_bytes = render_pdf(html, css_strings=[css])
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+logger = logging.getLogger("trgb.pdf_render_pool")
+
+_BASE_DIR = Path(__file__).resolve().parents[2]
+_WARMUP_CSS_FILES = [_BASE_DIR / "static" / "css" / "carta_pdf.css"]
+
+_lock = threading.Lock()
+_executor: Optional[ProcessPoolExecutor] = None
+_slots: Optional[threading.BoundedSemaphore] = None
+_stats = {"job_ok": 0, "job_err": 0, "timeout": 0, "restart": 0, "inline": 0, "ms_totali": 0}
+
+
+# ─────────────────────────────────────────────
+# CONFIG
+# ─────────────────────────────────────────────
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+def _pool_enabled() -> bool:
+    return (os.getenv("TRGB_PDF_POOL") or "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+# ─────────────────────────────────────────────
+# LATO WORKER (gira nei processi figli)
+# ─────────────────────────────────────────────
+
+_font_config = None
+
+
+def _worker_init(mem_mb: int) -> None:
+    """Pre-riscaldamento del processo renderer. Errori qui non sono fatali."""
+    global _font_config
+    if mem_mb > 0:
+        try:
+            import resource
+            limite = mem_mb * 1048576
+            resource.setrlimit(resource.RLIMIT_AS, (limite, limite))
+        except Exception as e:   # non-Linux o limite non permesso
+            logger.warning("Limite memoria renderer non applicato: %s", e)
+    try:
+        from weasyprint import HTML, CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        _font_config = FontConfiguration()
+        css = [CSS(filename=str(f), font_config=_font_config) for f in _WARMUP_CSS_FILES if f.exists()]
+        try:
+            from app.services.pdf_brand import _base_css_brand
+            css.append(CSS(string=_base_css_brand(), font_config=_font_config))
+        except Exception:
+            pass
+        HTML(string="<p>TRGB</p>", base_url=str(_BASE_DIR)).write_pdf(
+            stylesheets=css, font_config=_font_config,
+        )
+    except Exception as e:
+        logger.warning("Warm-up renderer PDF non riuscito: %s", e)
+
+
+def _render_inline(
+    html: str,
+    css_files: List[str],
+    css_strings: List[str],
+    base_url: Optional[str],
+) -> bytes:
+    from weasyprint import HTML, CSS
+
+    kw = {"font_config": _font_config} if _font_config is not None else {}
+    stylesheets = [CSS(filename=f, **kw) for f in css_files]
+    stylesheets += [CSS(string=s, **kw) for s in css_strings if s]
+    return HTML(string=html, base_url=base_url).write_pdf(stylesheets=stylesheets, **kw)
+
+
+def _job(html: str, css_files: List[str], css_strings: List[str], base_url: Optional[str]) -> bytes:
+    """Entry point del job nel processo figlio (deve essere picklable per nome)."""
+    return _render_inline(html, css_files, css_strings, base_url)
+
+
+# ─────────────────────────────────────────────
+# LATO BACKEND
+# ─────────────────────────────────────────────
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = max(1, _env_int("TRGB_PDF_WORKERS", 2))
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_worker_init,
+                initargs=(_env_int("TRGB_PDF_WORKER_MEM_MB", 1024),),
+                max_tasks_per_child=max(1, _env_int("TRGB_PDF_WORKER_MAX_TASKS", 50)),
+            )
+            logger.info("Pool renderer PDF avviato (%s processi)", workers)
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(max(1, _env_int("TRGB_PDF_QUEUE_MAX", 16)))
+        return _executor
+
+
+def _termina_pool(motivo: str) -> None:
+    """
+    Uccide tutti i processi del pool: un job in timeout non si interrompe in
+    altro modo. Il prossimo render ricrea il pool da zero.
+    """
+    global _executor
+    with _lock:
+        ex, _executor = _executor, None
+        _stats["restart"] += 1
+    if ex is None:
+        return
+    logger.warning("Pool renderer PDF terminato (%s): verrà ricreato", motivo)
+    # _processes è privato ma è l'unico modo di terminare un job in corso.
+    for p in list((getattr(ex, "_processes", None) or {}).values()):
+        try:
+            p.terminate()
+        except Exception:
+            pass
+    try:
+        ex.shutdown(wait=False, cancel_futures=True)
+    except Exception:
+        pass
+
+
+def avvia_pool() -> None:
+    """
+    Pre-avvio al boot (startup hook di main.py, non all'import: chi importa
+    main da un tool o da TestClient non deve lanciare processi renderer):
+    crea il pool e lancia un job vuoto per processo, così i renderer sono
+    caldi prima della prima richiesta. Non blocca il boot; se fallisce, il
+    primo render riprova a crearlo e in ultima istanza va in-process.
+    """
+    if not _pool_enabled():
+        return
+    try:
+        ex = _get_executor()
+        for _ in range(max(1, _env_int("TRGB_PDF_WORKERS", 2))):
+            ex.submit(_job, "<p></p>", [], [], None)
+    except Exception as e:
+        logger.warning("Pool renderer PDF non avviato (render in-process): %s", e)
+
+
+def _inline(html: str, css_files: List[str], css_strings: List[str], base_url: Optional[str]) -> bytes:
+    """Render nel processo backend: pool spento da env o non disponibile."""
+    with _lock:
+        _stats["inline"] += 1
+    return _render_inline(html, css_files, css_strings, base_url)
+
+
+def render_pdf(
+    html: str,
+    css_files: Iterable[Union[str, Path]] = (),
+    css_strings: Iterable[str] = (),
+    base_url: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> bytes:
+    """
+    HTML + CSS → bytes del PDF, renderizzato in un processo del pool.
+
+    Se il pool non si può creare o è già rotto quando arriva il job, il
+    render avviene in-process (come prima del pool). Solleva RuntimeError su
+    timeout, coda piena o crash del renderer DURANTE il job (rifarlo
+    in-process rischierebbe di portarsi dietro l'OOM nel backend); gli
+    errori di WeasyPrint (CSS/HTML invalidi) arrivano così come sono.
+    """
+    css_files = [str(f) for f in css_files]
+    css_strings = [s for s in css_strings if s]
+    t0 = time.monotonic()
+
+    if not _pool_enabled():
+        return _inline(html, css_files, css_strings, base_url)
+
+    timeout = timeout or float(_env_int("TRGB_PDF_TIMEOUT_S", 90))
+    try:
+        ex = _get_executor()
+    except Exception as e:
+        # spawn non disponibile, limiti di processi, /dev/shm assente, ...
+        logger.warning("Pool renderer PDF non creato, render in-process: %s", e)
+        return _inline(html, css_files, css_strings, base_url)
+    if not _slots.acquire(timeout=float(_env_int("TRGB_PDF_QUEUE_WAIT_S", 30))):
+        raise RuntimeError("Renderer PDF occupato: troppe stampe in coda, riprova fra poco")
+    try:
+        try:
+            fut = ex.submit(_job, html, css_files, css_strings, base_url)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # Pool già rotto o chiuso prima di accettare il job: il documento
+            # non è ancora partito, si ricrea il pool per il prossimo e questo
+            # si fa in-process.
+            _termina_pool(f"submit rifiutato: {e}")
+            return _inline(html, css_files, css_strings, base_url)
+        try:
+            data = fut.result(timeout=timeout)
+        except FutureTimeout:
+            with _lock:
+                _stats["timeout"] += 1
+            _termina_pool(f"job oltre {timeout:.0f}s")
+            raise RuntimeError(f"Generazione PDF interrotta: oltre {timeout:.0f}s")
+        except BrokenProcessPool:
+            with _lock:
+                _stats["job_err"] += 1
+            _termina_pool("processo renderer terminato")
+            raise RuntimeError("Il renderer PDF si è interrotto (memoria esaurita?): riprova")
+        except MemoryError:
+            with _lock:
+                _stats["job_err"] += 1
+            raise RuntimeError(
+                f"Documento troppo grande per il renderer PDF "
+                f"(limite {_env_int('TRGB_PDF_WORKER_MEM_MB', 1024)} MB)"
+            )
+        except Exception:
+            with _lock:
+                _stats["job_err"] += 1
+            raise
+    finally:
+        _slots.release()
+
+    with _lock:
+        _stats["job_ok"] += 1
+        _stats["ms_totali"] += int((time.monotonic() - t0) * 1000)
+    return data
+
+
+def stato() -> dict:
+    """Diagnostica del pool (processi vivi, contatori del processo backend)."""
+    with _lock:
+        ex = _executor
+        contatori = dict(_stats)
+    vivi = 0
+    if ex is not None:
+        vivi = sum(1 for p in (getattr(ex, "_processes", None) or {}).values() if p.is_alive())
+    return {
+        "abilitato": _pool_enabled(),
+        "processi_attivi": vivi,
+        "processi_config": _env_int("TRGB_PDF_WORKERS", 2),
+        "timeout_s": _env_int("TRGB_PDF_TIMEOUT_S", 90),
+        "mem_mb": _env_int("TRGB_PDF_WORKER_MEM_MB", 1024),
+        **contatori,
+    }
+
+
+def _shutdown() -> None:
+    global _executor
+    ex, _executor = _executor, None
+    if ex is not None:
+        try:
+            ex.shutdown(wait=False, cancel_futures=True)
+        except Exception:
+            pass
+
+
+atexit.register(_shutdown)
@@ -0,0 +1,422 @@
+# @version: v1.1 — Strumentazione latenza richieste + tempo SQL, fetch e iterazione inclusi (sessione 2026-10-19)
+# -*- coding: utf-8 -*-
+"""
+Perf monitor — TRGB Gestionale
+
+Modulo: platform
+Classificazione: [core]
+
+PERCHÉ ESISTE
+-------------
+Nessun tempo misurato da nessuna parte: per capire quale pagina è lenta (e
+se la colpa è dell'SQL o del Python attorno) serviva attaccare un profiler
+al processo in produzione. Qui si raccoglie il minimo per trovare i punti
+caldi senza toccare i router.
+
+COME FUNZIONA
+-------------
+- `PerfMiddleware` (ASGI puro, il più esterno) misura ogni richiesta HTTP e
+  la attribuisce alla route FastAPI (`/vini/{id}`, non `/vini/123`).
+  Per route: conteggio, errori 5xx, p50/p95/p99/max su una finestra delle
+  ultime richieste, numero di statement e tempo SQL per richiesta.
+- Hook SQLite: `installa()` sostituisce `sqlite3.connect` con una versione
+  che crea le connessioni con `_TracedConnection` (i ~140 `sqlite3.connect`
+  sparsi nei router e nei servizi restano come sono). Il trace callback
+  nativo di sqlite3 dà il testo dello statement ma non la durata, quindi
+  execute / executemany / executescript sono cronometrati nel cursore, e
+  con loro fetchone / fetchall / fetchmany e l'iterazione `for r in cur`
+  (un SELECT di SQLite lavora mentre si leggono le righe: execute da solo
+  misura solo la prima). Il tempo SQL di richiesta e route li comprende
+  tutti; gli statement lenti sono misurati sull'execute. Fuori da una
+  richiesta (migrazioni, thread in background) il costo è un lookup di
+  ContextVar.
+- Statement lenti (>= TRGB_PERF_SLOW_MS, default 50): testo, DB, route,
+  n/max/tot. Il piano (EXPLAIN QUERY PLAN) si calcola solo quando lo si
+  chiede da /system/perf, su una connessione read-only, con parametri NULL:
+  dei parametri veri si tiene solo la forma, mai i valori.
+- `Server-Timing: app;dur=…, sql;dur=…` sulle risposte se
+  TRGB_PERF_SERVER_TIMING=1 (o acceso a runtime da /system/perf/config):
+  DevTools lo mostra nella tab Network → Timing.
+
+TRGB_PERF=0 spegne tutto (middleware passante, connessioni normali).
+Dati in memoria del processo (un solo worker uvicorn): si azzerano al
+riavvio o con DELETE /system/perf.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+_DEFAULT_SLOW_MS = 50.0
+_CAMPIONI_PER_ROUTE = 1000      # finestra per i percentili
+_MAX_STATEMENT_LENTI = 200
+_MAX_SQL_CHARS = 2000
+
+_lock = threading.Lock()
+_route: Dict[str, "_StatRoute"] = {}
+_lenti: Dict[tuple, dict] = {}
+_avvio = time.time()
+_config = {
+    "server_timing": (os.getenv("TRGB_PERF_SERVER_TIMING") or "").strip().lower() in ("1", "true", "yes", "on"),
+}
+
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+def abilitato() -> bool:
+    """TRGB_PERF=0 spegne la strumentazione."""
+    return (os.getenv("TRGB_PERF") or "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+_SLOW_MS = _env_num("TRGB_PERF_SLOW_MS", _DEFAULT_SLOW_MS)
+
+
+# ─────────────────────────────────────────────
+# STATO PER RICHIESTA
+# ─────────────────────────────────────────────
+
+class _Richiesta:
+    __slots__ = ("n_sql", "sql_s", "scope")
+
+    def __init__(self, scope: dict):
+        self.n_sql = 0
+        self.sql_s = 0.0
+        self.scope = scope      # scope["route"] c'è dopo il routing
+
+
+_corrente: contextvars.ContextVar[Optional[_Richiesta]] = contextvars.ContextVar("trgb_perf", default=None)
+
+
+class _StatRoute:
+    __slots__ = ("n", "errori", "tot_s", "max_s", "sql_n", "sql_s", "campioni")
+
+    def __init__(self):
+        self.n = 0
+        self.errori = 0
+        self.tot_s = 0.0
+        self.max_s = 0.0
+        self.sql_n = 0
+        self.sql_s = 0.0
+        self.campioni: Deque[float] = deque(maxlen=_CAMPIONI_PER_ROUTE)
+
+
+# ─────────────────────────────────────────────
+# HOOK SQLITE
+# ─────────────────────────────────────────────
+
+def _forma_parametri(parametri: Any) -> Any:
+    """Forma dei parametri (per EXPLAIN): None al posto dei valori."""
+    if isinstance(parametri, dict):
+        return {k: None for k in parametri}
+    if isinstance(parametri, (list, tuple)):
+        return [None] * len(parametri)
+    return None
+
+
+def _registra_sql(acc: _Richiesta, conn: Any, sql: str, parametri: Any, durata: float) -> None:
+    acc.n_sql += 1
+    acc.sql_s += durata
+    ms = durata * 1000
+    if ms < _SLOW_MS or not isinstance(sql, str):
+        return
+    testo = " ".join(sql.split())[:_MAX_SQL_CHARS]
+    db = getattr(conn, "_trgb_db", None)
+    chiave = (db, testo)
+    with _lock:
+        s = _lenti.get(chiave)
+        if s is None:
+            if len(_lenti) >= _MAX_STATEMENT_LENTI:
+                # via il meno lento: restano i peggiori
+                del _lenti[min(_lenti, key=lambda k: _lenti[k]["max_ms"])]
+            s = _lenti[chiave] = {"sql": testo, "db": db, "n": 0, "tot_ms": 0.0, "max_ms": 0.0,
+                                  "route": None, "forma": _forma_parametri(parametri)}
+        s["n"] += 1
+        s["tot_ms"] += ms
+        if ms >= s["max_ms"]:
+            s["max_ms"] = ms
+            s["route"] = _nome_route(acc.scope, 200)
+
+
+class _TracedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=(), /):
+        acc = _corrente.get()
+        if acc is None:
+            return super().execute(sql, parameters)
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _registra_sql(acc, self.connection, sql, parameters, time.perf_counter() - t0)
+
+    def executemany(self, sql, seq_of_parameters, /):
+        acc = _corrente.get()
+        if acc is None:
+            return super().executemany(sql, seq_of_parameters)
+        forma = seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters else None
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _registra_sql(acc, self.connection, sql, forma, time.perf_counter() - t0)
+
+    def executescript(self, sql_script, /):
+        acc = _corrente.get()
+        if acc is None:
+            return super().executescript(sql_script)
+        t0 = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _registra_sql(acc, self.connection, sql_script, None, time.perf_counter() - t0)
+
+    def fetchone(self):
+        acc = _corrente.get()
+        if acc is None:
+            return super().fetchone()
+        t0 = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            acc.sql_s += time.perf_counter() - t0
+
+    def __next__(self):
+        acc = _corrente.get()
+        if acc is None:
+            return super().__next__()
+        t0 = time.perf_counter()
+        try:
+            return super().__next__()
+        finally:
+            acc.sql_s += time.perf_counter() - t0
+
+    def fetchall(self):
+        acc = _corrente.get()
+        if acc is None:
+            return super().fetchall()
+        t0 = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            acc.sql_s += time.perf_counter() - t0
+
+    def fetchmany(self, *args, **kwargs):
+        acc = _corrente.get()
+        if acc is None:
+            return super().fetchmany(*args, **kwargs)
+        t0 = time.perf_counter()
+        try:
+            return super().fetchmany(*args, **kwargs)
+        finally:
+            acc.sql_s += time.perf_counter() - t0
+
+
+class _TracedConnection(sqlite3.Connection):
+    """Connessione i cui cursori (anche quelli impliciti di conn.execute) sono cronometrati."""
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or _TracedCursor)
+
+    def execute(self, sql, parameters=(), /):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters, /):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script, /):
+        return self.cursor().executescript(sql_script)
+
+
+_connect_originale = sqlite3.connect
+
+
+def _connect(database, *args, **kwargs):
+    # factory esplicita del chiamante (6° posizionale o keyword): non si tocca
+    if "factory" in kwargs or len(args) >= 5:
+        return _connect_originale(database, *args, **kwargs)
+    conn = _connect_originale(database, *args, factory=_TracedConnection, **kwargs)
+    conn._trgb_db = str(database)
+    return conn
+
+
+def installa() -> bool:
+    """Attiva l'hook su sqlite3.connect (idempotente). False se TRGB_PERF=0."""
+    if not abilitato():
+        return False
+    sqlite3.connect = _connect
+    return True
+
+
+# ─────────────────────────────────────────────
+# MIDDLEWARE
+# ─────────────────────────────────────────────
+
+def _nome_route(scope: dict, status: int) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if path:
+        return f"{scope.get('method', '')} {path}"
+    if status == 404:
+        return "(404)"
+    # mount statici (/static, /uploads) e simili: un bucket per prefisso
+    primo = (scope.get("path") or "/").split("/")[1:2]
+    return f"{scope.get('method', '')} /{primo[0] if primo else ''}/*"
+
+
+def _registra_richiesta(scope: dict, status: int, durata: float, acc: _Richiesta) -> None:
+    nome = _nome_route(scope, status)
+    with _lock:
+        s = _route.get(nome)
+        if s is None:
+            s = _route[nome] = _StatRoute()
+        s.n += 1
+        if status >= 500:
+            s.errori += 1
+        s.tot_s += durata
+        s.max_s = max(s.max_s, durata)
+        s.sql_n += acc.n_sql
+        s.sql_s += acc.sql_s
+        s.campioni.append(durata)
+
+
+class PerfMiddleware:
+    """ASGI puro: misura la richiesta fino all'ultimo byte del body."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not abilitato():
+            await self.app(scope, receive, send)
+            return
+        acc = _Richiesta(scope)
+        token = _corrente.set(acc)
+        t0 = time.perf_counter()
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if _config["server_timing"]:
+                    dur = (time.perf_counter() - t0) * 1000
+                    valore = (
+                        f'app;dur={dur:.1f}, sql;dur={acc.sql_s * 1000:.1f};desc="{acc.n_sql} query"'
+                    )
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"server-timing", valore.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _corrente.reset(token)
+            _registra_richiesta(scope, status, time.perf_counter() - t0, acc)
+
+
+# ─────────────────────────────────────────────
+# LETTURA / DIAGNOSTICA
+# ─────────────────────────────────────────────
+
+def _percentile(ordinati: List[float], p: float) -> float:
+    if not ordinati:
+        return 0.0
+    # nearest-rank
+    return ordinati[max(0, math.ceil(p / 100 * len(ordinati)) - 1)]
+
+
+def _piano(db: Optional[str], sql: str, forma: Any) -> List[str]:
+    """EXPLAIN QUERY PLAN su connessione read-only, parametri a NULL."""
+    if not db or db == ":memory:":
+        return ["piano non disponibile: DB in memoria"]
+    if sql.split(None, 1)[0].upper() not in ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE"):
+        return []
+    try:
+        conn = _connect_originale(f"file:{db}?mode=ro", uri=True, timeout=2)
+        try:
+            righe = conn.execute(f"EXPLAIN QUERY PLAN {sql}", forma if forma is not None else ()).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return [f"piano non disponibile: {e}"]
+    return [r[3] for r in righe]
+
+
+def stato(n: int = 30, piani: bool = True) -> dict:
+    """
+    Route ordinate per tempo totale (= dove se ne va il tempo del processo)
+    e statement lenti ordinati per tempo massimo, con piano se richiesto.
+    """
+    with _lock:
+        route = [(nome, s.n, s.errori, s.tot_s, s.max_s, s.sql_n, s.sql_s, sorted(s.campioni))
+                 for nome, s in _route.items()]
+        lenti = [dict(v) for v in _lenti.values()]
+
+    righe = []
+    for nome, cnt, errori, tot_s, max_s, sql_n, sql_s, campioni in sorted(route, key=lambda r: -r[3])[:n]:
+        righe.append({
+            "route": nome,
+            "n": cnt,
+            "errori_5xx": errori,
+            "tot_ms": round(tot_s * 1000, 1),
+            "media_ms": round(tot_s / cnt * 1000, 2),
+            "p50_ms": round(_percentile(campioni, 50) * 1000, 2),
+            "p95_ms": round(_percentile(campioni, 95) * 1000, 2),
+            "p99_ms": round(_percentile(campioni, 99) * 1000, 2),
+            "max_ms": round(max_s * 1000, 2),
+            "sql_per_richiesta": round(sql_n / cnt, 1),
+            "sql_ms_per_richiesta": round(sql_s / cnt * 1000, 2),
+            "sql_quota": round(sql_s / tot_s, 3) if tot_s else 0,
+        })
+
+    lenti.sort(key=lambda s: -s["max_ms"])
+    statement = []
+    for s in lenti[:n]:
+        voce = {
+            "sql": s["sql"],
+            "db": os.path.basename(s["db"]) if s["db"] else None,
+            "route": s["route"],
+            "n": s["n"],
+            "max_ms": round(s["max_ms"], 2),
+            "media_ms": round(s["tot_ms"] / s["n"], 2),
+        }
+        if piani:
+            voce["piano"] = _piano(s["db"], s["sql"], s["forma"])
+        statement.append(voce)
+
+    return {
+        "abilitato": abilitato(),
+        "hook_sqlite": sqlite3.connect is _connect,
+        "server_timing": _config["server_timing"],
+        "soglia_lenti_ms": _SLOW_MS,
+        "finestra_percentili": _CAMPIONI_PER_ROUTE,
+        "dal": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(_avvio)),
+        "richieste": sum(r[1] for r in route),
+        "route": righe,
+        "statement_lenti": statement,
+    }
+
+
+def configura(server_timing: Optional[bool] = None) -> dict:
+    if server_timing is not None:
+        _config["server_timing"] = bool(server_timing)
+    return dict(_config)
+
+
+def azzera() -> None:
+    global _avvio
+    with _lock:
+        _route.clear()
+        _lenti.clear()
+        _avvio = time.time()
@@ -188,11 +188,10 @@ def _build_html(menu: Dict[str, Any], settings: Dict[str, Any]) -> str:
 # ─────────────────────────────────────────────────────────────
 def genera_pdf_menu_pranzo(menu: Dict[str, Any], settings: Dict[str, Any]) -> bytes:
     """Bytes del PDF. `menu` deve avere `settimana_inizio` e `righe[]`."""
-    from weasyprint import HTML, CSS  # lazy
+    from app.services.pdf_render_cache import render_pdf
     html = _build_html(menu, settings)
-    return HTML(string=html, base_url=str(BASE_DIR)).write_pdf(
-        stylesheets=[CSS(filename=str(CSS_PDF))],
-    )
+    # Render cache: ri-scaricare o pubblicare la stessa settimana non rifa' WeasyPrint.
+    return render_pdf(html, tipo="menu_pranzo", css_files=[CSS_PDF], base_url=str(BASE_DIR))
 
 
 def genera_html_menu_pranzo(menu: Dict[str, Any], settings: Dict[str, Any]) -> str:
@@ -229,9 +228,7 @@ def _build_html_esterno(menu: Dict[str, Any]) -> str:
 
 def genera_pdf_menu_esterno(menu: Dict[str, Any]) -> bytes:
     """Bytes del PDF variante esterno. `menu` deve avere `righe[]`."""
-    from weasyprint import HTML, CSS  # lazy
+    from app.services.pdf_render_cache import render_pdf
     html = _build_html_esterno(menu)
-    return HTML(string=html, base_url=str(BASE_DIR)).write_pdf(
-        stylesheets=[CSS(filename=str(CSS_PDF_ESTERNO))],
-    )
+    return render_pdf(html, tipo="menu_pranzo_esterno", css_files=[CSS_PDF_ESTERNO], base_url=str(BASE_DIR))
 
@@ -35,8 +35,6 @@ import re
 from pathlib import Path
 from typing import Optional
 
-import pdfplumber
-
 
 class UnsupportedLayoutError(Exception):
     """PDF che non sembra una bolletta A2A nel layout atteso."""
@@ -427,6 +425,8 @@ def parse_bolletta_a2a(path: str | Path) -> dict:
     raw = path.read_bytes()
     fonte_hash = hashlib.sha256(raw).hexdigest()
 
+    import pdfplumber   # pesante: caricato al primo parse, non al boot del backend
+
     with pdfplumber.open(path) as pdf:
         testi = [(p.extract_text() or "") for p in pdf.pages]
 
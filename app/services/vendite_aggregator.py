@@ -1,5 +1,5 @@
 # app/services/vendite_aggregator.py
-# @version: v1.0
+# @version: v1.1 — fact table vendite_giornaliere + rollup mensile
 #
 # Aggregatore vendite per Controllo di Gestione e altri consumer.
 # Fonte primaria: shift_closures (turni registrati in app).
@@ -10,8 +10,17 @@
 # mai fare SELECT diretta su daily_closures (rischio dati stantii) o solo su
 # shift_closures (rischio di perdere lo storico pre-turni).
 #
-# Ispirato a _merge_shift_and_daily() in corrispettivi_export.py che fa la
-# stessa cosa ma per il formato export Excel.
+# v1.1 (2026-10-19) — FACT TABLE `vendite_giornaliere` (mig 171):
+# il merge shift+daily non si rifa' piu' in Python a ogni range. Una riga per
+# giorno, gia' fusa, mantenuta da trigger su shift_closures, daily_closures e
+# shift_preconti: qualsiasi scrittura (chiusura turno, import Excel, modifica
+# manuale, preconti) aggiorna il giorno toccato nella stessa transazione.
+# Sopra c'e' `vendite_mensili` (rollup per mese, trigger sulla fact table) e
+# la vista `vendite_annuali`: lo storico pluriennale legge decine di righe,
+# non migliaia. La regola del merge vive UNA volta, in _SQL_GIORNO qui sotto;
+# _giorni_merged_sorgenti resta come fallback (tabella non ancora creata) e
+# come riferimento per verifica().
+# corrispettivi_export legge da qui (prima aveva una copia del merge).
 
 import sqlite3
 from typing import Dict, List, Optional
@@ -36,6 +45,299 @@ def get_vendite_db() -> sqlite3.Connection:
     return conn
 
 
+# ══════════════════════════════════════════════
+# FACT TABLE: vendite_giornaliere + rollup
+# ══════════════════════════════════════════════
+
+_COLONNE_GIORNO = (
+    "date", "fonte", "weekday",
+    "corrispettivi", "iva_10", "iva_22", "fatture", "corrispettivi_tot",
+    "contanti", "pos_bpm", "pos_sella", "theforkpay", "other_e_payments",
+    "bonifici", "mance", "note", "is_closed",
+    "coperti", "coperti_pranzo", "coperti_cena", "fatt_pranzo", "fatt_cena",
+    "preconti",
+)
+
+_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS vendite_giornaliere (
+        date              TEXT PRIMARY KEY,       -- YYYY-MM-DD
+        fonte             TEXT NOT NULL,          -- 'shift' | 'daily'
+        weekday           TEXT,                   -- solo daily (import Excel)
+        corrispettivi     REAL NOT NULL DEFAULT 0,
+        iva_10            REAL NOT NULL DEFAULT 0,
+        iva_22            REAL NOT NULL DEFAULT 0,
+        fatture           REAL NOT NULL DEFAULT 0,
+        corrispettivi_tot REAL NOT NULL DEFAULT 0,
+        contanti          REAL NOT NULL DEFAULT 0,
+        pos_bpm           REAL NOT NULL DEFAULT 0,
+        pos_sella         REAL NOT NULL DEFAULT 0,
+        theforkpay        REAL NOT NULL DEFAULT 0,
+        other_e_payments  REAL NOT NULL DEFAULT 0,
+        bonifici          REAL NOT NULL DEFAULT 0,
+        mance             REAL NOT NULL DEFAULT 0,
+        note              TEXT,
+        is_closed         INTEGER NOT NULL DEFAULT 0,
+        -- solo fonte shift (NULL per daily): coperti e split per turno con
+        -- la semantica cumulativa della Z di cena (vedi statistiche_router)
+        coperti           INTEGER,
+        coperti_pranzo    INTEGER,
+        coperti_cena      INTEGER,
+        fatt_pranzo       REAL,
+        fatt_cena         REAL,
+        preconti          REAL NOT NULL DEFAULT 0  -- shift_preconti del giorno
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS vendite_mensili (
+        anno              INTEGER NOT NULL,
+        mese              INTEGER NOT NULL,
+        giorni            INTEGER NOT NULL DEFAULT 0,  -- righe nel mese
+        giorni_apertura   INTEGER NOT NULL DEFAULT 0,  -- corrispettivi+fatture > 0
+        giorni_incasso    INTEGER NOT NULL DEFAULT 0,  -- shift, o daily con tot > 0
+        giorni_turni      INTEGER NOT NULL DEFAULT 0,  -- fonte shift
+        corrispettivi     REAL NOT NULL DEFAULT 0,
+        fatture           REAL NOT NULL DEFAULT 0,
+        corrispettivi_tot REAL NOT NULL DEFAULT 0,
+        fatturato         REAL NOT NULL DEFAULT 0,     -- corrispettivi_tot dei giorni_incasso
+        contanti          REAL NOT NULL DEFAULT 0,
+        pos               REAL NOT NULL DEFAULT 0,
+        theforkpay        REAL NOT NULL DEFAULT 0,
+        bonifici          REAL NOT NULL DEFAULT 0,
+        mance             REAL NOT NULL DEFAULT 0,
+        coperti           INTEGER,                     -- NULL se nessun giorno shift
+        PRIMARY KEY (anno, mese)
+    )
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS vendite_annuali AS
+    SELECT anno,
+           SUM(giorni) AS giorni, SUM(giorni_apertura) AS giorni_apertura,
+           SUM(giorni_incasso) AS giorni_incasso, SUM(giorni_turni) AS giorni_turni,
+           SUM(corrispettivi) AS corrispettivi, SUM(fatture) AS fatture,
+           SUM(corrispettivi_tot) AS corrispettivi_tot, SUM(fatturato) AS fatturato,
+           SUM(contanti) AS contanti, SUM(pos) AS pos, SUM(theforkpay) AS theforkpay,
+           SUM(bonifici) AS bonifici, SUM(mance) AS mance, SUM(coperti) AS coperti
+    FROM vendite_mensili
+    GROUP BY anno
+    """,
+)
+
+# Ricalcolo di UN giorno. {d} = espressione della data: ':d' da Python,
+# NEW.date / OLD.date dentro i trigger (SQLite non ammette CTE nei trigger).
+# Regola di merge (invariata da v1.0):
+#   - shift vince: base = cena se esiste, altrimenti pranzo (chiusura di
+#     cassa unica); fatture additive pranzo + cena;
+#   - daily solo se il giorno non ha turni.
+_SQL_GIORNO = (
+    "DELETE FROM vendite_giornaliere WHERE date = {d}",
+    """
+    INSERT INTO vendite_giornaliere (
+        date, fonte, weekday, corrispettivi, iva_10, iva_22, fatture, corrispettivi_tot,
+        contanti, pos_bpm, pos_sella, theforkpay, other_e_payments, bonifici, mance,
+        note, is_closed, coperti, coperti_pranzo, coperti_cena, fatt_pranzo, fatt_cena,
+        preconti
+    )
+    SELECT b.date, 'shift', NULL,
+           COALESCE(b.preconto, 0), 0, 0, t.fatture, COALESCE(b.preconto, 0) + t.fatture,
+           COALESCE(b.contanti, 0), COALESCE(b.pos_bpm, 0), COALESCE(b.pos_sella, 0),
+           COALESCE(b.theforkpay, 0), COALESCE(b.other_e_payments, 0),
+           COALESCE(b.bonifici, 0), COALESCE(b.mance, 0),
+           CASE WHEN t.np <> '' AND t.nc <> '' THEN 'P: ' || t.np || ' | C: ' || t.nc
+                WHEN t.np <> '' THEN 'P: ' || t.np
+                WHEN t.nc <> '' THEN 'C: ' || t.nc
+                ELSE '' END,
+           0,
+           t.coperti, COALESCE(t.cop_p, 0), COALESCE(t.cop_c, 0),
+           COALESCE(t.pre_p + t.fat_p, 0),
+           CASE WHEN t.pre_c IS NULL THEN 0
+                WHEN t.pre_p IS NULL THEN t.pre_c + t.fat_c
+                ELSE MAX(t.pre_c - t.pre_p, 0) + t.fat_c END,
+           (SELECT TOTAL(p.importo) FROM shift_preconti p
+              JOIN shift_closures s ON s.id = p.shift_closure_id
+             WHERE s.date = {d})
+    FROM (SELECT * FROM shift_closures WHERE date = {d}
+          ORDER BY turno = 'pranzo' LIMIT 1) b,
+         (SELECT TOTAL(fatture)                                             AS fatture,
+                 SUM(COALESCE(coperti, 0))                                  AS coperti,
+                 MAX(CASE WHEN turno = 'pranzo'  THEN COALESCE(coperti, 0) END)  AS cop_p,
+                 MAX(CASE WHEN turno <> 'pranzo' THEN COALESCE(coperti, 0) END)  AS cop_c,
+                 MAX(CASE WHEN turno = 'pranzo'  THEN COALESCE(preconto, 0) END) AS pre_p,
+                 MAX(CASE WHEN turno = 'pranzo'  THEN COALESCE(fatture, 0) END)  AS fat_p,
+                 MAX(CASE WHEN turno <> 'pranzo' THEN COALESCE(preconto, 0) END) AS pre_c,
+                 MAX(CASE WHEN turno <> 'pranzo' THEN COALESCE(fatture, 0) END)  AS fat_c,
+                 COALESCE(MAX(CASE WHEN turno = 'pranzo'  THEN note END), '')    AS np,
+                 COALESCE(MAX(CASE WHEN turno <> 'pranzo' THEN note END), '')    AS nc
+          FROM shift_closures WHERE date = {d}) t
+    """,
+    """
+    INSERT OR IGNORE INTO vendite_giornaliere (
+        date, fonte, weekday, corrispettivi, iva_10, iva_22, fatture, corrispettivi_tot,
+        contanti, pos_bpm, pos_sella, theforkpay, other_e_payments, bonifici, mance,
+        note, is_closed, preconti
+    )
+    SELECT date, 'daily', weekday,
+           COALESCE(corrispettivi, 0), COALESCE(iva_10, 0), COALESCE(iva_22, 0),
+           COALESCE(fatture, 0),
+           COALESCE(corrispettivi_tot, COALESCE(corrispettivi, 0) + COALESCE(fatture, 0)),
+           COALESCE(contanti_finali, 0), COALESCE(pos_bpm, 0), COALESCE(pos_sella, 0),
+           COALESCE(theforkpay, 0), COALESCE(other_e_payments, 0),
+           COALESCE(bonifici, 0), COALESCE(mance, 0),
+           note, COALESCE(is_closed, 0), 0
+    FROM daily_closures WHERE date = {d}
+    """,
+)
+
+# Ricalcolo del mese che contiene {d} (trigger sulla fact table).
+_SQL_MESE = (
+    """
+    DELETE FROM vendite_mensili
+    WHERE anno = CAST(substr({d}, 1, 4) AS INTEGER) AND mese = CAST(substr({d}, 6, 2) AS INTEGER)
+    """,
+    """
+    INSERT INTO vendite_mensili (
+        anno, mese, giorni, giorni_apertura, giorni_incasso, giorni_turni,
+        corrispettivi, fatture, corrispettivi_tot, fatturato,
+        contanti, pos, theforkpay, bonifici, mance, coperti
+    )
+    SELECT CAST(substr(date, 1, 4) AS INTEGER), CAST(substr(date, 6, 2) AS INTEGER),
+           COUNT(*),
+           SUM(corrispettivi + fatture > 0),
+           SUM(fonte = 'shift' OR corrispettivi_tot > 0),
+           SUM(fonte = 'shift'),
+           TOTAL(corrispettivi), TOTAL(fatture), TOTAL(corrispettivi_tot),
+           TOTAL(CASE WHEN fonte = 'shift' OR corrispettivi_tot > 0 THEN corrispettivi_tot END),
+           TOTAL(contanti), TOTAL(pos_bpm + pos_sella), TOTAL(theforkpay),
+           TOTAL(bonifici), TOTAL(mance),
+           SUM(coperti)
+    FROM vendite_giornaliere
+    WHERE date >= substr({d}, 1, 7) || '-01' AND date <= substr({d}, 1, 7) || '-31'
+    GROUP BY substr(date, 1, 7)
+    """,
+)
+
+
+def _corpo(sqls, alias: str) -> str:
+    return " ".join(q.format(d=f"{alias}.date").strip() + ";" for q in sqls)
+
+
+def _corpo_preconti(alias: str) -> str:
+    # I preconti puntano alla chiusura: si ricalcola il giorno della chiusura.
+    return " ".join(
+        q.format(d=f"(SELECT date FROM shift_closures WHERE id = {alias}.shift_closure_id)").strip() + ";"
+        for q in _SQL_GIORNO
+    )
+
+
+def _triggers() -> List[tuple]:
+    t = []
+    for tab in ("shift_closures", "daily_closures"):
+        t.append((f"trg_vg_{tab}_ins", f"AFTER INSERT ON {tab}", _corpo(_SQL_GIORNO, "NEW")))
+        t.append((f"trg_vg_{tab}_del", f"AFTER DELETE ON {tab}", _corpo(_SQL_GIORNO, "OLD")))
+        t.append((
+            f"trg_vg_{tab}_upd", f"AFTER UPDATE ON {tab}",
+            _corpo(_SQL_GIORNO, "OLD") + " " + _corpo(_SQL_GIORNO, "NEW"),
+        ))
+    t.append(("trg_vg_shift_preconti_ins", "AFTER INSERT ON shift_preconti", _corpo_preconti("NEW")))
+    t.append(("trg_vg_shift_preconti_del", "AFTER DELETE ON shift_preconti", _corpo_preconti("OLD")))
+    t.append((
+        "trg_vg_shift_preconti_upd", "AFTER UPDATE ON shift_preconti",
+        _corpo_preconti("OLD") + " " + _corpo_preconti("NEW"),
+    ))
+    t.append(("trg_vg_mensili_ins", "AFTER INSERT ON vendite_giornaliere", _corpo(_SQL_MESE, "NEW")))
+    t.append(("trg_vg_mensili_del", "AFTER DELETE ON vendite_giornaliere", _corpo(_SQL_MESE, "OLD")))
+    return t
+
+
+_SORGENTI = ("shift_closures", "daily_closures", "shift_preconti")
+
+
+def fact_table_pronta(conn: sqlite3.Connection) -> bool:
+    """True se vendite_giornaliere e tutti i suoi trigger esistono."""
+    nomi = {
+        r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'vendite_giornaliere' "
+            "OR name LIKE 'trg\\_vg\\_%' ESCAPE '\\'"
+        ).fetchall()
+    }
+    return "vendite_giornaliere" in nomi and all(n in nomi for n, _e, _c in _triggers())
+
+
+def ensure_vendite_giornaliere(conn: sqlite3.Connection) -> bool:
+    """
+    Crea fact table, rollup e trigger se mancano (idempotente, una query se
+    è già tutto a posto). Servono le tre tabelle sorgente: se una manca
+    (DB nuovo, modulo cassa mai aperto) non crea niente e ritorna False —
+    giorni_merged usa il merge in Python.
+    """
+    if fact_table_pronta(conn):
+        return True
+    presenti = {
+        r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).fetchall()
+    }
+    if not all(t in presenti for t in _SORGENTI):
+        return False
+    for ddl in _DDL:
+        conn.execute(ddl)
+    for nome, evento, corpo in _triggers():
+        conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        conn.execute(f"CREATE TRIGGER {nome} {evento} BEGIN {corpo} END")
+    ricostruisci(conn)
+    return True
+
+
+def ricostruisci(conn: sqlite3.Connection) -> int:
+    """Ricalcola da zero fact table e rollup. Ritorna i giorni scritti."""
+    conn.execute("DELETE FROM vendite_giornaliere")
+    conn.execute("DELETE FROM vendite_mensili")
+    date = [
+        {"d": r[0]} for r in conn.execute(
+            "SELECT date FROM shift_closures UNION SELECT date FROM daily_closures"
+        ).fetchall()
+    ]
+    # I trigger della fact table ricalcolano il mese a ogni riga: su migliaia
+    # di giorni è più rapido spegnerli e rifare i mesi una volta sola.
+    conn.execute("DROP TRIGGER IF EXISTS trg_vg_mensili_ins")
+    conn.execute("DROP TRIGGER IF EXISTS trg_vg_mensili_del")
+    try:
+        for q in _SQL_GIORNO:
+            conn.executemany(q.format(d=":d"), date)
+        mesi = [
+            {"d": r[0]} for r in conn.execute(
+                "SELECT DISTINCT substr(date, 1, 7) || '-01' FROM vendite_giornaliere"
+            ).fetchall()
+        ]
+        conn.executemany(_SQL_MESE[1].format(d=":d"), mesi)
+    finally:
+        for nome, evento, corpo in _triggers():
+            if nome.startswith("trg_vg_mensili_"):
+                conn.execute(f"CREATE TRIGGER IF NOT EXISTS {nome} {evento} BEGIN {corpo} END")
+    conn.commit()
+    return len(date)
+
+
+def verifica(conn: sqlite3.Connection) -> Dict:
+    """
+    Confronta la fact table col merge calcolato dalle sorgenti. Diagnostica
+    per admin: {"giorni": n, "differenze": [date, ...]} (max 50 date).
+    """
+    attese = {r["date"]: r for r in _giorni_merged_sorgenti(conn, "0000-00-00", "9999-99-99")}
+    reali = {r["date"]: r for r in _giorni_merged_tabella(conn, "0000-00-00", "9999-99-99")}
+    def _uguali(x, y) -> bool:
+        if isinstance(x, (int, float)) and isinstance(y, (int, float)):
+            return abs(x - y) < 0.005
+        return (x or None) == (y or None)
+
+    diff = []
+    for d in sorted(set(attese) | set(reali)):
+        a, b = attese.get(d), reali.get(d)
+        if a is None or b is None or not all(_uguali(a[k], b.get(k)) for k in a):
+            diff.append(d)
+    return {"giorni": len(reali), "differenze": diff[:50], "n_differenze": len(diff)}
+
+
 # ══════════════════════════════════════════════
 # CORE: merge shift + daily per range di date
 # ══════════════════════════════════════════════
@@ -52,7 +354,9 @@ def giorni_merged(
     Ogni dict ha i campi:
         date, corrispettivi, fatture, corrispettivi_tot,
         contanti, pos_bpm, pos_sella, theforkpay, other_e_payments,
-        bonifici, mance
+        bonifici, mance, _source ('shift' | 'daily')
+    più (v1.1) weekday, iva_10, iva_22, note, is_closed, coperti,
+    coperti_pranzo, coperti_cena, fatt_pranzo, fatt_cena, preconti.
 
     date_from e date_to sono YYYY-MM-DD. date_to e' ESCLUSIVO (half-open).
 
@@ -64,17 +368,58 @@ def giorni_merged(
     - daily_closures ha una riga per giorno, formato legacy.
     - Se per un giorno esiste shift_closures -> shift vince.
       Altrimenti -> si usa daily (se c'e').
+
+    v1.1: legge la fact table `vendite_giornaliere`, gia' fusa dai trigger.
     """
+    if fact_table_pronta(conn):
+        return _giorni_merged_tabella(conn, date_from, date_to)
+    return _giorni_merged_sorgenti(conn, date_from, date_to)
+
+
+def _giorni_merged_tabella(conn: sqlite3.Connection, date_from: str, date_to: str) -> List[Dict]:
+    rows = conn.execute(f"""
+        SELECT {', '.join(_COLONNE_GIORNO)}
+        FROM vendite_giornaliere
+        WHERE date >= ? AND date < ?
+        ORDER BY date ASC
+    """, (date_from, date_to)).fetchall()
+    out = []
+    for r in rows:
+        d = dict(zip(_COLONNE_GIORNO, tuple(r)))
+        d["_source"] = d.pop("fonte")
+        out.append(d)
+    return out
+
+
+def _giorni_merged_sorgenti(
+    conn: sqlite3.Connection,
+    date_from: str,
+    date_to: str,
+) -> List[Dict]:
+    """Merge in Python dalle tabelle sorgente (pre-v1.1). Stessi campi della fact table."""
     # 1. Shift closures: una o due righe per giorno
     shift_rows = conn.execute("""
-        SELECT date, turno, preconto, fatture, contanti,
+        SELECT id, date, turno, preconto, fatture, contanti,
                pos_bpm, pos_sella, theforkpay, other_e_payments,
-               bonifici, mance
+               bonifici, mance, note, coperti
         FROM shift_closures
         WHERE date >= ? AND date < ?
         ORDER BY date ASC
     """, (date_from, date_to)).fetchall()
 
+    preconti_per_chiusura: Dict[int, float] = {}
+    try:
+        for r in conn.execute("""
+            SELECT p.shift_closure_id, TOTAL(p.importo)
+            FROM shift_preconti p
+            JOIN shift_closures s ON s.id = p.shift_closure_id
+            WHERE s.date >= ? AND s.date < ?
+            GROUP BY p.shift_closure_id
+        """, (date_from, date_to)).fetchall():
+            preconti_per_chiusura[r[0]] = float(r[1] or 0)
+    except sqlite3.OperationalError:
+        pass   # shift_preconti non ancora creata
+
     shift_by_date: Dict[str, List[sqlite3.Row]] = {}
     for r in shift_rows:
         shift_by_date.setdefault(r["date"], []).append(r)
@@ -92,9 +437,27 @@ def giorni_merged(
         fatture_tot = ((pranzo["fatture"] if pranzo else 0) or 0) + \
                       ((cena["fatture"] if cena else 0) or 0)
 
+        # Split per turno (semantica cumulativa: cena.preconto = Z di giornata)
+        if pranzo and cena:
+            fatt_pranzo = (pranzo["preconto"] or 0) + (pranzo["fatture"] or 0)
+            fatt_cena = max((cena["preconto"] or 0) - (pranzo["preconto"] or 0), 0) + (cena["fatture"] or 0)
+        elif cena:
+            fatt_pranzo, fatt_cena = 0, (cena["preconto"] or 0) + (cena["fatture"] or 0)
+        else:
+            fatt_pranzo, fatt_cena = (pranzo["preconto"] or 0) + (pranzo["fatture"] or 0), 0
+
+        note_parts = []
+        if pranzo and pranzo["note"]:
+            note_parts.append(f"P: {pranzo['note']}")
+        if cena and cena["note"]:
+            note_parts.append(f"C: {cena['note']}")
+
         shift_map[date_str] = {
             "date": date_str,
+            "weekday": None,
             "corrispettivi": float(chiusura),
+            "iva_10": 0.0,
+            "iva_22": 0.0,
             "fatture": float(fatture_tot),
             "corrispettivi_tot": float(chiusura + fatture_tot),
             "contanti": float((base["contanti"] or 0) if base else 0),
@@ -104,14 +467,22 @@ def giorni_merged(
             "other_e_payments": float((base["other_e_payments"] or 0) if base else 0),
             "bonifici": float((base["bonifici"] or 0) if base else 0),
             "mance": float((base["mance"] or 0) if base else 0),
+            "note": " | ".join(note_parts),
+            "is_closed": 0,
+            "coperti": sum((t["coperti"] or 0) for t in turni),
+            "coperti_pranzo": (pranzo["coperti"] or 0) if pranzo else 0,
+            "coperti_cena": (cena["coperti"] or 0) if cena else 0,
+            "fatt_pranzo": float(fatt_pranzo),
+            "fatt_cena": float(fatt_cena),
+            "preconti": sum(preconti_per_chiusura.get(t["id"], 0.0) for t in turni),
             "_source": "shift",
         }
 
     # 2. Daily closures: fallback
     daily_rows = conn.execute("""
-        SELECT date, corrispettivi, fatture, corrispettivi_tot,
+        SELECT date, weekday, corrispettivi, iva_10, iva_22, fatture, corrispettivi_tot,
                contanti_finali, pos_bpm, pos_sella, theforkpay, other_e_payments,
-               bonifici, mance
+               bonifici, mance, note, is_closed
         FROM daily_closures
         WHERE date >= ? AND date < ?
         ORDER BY date ASC
@@ -124,7 +495,10 @@ def giorni_merged(
         corr_tot = r["corrispettivi_tot"]
         daily_map[r["date"]] = {
             "date": r["date"],
+            "weekday": r["weekday"],
             "corrispettivi": corr,
+            "iva_10": float(r["iva_10"] or 0),
+            "iva_22": float(r["iva_22"] or 0),
             "fatture": fat,
             "corrispettivi_tot": float(corr_tot) if corr_tot is not None else (corr + fat),
             "contanti": float(r["contanti_finali"] or 0),
@@ -134,6 +508,14 @@ def giorni_merged(
             "other_e_payments": float(r["other_e_payments"] or 0),
             "bonifici": float(r["bonifici"] or 0),
             "mance": float(r["mance"] or 0),
+            "note": r["note"],
+            "is_closed": int(r["is_closed"] or 0),
+            "coperti": None,
+            "coperti_pranzo": None,
+            "coperti_cena": None,
+            "fatt_pranzo": None,
+            "fatt_cena": None,
+            "preconti": 0.0,
             "_source": "daily",
         }
 
@@ -161,18 +543,30 @@ def totali_periodo(
         giorni_apertura (giorni con corrispettivi+fatture > 0),
         media_giornaliera (totale_corrispettivi / giorni_apertura o 0).
     """
-    righe = giorni_merged(conn, date_from, date_to)
+    if fact_table_pronta(conn):
+        # Un solo SUM sulla fact table (indice PK su date)
+        r = conn.execute("""
+            SELECT TOTAL(corrispettivi), TOTAL(fatture), TOTAL(contanti),
+                   TOTAL(pos_bpm + pos_sella), TOTAL(theforkpay), TOTAL(bonifici),
+                   TOTAL(corrispettivi + fatture > 0)
+            FROM vendite_giornaliere
+            WHERE date >= ? AND date < ?
+        """, (date_from, date_to)).fetchone()
+        totale_corr, totale_fat, totale_cont, totale_pos, totale_tfp, totale_bon = r[:6]
+        giorni_aperti = int(r[6])
+    else:
+        righe = _giorni_merged_sorgenti(conn, date_from, date_to)
 
-    totale_corr = sum(r["corrispettivi"] for r in righe)
-    totale_fat = sum(r["fatture"] for r in righe)
-    totale_cont = sum(r["contanti"] for r in righe)
-    totale_pos = sum(r["pos_bpm"] + r["pos_sella"] for r in righe)
-    totale_tfp = sum(r["theforkpay"] for r in righe)
-    totale_bon = sum(r["bonifici"] for r in righe)
+        totale_corr = sum(r["corrispettivi"] for r in righe)
+        totale_fat = sum(r["fatture"] for r in righe)
+        totale_cont = sum(r["contanti"] for r in righe)
+        totale_pos = sum(r["pos_bpm"] + r["pos_sella"] for r in righe)
+        totale_tfp = sum(r["theforkpay"] for r in righe)
+        totale_bon = sum(r["bonifici"] for r in righe)
 
-    # Giorno "aperto" = ha registrato qualche incasso (corrispettivi o fatture).
-    # NOTA: un pranzo chiuso con sola cena aperta conta come aperto.
-    giorni_aperti = sum(1 for r in righe if (r["corrispettivi"] + r["fatture"]) > 0)
+        # Giorno "aperto" = ha registrato qualche incasso (corrispettivi o fatture).
+        # NOTA: un pranzo chiuso con sola cena aperta conta come aperto.
+        giorni_aperti = sum(1 for r in righe if (r["corrispettivi"] + r["fatture"]) > 0)
 
     media = (totale_corr / giorni_aperti) if giorni_aperti > 0 else 0.0
 
@@ -199,19 +593,69 @@ def totali_mensili_anno(
 
     Ogni dict: {mese: int (1-12), totale_corrispettivi: float, totale_incassi: float}
     """
+    per_mese: Dict[int, tuple] = {}
+    if fact_table_pronta(conn):
+        # Rollup vendite_mensili: 12 righe al massimo
+        for r in conn.execute(
+            "SELECT mese, corrispettivi, fatture FROM vendite_mensili WHERE anno = ?",
+            (anno,),
+        ).fetchall():
+            per_mese[r[0]] = (r[1], r[2])
+    else:
+        for m in range(1, 13):
+            primo = f"{anno}-{m:02d}-01"
+            if m == 12:
+                ultimo = f"{anno + 1}-01-01"
+            else:
+                ultimo = f"{anno}-{m + 1:02d}-01"
+            righe = _giorni_merged_sorgenti(conn, primo, ultimo)
+            per_mese[m] = (
+                sum(r["corrispettivi"] for r in righe),
+                sum(r["fatture"] for r in righe),
+            )
+
     result = []
     for m in range(1, 13):
-        primo = f"{anno}-{m:02d}-01"
-        if m == 12:
-            ultimo = f"{anno + 1}-01-01"
-        else:
-            ultimo = f"{anno}-{m + 1:02d}-01"
-        righe = giorni_merged(conn, primo, ultimo)
-        tot_corr = sum(r["corrispettivi"] for r in righe)
-        tot_fat = sum(r["fatture"] for r in righe)
+        tot_corr, tot_fat = per_mese.get(m, (0.0, 0.0))
         result.append({
             "mese": m,
             "totale_corrispettivi": round(tot_corr, 2),
             "totale_incassi": round(tot_corr + tot_fat, 2),
         })
     return result
+
+
+def mensili_storico(conn: sqlite3.Connection) -> List[Dict]:
+    """
+    Rollup per mese su tutta la storia: {anno, mese, fatturato, giorni,
+    coperti}. giorni/fatturato contano i giorni "con incasso" (turni
+    registrati, o import daily con totale > 0); coperti None se nel mese
+    non c'è nessun giorno da chiusure turno. Usato dallo storico YoY.
+    """
+    if fact_table_pronta(conn):
+        rows = conn.execute("""
+            SELECT anno, mese, fatturato, giorni_incasso, coperti
+            FROM vendite_mensili
+            WHERE giorni_incasso > 0
+            ORDER BY anno, mese
+        """).fetchall()
+        return [
+            {"anno": r[0], "mese": r[1], "fatturato": r[2], "giorni": r[3], "coperti": r[4]}
+            for r in rows
+        ]
+    mensile: Dict[tuple, Dict] = {}
+    for r in _giorni_merged_sorgenti(conn, "0000-00-00", "9999-99-99"):
+        if not (r["_source"] == "shift" or r["corrispettivi_tot"] > 0):
+            continue
+        m = mensile.setdefault(
+            (int(r["date"][:4]), int(r["date"][5:7])),
+            {"fatturato": 0.0, "giorni": 0, "coperti": None},
+        )
+        m["fatturato"] += r["corrispettivi_tot"]
+        m["giorni"] += 1
+        if r["coperti"] is not None:
+            m["coperti"] = (m["coperti"] or 0) + r["coperti"]
+    return [
+        {"anno": k[0], "mese": k[1], **mensile[k]}
+        for k in sorted(mensile)
+    ]
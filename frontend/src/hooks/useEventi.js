@@ -0,0 +1,192 @@
+// @version: v1.1-useEventi
+// Canale eventi server-push (SSE) — client unico condiviso, Mattone platform
+//
+// Uso:
+//   const connesso = useEventi(["prenotazione", "tavolo"], (tipo, dati) => { ... });
+//
+// Una sola connessione GET /eventi/stream per scheda, aperta al primo
+// componente che si iscrive e chiusa quando non ne resta nessuno.
+// fetch + ReadableStream (non EventSource) così il JWT va nell'header
+// Authorization come in apiFetch.
+//
+// - Riconnessione automatica con Last-Event-ID (`<epoca>-<seq>`, il backend
+//   rimanda gli eventi persi) a fine stream regolare; backoff 1s → 30s sugli
+//   errori.
+// - `resync` (buffer superato / client troppo lento / backend riavviato)
+//   arriva a TUTTI gli iscritti: ricaricare la vista da zero.
+// - Riconnessione dopo un errore (rete giù, backend riavviato, standby):
+//   niente Last-Event-ID, il client stesso manda `resync` a tutti appena lo
+//   stream è di nuovo su. Cosa sia successo nel frattempo non si sa.
+// - `connesso` = false → il componente resta sul suo polling di sempre
+//   (fallback). Con backend vecchio o TRGB_SSE=0 (503) si riprova ogni 60s.
+
+import { useState, useEffect, useRef } from "react";
+import { API_BASE } from "../config/api";
+
+const BACKOFF_MIN = 1_000;
+const BACKOFF_MAX = 30_000;
+const RETRY_503 = 60_000;
+
+const iscritti = new Set();      // { tipi: Set|null, fn }
+const ascoltatoriStato = new Set();
+let connesso = false;
+let controller = null;
+let lastId = null;
+let dopoErrore = false;
+let backoff = BACKOFF_MIN;
+let timerRiconnessione = null;
+
+function setConnesso(v) {
+  if (connesso === v) return;
+  connesso = v;
+  ascoltatoriStato.forEach(fn => fn(v));
+}
+
+function dispatch(tipo, dati) {
+  iscritti.forEach(({ tipi, fn }) => {
+    if (tipo === "resync" || !tipi || tipi.has(tipo)) {
+      try { fn(tipo, dati); } catch (e) { console.error("[useEventi] handler", e); }
+    }
+  });
+}
+
+// Un blocco SSE ("id: …\nevent: …\ndata: …") → evento
+function parseBlocco(blocco) {
+  let id = null, tipo = "message", dati = "";
+  for (const riga of blocco.split("\n")) {
+    if (!riga || riga.startsWith(":")) continue;   // commento / ping
+    const i = riga.indexOf(":");
+    const campo = i < 0 ? riga : riga.slice(0, i);
+    const valore = i < 0 ? "" : riga.slice(i + 1).replace(/^ /, "");
+    if (campo === "id") id = valore;
+    else if (campo === "event") tipo = valore;
+    else if (campo === "data") dati += valore;
+  }
+  if (id) lastId = id;
+  if (!dati) return;
+  try { dispatch(tipo, JSON.parse(dati)); } catch { /* payload non JSON: ignora */ }
+}
+
+function programma(ms) {
+  clearTimeout(timerRiconnessione);
+  timerRiconnessione = setTimeout(connetti, ms);
+}
+
+async function connetti() {
+  if (controller || iscritti.size === 0) return;
+  const token = localStorage.getItem("token");
+  if (!token) { setConnesso(false); programma(RETRY_503); return; }
+
+  controller = new AbortController();
+  const mio = controller;
+  let terminatoRegolare = false;
+  try {
+    const res = await fetch(`${API_BASE}/eventi/stream`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+        Accept: "text/event-stream",
+        ...(lastId !== null ? { "Last-Event-ID": String(lastId) } : {}),
+      },
+      signal: mio.signal,
+      cache: "no-store",
+    });
+    if (!res.ok || !res.body) {
+      // 401: ci pensa il prossimo apiFetch (redirect al login); 503/404: hub
+      // spento o backend vecchio → polling, si riprova con calma.
+      dopoErrore = true;
+      lastId = null;
+      setConnesso(false);
+      controller = null;
+      programma(res.status === 503 || res.status === 404 ? RETRY_503 : backoff);
+      backoff = Math.min(backoff * 2, BACKOFF_MAX);
+      return;
+    }
+    setConnesso(true);
+    backoff = BACKOFF_MIN;
+    if (dopoErrore) {
+      dopoErrore = false;
+      dispatch("resync", { motivo: "riconnessione" });
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true }).replace(/\r\n?/g, "\n");
+      let sep;
+      while ((sep = buffer.indexOf("\n\n")) >= 0) {
+        parseBlocco(buffer.slice(0, sep));
+        buffer = buffer.slice(sep + 2);
+      }
+    }
+    // Il server chiude lo stream a fine durata / scadenza token: è normale.
+    terminatoRegolare = true;
+  } catch {
+    // rete giù, abort, backend riavviato
+  }
+  if (controller !== mio) return;   // chiuso da disconnetti()
+  controller = null;
+  if (iscritti.size === 0) return;
+  if (terminatoRegolare) {
+    programma(500);
+  } else {
+    dopoErrore = true;
+    lastId = null;
+    setConnesso(false);
+    programma(backoff);
+    backoff = Math.min(backoff * 2, BACKOFF_MAX);
+  }
+}
+
+function disconnetti() {
+  clearTimeout(timerRiconnessione);
+  if (controller) {
+    const c = controller;
+    controller = null;
+    c.abort();
+  }
+  setConnesso(false);
+}
+
+// Tablet che torna dallo standby: riconnetti subito invece di aspettare il backoff
+if (typeof document !== "undefined") {
+  document.addEventListener("visibilitychange", () => {
+    if (document.visibilityState === "visible" && !controller && iscritti.size > 0) {
+      backoff = BACKOFF_MIN;
+      programma(0);
+    }
+  });
+}
+
+/** Iscrizione a basso livello (fuori da React). Ritorna la funzione di disiscrizione. */
+export function iscriviEventi(tipi, fn) {
+  const voce = { tipi: tipi && tipi.length ? new Set(tipi) : null, fn };
+  iscritti.add(voce);
+  if (!controller) programma(0);
+  return () => {
+    iscritti.delete(voce);
+    if (iscritti.size === 0) disconnetti();
+  };
+}
+
+export default function useEventi(tipi, handler) {
+  const [statoConnessione, setStatoConnessione] = useState(connesso);
+  const handlerRef = useRef(handler);
+  handlerRef.current = handler;
+  const chiave = (tipi || []).join(",");
+
+  useEffect(() => {
+    ascoltatoriStato.add(setStatoConnessione);
+    setStatoConnessione(connesso);
+    const off = iscriviEventi(chiave ? chiave.split(",") : null,
+                             (tipo, dati) => handlerRef.current?.(tipo, dati));
+    return () => {
+      ascoltatoriStato.delete(setStatoConnessione);
+      off();
+    };
+  }, [chiave]);
+
+  return statoConnessione;
+}
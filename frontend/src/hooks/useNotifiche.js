@@ -1,14 +1,17 @@
-// @version: v1.0-useNotifiche
+// @version: v1.1-useNotifiche (eventi SSE)
 // Hook centralizzato per notifiche e comunicazioni — Mattone M.A
 //
 // Uso:
 //   const { totaleNonLette, notifiche, comunicazioni, refresh, segnaLetta, ... } = useNotifiche();
 //
-// Polling automatico ogni 60s per il contatore badge.
+// Contatore badge aggiornato dagli eventi server-push (useEventi: notifica /
+// comunicazione). Il polling ogni 60s resta solo come fallback quando il
+// canale eventi non è connesso.
 // Lista completa caricata on-demand quando si apre il pannello.
 
 import { useState, useEffect, useCallback, useRef } from "react";
 import { apiFetch, API_BASE } from "../config/api";
+import useEventi from "./useEventi";
 
 const POLL_INTERVAL = 60_000; // 60 secondi
 
@@ -36,12 +39,19 @@ export default function useNotifiche() {
     }
   }, []);
 
-  // ── Polling contatore ──
+  // ── Eventi server-push: ogni notifica/comunicazione → rileggi il contatore ──
+  const connesso = useEventi(["notifica", "comunicazione"], () => { fetchContatore(); });
+
   useEffect(() => {
     fetchContatore();
+  }, [fetchContatore]);
+
+  // ── Polling contatore (solo se il canale eventi non è connesso) ──
+  useEffect(() => {
+    if (connesso) return undefined;
     pollRef.current = setInterval(fetchContatore, POLL_INTERVAL);
     return () => clearInterval(pollRef.current);
-  }, [fetchContatore]);
+  }, [fetchContatore, connesso]);
 
   // ── Fetch lista notifiche ──
   const fetchNotifiche = useCallback(async () => {
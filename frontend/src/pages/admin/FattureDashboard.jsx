@@ -1,4 +1,4 @@
-// @version: v3.1-mattoni — M.I primitives (Btn) su CTA Import XML (tocco minimo, file 867 righe)
+// @version: v3.3-baseline — anomalie del mese vs media mobile 12 mesi (fornitori abituali)
 // Dashboard acquisti fatture elettroniche — KPI, grafici, categorie, anomalie, drill-down
 import React, { useEffect, useMemo, useState, useCallback, useRef } from "react";
 import { useNavigate } from "react-router-dom";
@@ -817,7 +817,10 @@ function AnomalieCard({ data, year }) {
     diminuzione: { bg: "bg-green-50", border: "border-green-200", text: "text-green-700", label: "Diminuzione" },
     nuovo: { bg: "bg-blue-50", border: "border-blue-200", text: "text-blue-700", label: "Nuovo" },
     scomparso: { bg: "bg-neutral-50", border: "border-neutral-300", text: "text-neutral-600", label: "Scomparso" },
+    sopra_media: { bg: "bg-amber-50", border: "border-amber-200", text: "text-amber-700", label: "Mese sopra media" },
+    sotto_media: { bg: "bg-sky-50", border: "border-sky-200", text: "text-sky-700", label: "Mese sotto media" },
   };
+  const mediaMese = (a) => a.tipo === "sopra_media" || a.tipo === "sotto_media";
 
   const visible = data.slice(0, 8);
 
@@ -828,6 +831,7 @@ function AnomalieCard({ data, year }) {
       </h3>
       <p className="text-[11px] text-neutral-400 mb-3">
         Fornitori con variazione superiore al 30% rispetto all'anno precedente
+        o, se abituali, nell'ultimo mese chiuso rispetto alla media dei 12 mesi prima
       </p>
       <div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-2">
         {visible.map((a, i) => {
@@ -850,9 +854,16 @@ function AnomalieCard({ data, year }) {
                   ? `€ ${fmt(a.totale_corrente)} (${a.n_fatture} fatt.)`
                   : a.tipo === "scomparso"
                     ? `Era € ${fmt(a.totale_precedente)}`
-                    : `€ ${fmt(a.totale_precedente)} → € ${fmt(a.totale_corrente)}`
+                    : mediaMese(a)
+                      ? `${a.mese_baseline}: € ${fmt(a.totale_corrente)}`
+                      : `€ ${fmt(a.totale_precedente)} → € ${fmt(a.totale_corrente)}`
                 }
               </div>
+              {a.media_12m > 0 && (
+                <div className="text-[10px] text-neutral-400">
+                  media 12 mesi € {fmt(a.media_12m)}/mese
+                </div>
+              )}
             </div>
           );
         })}
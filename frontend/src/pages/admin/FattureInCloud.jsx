@@ -1,9 +1,10 @@
-// @version: v1.2-mattoni — M.I primitives (Btn) su Collega/Sincronizza/Scollega (tocco minimo)
+// @version: v1.3-eventi — progress sync via evento SSE fic_sync (polling solo come fallback)
 // Pagina integrazione Fatture in Cloud — connessione, sync fatture ricevute, lista
 // + Tab "Warning" (mig 062 / problemi.md A1): lista documenti FIC skippati dal sync
 // perché senza numero e senza P.IVA (prima nota mascherata da fattura).
-import React, { useState, useEffect, useCallback } from "react";
+import React, { useState, useEffect, useCallback, useRef } from "react";
 import { API_BASE, apiFetch } from "../../config/api";
+import useEventi from "../../hooks/useEventi";
 import FattureNav from "./FattureNav";
 import Tooltip from "../../components/Tooltip";
 import { Btn } from "../../components/ui";
@@ -21,6 +22,15 @@ export default function FattureInCloud() {
   const [syncing, setSyncing] = useState(false);
   const [syncResult, setSyncResult] = useState(null);
   const [syncProgress, setSyncProgress] = useState(null); // { phase, total, phase1_done, phase2_total, phase2_done, last_fornitore, ... }
+
+  // Progress del sync spinto dal backend (evento fic_sync); il polling di
+  // /sync/progress parte solo se il canale eventi non è connesso.
+  const syncingRef = useRef(false);
+  const eventiConnessi = useEventi(["fic_sync"], (tipo, p) => {
+    if (tipo === "fic_sync" && syncingRef.current) setSyncProgress(prev => ({ ...prev, ...p }));
+  });
+  const eventiConnessiRef = useRef(eventiConnessi);
+  eventiConnessiRef.current = eventiConnessi;
   const [fatture, setFatture] = useState([]);
   const [totalFatture, setTotalFatture] = useState(0);
   const [page, setPage] = useState(1);
@@ -203,6 +213,7 @@ export default function FattureInCloud() {
   // ── Sync con progress ─────────────────────────────────
   const handleSync = async () => {
     setSyncing(true);
+    syncingRef.current = true;
     setSyncResult(null);
     setSyncProgress(null);
 
@@ -215,8 +226,9 @@ export default function FattureInCloud() {
       }
     } catch (_) {}
 
-    // 2) Avvia polling progress
+    // 2) Avvia polling progress (fallback: con gli eventi connessi non serve)
     const pollId = setInterval(async () => {
+      if (eventiConnessiRef.current) return;
       try {
         const pr = await apiFetch(`${FC}/sync/progress`);
         if (pr.ok) {
@@ -243,6 +255,7 @@ export default function FattureInCloud() {
     }
 
     clearInterval(pollId);
+    syncingRef.current = false;
     setSyncing(false);
     // Mantieni progress visibile per qualche secondo, poi nascondi
     setTimeout(() => setSyncProgress(null), 3000);
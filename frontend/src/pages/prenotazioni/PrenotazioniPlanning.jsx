@@ -1,8 +1,10 @@
-// @version: v1.1-mattoni — M.I primitives (Btn) su nav data + nuova prenotazione
+// @version: v1.2-delta — refresh in delta-sync (?since=) e su eventi SSE "prenotazione"
 // Vista planning giornaliero — modulo Prenotazioni TRGB
-import React, { useState, useEffect, useCallback } from "react";
+import React, { useState, useEffect, useCallback, useRef } from "react";
 import { useParams, useNavigate, Link } from "react-router-dom";
 import { API_BASE, apiFetch } from "../../config/api";
+import useEventi from "../../hooks/useEventi";
+import { applicaDelta, leggiCursore, ordinaPer } from "../../utils/deltaSync";
 import PrenotazioniNav from "./PrenotazioniNav";
 import PrenotazioniForm from "./PrenotazioniForm";
 import MiniCalendario from "./components/MiniCalendario";
@@ -318,6 +320,9 @@ function TabellaPrenotazioni({ titolo, prenotazioni, conteggio, pax, capienza, o
 // ============================================================
 // COMPONENTE PRINCIPALE
 // ============================================================
+// stesso ORDER BY di /planning/{data}
+const ORDINE_PLANNING = ordinaPer("ora_pasto", "id");
+
 export default function PrenotazioniPlanning() {
   const { data: dataParam } = useParams();
   const navigate = useNavigate();
@@ -329,18 +334,49 @@ export default function PrenotazioniPlanning() {
   const [showCalendario, setShowCalendario] = useState(false);
   const [toast, setToast] = useState(null);
 
+  const cursoreRef = useRef(null);   // delta-sync: null = prossimo giro completo
+
   const loadPlanning = useCallback(() => {
     setLoading(true);
+    cursoreRef.current = null;
     apiFetch(`${API_BASE}/prenotazioni/planning/${data}`)
-      .then((r) => r.json())
+      .then((r) => { cursoreRef.current = leggiCursore(r); return r.json(); })
       .then((d) => { setPlanning(d); setLoading(false); })
       .catch(() => setLoading(false));
   }, [data]);
 
+  // Refresh leggero dopo un'azione o un evento: solo le prenotazioni cambiate
+  const aggiornaPlanning = useCallback(async () => {
+    if (cursoreRef.current === null) return loadPlanning();
+    try {
+      const r = await apiFetch(`${API_BASE}/prenotazioni/planning/${data}?since=${cursoreRef.current}`);
+      if (!r.ok) return;
+      const d = await r.json();
+      if (d.data !== data) return;   // risposta arrivata dopo un cambio giorno
+      cursoreRef.current = d.cursor;
+      setPlanning(prev => {
+        const tutte = applicaDelta([...(prev?.pranzo || []), ...(prev?.cena || [])], d, ORDINE_PLANNING);
+        return {
+          data: d.data,
+          pranzo: tutte.filter(p => p.turno === "pranzo"),
+          cena: tutte.filter(p => p.turno !== "pranzo"),
+          contatori: d.contatori,
+        };
+      });
+    } catch { /* il prossimo evento o loadPlanning rimette a posto */ }
+  }, [data, loadPlanning]);
+
   useEffect(() => {
     loadPlanning();
   }, [loadPlanning]);
 
+  // Prenotazioni create/modificate da altri (o import TheFork): solo se
+  // toccano il giorno visualizzato
+  useEventi(["prenotazione"], (tipo, ev) => {
+    if (tipo === "resync") { loadPlanning(); return; }
+    if (!ev.data_pasto || ev.data_pasto === data || ev.data_pasto_prec === data) aggiornaPlanning();
+  });
+
   // Sync URL con data
   useEffect(() => {
     if (dataParam !== data) {
@@ -357,7 +393,7 @@ export default function PrenotazioniPlanning() {
       });
       if (r.ok) {
         setToast({ type: "ok", text: `Stato aggiornato → ${nuovoStato}` });
-        loadPlanning();
+        aggiornaPlanning();
       } else {
         const err = await r.json();
         setToast({ type: "err", text: err.detail || "Errore" });
@@ -374,7 +410,7 @@ export default function PrenotazioniPlanning() {
 
   const handleFormSuccess = () => {
     setShowForm(false);
-    loadPlanning();
+    aggiornaPlanning();
     setToast({ type: "ok", text: "Prenotazione creata" });
     setTimeout(() => setToast(null), 3000);
   };
@@ -1,8 +1,9 @@
-// @version: v1.1-mattoni — M.I primitives (Btn) su nav data
+// @version: v1.2-eventi — refresh su eventi SSE, polling 30s solo come fallback
 // Mappa serale tavoli — vista operativa con assegnazione, Fase 2 Prenotazioni
 import React, { useState, useEffect, useCallback, useRef } from "react";
 import { useParams, useNavigate } from "react-router-dom";
 import { API_BASE, apiFetch } from "../../config/api";
+import useEventi from "../../hooks/useEventi";
 import PrenotazioniNav from "./PrenotazioniNav";
 import StatoBadge from "./components/StatoBadge";
 import { Btn } from "../../components/ui";
@@ -60,11 +61,21 @@ export default function TavoliMappa() {
     loadMappa();
   }, [loadMappa]);
 
-  // Auto-refresh ogni 30s
+  // Eventi server-push: ricarica solo se tocca la serata visualizzata
+  // (o la prenotazione è stata spostata da qui). `tavolo` = layout cambiato.
+  const connesso = useEventi(["prenotazione", "tavolo"], (tipo, ev) => {
+    if (tipo === "resync" || tipo === "tavolo") { loadMappa(); return; }
+    const qui = (ev.data_pasto === data && (!ev.turno || ev.turno === turno))
+      || (ev.data_pasto_prec === data && ev.turno_prec === turno);
+    if (qui || !ev.data_pasto) loadMappa();
+  });
+
+  // Auto-refresh ogni 30s — solo se il canale eventi non è connesso
   useEffect(() => {
+    if (connesso) return undefined;
     refreshTimer.current = setInterval(loadMappa, 30000);
     return () => clearInterval(refreshTimer.current);
-  }, [loadMappa]);
+  }, [loadMappa, connesso]);
 
   // ── Assegna tavolo ──
   const assegnaTavolo = async (prenId, nometavolo) => {
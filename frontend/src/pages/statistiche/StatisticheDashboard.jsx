@@ -1,4 +1,4 @@
-// @version: v1.1-mattoni — EmptyState sui 3 placeholder "Nessun dato"
+// @version: v1.2 — un solo fetch /statistiche/riepilogo (cubo vendite) al posto di 5
 // Dashboard Statistiche — categorie, top prodotti, trend mensile
 import React, { useEffect, useState } from "react";
 import { API_BASE, apiFetch } from "../../config/api";
@@ -57,28 +57,21 @@ export default function StatisticheDashboard() {
   const loadAll = async () => {
     setLoading(true);
     const qs = buildParams();
+    // Un solo payload (categorie, top, trend, mesi, movimenti) dal cubo vendite.
+    // I movimenti arrivano solo in vista mese (anno+mese).
     try {
-      const [catRes, topRes, trendRes, mesiRes] = await Promise.all([
-        apiFetch(`${EP}/categorie?${qs}`),
-        apiFetch(`${EP}/top-prodotti?${qs}&n=15`),
-        apiFetch(`${EP}/trend?anno=${modo !== "tutto" ? selAnno : ""}`),
-        apiFetch(`${EP}/mesi`),
-      ]);
-      if (catRes.ok) setCategorie(await catRes.json());
-      if (topRes.ok) setTopProdotti(await topRes.json());
-      if (trendRes.ok) setTrend(await trendRes.json());
-      if (mesiRes.ok) setMesi(await mesiRes.json());
-    } catch (_) {}
-
-    // Movimenti prodotti: solo in vista mese (confronto col mese precedente importato)
-    if (modo === "mese") {
-      try {
-        const movRes = await apiFetch(`${EP}/movimenti?anno=${selAnno}&mese=${selMese}&n=8`);
-        setMovimenti(movRes.ok ? await movRes.json() : null);
-      } catch (_) { setMovimenti(null); }
-    } else {
-      setMovimenti(null);
-    }
+      const res = await apiFetch(`${EP}/riepilogo?${qs}&n=15&n_movimenti=8`);
+      if (res.ok) {
+        const d = await res.json();
+        setCategorie(d.categorie || []);
+        setTopProdotti(d.top_prodotti || []);
+        setTrend(d.trend || []);
+        setMesi(d.mesi || []);
+        setMovimenti(d.movimenti || null);
+      } else {
+        setMovimenti(null);
+      }
+    } catch (_) { setMovimenti(null); }
     setLoading(false);
   };
 
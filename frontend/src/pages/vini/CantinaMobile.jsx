@@ -1,6 +1,6 @@
 // frontend/src/pages/vini/CantinaMobile.jsx
 // Modulo: vini
-// @version: v1.0 — "Cantina da iPhone" fase 1 «trova la bottiglia» (2026-07-20)
+// @version: v1.1 — refresh su eventi "cantina" (SSE), polling 90s solo come fallback
 //
 // Pagina mobile-first, pensata per l'uso col telefono in mano tra gli
 // scaffali. Fase 1 (V.9): SOLO CONSULTAZIONE, nessuna scrittura.
@@ -23,15 +23,20 @@
 // Le fasi 2 (correggi giacenze +/−) e 3 (conta inventario) si innestano su
 // questa base — la card «Dove si trova» è già predisposta.
 //
+// Aggiornamento: eventi server-push "cantina" (hooks/useEventi) con debounce;
+// il polling ogni 90s resta solo mentre il canale eventi non è connesso.
+//
 // Stile osteria (Cormorant Garamond, palette beige/marrone/terracotta),
 // coerente con CartaStaff/CartaClienti. Prefisso classi: cm-.
 
-import React, { useState, useEffect, useMemo, useCallback } from "react";
+import React, { useState, useEffect, useMemo, useCallback, useRef } from "react";
 import { useNavigate, useParams } from "react-router-dom";
 import { API_BASE, apiFetch } from "../../config/api";
+import useEventi from "../../hooks/useEventi";
 import { t } from "../../utils/localeStrings";
 
-const REFRESH_MS = 90_000;
+const REFRESH_MS = 90_000;       // fallback se il canale eventi è giù
+const DEBOUNCE_EVENTI_MS = 1_500; // raffiche (modifica multipla, arrivo ordine) → 1 fetch
 
 // ─────────────────────────────────────────────────────────────
 // Helpers dati
@@ -304,12 +309,23 @@ function Finder() {
     }
   }, []);
 
+  const debounceRef = useRef(null);
+  const connesso = useEventi(["cantina"], () => {
+    clearTimeout(debounceRef.current);
+    debounceRef.current = setTimeout(fetchVini, DEBOUNCE_EVENTI_MS);
+  });
+  useEffect(() => () => clearTimeout(debounceRef.current), []);
+
   useEffect(() => {
     document.title = t("page.title_cantina_mobile", "Cantina · Tre Gobbi");
     fetchVini();
+  }, [fetchVini]);
+
+  useEffect(() => {
+    if (connesso) return undefined;
     const id = setInterval(fetchVini, REFRESH_MS);
     return () => clearInterval(id);
-  }, [fetchVini]);
+  }, [fetchVini, connesso]);
 
   const openScheda = (id) => navigate(`/vini/cantina-mobile/${id}`);
 
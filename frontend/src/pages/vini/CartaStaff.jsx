@@ -1,6 +1,6 @@
 // frontend/src/pages/vini/CartaStaff.jsx
 // Modulo: vini
-// @version: v2.0 — "banco di servizio" (2026-07-20)
+// @version: v2.2 — refresh in delta-sync (?since=) su eventi "cantina" (SSE)
 //
 // Ripensamento completo della vista sommelier (Marco: "rivediamone il senso,
 // così è inutilizzata"). Da elenco read-only a pagina OPERATIVA con due
@@ -29,12 +29,17 @@
 // bottiglia (/vini/v2/bottiglia/:id), dove c'è il MatricePicker.
 //
 // Stile osteria (Cormorant Garamond, palette beige/marrone/terracotta),
-// coerente con CartaClienti.jsx. Auto-refresh 60s (in pausa mentre il
-// toast-undo è visibile, per non far sparire l'annulla sotto le dita).
+// coerente con CartaClienti.jsx. Aggiornamento su eventi server-push
+// "cantina" (hooks/useEventi), auto-refresh 60s solo se il canale è giù;
+// in entrambi i casi in pausa mentre il toast-undo è visibile, per non far
+// sparire l'annulla sotto le dita. Dopo il primo caricamento completo i
+// refresh chiedono solo i vini cambiati (`?since=`, utils/deltaSync).
 
 import React, { useState, useEffect, useMemo, useCallback, useRef } from "react";
 import { useNavigate } from "react-router-dom";
 import { API_BASE, apiFetch } from "../../config/api";
+import useEventi from "../../hooks/useEventi";
+import { applicaDelta, leggiCursore, ordinaPer } from "../../utils/deltaSync";
 import ViniNav from "./ViniNav";
 import { t } from "../../utils/localeStrings";  // R5: helper stringhe locale-aware
 
@@ -42,7 +47,10 @@ import { t } from "../../utils/localeStrings";  // R5: helper stringhe locale-aw
 // Costanti operative
 // ─────────────────────────────────────────────────────────────
 const UNDO_MS = 10_000;          // finestra annulla vendita
-const REFRESH_MS = 60_000;       // auto-refresh dati
+const REFRESH_MS = 60_000;       // auto-refresh dati (fallback senza eventi)
+const DEBOUNCE_EVENTI_MS = 1_500; // raffiche di eventi "cantina" → 1 fetch
+// stesso ORDER BY di /carta-staff/ (le righe arrivate in delta si riordinano)
+const ORDINE_CARTA = ordinaPer("tipologia", "nazione", "regione", "produttore", "descrizione");
 const SOGLIA_FRIGO = 2;          // "frigo da rifornire" se qta frigo <= soglia
 const SOGLIA_ULTIMA = 1;         // "ultima bottiglia"
 
@@ -289,10 +297,13 @@ export default function CartaStaff() {
   const toastVisible = useRef(false);
   toastVisible.current = !!toast;
 
+  const cursoreRef = useRef(null);   // delta-sync: null = prossimo giro completo
+
   const fetchVini = useCallback(async () => {
     try {
       const r = await apiFetch(`${API_BASE}/vini/magazzino/carta-staff/`);
       if (!r.ok) throw new Error(`Errore ${r.status}`);
+      cursoreRef.current = leggiCursore(r);
       setVini(await r.json());
       setError(null);
     } catch (e) {
@@ -302,17 +313,52 @@ export default function CartaStaff() {
     }
   }, []);
 
+  // Refresh leggero: solo i vini cambiati dall'ultimo cursore.
+  const aggiornaVini = useCallback(async () => {
+    if (cursoreRef.current === null) return fetchVini();
+    try {
+      const r = await apiFetch(`${API_BASE}/vini/magazzino/carta-staff/?since=${cursoreRef.current}`);
+      if (!r.ok) throw new Error(`Errore ${r.status}`);
+      const delta = await r.json();
+      cursoreRef.current = delta.cursor;
+      setVini(prev => applicaDelta(prev, delta, ORDINE_CARTA));
+      setError(null);
+    } catch (e) {
+      setError(e.message);
+    }
+  }, [fetchVini]);
+
+  // Evento "cantina" (anche le nostre vendite): refetch con debounce, e se
+  // il toast-undo è aperto si rimanda finché non si chiude.
+  const debounceRef = useRef(null);
+  const refetchDaEvento = useCallback(() => {
+    clearTimeout(debounceRef.current);
+    debounceRef.current = setTimeout(function tenta() {
+      if (toastVisible.current) debounceRef.current = setTimeout(tenta, DEBOUNCE_EVENTI_MS);
+      else aggiornaVini();
+    }, DEBOUNCE_EVENTI_MS);
+  }, [aggiornaVini]);
+  const connesso = useEventi(["cantina"], (tipo) => {
+    if (tipo === "resync") cursoreRef.current = null;   // giro completo
+    refetchDaEvento();
+  });
+  useEffect(() => () => clearTimeout(debounceRef.current), []);
+
   useEffect(() => {
     // R5: title letto da locali/<locale>/strings.json (key: page.title_carta_staff)
     document.title = t("page.title_carta_staff", "Vista sommelier · Tre Gobbi");
     fetchVini();
+  }, [fetchVini]);
+
+  useEffect(() => {
+    if (connesso) return undefined;
     const tid = setInterval(() => {
       // Non refetchare mentre il toast-undo è visibile: un refresh sotto
       // le dita mentre stai per premere "Annulla" è il peggio in servizio.
-      if (!toastVisible.current) fetchVini();
+      if (!toastVisible.current) aggiornaVini();
     }, REFRESH_MS);
     return () => clearInterval(tid);
-  }, [fetchVini]);
+  }, [aggiornaVini, connesso]);
 
   function showToast(next) {
     clearTimeout(toastTid.current);
@@ -350,7 +396,7 @@ export default function CartaStaff() {
         msg: `−1 bt · ${vino.descrizione || vino.produttore} (da ${loc.nome})`,
         movId: mov ? mov.id : null,
       });
-      await fetchVini();
+      await aggiornaVini();
     } catch (e) {
       showToast({ msg: `Vendita non registrata: ${e.message}`, err: true });
     } finally {
@@ -366,7 +412,7 @@ export default function CartaStaff() {
     try {
       const r = await apiFetch(`${API_BASE}/vini/magazzino/movimenti/${movId}`, { method: "DELETE" });
       if (!r.ok) throw new Error(`Errore ${r.status}`);
-      await fetchVini();
+      await aggiornaVini();
     } catch (e) {
       showToast({ msg: `Annulla non riuscito: ${e.message}`, err: true });
     }
@@ -386,7 +432,7 @@ export default function CartaStaff() {
         try { detail = (await r.json()).detail || detail; } catch { /* noop */ }
         throw new Error(detail);
       }
-      await fetchVini();
+      await aggiornaVini();
     } catch (e) {
       showToast({ msg: `Mescita non aggiornata: ${e.message}`, err: true });
     } finally {
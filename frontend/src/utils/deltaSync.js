@@ -0,0 +1,59 @@
+// @version: v1.0-delta-sync
+// Client del delta-sync (?since=<cursore>) — vedi app/services/delta_sync.py
+//
+// Gli endpoint che lo supportano (carta staff, calici, lista magazzino,
+// planning prenotazioni):
+//   - senza `since` → risposta di sempre + header X-Sync-Cursor
+//   - con `since`   → { cursor, reset, upserts: [...], deletes: [id...] }
+//
+// Uso:
+//   const cur = leggiCursore(res);                       // dopo il caricamento completo
+//   const d = await (await apiFetch(`${url}?since=${cur}`)).json();
+//   setLista(prev => applicaDelta(prev, d, confrontaVini));
+//   cur = d.cursor;
+
+/** Cursore dall'header della risposta completa (null se il backend non lo manda). */
+export function leggiCursore(res) {
+  const v = res.headers.get("X-Sync-Cursor");
+  return v !== null && /^\d+$/.test(v) ? Number(v) : null;
+}
+
+/**
+ * Applica {reset, upserts, deletes} a una lista di righe con `id`.
+ * reset → la lista diventa gli upserts. `confronta` opzionale per
+ * riordinare come il server (le righe nuove altrimenti finiscono in coda).
+ */
+export function applicaDelta(lista, delta, confronta = null) {
+  let out;
+  if (delta.reset) {
+    out = [...delta.upserts];
+  } else {
+    if (!delta.upserts.length && !delta.deletes.length) return lista;
+    const via = new Set(delta.deletes);
+    const nuovi = new Map(delta.upserts.map(r => [r.id, r]));
+    out = [];
+    for (const r of lista || []) {
+      if (via.has(r.id)) continue;
+      if (nuovi.has(r.id)) {
+        out.push(nuovi.get(r.id));
+        nuovi.delete(r.id);
+      } else {
+        out.push(r);
+      }
+    }
+    out.push(...nuovi.values());
+  }
+  return confronta ? out.sort(confronta) : out;
+}
+
+/** Comparatore per più campi, NULL prima (come ORDER BY di SQLite). */
+export function ordinaPer(...campi) {
+  return (a, b) => {
+    for (const c of campi) {
+      const x = a[c] ?? "", y = b[c] ?? "";
+      if (x < y) return -1;
+      if (x > y) return 1;
+    }
+    return 0;
+  };
+}
@@ -1,4 +1,7 @@
 #!/usr/bin/env python3
+import time as _boot_time
+_BOOT_T0 = _boot_time.perf_counter()
+
 from pathlib import Path
 
 # Carica variabili d'ambiente da .env (se presente — ignorato da git)
@@ -8,129 +11,19 @@ try:
 except ImportError:
     pass  # python-dotenv non installato — le env var vengono dal sistema
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
 
 # MODULO MIGRAZIONI
 from app.migrations.migration_runner import run_migrations
 
-# ROUTER ESISTENTI
-from app.routers import auth_router
-from app.routers.users_router import router as users_router
-from app.routers.modules_router import router as modules_router
-from app.routers import menu_router
-from app.routers import vini_router
-from app.routers import vini_settings_router
-from app.routers import vini_magazzino_router
-from app.routers import vini_ordini_router
-from app.routers import vini_cantina_tools_router
-from app.routers import vini_anagrafiche_router  # V.6+V.7+V.8 Fase 2
-from app.routers import vini_v2_router  # V.6+V.7+V.8 — Modulo Gestione Vino 2 (test parallelo)
-from app.routers import foodcost_router
-from app.routers import foodcost_ingredients_router
-from app.routers import foodcost_recipes_router
-from app.routers import foodcost_matching_router
-from app.routers import menu_carta_router
-from app.routers import pranzo_router
-
-# AMMINISTRAZIONE (corrispettivi & analisi) — modulo unico
-from app.routers.admin_finance import router as admin_finance_router
-from app.routers.chiusure_turno import router as chiusure_turno_router
-
-# FATTURAZIONE ELETTRONICA (XML)
-from app.routers import fe_import
-from app.routers import fe_categorie_router
-from app.routers import fe_proforme_router
-
-# DIPENDENTI & TURNI — nuovo modulo
-from app.routers.dipendenti import router as dipendenti_router
-from app.routers.reparti import router as reparti_router
-from app.routers.turni_router import router as turni_router
-from app.routers.intermittenti_router import router as intermittenti_router
-from app.routers.email_router import router as email_router
-
-# BANCA — movimenti bancari
-from app.routers import banca_router
-from app.routers import banca_carta_router  # sub-area Carta di Credito (CC.2)
-
-# CONTROLLO DI GESTIONE — dashboard unificata cross-modulo
-from app.routers import controllo_gestione_router
-from app.routers import cg_utenze_router  # Analisi Utenze (spec_utenze.md)
-
-# STATISTICHE — import iPratico e analytics vendite
-from app.routers import statistiche_router
-
-# BACKUP — download database
-from app.routers import backup_router
-
-# PRICING — calcolo automatico PREZZO_CARTA
-from app.routers import vini_pricing_router
-
-# IPRATICO PRODUCTS — sync prodotti iPratico ↔ vini TRGB
-from app.routers import ipratico_products_router
-
-# CLIENTI CRM
-from app.routers.clienti_router import router as clienti_router
-from app.routers.clienti_giftcard_router import router as clienti_giftcard_router
-
-# PRENOTAZIONI
-from app.routers.prenotazioni_router import router as prenotazioni_router
-
-# PREVENTIVI — modulo 10 (gestione preventivi eventi)
-from app.routers.preventivi_router import router as preventivi_router
-from app.routers.menu_templates_router import (
-    router as menu_templates_router,
-    preventivi_bridge_router as menu_templates_preventivi_bridge_router,
-)
-
-# DASHBOARD HOME — widget aggregatore Home v3
-from app.routers.dashboard_router import router as dashboard_router
-
-# NOTIFICHE & COMUNICAZIONI — mattone M.A infrastruttura trasversale
-from app.routers.notifiche_router import router as notifiche_router
-from app.routers.notifiche_router import com_router as comunicazioni_router
-
-# ALERT ENGINE — mattone M.F controllo soglie/scadenze
-from app.routers.alerts_router import router as alerts_router
-
-# HOME PER RUOLO — config pulsanti rapidi Home per ogni ruolo (sessione 49)
-from app.routers.home_actions_router import router as home_actions_router
-
-# PUBBLICAZIONE WEB — mattone M.J: carica i PDF pubblici sull'FTP del sito
-from app.routers.pubblicazione_router import router as pubblicazione_router
-
-# SCELTA DEL MACELLAIO — tagli carne disponibili alla vendita
-from app.routers.scelta_macellaio_router import router as scelta_macellaio_router
-
-# SCELTA DEI SALUMI — salumi disponibili alla vendita (sessione 50)
-from app.routers.scelta_salumi_router import router as scelta_salumi_router
-
-# SCELTA DEI FORMAGGI — formaggi disponibili alla vendita (sessione 50)
-from app.routers.scelta_formaggi_router import router as scelta_formaggi_router
-
-# SCELTA DEL PESCATO — pesce/crostacei/molluschi (sessione 50, refactor "Selezioni del Giorno")
-from app.routers.scelta_pescato_router import router as scelta_pescato_router
-
-# PIATTI DEL GIORNO — 5a zona di "Selezioni del Giorno" (mig 107)
-from app.routers.piatti_giorno_router import router as piatti_giorno_router
-
-# FATTURE IN CLOUD — integrazione API v2
-from app.routers import fattureincloud_router
-
-# TASK MANAGER — checklist ricorrenti + task singoli (ex-Cucina, rinominato Phase B sessione 46)
-from app.routers.tasks_router import router as tasks_router
-
-# HACCP — reportistica mensile (Modulo I sessione 59 cont., 2026-04-27)
-from app.routers.haccp_router import router as haccp_router
-
-# LISTA SPESA CUCINA — Fase 1 MVP (Modulo J sessione 59 cont. c, 2026-04-27)
-from app.routers.lista_spesa_router import router as lista_spesa_router
-
-# CARTA BEVANDE — sub-modulo del modulo Vini (Aperitivi, Birre, Distillati, Tisane, Tè, Amari)
-from app.routers.bevande_router import router as bevande_router
+# ROUTER — NON importati qui (2026-10-19).
+# Prima main.py importava tutti i ~55 router al boot, anche quelli dei moduli
+# spenti per il locale, e con loro weasyprint/pandas/openpyxl/pdfplumber. Ora
+# ogni router è indicato per path nella sezione ROUTERS più sotto e
+# importato da _mount SOLO se il module_loader lo dà attivo.
 
 # R8b — module loader: feature flags per locale.
 # Legge locali/<TRGB_LOCALE>/moduli_attivi.json + core/moduli/<id>/module.json
@@ -207,7 +100,10 @@ print(f"📦 APP_VERSION: {APP_VERSION}")
 
 
 # Esegui le migrazioni PRIMA di creare l'app
+_BOOT_FASI = {"import_base_ms": int((_boot_time.perf_counter() - _BOOT_T0) * 1000)}
+_t_fase = _boot_time.perf_counter()
 run_migrations()   # ✅ esegue le migrazioni su foodcost.db prima di creare l'app
+_BOOT_FASI["migrazioni_ms"] = int((_boot_time.perf_counter() - _t_fase) * 1000)
 
 # A2-13 (audit 2026-06-12): vini.sqlite3 è l'unico DB non in WAL — legacy in
 # scrittura (import v2 l'ha sostituito) ma ancora LETTO da dashboard e alert
@@ -235,6 +131,12 @@ except Exception as _e_wal:
 # ----------------------------------------
 app = FastAPI(title="TRGB Gestionale Web", version=APP_VERSION)
 
+# Strumentazione latenza/SQL (2026-10-19): hook su sqlite3.connect prima che
+# i router aprano connessioni. Middleware più sotto, dopo gli altri (= esterno).
+# Vedi app/services/perf_monitor.py e /system/perf.
+from app.services import perf_monitor
+perf_monitor.installa()
+
 
 # ──────────────────────────────────────────────────────────────
 # /system/info — diagnostica + identificazione locale (R1)
@@ -449,6 +351,121 @@ def system_backup_health(user=Depends(get_current_user)):
     return out
 
 
+# ──────────────────────────────────────────────────────────────
+# /system/render-cache — diagnostica render cache PDF (2026-10-19)
+# Modulo: platform. Vedi app/services/pdf_render_cache.py e pdf_render_pool.py.
+# GET: dimensione, file per tipo, hit/miss del processo, stato del pool renderer.
+# DELETE: svuota la cache (dopo aver cambiato logo/asset referenziati via file://).
+# ──────────────────────────────────────────────────────────────
+@app.get("/system/render-cache")
+def system_render_cache(user=Depends(get_current_user)):
+    if not is_admin(user["role"]):
+        raise HTTPException(status_code=403, detail="Solo admin")
+    from app.services import pdf_render_cache, pdf_render_pool
+    return {**pdf_render_cache.stato(), "pool": pdf_render_pool.stato()}
+
+
+@app.delete("/system/render-cache")
+def system_render_cache_svuota(user=Depends(get_current_user)):
+    if not is_admin(user["role"]):
+        raise HTTPException(status_code=403, detail="Solo admin")
+    from app.services import pdf_render_cache
+    return {"rimossi": pdf_render_cache.svuota()}
+
+
+# ──────────────────────────────────────────────────────────────
+# /system/perf — latenza per route + tempo SQL (2026-10-19)
+# Modulo: platform. Vedi app/services/perf_monitor.py.
+# GET: route per tempo totale (p50/p95/p99, query e ms SQL per richiesta) e
+#      statement lenti con EXPLAIN QUERY PLAN (piani=false per saltarlo).
+# DELETE: azzera le statistiche. PUT /config: Server-Timing on/off a runtime.
+# ──────────────────────────────────────────────────────────────
+from fastapi import Query as _Query
+
+
+@app.get("/system/perf")
+def system_perf(
+    n: int = _Query(30, ge=1, le=200),
+    piani: bool = _Query(True),
+    user=Depends(get_current_user),
+):
+    if not is_admin(user["role"]):
+        raise HTTPException(status_code=403, detail="Solo admin")
+    return perf_monitor.stato(n=n, piani=piani)
+
+
+@app.delete("/system/perf")
+def system_perf_azzera(user=Depends(get_current_user)):
+    if not is_admin(user["role"]):
+        raise HTTPException(status_code=403, detail="Solo admin")
+    perf_monitor.azzera()
+    return {"ok": True}
+
+
+@app.put("/system/perf/config")
+def system_perf_config(
+    server_timing: bool | None = _Query(None),
+    user=Depends(get_current_user),
+):
+    if not is_admin(user["role"]):
+        raise HTTPException(status_code=403, detail="Solo admin")
+    return perf_monitor.configura(server_timing=server_timing)
+
+
+# ──────────────────────────────────────────────────────────────
+# /system/eventi — diagnostica hub SSE (2026-10-19)
+# Modulo: platform. Vedi app/services/eventi_hub.py: client connessi (utente,
+# tipi, eventi consegnati, coda), eventi pubblicati per tipo, resync.
+# ──────────────────────────────────────────────────────────────
+@app.get("/system/eventi")
+def system_eventi(user=Depends(get_current_user)):
+    if not is_admin(user["role"]):
+        raise HTTPException(status_code=403, detail="Solo admin")
+    from app.services import eventi_hub
+    return eventi_hub.stato()
+
+
+# ──────────────────────────────────────────────────────────────
+# /system/db-manutenzione — manutenzione SQLite (2026-10-19)
+# Modulo: platform. Vedi app/services/db_manutenzione.py.
+# GET: finestre, dimensioni file/WAL attuali, ultimo esito per DB (pagine
+#      libere, checkpoint, durata) e storico giri.
+# POST: giro immediato (completa=true forza ANALYZE), fuori finestra: da
+#       usare a servizio chiuso.
+# ──────────────────────────────────────────────────────────────
+@app.get("/system/db-manutenzione")
+def system_db_manutenzione(user=Depends(get_current_user)):
+    if not is_admin(user["role"]):
+        raise HTTPException(status_code=403, detail="Solo admin")
+    from app.services import db_manutenzione
+    return db_manutenzione.stato()
+
+
+@app.post("/system/db-manutenzione")
+def system_db_manutenzione_esegui(
+    completa: bool = _Query(False),
+    db: str | None = _Query(None),
+    user=Depends(get_current_user),
+):
+    if not is_admin(user["role"]):
+        raise HTTPException(status_code=403, detail="Solo admin")
+    from app.services import db_manutenzione
+    return db_manutenzione.esegui(completa=completa, solo=[db] if db else None)
+
+
+# ──────────────────────────────────────────────────────────────
+# /system/http-cache — ETag/304 e compressione (2026-10-19)
+# Modulo: platform. Vedi app/services/http_cache.py: ETag emessi, 304,
+# risposte senza ETag (trigger mancanti), byte prima/dopo la compressione.
+# ──────────────────────────────────────────────────────────────
+@app.get("/system/http-cache")
+def system_http_cache(user=Depends(get_current_user)):
+    if not is_admin(user["role"]):
+        raise HTTPException(status_code=403, detail="Solo admin")
+    from app.services import http_cache
+    return http_cache.stato()
+
+
 # ──────────────────────────────────────────────────────────────
 # /locale/branding.json — config visivo del locale (R2, sessione 60)
 # Endpoint pubblico read-only consumato dal frontend al boot per applicare
@@ -531,43 +548,59 @@ app.add_middleware(
         "X-Updated-Name",
         "X-Total-Matched",
         "X-Added-Missing",
+        "X-Sync-Cursor",   # delta-sync (?since=), services/delta_sync.py
     ],
 )
 
+# ETag sugli endpoint con http_cache.condizionale + compressione gzip/brotli
+# delle risposte JSON/testo (services/http_cache.py). Le StreamingResponse
+# (SSE, download) passano intatte.
+from app.services import http_cache as _http_cache
+app.add_middleware(_http_cache.HttpCacheMiddleware)
+
 
 # ----------------------------------------
 # MIDDLEWARE READ-ONLY PER RUOLO "viewer"
 # Blocca POST/PUT/PATCH/DELETE per utenti con ruolo viewer.
 # Permette solo GET/HEAD/OPTIONS + il login POST.
+# 2026-10-19: ASGI puro (non più BaseHTTPMiddleware, che avvolgeva ogni
+# risposta in un task + stream e rallentava download backup e PDF). Il token
+# si decodifica una volta per richiesta (auth_service.claims_da_scope, con
+# LRU dei token verificati) e get_current_user riusa gli stessi claims.
 # ----------------------------------------
-class ReadOnlyViewerMiddleware(BaseHTTPMiddleware):
+from app.services.auth_service import claims_da_scope
+
+
+class ReadOnlyViewerMiddleware:
     WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
     # Endpoint permessi anche in scrittura (login)
     ALLOWED_WRITE_PATHS = {"/auth/login"}
 
-    async def dispatch(self, request: Request, call_next):
-        if request.method in self.WRITE_METHODS:
-            # Controlla se è un path sempre permesso
-            if request.url.path not in self.ALLOWED_WRITE_PATHS:
-                # Estrai token dall'header Authorization
-                auth = request.headers.get("authorization", "")
-                if auth.startswith("Bearer "):
-                    token = auth[7:]
-                    try:
-                        from app.core.security import decode_access_token
-                        payload = decode_access_token(token)
-                        if payload.get("role") == "viewer":
-                            return JSONResponse(
-                                status_code=403,
-                                content={"detail": "Accesso in sola lettura — operazione non permessa per l'utente ospite"},
-                            )
-                    except Exception:
-                        pass  # Token invalido — lascia gestire al router
-        return await call_next(request)
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] == "http"
+            and scope["method"] in self.WRITE_METHODS
+            and scope["path"] not in self.ALLOWED_WRITE_PATHS
+        ):
+            claims = claims_da_scope(scope)   # token invalido/assente → None, lo gestisce il router
+            if claims is not None and claims.get("role") == "viewer":
+                response = JSONResponse(
+                    status_code=403,
+                    content={"detail": "Accesso in sola lettura — operazione non permessa per l'utente ospite"},
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
 
 
 app.add_middleware(ReadOnlyViewerMiddleware)
 
+# Perf monitor: aggiunto per ultimo → avvolge tutto (CORS e viewer compresi).
+app.add_middleware(perf_monitor.PerfMiddleware)
+
 
 # ----------------------------------------
 # STATIC FILES (CSS, Fonts, Images)
@@ -602,7 +635,9 @@ app.mount(
 
 # ----------------------------------------
 # ROUTERS — montaggio condizionale via module_loader (R8b)
+#           + import lazy dei router (2026-10-19)
 # ----------------------------------------
+import importlib
 # Ogni include_router è ora wrappato da _mount: il loader controlla se il
 # modulo associato è attivo per il locale corrente (locali/<TRGB_LOCALE>/
 # moduli_attivi.json). Default backward-compat: '*' o file mancante → tutti
@@ -612,40 +647,59 @@ app.mount(
 
 _mount_log_active = []
 _mount_log_skipped = []
+# Profilo del boot: ms spesi a importare ogni router (import di librerie
+# pesanti compreso). TRGB_BOOT_PROFILE=1 lo stampa al boot; sempre
+# consultabile da GET /system/boot-profile (admin). Per il dettaglio per
+# singolo modulo: `python -X importtime -c "import main" 2> importtime.log`.
+_boot_import_ms = {}
+_t_fase = _boot_time.perf_counter()
 
 
-def _mount(router_file: str, router, **kwargs) -> None:
-    """Monta un router solo se il modulo associato è attivo per il locale."""
-    if module_loader.is_router_active(router_file):
-        app.include_router(router, **kwargs)
+def _mount(router_file: str, module_path: str, attr: str = "router", **kwargs) -> None:
+    """
+    Monta un router solo se il modulo associato è attivo per il locale.
+    Il file del router viene importato SOLO in quel caso: i moduli spenti non
+    pagano il costo di import (né quello delle loro dipendenze).
+    """
+    if not module_loader.is_router_active(router_file):
+        if router_file not in _mount_log_skipped:
+            _mount_log_skipped.append(router_file)
+        return
+    t0 = _boot_time.perf_counter()
+    module = importlib.import_module(module_path)
+    _boot_import_ms[router_file] = _boot_import_ms.get(router_file, 0) + int(
+        (_boot_time.perf_counter() - t0) * 1000
+    )
+    app.include_router(getattr(module, attr), **kwargs)
+    if router_file not in _mount_log_active:
         _mount_log_active.append(router_file)
-    else:
-        _mount_log_skipped.append(router_file)
 
 
+_R = "app.routers."
+
 # VINI
-_mount("vini_settings_router", vini_settings_router.router)
-_mount("vini_router", vini_router.router)
-_mount("vini_magazzino_router", vini_magazzino_router.router)
-_mount("vini_ordini_router", vini_ordini_router.router)
-_mount("vini_cantina_tools_router", vini_cantina_tools_router.router)
-_mount("vini_anagrafiche_router", vini_anagrafiche_router.router)  # V.6+V.7+V.8 Fase 2
-_mount("vini_v2_router", vini_v2_router.router)  # V.6+V.7+V.8 — Modulo Gestione Vino 2 (test parallelo)
+_mount("vini_settings_router", _R + "vini_settings_router")
+_mount("vini_router", _R + "vini_router")
+_mount("vini_magazzino_router", _R + "vini_magazzino_router")
+_mount("vini_ordini_router", _R + "vini_ordini_router")
+_mount("vini_cantina_tools_router", _R + "vini_cantina_tools_router")
+_mount("vini_anagrafiche_router", _R + "vini_anagrafiche_router")  # V.6+V.7+V.8 Fase 2
+_mount("vini_v2_router", _R + "vini_v2_router")  # V.6+V.7+V.8 — Modulo Gestione Vino 2 (test parallelo)
 
 # FOODCOST (modulo: ricette)
-_mount("foodcost_router", foodcost_router.router, prefix="/foodcost", tags=["foodcost"])
-_mount("foodcost_ingredients_router", foodcost_ingredients_router.router, prefix="/foodcost", tags=["foodcost-ingredients"])
-_mount("foodcost_recipes_router", foodcost_recipes_router.router, prefix="/foodcost", tags=["foodcost-recipes"])
-_mount("foodcost_matching_router", foodcost_matching_router.router, prefix="/foodcost", tags=["foodcost-matching"])
+_mount("foodcost_router", _R + "foodcost_router", prefix="/foodcost", tags=["foodcost"])
+_mount("foodcost_ingredients_router", _R + "foodcost_ingredients_router", prefix="/foodcost", tags=["foodcost-ingredients"])
+_mount("foodcost_recipes_router", _R + "foodcost_recipes_router", prefix="/foodcost", tags=["foodcost-recipes"])
+_mount("foodcost_matching_router", _R + "foodcost_matching_router", prefix="/foodcost", tags=["foodcost-matching"])
 
 # MENU CARTA (sessione 57, mig 098-100)
-_mount("menu_carta_router", menu_carta_router.router, prefix="/menu-carta", tags=["menu-carta"])
-_mount("menu_carta_router", menu_carta_router.public_router, prefix="/menu-carta", tags=["menu-carta-public"])
+_mount("menu_carta_router", _R + "menu_carta_router", prefix="/menu-carta", tags=["menu-carta"])
+_mount("menu_carta_router", _R + "menu_carta_router", "public_router", prefix="/menu-carta", tags=["menu-carta-public"])
 
 # PRANZO DEL GIORNO (sessione 58, mig 102) — sub-modulo menu_carta
 # Init schema 1 volta al boot (pattern Vini magazzino) per evitare CREATE TABLE
 # concorrenti su prima request (riduce rischio di lock SQLite).
-# NB: l'init avviene anche se il modulo è disattivato — è no-op (CREATE IF NOT EXISTS).
+# NB: l'init avviene solo se il modulo è attivo.
 if module_loader.is_router_active("pranzo_router"):
     try:
         from app.repositories.pranzo_repository import init_pranzo_db
@@ -653,106 +707,169 @@ if module_loader.is_router_active("pranzo_router"):
         print("[init] pranzo_db OK")
     except Exception as _e:
         print(f"[init] pranzo_db WARN: {_e}")
-_mount("pranzo_router", pranzo_router.router)
-_mount("pranzo_router", pranzo_router.public_router)
+_mount("pranzo_router", _R + "pranzo_router")
+_mount("pranzo_router", _R + "pranzo_router", "public_router")
 
 # AMMINISTRAZIONE / CASSA (corrispettivi, chiusure, stats, confronti, calendario)
-_mount("admin_finance", admin_finance_router)
-_mount("chiusure_turno", chiusure_turno_router)
+_mount("admin_finance", _R + "admin_finance")
+_mount("chiusure_turno", _R + "chiusure_turno")
 
 # CONFIGURAZIONE CHIUSURE (giorno settimanale + ferie) — modulo cassa
-from app.routers.closures_config_router import router as closures_config_router
-_mount("closures_config_router", closures_config_router)
+_mount("closures_config_router", _R + "closures_config_router")
 
 # FATTURAZIONE ELETTRONICA (XML) — modulo acquisti
-_mount("fe_import", fe_import.router)
-_mount("fe_categorie_router", fe_categorie_router.router)
-_mount("fe_proforme_router", fe_proforme_router.router)
+_mount("fe_import", _R + "fe_import")
+_mount("fe_categorie_router", _R + "fe_categorie_router")
+_mount("fe_proforme_router", _R + "fe_proforme_router")
 
 # DIPENDENTI & TURNI
-_mount("dipendenti", dipendenti_router)
-_mount("reparti", reparti_router)
-_mount("turni_router", turni_router)
-_mount("intermittenti_router", intermittenti_router)
-_mount("email_router", email_router)
+_mount("dipendenti", _R + "dipendenti")
+_mount("reparti", _R + "reparti")
+_mount("turni_router", _R + "turni_router")
+_mount("intermittenti_router", _R + "intermittenti_router")
+_mount("email_router", _R + "email_router")
 
 # BANCA
-_mount("banca_router", banca_router.router)
-_mount("banca_carta_router", banca_carta_router.router)
+_mount("banca_router", _R + "banca_router")
+_mount("banca_carta_router", _R + "banca_carta_router")  # sub-area Carta di Credito (CC.2)
 
-# CONTROLLO DI GESTIONE
-_mount("controllo_gestione_router", controllo_gestione_router.router)
-_mount("cg_utenze_router", cg_utenze_router.router)  # Analisi Utenze U1+U2
+# CONTROLLO DI GESTIONE — dashboard unificata cross-modulo
+_mount("controllo_gestione_router", _R + "controllo_gestione_router")
+_mount("cg_utenze_router", _R + "cg_utenze_router")  # Analisi Utenze U1+U2
 
-# STATISTICHE
-_mount("statistiche_router", statistiche_router.router)
+# STATISTICHE — import iPratico e analytics vendite
+_mount("statistiche_router", _R + "statistiche_router")
 
 # AUTH E MENU (platform — sempre attivi, eccetto menu che è di menu_carta)
-_mount("auth_router", auth_router.router, prefix="/auth", tags=["auth"])
-_mount("users_router", users_router)
-_mount("modules_router", modules_router)
-_mount("menu_router", menu_router.router, prefix="/menu", tags=["menu"])
+_mount("auth_router", _R + "auth_router", prefix="/auth", tags=["auth"])
+_mount("users_router", _R + "users_router")
+_mount("modules_router", _R + "modules_router")
+_mount("menu_router", _R + "menu_router", prefix="/menu", tags=["menu"])
 
-# BACKUP / VINI / IPRATICO
-_mount("backup_router", backup_router.router)
-_mount("vini_pricing_router", vini_pricing_router.router)
-_mount("ipratico_products_router", ipratico_products_router.router)
+# BACKUP / VINI PRICING / IPRATICO PRODUCTS
+_mount("backup_router", _R + "backup_router")
+_mount("vini_pricing_router", _R + "vini_pricing_router")
+_mount("ipratico_products_router", _R + "ipratico_products_router")
 
 # CLIENTI CRM
-_mount("clienti_router", clienti_router)
-_mount("clienti_giftcard_router", clienti_giftcard_router)
+_mount("clienti_router", _R + "clienti_router")
+_mount("clienti_giftcard_router", _R + "clienti_giftcard_router")
 
 # PRENOTAZIONI
-_mount("prenotazioni_router", prenotazioni_router)
+_mount("prenotazioni_router", _R + "prenotazioni_router")
 
 # PREVENTIVI (modulo prenotazioni — gestione preventivi eventi)
-_mount("preventivi_router", preventivi_router)
-_mount("menu_templates_router", menu_templates_router)
-_mount("menu_templates_router", menu_templates_preventivi_bridge_router)
+_mount("preventivi_router", _R + "preventivi_router")
+_mount("menu_templates_router", _R + "menu_templates_router")
+_mount("menu_templates_router", _R + "menu_templates_router", "preventivi_bridge_router")
 
-# DASHBOARD HOME (platform)
-_mount("dashboard_router", dashboard_router)
+# DASHBOARD HOME — widget aggregatore Home v3 (platform)
+_mount("dashboard_router", _R + "dashboard_router")
 
 # NOTIFICHE & COMUNICAZIONI (mattone M.A — platform)
-_mount("notifiche_router", notifiche_router)
-_mount("notifiche_router", comunicazioni_router)
+_mount("notifiche_router", _R + "notifiche_router")
+_mount("notifiche_router", _R + "notifiche_router", "com_router")
+
+# EVENTI SERVER-PUSH (SSE) — sostituisce il polling di campanella, mappa
+# tavoli, carta staff, cantina mobile e sync FIC (platform, 2026-10-19)
+_mount("eventi_router", _R + "eventi_router")
 
 # ALERT ENGINE (mattone M.F — platform)
-_mount("alerts_router", alerts_router)
+_mount("alerts_router", _R + "alerts_router")
 
-# HOME ACTIONS (platform)
-_mount("home_actions_router", home_actions_router)
+# HOME ACTIONS — pulsanti rapidi Home per ruolo (platform)
+_mount("home_actions_router", _R + "home_actions_router")
 
 # PUBBLICAZIONE WEB (mattone M.J — platform)
-_mount("pubblicazione_router", pubblicazione_router)
+_mount("pubblicazione_router", _R + "pubblicazione_router")
 
 # SELEZIONI DEL GIORNO (modulo ricette)
-_mount("scelta_macellaio_router", scelta_macellaio_router)
-_mount("scelta_salumi_router", scelta_salumi_router)
-_mount("scelta_formaggi_router", scelta_formaggi_router)
-_mount("scelta_pescato_router", scelta_pescato_router)
-_mount("piatti_giorno_router", piatti_giorno_router)
+_mount("scelta_macellaio_router", _R + "scelta_macellaio_router")
+_mount("scelta_salumi_router", _R + "scelta_salumi_router")
+_mount("scelta_formaggi_router", _R + "scelta_formaggi_router")
+_mount("scelta_pescato_router", _R + "scelta_pescato_router")
+_mount("piatti_giorno_router", _R + "piatti_giorno_router")
 
 # FATTURE IN CLOUD (modulo acquisti)
-_mount("fattureincloud_router", fattureincloud_router.router)
+_mount("fattureincloud_router", _R + "fattureincloud_router")
 
 # TASK MANAGER — checklist ricorrenti + task singoli
-_mount("tasks_router", tasks_router)
+_mount("tasks_router", _R + "tasks_router")
 
 # HACCP — reportistica mensile (modulo task_manager)
-_mount("haccp_router", haccp_router)
+_mount("haccp_router", _R + "haccp_router")
 
 # LISTA SPESA CUCINA — Fase 1 MVP (modulo cucina)
-_mount("lista_spesa_router", lista_spesa_router)
+_mount("lista_spesa_router", _R + "lista_spesa_router")
 
 # CARTA BEVANDE — sub-modulo Vini
-_mount("bevande_router", bevande_router)
+_mount("bevande_router", _R + "bevande_router")
+
+_BOOT_FASI["router_ms"] = int((_boot_time.perf_counter() - _t_fase) * 1000)
 
 
 # Banner finale del module loader
 print(f"🧩 {module_loader.boot_banner()}")
 if _mount_log_skipped:
-    print(f"   ↳ skipped: {','.join(_mount_log_skipped)}")
+    print(f"   ↳ skipped (non importati): {','.join(_mount_log_skipped)}")
+
+_BOOT_FASI["totale_ms"] = int((_boot_time.perf_counter() - _BOOT_T0) * 1000)
+print(
+    f"⏱️  boot {_BOOT_FASI['totale_ms']} ms "
+    f"(import base {_BOOT_FASI['import_base_ms']}, migrazioni {_BOOT_FASI['migrazioni_ms']}, "
+    f"router {_BOOT_FASI['router_ms']})"
+)
+if (os.environ.get("TRGB_BOOT_PROFILE") or "").strip() in ("1", "true", "yes"):
+    for _rf, _ms in sorted(_boot_import_ms.items(), key=lambda kv: -kv[1])[:15]:
+        print(f"   ↳ {_ms:5d} ms  {_rf}")
+
+
+# ──────────────────────────────────────────────────────────────
+# /system/boot-profile — dove va il tempo di avvio (2026-10-19)
+# Modulo: platform. Fasi del boot + ms di import per router montato (i
+# router dei moduli spenti non compaiono: non vengono importati).
+# ──────────────────────────────────────────────────────────────
+@app.get("/system/boot-profile")
+def system_boot_profile(user=Depends(get_current_user)):
+    if not is_admin(user["role"]):
+        raise HTTPException(status_code=403, detail="Solo admin")
+    return {
+        "fasi": _BOOT_FASI,
+        "router_import_ms": dict(sorted(_boot_import_ms.items(), key=lambda kv: -kv[1])),
+        "montati": _mount_log_active,
+        "saltati": _mount_log_skipped,
+    }
+
+
+# ----------------------------------------
+# POOL RENDERER PDF — processi WeasyPrint pre-scaldati (2026-10-19)
+# I PDF si generano fuori dal processo uvicorn: una stampa pesante non
+# blocca piu' le altre richieste. Avvio nello startup, non all'import:
+# tool e TestClient che importano main non lanciano renderer. Se il pool
+# non si crea (o e' rotto quando arriva un job) render_pdf ripiega
+# in-process. Vedi pdf_render_pool.py.
+# ----------------------------------------
+from app.services import pdf_render_pool as _pdf_pool
+
+
+@app.on_event("startup")
+def _avvia_pool_pdf():
+    _pdf_pool.avvia_pool()
+
+
+# ----------------------------------------
+# MANUTENZIONE SQLITE — ANALYZE/optimize, checkpoint WAL, vacuum incrementale
+# (2026-10-19). Thread daemon che lavora solo nelle finestre fuori servizio
+# (TRGB_DB_MANUTENZIONE_FINESTRE). Avvio nello startup, come il pool PDF:
+# un tool che importa main non deve fare manutenzione sui DB.
+# Vedi app/services/db_manutenzione.py.
+# ----------------------------------------
+from app.services import db_manutenzione as _db_manutenzione
+
+
+@app.on_event("startup")
+def _avvia_db_manutenzione():
+    _db_manutenzione.avvia()
 
 
 # ----------------------------------------
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# @version: v1.0 — harness benchmark endpoint (sessione 2026-10-19)
+"""
+Benchmark in-process degli endpoint pesanti su un locale (di solito quello
+generato da tools/genera_locale_sintetico.py), con confronto su una baseline.
+
+PERCHÉ ESISTE
+  Le ottimizzazioni (cubi, ledger, cache PDF...) si verificano a mano una
+  volta e poi nessuno se ne accorge se una modifica successiva le rompe.
+  Questo script rifà sempre lo stesso giro e dice se latenza o numero di
+  query sono peggiorati rispetto all'ultima baseline salvata.
+
+COME FUNZIONA
+  - Importa main.app con TRGB_LOCALE=<locale> e la chiama con TestClient
+    (niente uvicorn, niente rete): misura l'app, non il trasporto.
+  - Token firmato qui per il primo superadmin/admin di users.json.
+  - perf_monitor con Server-Timing acceso: per ogni risposta si leggono
+    tempo SQL e numero di query (`sql;dur=…;desc="N query"`).
+  - Ogni endpoint: 1 chiamata a freddo (misurata a parte: cache PDF,
+    cache token, pagine SQLite) + N ripetizioni → p50/p95.
+  - Confronto con la baseline (JSON): regressione se p50 > base × (1 +
+    tolleranza) + margine, o se le query per richiesta aumentano.
+    Exit code 1 se c'è almeno una regressione.
+  I render PDF si saltano se WeasyPrint non è utilizzabile (librerie di
+  sistema mancanti).
+
+Uso (dalla root del repo):
+    python tools/bench_endpoints.py --locale bench --salva-baseline
+    python tools/bench_endpoints.py --locale bench                 # confronta
+    python tools/bench_endpoints.py --locale bench --ripetizioni 20 --solo cross ricette
+    python tools/bench_endpoints.py --json risultati.json
+
+Baseline di default: locali/<locale>/bench_baseline.json (dipende dalla
+macchina: confrontare solo misure prese sullo stesso host).
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+_RE_SQL = re.compile(r'sql;dur=([\d.]+);desc="(\d+) query"')
+
+
+def _endpoint(anno: int, ricetta_id):
+    """(nome, url, pdf) — il giro standard."""
+    out = [
+        ("dashboard_home", "/dashboard/home", False),
+        ("ce_anno", f"/controllo-gestione/conto-economico?anno={anno}&periodo=anno", False),
+        ("banca_cross_ref", "/banca/cross-ref", False),
+        ("ricette_lista", "/foodcost/ricette", False),
+        ("cantina_dashboard", "/vini/magazzino/dashboard", False),
+        ("clienti_lista", "/clienti/?limit=100", False),
+        ("clienti_segmenti", "/clienti/segmenti/conteggi", False),
+        ("ce_anno_pdf", f"/controllo-gestione/conto-economico/pdf?anno={anno}&periodo=anno", True),
+        ("carta_vini_pdf", "/vini/carta/pdf", True),
+    ]
+    if ricetta_id is not None:
+        out.append(("ricetta_pdf", f"/foodcost/ricette/{ricetta_id}/pdf", True))
+    return out
+
+
+def _pdf_disponibile() -> bool:
+    try:
+        from weasyprint import HTML  # noqa: F401
+        return True
+    except Exception:  # ImportError o OSError (pango/cairo mancanti)
+        return False
+
+
+def _token() -> str:
+    from app.core import security
+    from app.services.auth_service import USERS
+
+    for ruolo in ("superadmin", "admin"):
+        for username, u in USERS.items():
+            if u["role"] == ruolo:
+                return security.create_access_token({"sub": username, "role": ruolo})
+    raise SystemExit("nessun utente admin in users.json del locale")
+
+
+def _ricetta_campione():
+    from app.utils.locale_data import locale_data_path
+
+    conn = sqlite3.connect(locale_data_path("foodcost.db"))
+    try:
+        row = conn.execute(
+            "SELECT r.id FROM recipes r JOIN recipe_items i ON i.recipe_id = r.id "
+            "WHERE COALESCE(r.is_base, 0) = 0 GROUP BY r.id ORDER BY COUNT(*) DESC, r.id LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+
+
+def _chiama(client, url: str, headers: dict) -> dict:
+    t = time.perf_counter()
+    r = client.get(url, headers=headers)
+    ms = (time.perf_counter() - t) * 1000
+    m = _RE_SQL.search(r.headers.get("server-timing", ""))
+    return {
+        "status": r.status_code,
+        "ms": ms,
+        "sql_ms": float(m.group(1)) if m else None,
+        "query": int(m.group(2)) if m else None,
+        "byte": len(r.content),
+    }
+
+
+def _percentile(valori, p: float) -> float:
+    ordinati = sorted(valori)
+    k = max(0, min(len(ordinati) - 1, round(p / 100 * (len(ordinati) - 1))))
+    return ordinati[k]
+
+
+def misura(client, headers: dict, endpoint, ripetizioni: int) -> dict:
+    risultati = {}
+    for nome, url, _ in endpoint:
+        freddo = _chiama(client, url, headers)
+        caldi = [_chiama(client, url, headers) for _ in range(ripetizioni)]
+        tempi = [c["ms"] for c in caldi]
+        query = [c["query"] for c in caldi if c["query"] is not None]
+        sql = [c["sql_ms"] for c in caldi if c["sql_ms"] is not None]
+        risultati[nome] = {
+            "url": url,
+            "status": caldi[-1]["status"],
+            "freddo_ms": round(freddo["ms"], 1),
+            "p50_ms": round(statistics.median(tempi), 1),
+            "p95_ms": round(_percentile(tempi, 95), 1),
+            "sql_ms": round(statistics.median(sql), 1) if sql else None,
+            "query": int(statistics.median(query)) if query else None,
+            "byte": caldi[-1]["byte"],
+        }
+    return risultati
+
+
+def confronta(attuali: dict, baseline: dict, tolleranza: float, margine_ms: float):
+    """Righe (nome, esito, dettaglio); esito in {'ok', 'REGRESSIONE', 'meglio', 'nuovo'}."""
+    righe = []
+    for nome, a in attuali.items():
+        b = baseline.get(nome)
+        if b is None:
+            righe.append((nome, "nuovo", ""))
+            continue
+        problemi = []
+        soglia = b["p50_ms"] * (1 + tolleranza) + margine_ms
+        if a["p50_ms"] > soglia:
+            problemi.append(f"p50 {b['p50_ms']} → {a['p50_ms']} ms (soglia {soglia:.1f})")
+        if a["query"] is not None and b.get("query") is not None and a["query"] > b["query"]:
+            problemi.append(f"query {b['query']} → {a['query']}")
+        if a["status"] != b.get("status"):
+            problemi.append(f"status {b.get('status')} → {a['status']}")
+        if problemi:
+            righe.append((nome, "REGRESSIONE", "; ".join(problemi)))
+        elif a["p50_ms"] < b["p50_ms"] * (1 - tolleranza):
+            righe.append((nome, "meglio", f"p50 {b['p50_ms']} → {a['p50_ms']} ms"))
+        else:
+            righe.append((nome, "ok", ""))
+    return righe
+
+
+def _stampa(risultati: dict) -> None:
+    print(f"{'endpoint':<20} {'st':>3} {'freddo':>8} {'p50':>8} {'p95':>8} {'sql':>7} {'query':>6} {'KB':>7}")
+    for nome, r in risultati.items():
+        sql = f"{r['sql_ms']:.1f}" if r["sql_ms"] is not None else "-"
+        q = r["query"] if r["query"] is not None else "-"
+        print(f"{nome:<20} {r['status']:>3} {r['freddo_ms']:>8.1f} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {sql:>7} {q:>6} {r['byte'] / 1024:>7.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--locale", default="bench")
+    ap.add_argument("--ripetizioni", type=int, default=10)
+    ap.add_argument("--anno", type=int, default=None, help="anno del CE (default: anno scorso)")
+    ap.add_argument("--solo", nargs="*", help="solo gli endpoint il cui nome contiene una di queste parole")
+    ap.add_argument("--baseline", default=None, help="default locali/<locale>/bench_baseline.json")
+    ap.add_argument("--salva-baseline", action="store_true", help="scrive le misure come nuova baseline")
+    ap.add_argument("--tolleranza", type=float, default=0.25, help="peggioramento p50 tollerato (0.25 = +25%%)")
+    ap.add_argument("--margine-ms", type=float, default=5.0, help="margine assoluto sul p50 (rumore)")
+    ap.add_argument("--json", default=None, help="scrive anche le misure grezze in questo file")
+    args = ap.parse_args()
+
+    if not (ROOT / "locali" / args.locale / "data").is_dir():
+        raise SystemExit(f"locali/{args.locale}/data non esiste: generalo con tools/genera_locale_sintetico.py")
+    os.environ["TRGB_LOCALE"] = args.locale
+    baseline_path = Path(args.baseline) if args.baseline else ROOT / "locali" / args.locale / "bench_baseline.json"
+
+    from fastapi.testclient import TestClient
+
+    from app.services import perf_monitor
+    import main as app_main
+
+    perf_monitor.configura(server_timing=True)
+    headers = {"Authorization": f"Bearer {_token()}"}
+
+    anno = args.anno or date.today().year - 1
+    endpoint = _endpoint(anno, _ricetta_campione())
+    if not _pdf_disponibile():
+        print("WeasyPrint non utilizzabile: salto i render PDF")
+        endpoint = [e for e in endpoint if not e[2]]
+    if args.solo:
+        endpoint = [e for e in endpoint if any(s in e[0] for s in args.solo)]
+
+    with TestClient(app_main.app) as client:
+        risultati = misura(client, headers, endpoint, args.ripetizioni)
+    _stampa(risultati)
+
+    meta = {"locale": args.locale, "data": date.today().isoformat(),
+            "ripetizioni": args.ripetizioni, "anno_ce": anno, "host": os.uname().nodename}
+    if args.json:
+        Path(args.json).write_text(json.dumps({"meta": meta, "endpoint": risultati}, indent=2) + "\n",
+                                   encoding="utf-8")
+
+    if args.salva_baseline:
+        precedente = {}
+        if baseline_path.exists():
+            precedente = json.loads(baseline_path.read_text(encoding="utf-8")).get("endpoint", {})
+        precedente.update(risultati)  # con --solo si aggiornano solo quelli misurati
+        baseline_path.write_text(json.dumps({"meta": meta, "endpoint": precedente}, indent=2) + "\n",
+                                 encoding="utf-8")
+        print(f"\nBaseline salvata in {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print(f"\nNessuna baseline in {baseline_path}: rilancia con --salva-baseline")
+        return
+    base = json.loads(baseline_path.read_text(encoding="utf-8"))
+    print(f"\nConfronto con baseline del {base['meta'].get('data')} "
+          f"(tolleranza +{args.tolleranza:.0%}, margine {args.margine_ms} ms)")
+    righe = confronta(risultati, base["endpoint"], args.tolleranza, args.margine_ms)
+    for nome, esito, dettaglio in righe:
+        print(f"  {nome:<20} {esito:<12} {dettaglio}")
+    if any(esito == "REGRESSIONE" for _, esito, _ in righe):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
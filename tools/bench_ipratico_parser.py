@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark parser export iPratico: pandas.read_html (vecchio) vs
+html.parser (app/services/ipratico_parser.py, v2).
+
+Uso (dalla root del repo):
+    python tools/bench_ipratico_parser.py export_2025_01.xls export_2025_02.xls ...
+    python tools/bench_ipratico_parser.py                # export sintetico
+    python tools/bench_ipratico_parser.py --prodotti 3000 --ripetizioni 20
+
+Per ogni file: tempo medio dei due parser e verifica che producano le stesse
+categorie/prodotti. Il ramo pandas serve solo come riferimento: se pandas
+(o lxml) non è installato viene saltato.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.ipratico_parser import parse_ipratico_bytes  # noqa: E402
+
+
+def _parse_pandas(path):
+    """Il parser pre-v2, tale e quale (riferimento)."""
+    import pandas as pd
+
+    def _safe_int(val, default=0):
+        n = pd.to_numeric(val, errors="coerce")
+        if pd.isna(n):
+            return default
+        return int(n)
+
+    tables = pd.read_html(path, encoding="utf-8")
+    t0 = tables[0]
+    t0.columns = t0.iloc[0]
+    t0 = t0.iloc[1:].reset_index(drop=True)
+    col_map_0 = {}
+    for c in t0.columns:
+        cl = str(c).lower().strip()
+        if "categ" in cl:
+            col_map_0[c] = "categoria"
+        elif "quant" in cl:
+            col_map_0[c] = "quantita"
+        elif "total" in cl:
+            col_map_0[c] = "totale"
+    t0 = t0.rename(columns=col_map_0)
+    categorie = []
+    for _, r in t0.iterrows():
+        cat = str(r.get("categoria", "")).strip()
+        if not cat:
+            continue
+        categorie.append({
+            "categoria": cat,
+            "quantita": _safe_int(r.get("quantita", 0)),
+            "totale_cent": _safe_int(r.get("totale", 0)),
+        })
+    t1 = tables[1]
+    t1.columns = t1.iloc[0]
+    t1 = t1.iloc[1:].reset_index(drop=True)
+    col_map_1 = {}
+    for c in t1.columns:
+        cl = str(c).lower().strip()
+        for k, v in (("categ", "categoria"), ("prodot", "prodotto"), ("quant", "quantita"),
+                     ("total", "totale"), ("plu", "plu"), ("barco", "barcode")):
+            if k in cl:
+                col_map_1[c] = v
+                break
+    t1 = t1.rename(columns=col_map_1)
+    prodotti_map = {}
+    for _, r in t1.iterrows():
+        cat = str(r.get("categoria", "")).strip()
+        prod = str(r.get("prodotto", "")).strip()
+        if not cat or not prod:
+            continue
+        key = (cat, prod)
+        if key in prodotti_map:
+            prodotti_map[key]["quantita"] += _safe_int(r.get("quantita", 0))
+            prodotti_map[key]["totale_cent"] += _safe_int(r.get("totale", 0))
+        else:
+            prodotti_map[key] = {
+                "categoria": cat,
+                "prodotto": prod,
+                "quantita": _safe_int(r.get("quantita", 0)),
+                "totale_cent": _safe_int(r.get("totale", 0)),
+                "plu": str(r.get("plu", "")).strip() if pd.notna(r.get("plu")) else None,
+                "barcode": str(r.get("barcode", "")).strip() if pd.notna(r.get("barcode")) else None,
+            }
+    return categorie, list(prodotti_map.values())
+
+
+def _export_sintetico(n_prodotti: int) -> str:
+    """
+    HTML con la stessa forma di un export iPratico (header in prima riga, td),
+    con quantità, totali e PLU anche nel formato "1,500".
+    """
+    rnd = random.Random(42)
+    cats = ["ANTIPASTI", "PRIMI", "SECONDI", "DOLCI", "VINI ROSSI", "VINI BIANCHI", "BIRRE", "CAFFETTERIA"]
+    righe_p = ["<tr><td>Categoria</td><td>Prodotto</td><td>Quantità</td><td>Totale</td><td>PLU</td><td>Barcode</td></tr>"]
+    per_cat = {c: [0, 0] for c in cats}
+    for i in range(n_prodotti):
+        c = rnd.choice(cats)
+        q = rnd.randint(1, 300)
+        t = q * rnd.randint(150, 4500)
+        per_cat[c][0] += q
+        per_cat[c][1] += t
+        plu = f"{rnd.randint(100, 9999):,}" if rnd.random() < 0.7 else ""
+        # una riga su tre col separatore delle migliaia, come negli export veri
+        fmt = "{:,}" if i % 3 == 0 else "{}"
+        righe_p.append(
+            f"<tr><td>{c}</td><td>Prodotto &amp; {i % (n_prodotti - 5 or 1)}</td><td>{fmt.format(q)}</td>"
+            f"<td>{fmt.format(t)}</td><td>{plu}</td><td></td></tr>"
+        )
+    righe_c = ["<tr><td>Categoria</td><td>Quantità</td><td>Totale</td></tr>"] + [
+        f"<tr><td>{c}</td><td>{v[0]:,}</td><td>{v[1]:,}</td></tr>" for c, v in per_cat.items()
+    ]
+    return (
+        "<html><head><meta charset='utf-8'></head><body>"
+        "<table>" + "".join(righe_c) + "</table><br/>"
+        "<table>" + "".join(righe_p) + "</table></body></html>"
+    )
+
+
+def _cronometra(fn, ripetizioni: int) -> float:
+    t = time.perf_counter()
+    for _ in range(ripetizioni):
+        fn()
+    return (time.perf_counter() - t) / ripetizioni * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("files", nargs="*", help="export iPratico (.xls HTML)")
+    ap.add_argument("--prodotti", type=int, default=1500, help="righe prodotto dell'export sintetico")
+    ap.add_argument("--ripetizioni", type=int, default=10)
+    args = ap.parse_args()
+
+    files = list(args.files)
+    tmp = None
+    if not files:
+        import tempfile
+        tmp = tempfile.NamedTemporaryFile("w", suffix=".xls", delete=False, encoding="utf-8")
+        tmp.write(_export_sintetico(args.prodotti))
+        tmp.close()
+        files = [tmp.name]
+        print(f"Export sintetico: {args.prodotti} righe prodotto")
+
+    try:
+        import pandas  # noqa: F401
+        import lxml  # noqa: F401
+        con_pandas = True
+    except ImportError:
+        con_pandas = False
+        print("pandas/lxml non installati: misuro solo il parser v2")
+
+    try:
+        for path in files:
+            with open(path, "rb") as f:
+                content = f.read()
+            nuovo = parse_ipratico_bytes(content)
+            t_new = _cronometra(lambda: parse_ipratico_bytes(content), args.ripetizioni)
+            riga = f"{os.path.basename(path)}: {len(nuovo[0])} categorie, {len(nuovo[1])} prodotti | v2 {t_new:.1f} ms"
+            if con_pandas:
+                vecchio = _parse_pandas(path)
+                t_old = _cronometra(lambda: _parse_pandas(path), args.ripetizioni)
+                uguali = vecchio == nuovo
+                riga += f" | pandas {t_old:.1f} ms | x{t_old / t_new:.1f} | risultati {'identici' if uguali else 'DIVERSI'}"
+            print(riga)
+    finally:
+        if tmp is not None:
+            os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    main()
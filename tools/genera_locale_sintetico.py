@@ -0,0 +1,588 @@
+#!/usr/bin/env python3
+# @version: v1.1 — locale sintetico per benchmark, 086/087 saltate sul locale nuovo (sessione 2026-10-19)
+"""
+Genera un locale sintetico "grande" sotto locali/<id>/ per misurare le
+prestazioni dell'app su volumi realistici (vedi tools/bench_endpoints.py).
+
+PERCHÉ ESISTE
+  I DB di tregobbi non si copiano fuori dalla VPS (dati veri di clienti e
+  fornitori) e un locale nuovo è vuoto: le query lente su anni di fatture,
+  decine di migliaia di clienti o migliaia di vini non si vedono finché non
+  arrivano in produzione. Qui si costruisce un locale con la stessa forma
+  dei dati veri, riproducibile dal seed.
+
+COME FUNZIONA
+  1. Crea locali/<id>/ (locale.json, moduli_attivi.json con '*').
+  2. Porta su gli schemi come al primo boot: migrazioni + init dei moduli.
+     Su un locale vergine alcune migrazioni storiche presuppongono tabelle
+     create dai router al boot: in quel caso si creano e si riprova.
+  3. Riempie i DB con executemany, a scala (default 1.0):
+       foodcost.db          fornitori, anni di fe_fatture/fe_righe, cg_uscite,
+                            movimenti banca (in parte riconciliati), iPratico
+                            mensile, ingredienti/prezzi, ricette con sotto-ricette
+       admin_finance.sqlite3  chiusure turno pranzo/cena
+       clienti.sqlite3      clienti + prenotazioni TheFork/interne
+       vini_magazzino.sqlite3 produttori, bottiglie, movimenti
+  4. Ricostruisce i dati derivati (cubo iPratico) e fa ANALYZE.
+  Gli utenti sono quelli di emergenza (users.json creato al primo import
+  di auth_service): il benchmark firma il token da sé.
+
+Uso (dalla root del repo):
+    python tools/genera_locale_sintetico.py                    # locali/bench, scala 1
+    python tools/genera_locale_sintetico.py --scala 0.1 --locale bench_small
+    python tools/genera_locale_sintetico.py --anni 5 --seed 7 --sovrascrivi
+
+Il locale è marcato "sintetico" in locale.json: --sovrascrivi rifiuta di
+toccare una cartella che non lo sia (mai i dati di un locale vero).
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Volumi a scala 1.0 (ordini di grandezza di un'osteria con qualche anno di storico)
+VOLUMI = {
+    "fornitori": 150,
+    "fatture_anno": 3000,
+    "movimenti_banca_anno": 4000,
+    "clienti": 25000,
+    "prenotazioni": 80000,
+    "produttori_vino": 400,
+    "vini": 3000,
+    "movimenti_vino": 60000,
+    "ingredienti": 900,
+    "ricette": 400,
+    "prodotti_ipratico": 220,
+}
+
+NOMI = ["Marco", "Giulia", "Luca", "Francesca", "Andrea", "Sara", "Paolo", "Chiara", "Matteo",
+        "Elena", "Davide", "Laura", "Simone", "Valentina", "Stefano", "Anna", "Hans", "Claire"]
+COGNOMI = ["Rossi", "Bianchi", "Ferrari", "Colombo", "Ricci", "Marino", "Greco", "Bruno", "Gallo",
+           "Conti", "Costa", "Giordano", "Mancini", "Rizzo", "Lombardi", "Moretti", "Barbieri",
+           "Fontana", "Santoro", "Mariani", "Rinaldi", "Caruso", "Ferrara", "Galli", "Martini"]
+RAGIONI = ["Carni", "Ortofrutta", "Vini", "Pesce", "Latticini", "Forniture", "Distribuzione",
+           "Caffè", "Energia", "Pulizie", "Birre", "Pasta Fresca", "Salumi", "Servizi"]
+FORME = ["S.r.l.", "S.p.A.", "S.n.c.", "S.a.s.", "di Rossi & C."]
+ARTICOLI = ["Filetto di manzo", "Guanciale", "Parmigiano 24 mesi", "Farina 00", "Uova bio",
+            "Olio EVO", "Pomodori San Marzano", "Burro", "Panna fresca", "Branzino", "Vongole",
+            "Radicchio", "Funghi porcini", "Tartufo nero", "Prosecco DOC", "Acqua minerale",
+            "Caffè in grani", "Detersivo piatti", "Tovaglioli", "Gas metano", "Energia elettrica"]
+TIPOLOGIE = ["BOLLICINE", "BIANCHI", "ROSSI", "ROSATI", "GRANDI FORMATI",
+             "PASSITI E VINI DA MEDITAZIONE"]
+REGIONI = ["Lombardia", "Piemonte", "Toscana", "Veneto", "Friuli", "Trentino", "Sicilia",
+           "Campania", "Marche", "Alto Adige", "Champagne", "Borgogna"]
+CATEGORIE_IPRATICO = ["ANTIPASTI", "PRIMI", "SECONDI", "DOLCI", "VINI ROSSI", "VINI BIANCHI",
+                      "BOLLICINE", "BIRRE", "CAFFETTERIA", "BEVANDE"]
+STATI_PREN = ["SEATED"] * 12 + ["LEFT"] * 4 + ["CANCELED"] * 3 + ["NO_SHOW", "RECORDED", "BILL"]
+
+
+def _log(msg: str) -> None:
+    print(f"[genera] {msg}", flush=True)
+
+
+def _scala(n: int, fattore: float) -> int:
+    return max(1, int(n * fattore))
+
+
+def _inserisci(conn: sqlite3.Connection, tabella: str, colonne, righe) -> int:
+    """executemany su un sottoinsieme di colonne; ritorna le righe scritte."""
+    righe = list(righe)
+    if righe:
+        segnaposto = ", ".join("?" * len(colonne))
+        conn.executemany(
+            f"INSERT INTO {tabella} ({', '.join(colonne)}) VALUES ({segnaposto})", righe
+        )
+    return len(righe)
+
+
+def _max_id(conn: sqlite3.Connection, tabella: str) -> int:
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabella}").fetchone()[0]
+
+
+# ---------------------------------------------------------------------------
+# 1-2. Cartella del locale e schemi
+# ---------------------------------------------------------------------------
+def prepara_cartella(locale_id: str, sovrascrivi: bool) -> Path:
+    base = ROOT / "locali" / locale_id
+    meta = base / "locale.json"
+    if base.exists():
+        sintetico = meta.exists() and json.loads(meta.read_text(encoding="utf-8")).get("sintetico")
+        if not sintetico:
+            raise SystemExit(f"locali/{locale_id} esiste e non è un locale sintetico: non lo tocco")
+        if not sovrascrivi:
+            raise SystemExit(f"locali/{locale_id} esiste già: usa --sovrascrivi per rigenerarlo")
+        shutil.rmtree(base)
+    (base / "data").mkdir(parents=True)
+    meta.write_text(json.dumps({
+        "id": locale_id,
+        "nome": f"Locale sintetico {locale_id}",
+        "descrizione": "Dati generati da tools/genera_locale_sintetico.py per i benchmark.",
+        "lingua": "it-IT",
+        "timezone": "Europe/Rome",
+        "valuta": "EUR",
+        "creato_il": date.today().isoformat(),
+        "moduli_attivi_default": "*",
+        "sintetico": True,
+    }, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    (base / "moduli_attivi.json").write_text(
+        json.dumps({"locale_id": locale_id, "moduli": ["*"]}, indent=2) + "\n", encoding="utf-8"
+    )
+    return base
+
+
+# Init dei moduli che al boot creano i propri DB/tabelle (stesso ordine di main.py).
+_INIT_MODULI = [
+    ("app.models.dipendenti_db", "init_dipendenti_db"),
+    ("app.models.clienti_db", "init_clienti_db"),
+    ("app.models.tasks_db", "init_tasks_db"),
+    ("app.models.notifiche_db", "init_notifiche_db"),
+    ("app.models.bevande_db", "init_bevande_db"),
+    ("app.models.vini_magazzino_db", "init_magazzino_database"),
+    ("app.models.settings_db", "init_settings_db"),
+]
+
+
+def _init_moduli() -> None:
+    from app.routers import fe_import
+    from app.utils.locale_data import locale_data_path
+
+    conn = sqlite3.connect(locale_data_path("foodcost.db"))
+    try:
+        fe_import._ensure_tables(conn)
+    finally:
+        conn.close()
+    for modulo, funzione in _INIT_MODULI:
+        getattr(importlib.import_module(modulo), funzione)()
+
+
+# Rinomina cucina.sqlite3 → tasks.sqlite3 e self-heal di installazioni nate
+# prima del modulo Tasks. Su un locale nuovo tasks.sqlite3 lo crea già
+# init_tasks_db, e i rami che spostano i file usano un DATA_DIR mai definito
+# (migrazioni storiche, non si toccano): il runner le salta, e a schemi pronti
+# girano a mano senza cucina.sqlite3, cioè solo rinomine e colonne su tasks.
+_MIGRAZIONI_SOLO_STORICHE = ("086_rename_cucina_to_tasks.py", "087_tasks_db_self_heal.py")
+
+
+def _segna_migrazioni_storiche() -> None:
+    from app.migrations.migration_runner import get_applied_migrations
+    from app.utils.locale_data import locale_data_path
+
+    conn = sqlite3.connect(locale_data_path("foodcost.db"))
+    try:
+        get_applied_migrations(conn)
+        conn.executemany(
+            "INSERT OR IGNORE INTO schema_migrations (name) VALUES (?)",
+            [(m,) for m in _MIGRAZIONI_SOLO_STORICHE],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def prepara_schemi() -> None:
+    """Migrazioni come al primo boot; se una storica non trova le sue tabelle, le crea e riprova."""
+    from app.migrations.migration_runner import run_migrations
+    from app.routers import admin_finance, chiusure_turno
+    from app.utils.locale_data import locale_data_path
+
+    _segna_migrazioni_storiche()
+    for _ in range(10):
+        try:
+            run_migrations()
+            break
+        except sqlite3.OperationalError as e:
+            _log(f"migrazioni: {e} → init moduli e nuovo tentativo")
+            _init_moduli()
+    else:
+        raise SystemExit("migrazioni non convergenti sul locale vergine")
+    _init_moduli()
+    # Scritto dalla 084: sul locale nuovo il DB vero è tasks.sqlite3
+    locale_data_path("cucina.sqlite3").unlink(missing_ok=True)
+    conn = sqlite3.connect(locale_data_path("foodcost.db"))
+    try:
+        for nome in _MIGRAZIONI_SOLO_STORICHE:
+            importlib.import_module(f"app.migrations.{nome[:-3]}").upgrade(conn)
+    finally:
+        conn.close()
+
+    conn = sqlite3.connect(chiusure_turno.DB_PATH)
+    try:
+        chiusure_turno.ensure_shift_closures_tables(conn)
+        admin_finance.ensure_daily_closures_table(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------------------------
+# 3. Dati
+# ---------------------------------------------------------------------------
+def _fornitori(rnd: random.Random, n: int):
+    out = []
+    for i in range(n):
+        nome = f"{rnd.choice(RAGIONI)} {rnd.choice(COGNOMI)} {rnd.choice(FORME)}"
+        out.append({
+            "nome": f"{nome} #{i + 1}",
+            "piva": f"{10000000000 + i * 7919:011d}",
+            "categoria_id": rnd.choice([1, 1, 1, 1, 2, 2, 5, 6, 7, 8, 9, 11]),
+            "giorni": rnd.choice([0, 30, 60, 90]),
+        })
+    return out
+
+
+def genera_acquisti(conn, rnd, inizio: date, fine: date, f: float) -> dict:
+    fornitori = _fornitori(rnd, _scala(VOLUMI["fornitori"], f))
+    _inserisci(conn, "suppliers", ("name", "partita_iva", "giorni_pagamento"),
+               ((x["nome"], x["piva"], x["giorni"]) for x in fornitori))
+    _inserisci(conn, "fe_fornitore_categoria", ("fornitore_piva", "fornitore_nome", "categoria_id"),
+               ((x["piva"], x["nome"], x["categoria_id"]) for x in fornitori))
+
+    giorni = (fine - inizio).days
+    n_fatture = _scala(VOLUMI["fatture_anno"] * giorni // 365, f)
+    fid0 = _max_id(conn, "fe_fatture")
+    fatture, righe, uscite = [], [], []
+    oggi = date.today()
+    for k in range(n_fatture):
+        fid = fid0 + k + 1
+        forn = rnd.choice(fornitori)
+        d = inizio + timedelta(days=rnd.randrange(giorni))
+        n_righe = rnd.choice([1, 2, 3, 5, 8, 8, 12, 15, 25])
+        imponibile = 0.0
+        for ln in range(n_righe):
+            q = round(rnd.uniform(1, 40), 2)
+            pu = round(rnd.uniform(0.8, 60), 2)
+            tot = round(q * pu, 2)
+            imponibile += tot
+            righe.append((fid, ln + 1, rnd.choice(ARTICOLI), q, rnd.choice(["KG", "PZ", "LT", "CF"]),
+                          pu, tot, rnd.choice([4.0, 10.0, 22.0])))
+        imponibile = round(imponibile, 2)
+        iva = round(imponibile * 0.1, 2)
+        totale = round(imponibile + iva, 2)
+        scad = d + timedelta(days=forn["giorni"])
+        pagata = scad < oggi - timedelta(days=20) or rnd.random() < 0.2
+        fatture.append((fid, forn["nome"], forn["piva"], f"{d.year}/{fid}", d.isoformat(), imponibile,
+                        iva, totale, "EUR", f"sint-{fid:08x}", "TD01", "XML", scad.isoformat(),
+                        totale))
+        uscite.append((fid, forn["nome"], forn["piva"], f"{d.year}/{fid}", d.isoformat(), totale,
+                       scad.isoformat(), totale if pagata else 0,
+                       scad.isoformat() if pagata else None,
+                       "PAGATO" if pagata else ("SCADUTO" if scad < oggi else "PROGRAMMATO"),
+                       "FATTURA"))
+
+    _inserisci(conn, "fe_fatture",
+               ("id", "fornitore_nome", "fornitore_piva", "numero_fattura", "data_fattura",
+                "imponibile_totale", "iva_totale", "totale_fattura", "valuta", "xml_hash",
+                "tipo_documento", "fonte", "data_scadenza", "importo_pagamento"), fatture)
+    _inserisci(conn, "fe_righe",
+               ("fattura_id", "numero_linea", "descrizione", "quantita", "unita_misura",
+                "prezzo_unitario", "prezzo_totale", "aliquota_iva"), righe)
+    _inserisci(conn, "cg_uscite",
+               ("fattura_id", "fornitore_nome", "fornitore_piva", "numero_fattura", "data_fattura",
+                "totale", "data_scadenza", "importo_pagato", "data_pagamento", "stato",
+                "tipo_uscita"), uscite)
+    conn.commit()
+    _log(f"acquisti: {len(fornitori)} fornitori, {len(fatture)} fatture, {len(righe)} righe")
+    return {"fornitori": fornitori, "fatture": fatture}
+
+
+def genera_banca(conn, rnd, inizio: date, fine: date, f: float, acquisti: dict) -> None:
+    giorni = (fine - inizio).days
+    n = _scala(VOLUMI["movimenti_banca_anno"] * giorni // 365, f)
+    mid0 = _max_id(conn, "banca_movimenti")
+    movimenti, link = [], []
+    pagate = [x for x in acquisti["fatture"] if rnd.random() < 0.6]
+    for k in range(n):
+        mid = mid0 + k + 1
+        if k < len(pagate) and rnd.random() < 0.5:
+            fat = pagate[k]
+            d = date.fromisoformat(fat[12])
+            importo = -fat[7]
+            descr = f"BONIFICO A FAVORE DI {fat[1]} FT {fat[3]}"
+            cat = "Fornitori"
+            if rnd.random() < 0.7:
+                link.append((mid, fat[0], "auto"))
+        elif rnd.random() < 0.45:
+            d = inizio + timedelta(days=rnd.randrange(giorni))
+            importo = round(rnd.uniform(300, 6000), 2)
+            descr = f"VERSAMENTO POS {rnd.choice(['BPM', 'SELLA'])} DEL {d.isoformat()}"
+            cat = "Incassi"
+        else:
+            d = inizio + timedelta(days=rnd.randrange(giorni))
+            importo = -round(rnd.uniform(5, 2500), 2)
+            descr = rnd.choice(["ADDEBITO SDD ENEL ENERGIA", "COMMISSIONI POS", "F24 TELEMATICO",
+                                "PAGAMENTO CARTA METRO", "RATA MUTUO", "STIPENDI"])
+            cat = rnd.choice(["Utenze", "Commissioni", "Tasse", "Acquisti", "Finanziamenti", "Personale"])
+        movimenti.append((mid, "Banca Sintetica", d.isoformat(), d.isoformat(), importo, "EUR",
+                          descr, cat, f"sint-{mid:010d}"))
+    _inserisci(conn, "banca_movimenti",
+               ("id", "banca", "data_contabile", "data_valuta", "importo", "divisa", "descrizione",
+                "categoria_banca", "dedup_hash"), movimenti)
+    _inserisci(conn, "banca_fatture_link", ("movimento_id", "fattura_id", "tipo_match"), link)
+    conn.commit()
+    _log(f"banca: {len(movimenti)} movimenti, {len(link)} riconciliati")
+
+
+def genera_ipratico(conn, rnd, inizio: date, fine: date, f: float) -> None:
+    prodotti = [(rnd.choice(CATEGORIE_IPRATICO), f"Prodotto {i + 1:04d}", rnd.randint(300, 4500))
+                for i in range(_scala(VOLUMI["prodotti_ipratico"], f))]
+    imports, cats, prods = [], [], []
+    a, m = inizio.year, inizio.month
+    while (a, m) <= (fine.year, fine.month):
+        per_cat = {}
+        for cat, nome, prezzo in prodotti:
+            if rnd.random() < 0.1:
+                continue
+            q = rnd.randint(1, 400)
+            prods.append((a, m, cat, nome, q, q * prezzo))
+            acc = per_cat.setdefault(cat, [0, 0])
+            acc[0] += q
+            acc[1] += q * prezzo
+        cats.extend((a, m, c, v[0], v[1]) for c, v in per_cat.items())
+        imports.append((a, m, f"sintetico_{a}_{m:02d}.xls", len(per_cat),
+                        sum(1 for p in prods if p[0] == a and p[1] == m),
+                        sum(v[1] for v in per_cat.values()) / 100))
+        a, m = (a + 1, 1) if m == 12 else (a, m + 1)
+    _inserisci(conn, "ipratico_imports",
+               ("anno", "mese", "filename", "n_categorie", "n_prodotti", "totale_euro"), imports)
+    _inserisci(conn, "ipratico_categorie", ("anno", "mese", "categoria", "quantita", "totale_cent"), cats)
+    _inserisci(conn, "ipratico_prodotti",
+               ("anno", "mese", "categoria", "prodotto", "quantita", "totale_cent"), prods)
+    conn.commit()
+    _log(f"ipratico: {len(imports)} mesi, {len(prods)} righe prodotto")
+
+
+def genera_ricette(conn, rnd, f: float) -> None:
+    n_ing = _scala(VOLUMI["ingredienti"], f)
+    iid0 = _max_id(conn, "ingredients")
+    allergeni = ["", "", "", "glutine", "latte", "uova", "frutta a guscio", "pesce", "sedano"]
+    _inserisci(conn, "ingredients", ("id", "name", "default_unit", "allergeni", "is_active"),
+               ((iid0 + i + 1, f"{rnd.choice(ARTICOLI)} {i + 1}", rnd.choice(["kg", "g", "l", "pz"]),
+                 rnd.choice(allergeni) or None, 1) for i in range(n_ing)))
+    sup_ids = [r[0] for r in conn.execute("SELECT id FROM suppliers")]
+    oggi = date.today()
+    _inserisci(conn, "ingredient_prices",
+               ("ingredient_id", "supplier_id", "price_date", "unit_price", "quantity", "unit"),
+               ((iid0 + i + 1, rnd.choice(sup_ids), (oggi - timedelta(days=rnd.randrange(700))).isoformat(),
+                 round(rnd.uniform(0.5, 45), 2), 1, "kg")
+                for i in range(n_ing) for _ in range(rnd.randint(1, 4))))
+
+    categorie = [r[0] for r in conn.execute("SELECT id FROM recipe_categories")] or [None]
+    n_ric = _scala(VOLUMI["ricette"], f)
+    n_base = max(1, n_ric // 5)
+    rid0 = _max_id(conn, "recipes")
+    ricette, items = [], []
+    for i in range(n_ric):
+        rid = rid0 + i + 1
+        base = i < n_base
+        ricette.append((rid, f"{'Base' if base else 'Piatto'} {i + 1}", rnd.choice(categorie),
+                        1 if base else 0, rnd.choice([1, 4, 10]), "porzioni",
+                        None if base else round(rnd.uniform(9, 38), 1), 1,
+                        "base" if base else "dish"))
+        for s in range(rnd.randint(3, 12)):
+            if not base and i > n_base and rnd.random() < 0.25:
+                items.append((rid, None, rid0 + rnd.randrange(n_base) + 1, 1, "porzioni", s))
+            else:
+                items.append((rid, iid0 + rnd.randrange(n_ing) + 1, None,
+                               round(rnd.uniform(0.01, 0.5), 3), "kg", s))
+    _inserisci(conn, "recipes",
+               ("id", "name", "category_id", "is_base", "yield_qty", "yield_unit", "selling_price",
+                "is_active", "kind"), ricette)
+    _inserisci(conn, "recipe_items",
+               ("recipe_id", "ingredient_id", "sub_recipe_id", "qty", "unit", "sort_order"), items)
+    conn.commit()
+    _log(f"ricette: {n_ing} ingredienti, {n_ric} ricette ({n_base} basi), {len(items)} righe")
+
+
+def genera_chiusure(rnd, inizio: date, fine: date) -> None:
+    from app.routers.chiusure_turno import DB_PATH
+
+    righe = []
+    d = inizio
+    while d <= fine:
+        if d.weekday() != 0:  # lunedì chiuso
+            for turno, base in (("pranzo", 900), ("cena", 2200)):
+                tot = round(rnd.uniform(0.5, 1.6) * base, 2)
+                contanti = round(tot * rnd.uniform(0.1, 0.3), 2)
+                righe.append((d.isoformat(), turno, contanti, round(tot - contanti, 2),
+                              rnd.randint(10, 70), tot, "bench"))
+        d += timedelta(days=1)
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        _inserisci(conn, "shift_closures",
+                   ("date", "turno", "contanti", "pos_bpm", "coperti", "totale_incassi", "created_by"),
+                   righe)
+        conn.commit()
+    finally:
+        conn.close()
+    _log(f"cassa: {len(righe)} chiusure turno")
+
+
+def genera_clienti(rnd, inizio: date, fine: date, f: float) -> None:
+    from app.utils.locale_data import locale_data_path
+
+    conn = sqlite3.connect(locale_data_path("clienti.sqlite3"))
+    try:
+        n = _scala(VOLUMI["clienti"], f)
+        cid0 = _max_id(conn, "clienti")
+        clienti = []
+        for i in range(n):
+            nome, cognome = rnd.choice(NOMI), rnd.choice(COGNOMI)
+            nascita = (date(1950, 1, 1) + timedelta(days=rnd.randrange(20000))).isoformat() \
+                if rnd.random() < 0.6 else None
+            clienti.append((cid0 + i + 1, f"tf-{i}" if rnd.random() < 0.7 else None, nome, cognome,
+                            f"{nome}.{cognome}.{i}@example.com".lower() if rnd.random() < 0.8 else None,
+                            f"+39 3{rnd.randrange(10**8, 10**9)}" if rnd.random() < 0.9 else None,
+                            nascita, 1 if rnd.random() < 0.03 else 0,
+                            1 if rnd.random() < 0.4 else 0, 1, "sintetico"))
+        _inserisci(conn, "clienti",
+                   ("id", "thefork_id", "nome", "cognome", "email", "telefono", "data_nascita", "vip",
+                    "newsletter", "attivo", "origine"), clienti)
+
+        giorni = (fine - inizio).days + 60
+        pren = []
+        for k in range(_scala(VOLUMI["prenotazioni"], f)):
+            # distribuzione a coda lunga: pochi clienti abituali, molti occasionali
+            cid = cid0 + min(int(rnd.paretovariate(1.2)) - 1, n - 1) * 37 % n + 1 \
+                if rnd.random() < 0.5 else cid0 + rnd.randrange(n) + 1
+            d = inizio + timedelta(days=rnd.randrange(giorni))
+            turno = rnd.choice(["pranzo", "cena", "cena"])
+            pren.append((cid, f"tfb-{k}" if rnd.random() < 0.6 else None, d.isoformat(),
+                         "13:00" if turno == "pranzo" else rnd.choice(["19:30", "20:00", "21:00"]),
+                         rnd.choice(STATI_PREN), rnd.choice([2, 2, 2, 3, 4, 4, 6, 8]),
+                         rnd.choice(["TheFork", "Telefono", "Walk-in", "Sito"]), turno,
+                         "thefork" if rnd.random() < 0.6 else "interno",
+                         round(rnd.uniform(30, 400), 2) if rnd.random() < 0.5 else None))
+        _inserisci(conn, "clienti_prenotazioni",
+                   ("cliente_id", "thefork_booking_id", "data_pasto", "ora_pasto", "stato", "pax",
+                    "canale", "turno", "fonte", "importo_conto"), pren)
+        conn.commit()
+        _log(f"clienti: {len(clienti)} clienti, {len(pren)} prenotazioni")
+    finally:
+        conn.close()
+
+
+def genera_vini(rnd, inizio: date, fine: date, f: float) -> None:
+    from app.utils.locale_data import locale_data_path
+
+    conn = sqlite3.connect(locale_data_path("vini_magazzino.sqlite3"))
+    try:
+        n_prod = _scala(VOLUMI["produttori_vino"], f)
+        pid0 = _max_id(conn, "vini_produttori")
+        produttori = [(pid0 + i + 1, f"Cantina {rnd.choice(COGNOMI)} {i + 1}",
+                       "Francia" if rnd.random() < 0.15 else "Italia", rnd.choice(REGIONI))
+                      for i in range(n_prod)]
+        _inserisci(conn, "vini_produttori", ("id", "nome", "nazione", "regione"), produttori)
+
+        n_vini = _scala(VOLUMI["vini"], f)
+        vid0 = _max_id(conn, "vini_bottiglie")
+        vini = []
+        for i in range(n_vini):
+            p = rnd.choice(produttori)
+            listino = round(rnd.uniform(6, 120), 2)
+            q1, q2 = rnd.randint(0, 24), rnd.randint(0, 12)
+            vini.append((vid0 + i + 1, rnd.choice(TIPOLOGIE), p[2], p[3], f"Etichetta {i + 1}",
+                         rnd.choice([None, "DOC", "DOCG", "IGT"]), rnd.randint(2005, fine.year - 1),
+                         p[1], rnd.choice(["BT", "BT", "BT", "MG", "MZ"]), listino,
+                         round(listino * rnd.uniform(2.2, 3.2), 0), 1 if rnd.random() < 0.7 else 0,
+                         "Cantina", q1, "Scaffale", q2, q1 + q2, rnd.choice([0, 1, 2, 2, 2, 3])))
+        _inserisci(conn, "vini_bottiglie",
+                   ("id", "TIPOLOGIA", "NAZIONE", "REGIONE", "DESCRIZIONE", "DENOMINAZIONE", "ANNATA",
+                    "PRODUTTORE", "FORMATO", "EURO_LISTINO", "PREZZO_CARTA", "CARTA",
+                    "LOCAZIONE_1", "QTA_LOC1", "LOCAZIONE_2", "QTA_LOC2", "QTA_TOTALE",
+                    "STATO_VENDITA"), vini)
+
+        giorni = (fine - inizio).days
+        movimenti = []
+        for _ in range(_scala(VOLUMI["movimenti_vino"], f)):
+            v = rnd.choice(vini)
+            tipo = rnd.choice(["VENDITA"] * 6 + ["SCARICO", "CARICO", "CARICO", "RETTIFICA"])
+            d = inizio + timedelta(days=rnd.randrange(giorni), minutes=rnd.randrange(1440))
+            qta = rnd.randint(1, 12) if tipo == "CARICO" else rnd.randint(1, 3)
+            movimenti.append((v[0], d.isoformat(), tipo, qta, "Cantina", "bench", "bench",
+                              d.isoformat(), v[10] if tipo == "VENDITA" else v[9]))
+        _inserisci(conn, "vini_magazzino_movimenti",
+                   ("vino_id", "data_mov", "tipo", "qta", "locazione", "origine", "utente",
+                    "created_at", "prezzo_unitario"), movimenti)
+        conn.commit()
+        _log(f"vini: {n_prod} produttori, {n_vini} bottiglie, {len(movimenti)} movimenti")
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------------------------
+# 4. Derivati
+# ---------------------------------------------------------------------------
+def finalizza() -> None:
+    from app.services import ipratico_cubo
+    from app.utils.locale_data import locale_data_path
+
+    conn = sqlite3.connect(locale_data_path("foodcost.db"))
+    try:
+        ipratico_cubo.ricostruisci(conn)
+    finally:
+        conn.close()
+    for nome in ("foodcost.db", "clienti.sqlite3", "vini_magazzino.sqlite3", "admin_finance.sqlite3"):
+        conn = sqlite3.connect(locale_data_path(nome))
+        try:
+            conn.execute("ANALYZE")
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--locale", default="bench", help="id del locale da creare sotto locali/")
+    ap.add_argument("--scala", type=float, default=1.0, help="moltiplicatore dei volumi (default 1.0)")
+    ap.add_argument("--anni", type=int, default=3, help="anni di storico fino a oggi")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--sovrascrivi", action="store_true", help="rigenera un locale sintetico esistente")
+    args = ap.parse_args()
+
+    if args.locale in ("tregobbi", "trgb", "_template"):
+        raise SystemExit(f"'{args.locale}' è un locale vero: scegli un altro id")
+    base = prepara_cartella(args.locale, args.sovrascrivi)
+    # Tutti i path dei DB si risolvono da TRGB_LOCALE: va impostato prima di importare app.*
+    os.environ["TRGB_LOCALE"] = args.locale
+
+    t0 = time.perf_counter()
+    rnd = random.Random(args.seed)
+    fine = date.today()
+    inizio = date(fine.year - args.anni, fine.month, 1)
+
+    prepara_schemi()
+    _log(f"schemi pronti ({time.perf_counter() - t0:.1f}s)")
+
+    from app.utils.locale_data import locale_data_path
+
+    conn = sqlite3.connect(locale_data_path("foodcost.db"))
+    try:
+        acquisti = genera_acquisti(conn, rnd, inizio, fine, args.scala)
+        genera_banca(conn, rnd, inizio, fine, args.scala, acquisti)
+        genera_ipratico(conn, rnd, inizio, fine, args.scala)
+        genera_ricette(conn, rnd, args.scala)
+    finally:
+        conn.close()
+    genera_chiusure(rnd, inizio, fine)
+    genera_clienti(rnd, inizio, fine, args.scala)
+    genera_vini(rnd, inizio, fine, args.scala)
+    finalizza()
+
+    import app.services.auth_service  # noqa: F401  (crea users.json di emergenza)
+
+    _log(f"locale '{args.locale}' pronto in {base} ({time.perf_counter() - t0:.1f}s)")
+    _log(f"benchmark: python tools/bench_endpoints.py --locale {args.locale}")
+
+
+if __name__ == "__main__":
+    main()
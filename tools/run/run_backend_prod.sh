@@ -3,4 +3,7 @@
 export PATH="/home/marco/trgb/venv-trgb/bin:$PATH"
 cd /home/marco/trgb/trgb || exit 1
 
-exec uvicorn main:app --host 127.0.0.1 --port 8000
+# --timeout-graceful-shutdown: gli stream SSE (/eventi/stream) restano aperti
+# fino a 15 min; al restart non aspettiamo che finiscano, i client si
+# riconnettono da soli con Last-Event-ID.
+exec uvicorn main:app --host 127.0.0.1 --port 8000 --timeout-graceful-shutdown 5
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Controllo ce_ledger vs calcolo diretto del Conto Economico su una spalmatura
+che parte a metà mese (caso dei trigger corretti dalla mig 181).
+
+Uso (dalla root del repo, locale con migrazioni applicate):
+    TRGB_LOCALE=bench python tools/verifica_ce_ledger.py
+    python tools/verifica_ce_ledger.py --locale bench --anno 2026
+
+Lavora su una COPIA di foodcost.db in una cartella temporanea: il locale non
+viene toccato. Passi:
+  1. reinstalla i trigger (ce_ledger.installa_trigger) e riempie il ledger;
+  2. aggiunge una spesa fissa spalmata dal 15/01 su 3 mesi e spalma una
+     fattura dal 20/05 su 4 mesi (la query le copre feb–apr e giu–set);
+  3. riempie il ledger, poi cambia importo della spesa e righe della fattura;
+  4. confronta ogni mese dell'anno: ledger (dopo il drenaggio della coda)
+     contro calcola_mese. Exit code 1 se un mese diverge.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--locale", default=None, help="default: TRGB_LOCALE")
+    ap.add_argument("--anno", type=int, default=2026)
+    args = ap.parse_args()
+    if args.locale:
+        os.environ["TRGB_LOCALE"] = args.locale
+
+    from app.services import ce_ledger  # noqa: E402
+    from app.utils.locale_data import locale_data_path  # noqa: E402
+
+    sorgente = locale_data_path("foodcost.db")
+    if not sorgente.exists():
+        print(f"foodcost.db non trovato in {sorgente.parent}")
+        return 2
+    tmp = tempfile.mkdtemp(prefix="verifica_ce_ledger_")
+    try:
+        copia = os.path.join(tmp, "foodcost.db")
+        shutil.copy2(sorgente, copia)
+        fc = sqlite3.connect(copia)
+        fc.row_factory = sqlite3.Row
+        dip_path = locale_data_path("dipendenti.sqlite3")
+        dip = None
+        if dip_path.exists():
+            dip = sqlite3.connect(f"file:{dip_path}?mode=ro", uri=True)
+            dip.row_factory = sqlite3.Row
+
+        mesi = [f"{args.anno}-{m:02d}" for m in range(1, 13)]
+        ce_ledger.installa_trigger(fc)
+        ce_ledger.invalida(fc)
+        fc.commit()
+        ce_ledger.righe_mesi(fc, dip, mesi)
+
+        cat = fc.execute("SELECT id FROM fe_categorie ORDER BY id LIMIT 1").fetchone()
+        sf_id = fc.execute(
+            """
+            INSERT INTO cg_spese_fisse
+                (tipo, titolo, importo, attiva, categoria_id,
+                 spalmatura_mesi, spalmatura_data_inizio)
+            VALUES ('ASSICURAZIONE', 'verifica_ce_ledger', 1200, 1, ?, 3, ?)
+            """,
+            (cat[0] if cat else None, f"{args.anno}-01-15"),
+        ).lastrowid
+        fattura = fc.execute(
+            "SELECT f.id FROM fe_fatture f JOIN fe_righe r ON r.fattura_id = f.id "
+            "WHERE COALESCE(f.is_autofattura, 0) = 0 ORDER BY f.id LIMIT 1"
+        ).fetchone()
+        if fattura:
+            fc.execute(
+                "UPDATE fe_fatture SET spalmatura_mesi = 4, spalmatura_data_inizio = ? WHERE id = ?",
+                (f"{args.anno}-05-20", fattura[0]),
+            )
+        fc.commit()
+        ce_ledger.righe_mesi(fc, dip, mesi)
+
+        # Modifica dopo che il ledger è pieno: solo i trigger lo possono sapere
+        fc.execute("UPDATE cg_spese_fisse SET importo = 3000 WHERE id = ?", (sf_id,))
+        if fattura:
+            fc.execute(
+                "UPDATE fe_righe SET prezzo_totale = prezzo_totale + 100 WHERE fattura_id = ?",
+                (fattura[0],),
+            )
+        fc.commit()
+
+        diversi = ce_ledger.verifica(fc, dip, mesi)
+        if not fattura:
+            print("nessuna fattura con righe: controllata solo la spesa fissa")
+        if diversi:
+            print(f"KO: ledger diverso dal calcolo diretto in {', '.join(diversi)}")
+            return 1
+        print(f"OK: ledger allineato al calcolo diretto su {mesi[0]} … {mesi[-1]}")
+        return 0
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())